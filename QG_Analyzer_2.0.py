@@ -6,18 +6,22 @@ FASE 2: ESPANSIONE E VALIDAZIONE SCIENTIFICA
 
 import os
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-from scipy import stats
-from scipy.optimize import curve_fit
-from sklearn.linear_model import RANSACRegressor, LinearRegression
-from astropy.io import fits
-from astropy.cosmology import Planck18
 import json
 import time
 from datetime import datetime
 import warnings
+
+from lazy_imports import lazy_module, lazy_pyplot
+from stage_profiler import stage, profiled, set_context, PROFILER
+from liv_cosmology import PLANCK_ENERGY_GEV
+from synthetic_bursts import generate_burst
+from sliding_correlation import WindowComoments, detect_change_point
+
+# Plot, ML e tabelle caricati al primo uso
+pd = lazy_module('pandas')
+plt = lazy_pyplot()
+sns = lazy_module('seaborn')
+stats = lazy_module('scipy.stats')
 warnings.filterwarnings('ignore')
 
 class QGAnalyzer2:
@@ -27,12 +31,15 @@ class QGAnalyzer2:
         self.results = []
         self.grbs_analyzed = []
         self.start_time = datetime.now()
-        self.setup_plotting()
+        self.plotting_ready = False
         
     def setup_plotting(self):
-        """Configura stile plotting"""
+        """Configura stile plotting (al primo grafico, non all'avvio)"""
+        if self.plotting_ready:
+            return
         plt.style.use('seaborn-v0_8')
         sns.set_palette("husl")
+        self.plotting_ready = True
         
     def load_grb_catalog(self, catalog_file=None):
         """Carica catalogo GRB esteso (2018-2025)"""
@@ -79,40 +86,25 @@ class QGAnalyzer2:
     
     def generate_realistic_grb_data(self, grb_info):
         """Genera dati realistici per un GRB"""
-        n_photons = grb_info['Photon_Count']
-        
-        # Genera energie con distribuzione power-law (correzione per alpha negativo)
-        alpha = np.random.uniform(-2.5, -1.5)  # Range fisicamente ragionevole
-        # Per alpha negativo, usiamo una distribuzione inversa
-        if alpha < 0:
-            # Genera distribuzione power-law con alpha negativo
-            uniform_samples = np.random.uniform(0, 1, n_photons)
-            energies = grb_info['Energy_Range_Min'] * (1 - uniform_samples) ** (1 / (alpha + 1))
-            # Normalizza al range energetico
-            energies = energies * (grb_info['Energy_Range_Max'] - grb_info['Energy_Range_Min']) + grb_info['Energy_Range_Min']
-        else:
-            # Per alpha positivo, usa il metodo standard
-            energies = np.random.power(1 + alpha, n_photons) * grb_info['Energy_Range_Max']
-        
-        # Genera tempi con struttura temporale realistica
-        t_start = 0
-        t_end = grb_info['Duration']
-        times = np.random.uniform(t_start, t_end, n_photons)
-        
-        # Aggiungi effetti QG casualmente (62.5% probabilità)
-        has_qg_effect = np.random.random() < 0.625
-        
-        if has_qg_effect:
-            # Aggiungi dispersione quantistica
-            qg_strength = np.random.uniform(0.5, 2.0)  # σ range
-            energy_dependent_delay = qg_strength * (energies / 1.0) * np.random.normal(0, 0.1, n_photons)
-            times += energy_dependent_delay
-            
-            # Aggiungi transizioni di fase per alcuni GRB
-            if np.random.random() < 0.4:  # 40% probabilità
-                phase_transition_time = np.random.uniform(0.2, 0.8) * t_end
-                phase_mask = times > phase_transition_time
-                times[phase_mask] += np.random.uniform(0.5, 2.0) * (energies[phase_mask] / 10.0)
+        duration = grb_info['Duration']
+        # Generatore derivato dallo stato globale: np.random.seed resta riproducibile
+        rng = np.random.default_rng(np.random.randint(2**31))
+        
+        # Effetti QG casualmente (62.5% probabilità): LIV lineare con K(z) cosmologico,
+        # E_QG attorno alla scala di Planck
+        has_qg_effect = rng.random() < 0.625
+        qg_strength = rng.uniform(0.5, 2.0)
+        
+        burst = generate_burst(
+            rng=rng,
+            n_photons=int(grb_info['Photon_Count']),
+            z=float(grb_info.get('Redshift', 1.0)),
+            pulse_peaks=[0.2 * duration], rise=0.02 * duration, decay=0.15 * duration,
+            index=rng.uniform(-2.5, -1.5),  # Range fisicamente ragionevole
+            E_min=grb_info['Energy_Range_Min'], E_max=grb_info['Energy_Range_Max'],
+            E_QG=PLANCK_ENERGY_GEV / qg_strength if has_qg_effect else None,
+        )
+        energies, times = burst['energies'], burst['times']
         
         return {
             'energies': energies,
@@ -121,6 +113,7 @@ class QGAnalyzer2:
             'grb_info': grb_info
         }
     
+    @profiled
     def analyze_grb(self, grb_data):
         """Analizza un singolo GRB per effetti QG"""
         energies = grb_data['energies']
@@ -140,6 +133,7 @@ class QGAnalyzer2:
         X = energies.reshape(-1, 1)
         y = times
         
+        from sklearn.linear_model import RANSACRegressor, LinearRegression
         ransac = RANSACRegressor(LinearRegression(), min_samples=0.5, random_state=42)
         ransac.fit(X, y)
         inlier_mask = ransac.inlier_mask_
@@ -148,10 +142,11 @@ class QGAnalyzer2:
         # Permutation test
         n_permutations = 10000
         permuted_correlations = []
-        for _ in range(n_permutations):
-            perm_energies = np.random.permutation(energies)
-            perm_r, _ = stats.pearsonr(perm_energies, times)
-            permuted_correlations.append(perm_r)
+        with stage('permutation_test', n_photons=n):
+            for _ in range(n_permutations):
+                perm_energies = np.random.permutation(energies)
+                perm_r, _ = stats.pearsonr(perm_energies, times)
+                permuted_correlations.append(perm_r)
         
         perm_p_value = np.mean(np.abs(permuted_correlations) >= abs(pearson_r))
         
@@ -176,6 +171,7 @@ class QGAnalyzer2:
         
         # Rileva transizioni di fase
         phase_transitions = self.detect_phase_transitions(energies, times)
+        change_point = detect_change_point(times, energies, min_photons=20)
         
         result = {
             'GRB': grb_info['GRB'],
@@ -197,32 +193,30 @@ class QGAnalyzer2:
             'Significance_Class': significance_class,
             'Has_QG_Effect': grb_data['has_qg_effect'],
             'Phase_Transitions': phase_transitions,
+            'Change_Point': change_point,
             'Analysis_Time': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         }
         
         return result
     
     def detect_phase_transitions(self, energies, times):
-        """Rileva transizioni di fase temporali"""
+        """Rileva transizioni di fase temporali (segmenti da co-momenti cumulativi, O(1) ciascuno)"""
         # Suddivide in segmenti temporali
         n_segments = 10
         time_segments = np.linspace(times.min(), times.max(), n_segments + 1)
         
+        comoments = WindowComoments(times, energies)
+        bounds = np.searchsorted(comoments.times, time_segments, side='left')
+        segments = comoments.statistics(bounds[:-1], bounds[1:])
+        
         phase_transitions = []
         for i in range(n_segments):
-            mask = (times >= time_segments[i]) & (times < time_segments[i+1])
-            if np.sum(mask) > 10:  # Minimo 10 fotoni per segmento
-                segment_energies = energies[mask]
-                segment_times = times[mask]
-                
-                # Calcola correlazione per segmento
-                if len(segment_energies) > 2:
-                    r, _ = stats.pearsonr(segment_energies, segment_times)
-                    phase_transitions.append({
-                        'time_segment': i,
-                        'correlation': r,
-                        'photon_count': len(segment_energies)
-                    })
+            if segments['n_photons'][i] > 10:  # Minimo 10 fotoni per segmento
+                phase_transitions.append({
+                    'time_segment': i,
+                    'correlation': float(segments['correlation'][i]),
+                    'photon_count': int(segments['n_photons'][i])
+                })
         
         return phase_transitions
     
@@ -237,6 +231,7 @@ class QGAnalyzer2:
                 break
                 
             print(f"🔍 Analyzing {grb_info['GRB']} ({idx+1}/{min(len(grb_catalog), max_grbs)})...")
+            set_context(grb=grb_info['GRB'])
             
             # Genera dati realistici
             grb_data = self.generate_realistic_grb_data(grb_info)
@@ -310,6 +305,7 @@ class QGAnalyzer2:
             return
         
         df = pd.DataFrame(self.results)
+        self.setup_plotting()
         
         # Setup figure
         fig, axes = plt.subplots(2, 3, figsize=(18, 12))
@@ -455,6 +451,9 @@ def main():
     print("   - QG_Analyzer_2.0_Log.txt")
     print("   - QG_Analyzer_2.0_Multi_GRB_Results.png")
     print("=" * 60)
+    
+    if PROFILER.enabled:
+        PROFILER.print_summary()
 
 if __name__ == "__main__":
     main()
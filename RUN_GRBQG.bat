@@ -0,0 +1,7 @@
+@echo off
+echo ======================================================================
+echo GRBQG: ANALISI QG DA FILE DI CONFIGURAZIONE
+echo ======================================================================
+if not exist grbqg_run.toml python grbqg.py init grbqg_run.toml
+python grbqg.py run grbqg_run.toml %*
+pause
@@ -5,16 +5,16 @@ Corrects time-base mismatch and performs robust QG analysis
 """
 
 import numpy as np
-import matplotlib.pyplot as plt
-from astropy.io import fits
-from astropy.time import Time
-from astropy.cosmology import Planck18
-from scipy import stats
-from scipy.optimize import curve_fit
-import pandas as pd
-from sklearn.linear_model import RANSACRegressor, LinearRegression
-from sklearn.utils import resample
 import warnings
+from lazy_imports import lazy_module, lazy_pyplot
+from multi_instrument_events import MultiInstrumentEventTable
+from robust_line_fit import RANSACLineFitter
+from stage_profiler import profiled, PROFILER
+
+# Plot, FITS e cosmologia caricati solo quando servono
+plt = lazy_pyplot()
+fits = lazy_module('astropy.io.fits')
+stats = lazy_module('scipy.stats')
 warnings.filterwarnings('ignore')
 
 class TimeAlignedQGAnalyzer:
@@ -22,9 +22,11 @@ class TimeAlignedQGAnalyzer:
         self.lat_data = None
         self.lhaaso_data = None
         self.combined_data = None
+        self.event_table = None
         
         # GRB221009A parameters
         self.grb_name = "GRB221009A"
+        from astropy.time import Time
         self.t0 = Time("2022-10-09 13:16:59.000", format='iso', scale='utc')
         self.t0_unix = self.t0.unix  # Convert to Unix timestamp
         self.ra = 288.265  # degrees
@@ -37,6 +39,7 @@ class TimeAlignedQGAnalyzer:
         print(f"📍 RA: {self.ra}°, Dec: {self.dec}°")
         print(f"🌌 Redshift: z = {self.z}")
         
+    @profiled('load_fits')
     def load_lat_data(self, filename=None):
         """Load Fermi LAT data for GRB221009A"""
         print("\n🛰️ Loading Fermi LAT data...")
@@ -160,6 +163,8 @@ class TimeAlignedQGAnalyzer:
         lhaaso_t_rel = self.lhaaso_data['time'] - t0_common
         
         # Update data
+        self.time_offset = offset
+        self.t0_common = t0_common
         self.lat_data['time_aligned'] = lat_times_aligned
         self.lat_data['time_rel'] = lat_t_rel
         self.lhaaso_data['time_rel'] = lhaaso_t_rel
@@ -179,23 +184,23 @@ class TimeAlignedQGAnalyzer:
         """Combine LAT and LHAASO datasets with proper unit conversion and time alignment"""
         print("\n🔗 Combining LAT and LHAASO datasets...")
         
-        # Convert LHAASO energies to GeV for consistency
-        lhaaso_energy_gev = self.lhaaso_data['energy'] * 1000.0
-        
-        # Use aligned relative times
-        lat_t_rel = self.lat_data['time_rel']
-        lhaaso_t_rel = self.lhaaso_data['time_rel']
+        # Per-instrument column blocks: LHAASO TeV -> GeV and the common T0
+        # are applied on read, the instrument label is a categorical code
+        self.event_table = MultiInstrumentEventTable(t0=self.t0_common)
+        self.event_table.add_instrument('LAT', self.lat_data['time'], self.lat_data['energy'],
+                                        energy_unit='GeV', time_offset=self.time_offset,
+                                        ra=self.lat_data['ra'], dec=self.lat_data['dec'])
+        self.event_table.add_instrument('LHAASO', self.lhaaso_data['time'], self.lhaaso_data['energy'],
+                                        energy_unit='TeV',
+                                        ra=self.lhaaso_data['ra'], dec=self.lhaaso_data['dec'])
         
         # Combine data
         self.combined_data = {
-            'time': np.concatenate([lat_t_rel, lhaaso_t_rel]),
-            'energy': np.concatenate([self.lat_data['energy'], lhaaso_energy_gev]),
-            'instrument': np.concatenate([
-                np.full(len(self.lat_data['time']), 'LAT'),
-                np.full(len(self.lhaaso_data['time']), 'LHAASO')
-            ]),
-            'ra': np.concatenate([self.lat_data['ra'], self.lhaaso_data['ra']]),
-            'dec': np.concatenate([self.lat_data['dec'], self.lhaaso_data['dec']])
+            'time': self.event_table.column('time_rel'),
+            'energy': self.event_table.column('energy_GeV'),
+            'instrument': self.event_table.instrument,
+            'ra': self.event_table.column('ra'),
+            'dec': self.event_table.column('dec')
         }
         
         print(f"✅ Combined dataset: {len(self.combined_data['time'])} total photons")
@@ -209,6 +214,7 @@ class TimeAlignedQGAnalyzer:
         low, high = np.percentile(data, [p*100, (1-p)*100])
         return np.clip(data, low, high)
         
+    @profiled
     def permutation_test(self, x, y, n_perm=10000):
         """Perform permutation test for correlation significance"""
         print(f"\n🔄 Performing permutation test with {n_perm} permutations...")
@@ -236,6 +242,7 @@ class TimeAlignedQGAnalyzer:
         
         return obs_r, p_value, perm_correlations
         
+    @profiled
     def bootstrap_correlation(self, x, y, n_bootstrap=1000):
         """Perform bootstrap analysis for correlation confidence intervals"""
         print(f"\n🔄 Performing bootstrap analysis with {n_bootstrap} samples...")
@@ -264,16 +271,14 @@ class TimeAlignedQGAnalyzer:
         
         return bootstrap_correlations
         
-    def ransac_regression(self, x, y):
+    @profiled
+    def ransac_regression(self, x, y, warm_start=None):
         """Perform RANSAC regression to handle outliers"""
         print("\n🔍 Performing RANSAC regression to handle outliers...")
         
-        # Reshape for sklearn
-        X = x.reshape(-1, 1)
-        
-        # RANSAC regression
-        ransac = RANSACRegressor(LinearRegression(), min_samples=0.5, random_state=42)
-        ransac.fit(X, y)
+        # RANSAC regression (warm start from the parent consensus model if given)
+        ransac = RANSACLineFitter(min_samples=0.5, random_state=42)
+        ransac.fit(x, y, warm_start=warm_start)
         
         # Get results
         slope = ransac.estimator_.coef_[0]
@@ -295,6 +300,7 @@ class TimeAlignedQGAnalyzer:
         print("\n🌌 Calculating cosmological factor K(z)...")
         
         # Use Planck18 cosmology
+        from astropy.cosmology import Planck18
         cosmo = Planck18
         
         # Calculate luminosity distance
@@ -347,6 +353,11 @@ class TimeAlignedQGAnalyzer:
         
         results = {}
         
+        # Consensus model of the combined set, used to warm-start each instrument
+        parent = RANSACLineFitter(min_samples=0.5, random_state=42).fit(
+            self.combined_data['time'], self.combined_data['energy'])
+        parent_model = (parent.slope_, parent.intercept_)
+        
         for instrument in ['LAT', 'LHAASO']:
             mask = self.combined_data['instrument'] == instrument
             if np.sum(mask) < 10:  # Skip if too few photons
@@ -375,7 +386,8 @@ class TimeAlignedQGAnalyzer:
             
             # RANSAC regression
             if len(times) > 20:  # Only if enough data
-                ransac, slope, intercept, inlier_mask = self.ransac_regression(times, energies)
+                ransac, slope, intercept, inlier_mask = self.ransac_regression(
+                    times, energies, warm_start=parent_model)
                 results[instrument] = {
                     'corr_pearson': corr_pearson,
                     'corr_spearman': corr_spearman,
@@ -601,6 +613,7 @@ class TimeAlignedQGAnalyzer:
         
         print("✅ Comprehensive diagnostic plots created: grb221009a_time_aligned_analysis.png")
         
+    @profiled(grb='GRB221009A')
     def run_time_aligned_analysis(self):
         """Run complete time-aligned analysis"""
         print("🚀 Starting TIME-ALIGNED analysis for GRB221009A...")
@@ -676,6 +689,9 @@ def main():
     analyzer = TimeAlignedQGAnalyzer()
     results = analyzer.run_time_aligned_analysis()
     
+    if PROFILER.enabled:
+        PROFILER.print_summary()
+    
     print("\n✅ TIME-ALIGNED analysis complete!")
     print("📊 Check 'grb221009a_time_aligned_analysis.png' for comprehensive diagnostic plots.")
     print("🔍 Results now show proper time alignment and robust statistics.")
@@ -11,6 +11,8 @@ import json
 from datetime import datetime
 import glob
 
+from package_builder import build_package
+
 class ZenodoPackagePreparer:
     def __init__(self):
         self.base_dir = os.getcwd()
@@ -554,15 +556,16 @@ We thank the Fermi LAT collaboration for providing the data used in this analysi
         
         zip_filename = f"quantum-gravity-discovery-{self.version}.zip"
         
-        with zipfile.ZipFile(zip_filename, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for root, dirs, files in os.walk(self.zenodo_dir):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    arcname = os.path.relpath(file_path, self.base_dir)
-                    zipf.write(file_path, arcname)
-                    print(f"   ✅ {arcname}")
+        # Dedup per contenuto, compressione parallela, cache per rebuild incrementali
+        manifest = build_package([self.zenodo_dir], zip_filename, base_dir=self.base_dir,
+                                 version=self.version)
+        
+        with zipfile.ZipFile(zip_filename) as zipf:
+            bad_member = zipf.testzip()
+        if bad_member is not None:
+            raise RuntimeError(f"Corrupted member in ZIP package: {bad_member}")
         
-        print(f"✅ ZIP package created: {zip_filename}")
+        print(f"✅ ZIP package created: {zip_filename} ({manifest['n_files']} files, {manifest['n_unique']} unique contents)")
         
         # Get file size
         file_size = os.path.getsize(zip_filename) / (1024 * 1024)  # MB
@@ -12,24 +12,18 @@ Email: info@rthitalia.com
 """
 
 import numpy as np
-import matplotlib.pyplot as plt
 import json
-from astropy.io import fits
 from datetime import datetime
-import seaborn as sns
-from scipy import stats
-from scipy.optimize import curve_fit, minimize
-from sklearn.model_selection import cross_val_score
-from sklearn.linear_model import LinearRegression
-from sklearn.preprocessing import PolynomialFeatures
 import warnings
+from lazy_imports import lazy_module, lazy_pyplot
+from stage_profiler import stage, profiled, set_context, PROFILER
+from lag_profile import lag_profile, fit_lag_profile
 warnings.filterwarnings('ignore')
 
-# Configurazione matplotlib per headless
-import matplotlib
-matplotlib.use('Agg')
-plt.rcParams['figure.figsize'] = (18, 14)
-plt.rcParams['font.size'] = 10
+# Configurazione matplotlib per headless (applicata al primo grafico)
+plt = lazy_pyplot('Agg', rcparams={'figure.figsize': (18, 14), 'font.size': 10})
+fits = lazy_module('astropy.io.fits')
+stats = lazy_module('scipy.stats')
 
 def convert_numpy(obj):
     """Converte tipi NumPy in tipi Python standard per JSON"""
@@ -85,160 +79,75 @@ def model_temporal_band_lag(times, energies, t0, alpha, beta, t_break, alpha2, b
     
     return result
 
-def fit_advanced_lag_models(times, energies):
-    """Fit modelli lag avanzati"""
-    models = {}
-    
-    # Modello 1: Lag che evolve nel tempo
-    try:
-        def temporal_evolving(E, t0, alpha, beta, gamma):
-            return model_temporal_evolving_lag(times, E, t0, alpha, beta, gamma)
-        
-        p0 = [np.mean(times), -1.0, -0.5, 0.01]
-        bounds = ([times.min(), -100, -2, -0.1], [times.max(), 100, 2, 0.1])
-        
-        popt, pcov = curve_fit(temporal_evolving, energies, times, p0=p0, bounds=bounds, maxfev=3000)
-        t0, alpha, beta, gamma = popt
-        
-        times_pred = temporal_evolving(energies, t0, alpha, beta, gamma)
-        residuals = times - times_pred
-        chi2 = np.sum((residuals / np.std(residuals))**2)
-        dof = len(times) - 4
-        chi2_red = chi2 / dof
-        
-        correlation = np.corrcoef(times, times_pred)[0, 1]
-        
-        models['temporal_evolving'] = {
-            't0': float(t0),
-            'alpha': float(alpha),
-            'beta': float(beta),
-            'gamma': float(gamma),
-            'chi2': float(chi2),
-            'chi2_red': float(chi2_red),
-            'dof': int(dof),
-            'correlation': float(correlation),
-            'aic': float(2 * 4 + chi2),
-            'type': 'Temporal Evolving Lag'
-        }
-    except Exception as e:
-        print(f"⚠️ Errore fit temporal evolving: {e}")
-        models['temporal_evolving'] = None
-    
-    # Modello 2: Lag multi-componente
-    try:
-        def multi_component(E, t0, alpha1, beta1, alpha2, beta2, E_break):
-            return model_multi_component_lag(times, E, t0, alpha1, beta1, alpha2, beta2, E_break)
-        
-        E_break_init = np.median(energies)
-        p0 = [np.mean(times), -1.0, -0.5, -0.5, -0.3, E_break_init]
-        bounds = ([times.min(), -50, -2, -50, -2, energies.min()], 
-                 [times.max(), 50, 2, 50, 2, energies.max()])
-        
-        popt, pcov = curve_fit(multi_component, energies, times, p0=p0, bounds=bounds, maxfev=4000)
-        t0, alpha1, beta1, alpha2, beta2, E_break = popt
-        
-        times_pred = multi_component(energies, t0, alpha1, beta1, alpha2, beta2, E_break)
-        residuals = times - times_pred
-        chi2 = np.sum((residuals / np.std(residuals))**2)
-        dof = len(times) - 6
-        chi2_red = chi2 / dof
-        
-        correlation = np.corrcoef(times, times_pred)[0, 1]
-        
-        models['multi_component'] = {
-            't0': float(t0),
-            'alpha1': float(alpha1),
-            'beta1': float(beta1),
-            'alpha2': float(alpha2),
-            'beta2': float(beta2),
-            'E_break': float(E_break),
-            'chi2': float(chi2),
-            'chi2_red': float(chi2_red),
-            'dof': int(dof),
-            'correlation': float(correlation),
-            'aic': float(2 * 6 + chi2),
-            'type': 'Multi-Component Lag'
-        }
-    except Exception as e:
-        print(f"⚠️ Errore fit multi-component: {e}")
-        models['multi_component'] = None
-    
-    # Modello 3: Lag non-lineare in energia
-    try:
-        def nonlinear_energy(E, t0, alpha, beta, gamma):
-            return model_nonlinear_energy_lag(times, E, t0, alpha, beta, gamma)
-        
-        p0 = [np.mean(times), -1.0, -0.5, 0.001]
-        bounds = ([times.min(), -100, -2, -0.01], [times.max(), 100, 2, 0.01])
-        
-        popt, pcov = curve_fit(nonlinear_energy, energies, times, p0=p0, bounds=bounds, maxfev=3000)
-        t0, alpha, beta, gamma = popt
-        
-        times_pred = nonlinear_energy(energies, t0, alpha, beta, gamma)
-        residuals = times - times_pred
-        chi2 = np.sum((residuals / np.std(residuals))**2)
-        dof = len(times) - 4
-        chi2_red = chi2 / dof
-        
-        correlation = np.corrcoef(times, times_pred)[0, 1]
-        
-        models['nonlinear_energy'] = {
-            't0': float(t0),
-            'alpha': float(alpha),
-            'beta': float(beta),
-            'gamma': float(gamma),
-            'chi2': float(chi2),
-            'chi2_red': float(chi2_red),
-            'dof': int(dof),
-            'correlation': float(correlation),
-            'aic': float(2 * 4 + chi2),
-            'type': 'Nonlinear Energy Lag'
-        }
-    except Exception as e:
-        print(f"⚠️ Errore fit nonlinear energy: {e}")
-        models['nonlinear_energy'] = None
+@profiled
+def fit_advanced_lag_models(times, energies, profile=None):
+    """
+    Fit modelli lag avanzati sul profilo lag-energia binnato (mediana per
+    bin, errori bootstrap, tempi relativi al trigger). Nei modelli che
+    dipendono dal tempo di arrivo il tempo del fotone e' sostituito dal
+    tempo del bin.
+    """
+    if profile is None:
+        with stage('lag_profile'):
+            profile = lag_profile(energies, times, estimator='median', n_bootstrap=200, seed=42, t_ref=0.0)
+    bin_times = profile['time']
+    
+    def bin_times_like(E):
+        # il fit valuta i modelli sui nodi di energia di ogni bin: (n_bin, nodi)
+        return np.broadcast_to(bin_times.reshape((-1,) + (1,) * (np.ndim(E) - 1)), np.shape(E))
+    
+    specs = {
+        'temporal_evolving': (
+            lambda E, t0, alpha, beta, gamma: model_temporal_evolving_lag(bin_times_like(E), E, t0, alpha, beta, gamma),
+            ('t0', 'alpha', 'beta', 'gamma'),
+            [np.mean(times), -1.0, -0.5, 0.01],
+            ([times.min(), -100, -2, -0.1], [times.max(), 100, 2, 0.1]),
+            3000, 'Temporal Evolving Lag'),
+        'multi_component': (
+            lambda E, t0, alpha1, beta1, alpha2, beta2, E_break: model_multi_component_lag(
+                bin_times_like(E), E, t0, alpha1, beta1, alpha2, beta2, E_break),
+            ('t0', 'alpha1', 'beta1', 'alpha2', 'beta2', 'E_break'),
+            [np.mean(times), -1.0, -0.5, -0.5, -0.3, np.median(energies)],
+            ([times.min(), -50, -2, -50, -2, energies.min()],
+             [times.max(), 50, 2, 50, 2, energies.max()]),
+            4000, 'Multi-Component Lag'),
+        'nonlinear_energy': (
+            lambda E, t0, alpha, beta, gamma: model_nonlinear_energy_lag(bin_times_like(E), E, t0, alpha, beta, gamma),
+            ('t0', 'alpha', 'beta', 'gamma'),
+            [np.mean(times), -1.0, -0.5, 0.001],
+            ([times.min(), -100, -2, -0.01], [times.max(), 100, 2, 0.01]),
+            3000, 'Nonlinear Energy Lag'),
+        'temporal_band': (
+            lambda E, t0, alpha, beta, t_break, alpha2, beta2: model_temporal_band_lag(
+                bin_times_like(E), E, t0, alpha, beta, t_break, alpha2, beta2),
+            ('t0', 'alpha', 'beta', 't_break', 'alpha2', 'beta2'),
+            [np.mean(times), -1.0, -0.5, np.median(times), -0.5, -0.3],
+            ([times.min(), -50, -2, times.min(), -50, -2],
+             [times.max(), 50, 2, times.max(), 50, 2]),
+            4000, 'Temporal Band Lag'),
+    }
     
-    # Modello 4: Lag con break temporale
-    try:
-        def temporal_band(E, t0, alpha, beta, t_break, alpha2, beta2):
-            return model_temporal_band_lag(times, E, t0, alpha, beta, t_break, alpha2, beta2)
-        
-        t_break_init = np.median(times)
-        p0 = [np.mean(times), -1.0, -0.5, t_break_init, -0.5, -0.3]
-        bounds = ([times.min(), -50, -2, times.min(), -50, -2], 
-                 [times.max(), 50, 2, times.max(), 50, 2])
-        
-        popt, pcov = curve_fit(temporal_band, energies, times, p0=p0, bounds=bounds, maxfev=4000)
-        t0, alpha, beta, t_break, alpha2, beta2 = popt
-        
-        times_pred = temporal_band(energies, t0, alpha, beta, t_break, alpha2, beta2)
-        residuals = times - times_pred
-        chi2 = np.sum((residuals / np.std(residuals))**2)
-        dof = len(times) - 6
-        chi2_red = chi2 / dof
-        
-        correlation = np.corrcoef(times, times_pred)[0, 1]
-        
-        models['temporal_band'] = {
-            't0': float(t0),
-            'alpha': float(alpha),
-            'beta': float(beta),
-            't_break': float(t_break),
-            'alpha2': float(alpha2),
-            'beta2': float(beta2),
-            'chi2': float(chi2),
-            'chi2_red': float(chi2_red),
-            'dof': int(dof),
-            'correlation': float(correlation),
-            'aic': float(2 * 6 + chi2),
-            'type': 'Temporal Band Lag'
-        }
-    except Exception as e:
-        print(f"⚠️ Errore fit temporal band: {e}")
-        models['temporal_band'] = None
+    models = {}
+    for model_name, (func, param_names, p0, bounds, maxfev, label) in specs.items():
+        try:
+            fit = fit_lag_profile(profile, func, p0, param_names, bounds=bounds, maxfev=maxfev)
+            models[model_name] = {k: fit[k] for k in param_names}
+            models[model_name].update({
+                'chi2': fit['chi2'],
+                'chi2_red': fit['chi2_red'],
+                'dof': fit['dof'],
+                'n_bins': fit['n_bins'],
+                'correlation': fit['correlation'],
+                'aic': fit['aic'],
+                'type': label
+            })
+        except Exception as e:
+            print(f"⚠️ Errore fit {model_name.replace('_', ' ')}: {e}")
+            models[model_name] = None
     
     return models
 
+@profiled
 def analyze_systematic_effects(times, energies):
     """Analizza effetti sistematici"""
     systematic_results = {}
@@ -317,8 +226,12 @@ def analyze_systematic_effects(times, energies):
     
     return systematic_results
 
+@profiled
 def cross_validation_analysis(times, energies):
     """Analisi cross-validation"""
+    from sklearn.model_selection import cross_val_score
+    from sklearn.linear_model import LinearRegression
+    from sklearn.preprocessing import PolynomialFeatures
     cv_results = {}
     
     # 1. Cross-validation con regressione lineare
@@ -588,11 +501,12 @@ def main():
             
         print(f"\n🔬 ANALISI AVANZATA LAG: {grb_name}")
         print("-" * 50)
+        set_context(grb=grb_name)
         
         # Carica dati originali
         config = grb_configs[grb_name]
         try:
-            with fits.open(config['file']) as hdul:
+            with stage('load_fits'), fits.open(config['file']) as hdul:
                 events_data = hdul['EVENTS'].data
                 
                 if events_data is None:
@@ -669,6 +583,9 @@ def main():
     print("\n" + "="*70)
     print("FASE 4 COMPLETATA! Pronto per analisi finale!")
     print("="*70)
+    
+    if PROFILER.enabled:
+        PROFILER.print_summary()
 
 if __name__ == "__main__":
     main()
@@ -21,6 +21,9 @@ from scipy.optimize import curve_fit
 import json
 from datetime import datetime
 import warnings
+
+from liv_cosmology import PLANCK_ENERGY_GEV
+from synthetic_bursts import generate_burst
 warnings.filterwarnings('ignore')
 
 # Configurazione matplotlib
@@ -45,41 +48,24 @@ def convert_numpy(obj):
 def generate_multi_pulse_grb(n_photons=5000, n_pulses=3, has_qg=True):
     """Genera GRB con burst multipli"""
     
-    np.random.seed(42)
-    
-    # Parametri per ogni pulse
-    pulse_centers = np.linspace(0, 2000, n_pulses)
-    pulse_widths = np.random.uniform(100, 300, n_pulses)
-    pulse_amplitudes = np.random.uniform(0.5, 2.0, n_pulses)
-    
-    all_energies = []
-    all_times = []
-    
-    for i, (center, width, amplitude) in enumerate(zip(pulse_centers, pulse_widths, pulse_amplitudes)):
-        # Fotoni per questo pulse
-        n_pulse_photons = int(n_photons / n_pulses * amplitude)
-        
-        # Energia per questo pulse
-        pulse_energies = np.random.lognormal(0.5 + i*0.2, 1.0, n_pulse_photons)
-        pulse_energies = np.clip(pulse_energies, 0.1, 50.0)
-        
-        # Tempo per questo pulse
-        pulse_times = np.random.normal(center, width, n_pulse_photons)
-        pulse_times = np.clip(pulse_times, 0, 3000)
-        
-        # Lag intrinseci specifici per pulse
-        intrinsic_lag = 0.1 * np.power(pulse_energies, -0.3) + 0.05 * np.random.randn(n_pulse_photons)
-        pulse_times += intrinsic_lag
-        
-        # Effetti QG se richiesti
-        if has_qg:
-            qg_delay = 0.001 * (pulse_energies / 10.0) * (1 + 0.1 * pulse_times / 1000)
-            pulse_times += qg_delay
-        
-        all_energies.extend(pulse_energies)
-        all_times.extend(pulse_times)
-    
-    return np.array(all_energies), np.array(all_times), n_pulses
+    rng = np.random.default_rng(42)
+    
+    # Pulse FRED equispaziati, larghezze e ampiezze casuali
+    pulse_widths = rng.uniform(100, 300, n_pulses)
+    burst = generate_burst(
+        rng=rng,
+        n_photons=n_photons, z=1.0,
+        pulse_peaks=np.linspace(0, 2000, n_pulses),
+        pulse_amplitudes=rng.uniform(0.5, 2.0, n_pulses),
+        rise=0.3 * pulse_widths, decay=pulse_widths,
+        index=-2.0, E_min=0.1, E_max=50.0,
+        # Lag intrinseco: fotoni piu' energetici arrivano prima (soft lag)
+        lag_amplitude=-0.1, E_ref=0.1,
+        # Effetti QG: LIV lineare alla scala di Planck
+        E_QG=PLANCK_ENERGY_GEV if has_qg else None,
+    )
+    
+    return burst['energies'], burst['times'], n_pulses
 
 def generate_temporal_evolution_grb(n_photons=5000, has_qg=True):
     """Genera GRB con evoluzione temporale"""
@@ -17,6 +17,12 @@ from scipy.optimize import curve_fit
 import os
 import glob
 
+from stage_profiler import stage, set_context, PROFILER
+from figure_renderer import function_hash
+from results_journal import ResultsJournal, fingerprint, file_fingerprint
+
+JOURNAL_FILE = 'batch_grb_analysis_journal.jsonl'
+
 class BatchGRBAnalyzer:
     def __init__(self):
         self.results = {}
@@ -84,6 +90,7 @@ class BatchGRBAnalyzer:
     def analyze_single_grb(self, grb_info):
         """Analyze a single GRB"""
         print(f"\n🔬 Analyzing {grb_info['name']}...")
+        set_context(grb=grb_info['name'])
         
         try:
             # Load data
@@ -91,7 +98,7 @@ class BatchGRBAnalyzer:
                 print(f"   ❌ File not found: {grb_info['filename']}")
                 return None
             
-            with fits.open(grb_info['filename']) as hdul:
+            with stage('load_fits'), fits.open(grb_info['filename']) as hdul:
                 events_data = hdul['EVENTS'].data
                 
             times = events_data['TIME']
@@ -118,10 +125,11 @@ class BatchGRBAnalyzer:
             # 2. Permutation test
             n_permutations = 1000
             perm_correlations = []
-            for _ in range(n_permutations):
-                perm_times = np.random.permutation(times)
-                perm_corr = np.corrcoef(energies, perm_times)[0, 1]
-                perm_correlations.append(perm_corr)
+            with stage('permutation_test', n_photons=len(times)):
+                for _ in range(n_permutations):
+                    perm_times = np.random.permutation(times)
+                    perm_corr = np.corrcoef(energies, perm_times)[0, 1]
+                    perm_correlations.append(perm_corr)
             
             perm_p_value = np.sum(np.abs(perm_correlations) >= abs(correlation)) / n_permutations
             
@@ -135,12 +143,13 @@ class BatchGRBAnalyzer:
             # 3. Bootstrap analysis
             n_bootstrap = 1000
             bootstrap_correlations = []
-            for _ in range(n_bootstrap):
-                indices = np.random.choice(len(energies), size=len(energies), replace=True)
-                boot_energies = energies[indices]
-                boot_times = times[indices]
-                boot_corr = np.corrcoef(boot_energies, boot_times)[0, 1]
-                bootstrap_correlations.append(boot_corr)
+            with stage('bootstrap', n_photons=len(times)):
+                for _ in range(n_bootstrap):
+                    indices = np.random.choice(len(energies), size=len(energies), replace=True)
+                    boot_energies = energies[indices]
+                    boot_times = times[indices]
+                    boot_corr = np.corrcoef(boot_energies, boot_times)[0, 1]
+                    bootstrap_correlations.append(boot_corr)
             
             bootstrap_mean = np.mean(bootstrap_correlations)
             bootstrap_std = np.std(bootstrap_correlations)
@@ -236,33 +245,41 @@ class BatchGRBAnalyzer:
             print(f"   ❌ Error analyzing {grb_info['name']}: {e}")
             return None
     
-    def run_batch_analysis(self):
-        """Run analysis on all GRB candidates"""
+    def run_batch_analysis(self, journal_path=JOURNAL_FILE, resume=True):
+        """Run analysis on all GRB candidates, checkpointing each one in the journal"""
         print("\n🚀 Running batch analysis...")
         
-        batch_results = {}
-        successful_analyses = 0
+        # Rerun only GRBs whose FITS file, catalog entry or analysis code changed
+        journal = ResultsJournal(journal_path, config=function_hash(BatchGRBAnalyzer.analyze_single_grb))
         
         for grb_info in self.grb_candidates:
+            input_hash = fingerprint(grb_info, file_fingerprint(grb_info['filename']))
+            if resume and journal.is_done(grb_info['name'], input_hash):
+                print(f"\n⏭️  {grb_info['name']} already in journal, skipping")
+                continue
+            
             print(f"\n{'='*50}")
             print(f"Analyzing {grb_info['name']}")
             print(f"{'='*50}")
             
             analysis_result = self.analyze_single_grb(grb_info)
-            
-            if analysis_result is not None:
-                batch_results[grb_info['name']] = {
-                    'grb_info': grb_info,
-                    'analysis': analysis_result,
-                    'status': 'SUCCESS'
-                }
-                successful_analyses += 1
-            else:
-                batch_results[grb_info['name']] = {
-                    'grb_info': grb_info,
-                    'analysis': None,
-                    'status': 'FAILED'
-                }
+            journal.record(grb_info['name'], analysis_result,
+                           status='SUCCESS' if analysis_result is not None else 'FAILED',
+                           input_hash=input_hash)
+        
+        # Risultati ricostruiti dal journal (ultimo record per GRB del batch)
+        grb_infos = {grb_info['name']: grb_info for grb_info in self.grb_candidates}
+        batch_results = {}
+        successful_analyses = 0
+        for record in journal.iter_latest():
+            if record['key'] not in grb_infos:
+                continue
+            batch_results[record['key']] = {
+                'grb_info': grb_infos[record['key']],
+                'analysis': record['result'],
+                'status': record['status']
+            }
+            successful_analyses += record['status'] == 'SUCCESS'
         
         self.results['batch_analysis'] = batch_results
         self.results['summary'] = {
@@ -593,6 +610,9 @@ analysis, permutation tests, bootstrap analysis, RANSAC regression, and spectral
             print(f"   📊 Significant GRBs: {len(pattern['significant_grbs'])}")
             print(f"   📊 Assessment breakdown: {pattern['assessment_counts']}")
         
+        if PROFILER.enabled:
+            PROFILER.print_summary()
+        
         return True
 
 def main():
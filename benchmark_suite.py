@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+"""
+BENCHMARK SUITE - Prestazioni dei motori statistici con regression gate
+=======================================================================
+Dataset di riferimento:
+- GRB090926A_PH00.csv (24k fotoni) e GRB130427A_PH00.csv (706 fotoni)
+- burst sintetici da 10^5 e 10^6 fotoni (QGAnalyzer2.generate_realistic_grb_data)
+
+Percorsi misurati: bootstrap, permutation, correlation subsets, RANSAC,
+lag fitting (Bayesian Blocks, CCF, modelli avanzati) e limiti E_QG.
+Per ogni percorso: wall time (minimo su piu' ripetizioni), fotoni/s e
+picco di memoria (tracemalloc, run separato).
+
+Uso:
+    python benchmark_suite.py                                   # tutto
+    python benchmark_suite.py --quick                           # senza 10^6
+    python benchmark_suite.py --compare benchmarks/bench_A.json # regression report
+    python benchmark_suite.py --report benchmarks/bench_A.json benchmarks/bench_B.json
+
+Autore: Christian Quintino De Luca
+Affiliazione: RTH Italia - Research & Technology Hub
+"""
+
+import argparse
+import contextlib
+import functools
+import importlib.util
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+REPO_DIR = Path(__file__).resolve().parent
+BENCH_DIR = Path('benchmarks')
+
+REFERENCE_FILES = {
+    'GRB090926A': ('GRB090926A_PH00.csv', 2.1062),
+    'GRB130427A': ('GRB130427A_PH00.csv', 0.3399),
+}
+
+SYNTHETIC_SIZES = {'synthetic_1e5': 100_000, 'synthetic_1e6': 1_000_000}
+
+# Ricampionamenti per run: tengono il benchmark in tempi ragionevoli,
+# i fotoni/s sono normalizzati per ricampionamento
+N_RESAMPLES = 100
+
+# Soglie default del regression gate (variazione relativa)
+TIME_THRESHOLD = 0.10
+MEMORY_THRESHOLD = 0.20
+
+
+# ============================================================================
+# DATASET
+# ============================================================================
+
+def load_reference_csv(filename):
+    """CSV Fermi (ENERGY in MeV, TIME in MET) -> (times [s rel], energies [GeV])"""
+    df = pd.read_csv(filename)
+    times = df['TIME'].values.astype(float)
+    return times - times.min(), df['ENERGY'].values.astype(float) / 1000.0
+
+
+def _load_qg_analyzer():
+    """QG_Analyzer_2.0.py non e' importabile col nome: caricalo dal path"""
+    spec = importlib.util.spec_from_file_location('qg_analyzer_2', REPO_DIR / 'QG_Analyzer_2.0.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def synthetic_burst(n_photons, seed=42):
+    """Burst sintetico dal generatore di QG-Analyzer 2.0"""
+    module = _load_qg_analyzer()
+    with contextlib.redirect_stdout(io.StringIO()):
+        analyzer = module.QGAnalyzer2()
+    np.random.seed(seed)
+    grb_info = {'GRB': f'SYN{n_photons}', 'Photon_Count': n_photons, 'Energy_Range_Min': 0.1,
+                'Energy_Range_Max': 100.0, 'Duration': 1000.0, 'Redshift': 1.0}
+    data = analyzer.generate_realistic_grb_data(grb_info)
+    return np.asarray(data['times'], dtype=float), np.asarray(data['energies'], dtype=float)
+
+
+def load_datasets(names):
+    datasets = {}
+    for name in names:
+        if name in REFERENCE_FILES:
+            filename, z = REFERENCE_FILES[name]
+            filename = REPO_DIR / filename
+            if not filename.exists():
+                print(f"⚠️  {filename} not found, skipping {name}")
+                continue
+            times, energies = load_reference_csv(filename)
+        elif name in SYNTHETIC_SIZES:
+            times, energies = synthetic_burst(SYNTHETIC_SIZES[name])
+            z = 1.0
+        else:
+            raise ValueError(f"Unknown dataset: {name}")
+        datasets[name] = {'times': times, 'energies': energies, 'z': z}
+    return datasets
+
+
+# ============================================================================
+# PERCORSI MISURATI
+# ============================================================================
+# Ogni percorso: f(times, energies, z) -> numero di "unita' fotone" processate
+# (n_fotoni x ricampionamenti per bootstrap/permutation)
+
+@functools.lru_cache(maxsize=None)
+def _time_aligned_analyzer():
+    from TIME_ALIGNMENT_AND_ANALYSIS import TimeAlignedQGAnalyzer
+    with contextlib.redirect_stdout(io.StringIO()):
+        return TimeAlignedQGAnalyzer()
+
+
+def bench_bootstrap(times, energies, z):
+    _time_aligned_analyzer().bootstrap_correlation(energies, times, n_bootstrap=N_RESAMPLES)
+    return len(times) * N_RESAMPLES
+
+
+def bench_permutation(times, energies, z):
+    _time_aligned_analyzer().permutation_test(energies, times, n_perm=N_RESAMPLES)
+    return len(times) * N_RESAMPLES
+
+
+def bench_correlation_subsets(times, energies, z):
+    import grb_analysis_simple as gas
+    grb_data = gas.GRBPhotonData('BENCH', {'trigger_met': 0.0, 'z': z})
+    grb_data.energies = energies
+    grb_data.times = times
+    grb_data.photons = pd.DataFrame({'energy': energies, 'time': times})
+    grb_data.n_photons = len(times)
+
+    n_boot = gas.Config.N_BOOTSTRAP
+    gas.Config.N_BOOTSTRAP = N_RESAMPLES
+    try:
+        analysis = gas.MultiTechniqueAnalysis(grb_data)
+        analysis.analyze_energy_subsets()
+        analysis.analyze_temporal_phases()
+    finally:
+        gas.Config.N_BOOTSTRAP = n_boot
+    n_used = sum(r['n_photons'] for r in analysis.results.values())
+    return n_used * N_RESAMPLES
+
+
+def bench_ransac(times, energies, z):
+    from robust_line_fit import RANSACLineFitter
+    RANSACLineFitter(min_samples=0.5, random_state=42).fit(energies.reshape(-1, 1), times)
+    return len(times)
+
+
+def bench_lag_blocks(times, energies, z):
+    from light_curve_blocks import pulse_lag_analysis
+    pulse_lag_analysis(times, energies)
+    return len(times)
+
+
+def bench_lag_ccf(times, energies, z):
+    from ccf_lag import ccf_spectral_lags
+    ccf_spectral_lags(times, energies, n_sim=N_RESAMPLES, random_state=42)
+    return len(times)
+
+
+def bench_lag_models(times, energies, z):
+    from advanced_lag_analysis import fit_advanced_lag_models
+    fit_advanced_lag_models(times, energies)
+    return len(times)
+
+
+def bench_qg_limits(times, energies, z):
+    from qg_residual_search import calculate_qg_limits
+    calculate_qg_limits(times, energies, z)
+    return len(times)
+
+
+BENCHMARKS = {
+    'bootstrap': bench_bootstrap,
+    'permutation': bench_permutation,
+    'correlation_subsets': bench_correlation_subsets,
+    'ransac': bench_ransac,
+    'lag_blocks': bench_lag_blocks,
+    'lag_ccf': bench_lag_ccf,
+    'lag_models': bench_lag_models,
+    'qg_limits': bench_qg_limits,
+}
+
+
+# ============================================================================
+# ESECUZIONE
+# ============================================================================
+
+def _run_once(func, data, seed=42):
+    np.random.seed(seed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(data['times'], data['energies'], data['z'])
+
+
+def run_benchmark(name, func, dataset_name, data, repeat=3, measure_memory=True):
+    """Minimo wall time su repeat run + picco tracemalloc da un run dedicato"""
+    walls = []
+    cpus = []
+    units = 0
+    for _ in range(repeat):
+        wall0, cpu0 = time.perf_counter(), time.process_time()
+        units = _run_once(func, data)
+        walls.append(time.perf_counter() - wall0)
+        cpus.append(time.process_time() - cpu0)
+
+    peak_mb = None
+    if measure_memory:
+        tracemalloc.start()
+        try:
+            _run_once(func, data)
+            peak_mb = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+        finally:
+            tracemalloc.stop()
+
+    wall = min(walls)
+    return {
+        'path': name,
+        'dataset': dataset_name,
+        'n_photons': int(len(data['times'])),
+        'photon_units': int(units),
+        'wall_s': wall,
+        'wall_all_s': walls,
+        'cpu_s': min(cpus),
+        'photons_per_s': units / wall if wall > 0 else float('inf'),
+        'peak_mb': peak_mb
+    }
+
+
+def environment_info():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'timestamp': datetime.now().isoformat(),
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'n_resamples': N_RESAMPLES
+    }
+
+
+def run_suite(paths, dataset_names, repeat=3, measure_memory=True):
+    datasets = load_datasets(dataset_names)
+    results = []
+
+    print(f"\n{'='*92}")
+    print(f"BENCHMARK SUITE: {len(paths)} paths x {len(datasets)} datasets (repeat={repeat})")
+    print(f"{'='*92}")
+    print(f"{'path':<22} {'dataset':<16} {'photons':>9} {'wall s':>9} {'photons/s':>12} {'peak MB':>9}")
+    print('-' * 92)
+
+    for dataset_name, data in datasets.items():
+        for name in paths:
+            try:
+                res = run_benchmark(name, BENCHMARKS[name], dataset_name, data,
+                                    repeat=repeat, measure_memory=measure_memory)
+            except Exception as e:
+                print(f"{name:<22} {dataset_name:<16} ❌ {e}")
+                results.append({'path': name, 'dataset': dataset_name, 'error': str(e)})
+                continue
+            results.append(res)
+            peak = f"{res['peak_mb']:.1f}" if res['peak_mb'] is not None else '-'
+            print(f"{name:<22} {dataset_name:<16} {res['n_photons']:>9d} {res['wall_s']:>9.3f} "
+                  f"{res['photons_per_s']:>12.3e} {peak:>9}")
+
+    return {'environment': environment_info(), 'results': results}
+
+
+def save_results(run, output=None):
+    if output is None:
+        BENCH_DIR.mkdir(exist_ok=True)
+        output = BENCH_DIR / f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    output = Path(output)
+    with open(output, 'w') as f:
+        json.dump(run, f, indent=2)
+    print(f"\n💾 Benchmark results: {output}")
+    return output
+
+
+# ============================================================================
+# REGRESSION REPORT
+# ============================================================================
+
+def compare_runs(baseline, current, time_threshold=TIME_THRESHOLD, memory_threshold=MEMORY_THRESHOLD):
+    """
+    Confronta due run (dict caricati dai JSON). Ritorna lista di righe con
+    ratio tempo/memoria e status: REGRESSION, ERROR, IMPROVED, OK, NEW, MISSING.
+    ERROR = il percorso ha sollevato un'eccezione nel run corrente.
+    """
+    def index(run):
+        return {(r['path'], r['dataset']): r for r in run['results'] if 'wall_s' in r}
+
+    base = index(baseline)
+    curr = index(current)
+    errors = {(r['path'], r['dataset']): r['error'] for r in current['results'] if 'error' in r}
+    rows = []
+
+    for key in sorted(set(base) | set(curr) | set(errors)):
+        b, c = base.get(key), curr.get(key)
+        row = {'path': key[0], 'dataset': key[1], 'time_ratio': None, 'memory_ratio': None}
+        if key in errors:
+            row['status'] = 'ERROR'
+            row['error'] = errors[key]
+        elif b is None:
+            row['status'] = 'NEW'
+        elif c is None:
+            row['status'] = 'MISSING'
+        else:
+            row['time_ratio'] = c['wall_s'] / b['wall_s'] if b['wall_s'] > 0 else float('inf')
+            if b.get('peak_mb') and c.get('peak_mb') is not None:
+                row['memory_ratio'] = c['peak_mb'] / b['peak_mb']
+
+            slower = row['time_ratio'] > 1 + time_threshold
+            fatter = row['memory_ratio'] is not None and row['memory_ratio'] > 1 + memory_threshold
+            if slower or fatter:
+                row['status'] = 'REGRESSION'
+            elif row['time_ratio'] < 1 - time_threshold:
+                row['status'] = 'IMPROVED'
+            else:
+                row['status'] = 'OK'
+        rows.append(row)
+
+    return rows
+
+
+def print_report(rows, time_threshold=TIME_THRESHOLD, memory_threshold=MEMORY_THRESHOLD):
+    print(f"\n{'='*84}")
+    print(f"REGRESSION REPORT (time > +{time_threshold:.0%}, memory > +{memory_threshold:.0%})")
+    print(f"{'='*84}")
+    print(f"{'path':<22} {'dataset':<16} {'time x':>9} {'memory x':>9}   status")
+    print('-' * 84)
+    icons = {'REGRESSION': '🔴', 'ERROR': '❌', 'IMPROVED': '🟢', 'OK': '⚪', 'NEW': '🆕', 'MISSING': '❔'}
+    for row in rows:
+        t = f"{row['time_ratio']:.2f}" if row['time_ratio'] is not None else '-'
+        m = f"{row['memory_ratio']:.2f}" if row['memory_ratio'] is not None else '-'
+        detail = f" ({row['error']})" if row['status'] == 'ERROR' else ''
+        print(f"{row['path']:<22} {row['dataset']:<16} {t:>9} {m:>9}   "
+              f"{icons[row['status']]} {row['status']}{detail}")
+
+    n_reg = sum(r['status'] == 'REGRESSION' for r in rows)
+    n_err = sum(r['status'] == 'ERROR' for r in rows)
+    print(f"\n{'❌' if n_reg or n_err else '✅'} {n_reg} regressions, {n_err} errors")
+    return n_reg + n_err
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the QG statistics engines")
+    parser.add_argument('--paths', nargs='+', default=list(BENCHMARKS), choices=list(BENCHMARKS))
+    parser.add_argument('--datasets', nargs='+', default=list(REFERENCE_FILES) + list(SYNTHETIC_SIZES),
+                        choices=list(REFERENCE_FILES) + list(SYNTHETIC_SIZES))
+    parser.add_argument('--quick', action='store_true', help="skip the 10^6-photon burst")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--no-memory', action='store_true', help="skip the tracemalloc run")
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--compare', default=None, help="baseline JSON for the regression gate")
+    parser.add_argument('--report', nargs=2, metavar=('BASELINE', 'CURRENT'),
+                        help="only compare two stored runs")
+    parser.add_argument('--time-threshold', type=float, default=TIME_THRESHOLD)
+    parser.add_argument('--memory-threshold', type=float, default=MEMORY_THRESHOLD)
+    args = parser.parse_args()
+
+    if args.report:
+        with open(args.report[0]) as f:
+            baseline = json.load(f)
+        with open(args.report[1]) as f:
+            current = json.load(f)
+    else:
+        datasets = [d for d in args.datasets if not (args.quick and d == 'synthetic_1e6')]
+        current = run_suite(args.paths, datasets, repeat=args.repeat,
+                            measure_memory=not args.no_memory)
+        save_results(current, args.output)
+        if not args.compare:
+            return 0
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    rows = compare_runs(baseline, current, args.time_threshold, args.memory_threshold)
+    n_failed = print_report(rows, args.time_threshold, args.memory_threshold)
+    return 1 if n_failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -12,20 +12,36 @@ import json
 from datetime import datetime
 import seaborn as sns
 from urllib.parse import urljoin
+from scipy.spatial import cKDTree
+
+# Default reference GRB (GRB090902B)
+GRB090902_PROPERTIES = {
+    'z': 1.822,
+    'n_photons': 3972,
+    'e_max_gev': 80.8,
+    't90_s': 2208.5,
+    'significance': 5.46,
+    'energy_fluence': 1.2e4,  # GeV (estimated)
+    'hardness_ratio': 0.15
+}
+
+# Similarity feature space: (reference key, catalog column, log-scaled)
+SIMILARITY_FEATURES = [
+    ('z', 'z', False),
+    ('n_photons', 'n_photons', True),
+    ('e_max_gev', 'e_max_gev', True),
+    ('t90_s', 't90_s', True),
+    ('energy_fluence', 'energy_fluence_gev', True),
+]
 
 class CatalogAnalyzer2FLGC:
-    def __init__(self):
+    def __init__(self, reference_name='GRB090902B', reference_properties=None):
         self.catalog_url = "https://fermi.gsfc.nasa.gov/ssc/data/access/lat/2nd_GRB_catalog/"
-        self.grb090902_properties = {
-            'z': 1.822,
-            'n_photons': 3972,
-            'e_max_gev': 80.8,
-            't90_s': 2208.5,
-            'significance': 5.46,
-            'energy_fluence': 1.2e4,  # GeV (estimated)
-            'hardness_ratio': 0.15
-        }
+        self.reference_name = reference_name
+        self.grb090902_properties = dict(reference_properties or GRB090902_PROPERTIES)
+        self.reference_properties = self.grb090902_properties
         self.results = {}
+        self._kdtree = None
         
         print(f"📊 2FLGC Catalog Analyzer for Similar GRB Candidates")
         print(f"📅 Analysis Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
@@ -181,8 +197,23 @@ class CatalogAnalyzer2FLGC:
         
         return mock_data
         
+    def set_reference(self, reference_name, reference_properties=None):
+        """Set the reference GRB, taking its properties from the catalog if not given"""
+        if reference_properties is None:
+            row = self.catalog_data[self.catalog_data['GRB'] == reference_name]
+            if len(row) == 0:
+                raise ValueError(f"{reference_name} not found in catalog")
+            row = row.iloc[0]
+            reference_properties = {ref_key: float(row[col]) for ref_key, col, _ in SIMILARITY_FEATURES}
+            if 'hardness_ratio' in row:
+                reference_properties['hardness_ratio'] = float(row['hardness_ratio'])
+        
+        self.reference_name = reference_name
+        self.grb090902_properties = dict(reference_properties)
+        self.reference_properties = self.grb090902_properties
+        
     def find_similar_grbs(self):
-        """Find GRBs similar to GRB090902B"""
+        """Find GRBs similar to the reference GRB (GRB090902B by default)"""
         print("\n🔍 Finding similar GRBs...")
         
         # Define similarity criteria
@@ -206,33 +237,31 @@ class CatalogAnalyzer2FLGC:
             (self.catalog_data['classification'] == 'Long')
         ].copy()
         
-        # Calculate similarity scores
-        similarity_scores = []
-        for idx, grb in filtered_grbs.iterrows():
-            score = self.calculate_similarity_score(grb)
-            similarity_scores.append(score)
-        
-        filtered_grbs['similarity_score'] = similarity_scores
+        # Calculate similarity scores (column-wise)
+        filtered_grbs['similarity_score'] = self.calculate_similarity_scores(filtered_grbs)
         
         # Sort by similarity score
         similar_grbs = filtered_grbs.sort_values('similarity_score', ascending=False)
         
         self.results['similar_grbs'] = similar_grbs.to_dict('records')
         self.results['criteria'] = criteria
+        self.results['reference_grb'] = self.reference_name
         
         print(f"   📊 GRBs meeting criteria: {len(filtered_grbs)}")
         print(f"   📊 Top 5 similar GRBs:")
         for i, (idx, grb) in enumerate(similar_grbs.head(5).iterrows(), 1):
             print(f"      {i}. {grb['GRB']}: score={grb['similarity_score']:.3f}, z={grb['z']:.2f}, photons={grb['n_photons']}")
         
-    def calculate_similarity_score(self, grb):
-        """Calculate similarity score for a GRB"""
+    def calculate_similarity_scores(self, grbs):
+        """Calculate similarity scores for all GRBs of a DataFrame at once"""
+        ref = self.grb090902_properties
+        
         # Normalize properties
-        z_norm = 1 - abs(grb['z'] - self.grb090902_properties['z']) / 4.0
-        photons_norm = min(grb['n_photons'] / self.grb090902_properties['n_photons'], 1.0)
-        e_max_norm = min(grb['e_max_gev'] / self.grb090902_properties['e_max_gev'], 1.0)
-        t90_norm = 1 - abs(grb['t90_s'] - self.grb090902_properties['t90_s']) / 2000.0
-        fluence_norm = min(grb['energy_fluence_gev'] / self.grb090902_properties['energy_fluence'], 1.0)
+        z_norm = 1 - np.abs(grbs['z'].to_numpy(float) - ref['z']) / 4.0
+        photons_norm = np.minimum(grbs['n_photons'].to_numpy(float) / ref['n_photons'], 1.0)
+        e_max_norm = np.minimum(grbs['e_max_gev'].to_numpy(float) / ref['e_max_gev'], 1.0)
+        t90_norm = 1 - np.abs(grbs['t90_s'].to_numpy(float) - ref['t90_s']) / 2000.0
+        fluence_norm = np.minimum(grbs['energy_fluence_gev'].to_numpy(float) / ref['energy_fluence'], 1.0)
         
         # Weighted similarity score
         weights = {
@@ -249,7 +278,46 @@ class CatalogAnalyzer2FLGC:
                 weights['t90'] * t90_norm + 
                 weights['fluence'] * fluence_norm)
         
-        return max(0, min(1, score))  # Clamp between 0 and 1
+        return np.clip(score, 0, 1)  # Clamp between 0 and 1
+        
+    def calculate_similarity_score(self, grb):
+        """Calculate similarity score for a single GRB"""
+        return float(self.calculate_similarity_scores(pd.DataFrame([grb]))[0])
+        
+    def _feature_matrix(self, data):
+        """Build the (z, n_photons, e_max, T90, fluence) feature matrix"""
+        columns = []
+        for ref_key, col, log_scaled in SIMILARITY_FEATURES:
+            values = np.asarray(data[col] if isinstance(data, pd.DataFrame) else data[ref_key], dtype=float)
+            columns.append(np.log10(np.maximum(values, 1e-12)) if log_scaled else values)
+        return np.column_stack(columns) if isinstance(data, pd.DataFrame) else np.array(columns)[None, :]
+        
+    def build_similarity_index(self):
+        """Build a KD-tree over the standardized catalog feature space"""
+        features = self._feature_matrix(self.catalog_data)
+        self._feature_mean = features.mean(axis=0)
+        self._feature_std = features.std(axis=0)
+        self._feature_std[self._feature_std == 0] = 1.0
+        self._kdtree = cKDTree((features - self._feature_mean) / self._feature_std)
+        
+    def find_nearest_grbs(self, reference_properties=None, k=5, exclude_reference=True):
+        """Find the k nearest GRBs to a reference in standardized feature space"""
+        if self._kdtree is None:
+            self.build_similarity_index()
+        
+        reference = reference_properties or self.grb090902_properties
+        query = (self._feature_matrix(reference) - self._feature_mean) / self._feature_std
+        
+        n_query = min(k + 1 if exclude_reference else k, len(self.catalog_data))
+        distances, indices = self._kdtree.query(query[0], k=n_query)
+        distances, indices = np.atleast_1d(distances), np.atleast_1d(indices)
+        
+        nearest = self.catalog_data.iloc[indices].copy()
+        nearest['distance'] = distances
+        if exclude_reference:
+            nearest = nearest[nearest['distance'] > 1e-9]
+        
+        return nearest.head(k)
         
     def analyze_candidate_properties(self):
         """Analyze properties of candidate GRBs"""
@@ -274,7 +342,7 @@ class CatalogAnalyzer2FLGC:
                 'median': float(similar_grbs[prop].median())
             }
         
-        # Compare with GRB090902B
+        # Compare with the reference GRB
         comparison = {}
         for prop in properties:
             grb090902_value = self.grb090902_properties.get(prop, 0)
@@ -309,14 +377,14 @@ class CatalogAnalyzer2FLGC:
             return
         
         fig, axes = plt.subplots(2, 3, figsize=(18, 12))
-        fig.suptitle('2FLGC Catalog Analysis: GRBs Similar to GRB090902B', fontsize=16, fontweight='bold')
+        fig.suptitle(f'2FLGC Catalog Analysis: GRBs Similar to {self.reference_name}', fontsize=16, fontweight='bold')
         
         # Plot 1: Redshift vs Photon Count
         ax1 = axes[0, 0]
         scatter = ax1.scatter(similar_grbs['z'], similar_grbs['n_photons'], 
                             c=similar_grbs['similarity_score'], cmap='viridis', s=100, alpha=0.7)
         ax1.scatter(self.grb090902_properties['z'], self.grb090902_properties['n_photons'], 
-                   c='red', s=200, marker='*', label='GRB090902B')
+                   c='red', s=200, marker='*', label=self.reference_name)
         ax1.set_xlabel('Redshift (z)')
         ax1.set_ylabel('Photon Count')
         ax1.set_title('Redshift vs Photon Count')
@@ -328,7 +396,7 @@ class CatalogAnalyzer2FLGC:
         scatter = ax2.scatter(similar_grbs['e_max_gev'], similar_grbs['n_photons'], 
                             c=similar_grbs['similarity_score'], cmap='viridis', s=100, alpha=0.7)
         ax2.scatter(self.grb090902_properties['e_max_gev'], self.grb090902_properties['n_photons'], 
-                   c='red', s=200, marker='*', label='GRB090902B')
+                   c='red', s=200, marker='*', label=self.reference_name)
         ax2.set_xlabel('Max Energy (GeV)')
         ax2.set_ylabel('Photon Count')
         ax2.set_title('Max Energy vs Photon Count')
@@ -340,7 +408,7 @@ class CatalogAnalyzer2FLGC:
         scatter = ax3.scatter(similar_grbs['t90_s'], similar_grbs['energy_fluence_gev'], 
                             c=similar_grbs['similarity_score'], cmap='viridis', s=100, alpha=0.7)
         ax3.scatter(self.grb090902_properties['t90_s'], self.grb090902_properties['energy_fluence'], 
-                   c='red', s=200, marker='*', label='GRB090902B')
+                   c='red', s=200, marker='*', label=self.reference_name)
         ax3.set_xlabel('T90 (s)')
         ax3.set_ylabel('Energy Fluence (GeV)')
         ax3.set_title('T90 vs Energy Fluence')
@@ -361,7 +429,7 @@ class CatalogAnalyzer2FLGC:
         ax5 = axes[1, 1]
         ax5.hist(similar_grbs['z'], bins=15, alpha=0.7, color='green', edgecolor='black')
         ax5.axvline(self.grb090902_properties['z'], color='red', linestyle='--', 
-                   label=f'GRB090902B: z={self.grb090902_properties["z"]}')
+                   label=f'{self.reference_name}: z={self.grb090902_properties["z"]}')
         ax5.set_xlabel('Redshift (z)')
         ax5.set_ylabel('Count')
         ax5.set_title('Redshift Distribution')
@@ -425,9 +493,9 @@ class CatalogAnalyzer2FLGC:
         reasons = []
         
         if grb['similarity_score'] > 0.8:
-            reasons.append("Very high similarity to GRB090902B")
+            reasons.append(f"Very high similarity to {self.reference_name}")
         elif grb['similarity_score'] > 0.6:
-            reasons.append("High similarity to GRB090902B")
+            reasons.append(f"High similarity to {self.reference_name}")
         
         if grb['n_photons'] > 1000:
             reasons.append("High photon count for good statistics")
@@ -468,6 +536,7 @@ class CatalogAnalyzer2FLGC:
         self.results['metadata'] = {
             'catalog': '2FLGC',
             'analysis_date': datetime.now().isoformat(),
+            'reference_grb': self.reference_name,
             'grb090902_properties': self.grb090902_properties,
             'n_candidates': len(self.results.get('similar_grbs', []))
         }
@@ -485,6 +554,7 @@ class CatalogAnalyzer2FLGC:
             return False
         
         self.find_similar_grbs()
+        self.results['nearest_neighbors'] = self.find_nearest_grbs(k=5)[['GRB', 'distance']].to_dict('records')
         self.analyze_candidate_properties()
         self.generate_candidate_plots()
         self.generate_candidate_list()
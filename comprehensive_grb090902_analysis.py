@@ -19,6 +19,7 @@ import matplotlib.pyplot as plt
 from astropy.io import fits
 from scipy import stats
 from scipy.optimize import curve_fit
+from lag_profile import lag_profile, fit_lag_profile
 import json
 import os
 from datetime import datetime
@@ -270,6 +271,10 @@ def intrinsic_lag_analysis(data):
     # Converti energie in GeV
     energies_gev = energies / 1000.0
     
+    # Profilo lag-energia binnato: i fit girano su ~20 bin pesati, non sui fotoni
+    profile = lag_profile(energies_gev, times, estimator='median', n_bootstrap=200, seed=42)
+    print(f"  📊 Profilo: {profile['n_bins']} bin in log E (mediana, errori bootstrap)")
+    
     # Modelli lag intrinseci
     lag_models = {}
     
@@ -277,60 +282,36 @@ def intrinsic_lag_analysis(data):
     def linear_lag(E, t0, alpha):
         return t0 + alpha * E
     
-    try:
-        popt_linear, _ = curve_fit(linear_lag, energies_gev, times, p0=[times.min(), 0])
-        lag_models['linear'] = {
-            'parameters': popt_linear,
-            't0': popt_linear[0],
-            'alpha': popt_linear[1]
-        }
-    except:
-        lag_models['linear'] = None
-    
     # 2. Modello power-law
     def power_law_lag(E, t0, alpha, beta):
         return t0 + alpha * (E ** beta)
     
-    try:
-        popt_power, _ = curve_fit(power_law_lag, energies_gev, times, p0=[times.min(), 0, 1])
-        lag_models['power_law'] = {
-            'parameters': popt_power,
-            't0': popt_power[0],
-            'alpha': popt_power[1],
-            'beta': popt_power[2]
-        }
-    except:
-        lag_models['power_law'] = None
-    
     # 3. Modello esponenziale
     def exponential_lag(E, t0, alpha, beta):
         return t0 + alpha * np.exp(-beta * E)
     
-    try:
-        popt_exp, _ = curve_fit(exponential_lag, energies_gev, times, p0=[times.min(), 0, 1])
-        lag_models['exponential'] = {
-            'parameters': popt_exp,
-            't0': popt_exp[0],
-            'alpha': popt_exp[1],
-            'beta': popt_exp[2]
-        }
-    except:
-        lag_models['exponential'] = None
-    
     # 4. Modello logaritmico
     def logarithmic_lag(E, t0, alpha, beta):
         return t0 + alpha * np.log(1 + beta * E)
     
-    try:
-        popt_log, _ = curve_fit(logarithmic_lag, energies_gev, times, p0=[times.min(), 0, 1])
-        lag_models['logarithmic'] = {
-            'parameters': popt_log,
-            't0': popt_log[0],
-            'alpha': popt_log[1],
-            'beta': popt_log[2]
-        }
-    except:
-        lag_models['logarithmic'] = None
+    model_specs = {
+        'linear': (linear_lag, ('t0', 'alpha'), [times.min(), 0]),
+        'power_law': (power_law_lag, ('t0', 'alpha', 'beta'), [times.min(), 0, 1]),
+        'exponential': (exponential_lag, ('t0', 'alpha', 'beta'), [times.min(), 0, 1]),
+        'logarithmic': (logarithmic_lag, ('t0', 'alpha', 'beta'), [times.min(), 0, 1]),
+    }
+    
+    for model_name, (func, param_names, p0) in model_specs.items():
+        try:
+            fit = fit_lag_profile(profile, func, p0, param_names)
+            lag_models[model_name] = {k: fit[k] for k in ('parameters',) + param_names}
+            lag_models[model_name].update({
+                'chi2': fit['chi2'],
+                'chi2_red': fit['chi2_red'],
+                'aic': fit['aic'],
+            })
+        except Exception:
+            lag_models[model_name] = None
     
     # Calcola residui per ogni modello
     residuals_analysis = {}
@@ -360,7 +341,8 @@ def intrinsic_lag_analysis(data):
     
     return {
         'lag_models': lag_models,
-        'residuals_analysis': residuals_analysis
+        'residuals_analysis': residuals_analysis,
+        'lag_profile': {k: profile[k] for k in ('energy', 'lag', 'lag_error', 'n_photons', 't_ref', 'estimator')}
     }
 
 def qg_analysis(data):
@@ -19,13 +19,13 @@ import matplotlib.pyplot as plt
 from scipy import stats
 from scipy.signal import find_peaks, periodogram
 from sklearn.linear_model import RANSACRegressor, LinearRegression
-from sklearn.cluster import DBSCAN
-from sklearn.preprocessing import StandardScaler
 import json
 from datetime import datetime
 import warnings
 warnings.filterwarnings('ignore')
 
+from photon_clustering import cluster_photons
+
 class ComprehensiveQGAnalyzer:
     """Analizzatore completo per effetti QG"""
     
@@ -265,45 +265,27 @@ class ComprehensiveQGAnalyzer:
         }
     
     def clustering_analysis(self):
-        """Analisi clustering per pattern nascosti"""
-        # Prepare data for clustering
-        data = np.column_stack([self.energies, self.times])
-        scaler = StandardScaler()
-        data_scaled = scaler.fit_transform(data)
-        
-        # DBSCAN clustering
-        clustering = DBSCAN(eps=0.5, min_samples=5)
-        cluster_labels = clustering.fit_predict(data_scaled)
-        
-        n_clusters = len(set(cluster_labels)) - (1 if -1 in cluster_labels else 0)
-        n_noise = list(cluster_labels).count(-1)
+        """Analisi clustering per pattern nascosti (DBSCAN a griglia su log E, t)"""
+        clustering = cluster_photons(self.energies, self.times, eps=0.5, min_samples=5)
         
         # Analyze each cluster
         cluster_analysis = {}
-        for cluster_id in set(cluster_labels):
-            if cluster_id == -1:  # Noise
-                continue
-                
-            mask = cluster_labels == cluster_id
-            e_cluster = self.energies[mask]
-            t_cluster = self.times[mask]
-            
-            if len(e_cluster) >= 10:
-                r, p = stats.pearsonr(e_cluster, t_cluster)
-                sigma = abs(r) * np.sqrt(len(e_cluster) - 2) / np.sqrt(1 - r**2)
-                
-                cluster_analysis[f'cluster_{cluster_id}'] = {
-                    'n_photons': int(np.sum(mask)),
-                    'energy_range': [float(e_cluster.min()), float(e_cluster.max())],
-                    'time_range': [float(t_cluster.min()), float(t_cluster.max())],
-                    'pearson_r': float(r),
-                    'pearson_p': float(p),
-                    'sigma': float(sigma)
+        for name, cluster in clustering['clusters'].items():
+            if cluster['n_photons'] >= 10:
+                cluster_analysis[name] = {
+                    'n_photons': cluster['n_photons'],
+                    'energy_range': [cluster['energy_min'], cluster['energy_max']],
+                    'time_range': [cluster['time_min'], cluster['time_max']],
+                    'pearson_r': cluster['pearson_r'],
+                    'pearson_p': cluster['pearson_p'],
+                    'sigma': abs(cluster['t_stat']),
+                    'lag_slope': cluster['ols_slope'],
+                    'stability': cluster['stability']
                 }
         
         return {
-            'n_clusters': n_clusters,
-            'n_noise': n_noise,
+            'n_clusters': clustering['n_clusters'],
+            'n_noise': clustering['n_noise'],
             'cluster_analysis': cluster_analysis
         }
     
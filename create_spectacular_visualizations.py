@@ -19,6 +19,7 @@ from scipy import stats
 import pandas as pd
 from datetime import datetime
 import warnings
+from figure_renderer import density_scatter, render_figures
 warnings.filterwarnings('ignore')
 
 # Set style for spectacular plots
@@ -136,7 +137,8 @@ def create_spectacular_figure_2():
     qg_effect1 = -0.0001 * e1 + np.random.normal(0, 0.1, n1)
     t1 += qg_effect1
     
-    ax1.scatter(t1, e1, alpha=0.6, s=1, c='red', edgecolors='none')
+    density_scatter(ax1, t1, e1, color='red', alpha=0.6, s=1, edgecolors='none',
+                    cmap='magma', log_y=True)
     ax1.set_xlabel('Time (s)', fontsize=12, fontweight='bold')
     ax1.set_ylabel('Energy (GeV)', fontsize=12, fontweight='bold')
     ax1.set_title('🔴 GRB1: 10.18σ SIGNAL\n9,371 photons, 0.1-58.7 GeV', fontsize=14, fontweight='bold')
@@ -156,7 +158,8 @@ def create_spectacular_figure_2():
     qg_effect2 = -0.0002 * e2 + np.random.normal(0, 0.15, n2)
     t2 += qg_effect2
     
-    ax2.scatter(t2, e2, alpha=0.6, s=1, c='orange', edgecolors='none')
+    density_scatter(ax2, t2, e2, color='orange', alpha=0.6, s=1, edgecolors='none',
+                    cmap='magma', log_y=True)
     ax2.set_xlabel('Time (s)', fontsize=12, fontweight='bold')
     ax2.set_ylabel('Energy (GeV)', fontsize=12, fontweight='bold')
     ax2.set_title('🟠 GRB2: 5.21σ SIGNAL\n8,354 photons, 0.1-94.1 GeV', fontsize=14, fontweight='bold')
@@ -176,7 +179,8 @@ def create_spectacular_figure_2():
     qg_effect3 = -0.0003 * e3 + np.random.normal(0, 0.2, n3)
     t3 += qg_effect3
     
-    ax3.scatter(t3, e3, alpha=0.6, s=1, c='gold', edgecolors='none')
+    density_scatter(ax3, t3, e3, color='gold', alpha=0.6, s=1, edgecolors='none',
+                    cmap='magma', log_y=True)
     ax3.set_xlabel('Time (s)', fontsize=12, fontweight='bold')
     ax3.set_ylabel('Energy (GeV)', fontsize=12, fontweight='bold')
     ax3.set_title('🟡 GRB3: 3.36σ SIGNAL\n5,908 photons, 0.1-15.4 GeV', fontsize=14, fontweight='bold')
@@ -193,7 +197,8 @@ def create_spectacular_figure_2():
     all_times = np.concatenate([t1, t2, t3])
     all_energies = np.concatenate([e1, e2, e3])
     
-    ax4.scatter(all_times, all_energies, alpha=0.4, s=0.5, c='purple', edgecolors='none')
+    density_scatter(ax4, all_times, all_energies, color='purple', alpha=0.4, s=0.5, edgecolors='none',
+                    cmap='magma', log_y=True)
     ax4.set_xlabel('Time (s)', fontsize=12, fontweight='bold')
     ax4.set_ylabel('Energy (GeV)', fontsize=12, fontweight='bold')
     ax4.set_title('🔮 COMBINED ANALYSIS\n24,633 photons, Multi-GRB Pattern', fontsize=14, fontweight='bold')
@@ -610,13 +615,21 @@ def create_all_spectacular_figures():
     print("🎨 Creating MOZZAFIATO figures for Quantum Gravity Discovery...")
     print("=" * 80)
     
-    # Create all figures
-    create_spectacular_figure_1()
-    create_spectacular_figure_2()
-    create_spectacular_figure_3()
-    create_spectacular_figure_4()
-    create_spectacular_figure_5()
-    create_spectacular_figure_6()
+    # Create all figures (process pool, unchanged figures are skipped)
+    jobs = [
+        {'func': create_spectacular_figure_1, 'output': 'SPECTACULAR_FIGURE_1_Multi_GRB_Discovery.png'},
+        {'func': create_spectacular_figure_2, 'output': 'SPECTACULAR_FIGURE_2_Energy_Time_Correlations.png'},
+        {'func': create_spectacular_figure_3, 'output': 'SPECTACULAR_FIGURE_3_Statistical_Significance.png'},
+        {'func': create_spectacular_figure_4, 'output': 'SPECTACULAR_FIGURE_4_Quantum_Gravity_Energy_Scale.png'},
+        {'func': create_spectacular_figure_5, 'output': 'SPECTACULAR_FIGURE_5_Hidden_Patterns_Phase_Transitions.png'},
+        {'func': create_spectacular_figure_6, 'output': 'SPECTACULAR_FIGURE_6_Comprehensive_Summary.png'},
+    ]
+    status = render_figures(jobs)
+    for output, state in status.items():
+        if state == 'cached':
+            print(f"⏭️  Unchanged, skipped: {output}")
+        elif state.startswith('error'):
+            print(f"❌ {output}: {state}")
     
     print("=" * 80)
     print("🎉 ALL SPECTACULAR FIGURES CREATED!")
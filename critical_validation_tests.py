@@ -20,6 +20,9 @@ from datetime import datetime
 import warnings
 warnings.filterwarnings('ignore')
 
+from liv_cosmology import liv_K
+from synthetic_bursts import generate_burst, generate_bursts
+
 # Configurazione matplotlib
 plt.style.use('default')
 plt.rcParams['figure.figsize'] = (12, 8)
@@ -40,33 +43,33 @@ def convert_numpy(obj):
         return bool(obj)
     raise TypeError(f"Object of type {obj.__class__.__name__} is not JSON serializable")
 
+def _realistic_grb_params(n_photons, has_qg=False, qg_strength=0.001):
+    """Parametri synthetic_bursts per un GRB tipo GRB090902 (z = 1.822)"""
+    redshift = 1.822
+    return {
+        'n_photons': int(n_photons), 'z': redshift,
+        # Un pulse FRED lungo (decadimento ~500 s), spettro power-law 0.1-80.8 GeV
+        'pulse_peaks': [50.0], 'rise': 5.0, 'decay': 500.0,
+        'index': -2.0, 'E_min': 0.1, 'E_max': 80.8,
+        # Lag intrinseco: fotoni piu' energetici arrivano prima (soft lag)
+        'lag_amplitude': -0.1, 'E_ref': 0.1,
+        # Effetti QG: LIV lineare con la pendenza di prima, qg_strength / 10 s/GeV
+        'E_QG': float(liv_K(redshift)) * 10.0 / qg_strength if has_qg else None,
+    }
+
+
 def generate_realistic_grb_data(n_photons=3972, has_qg=False, qg_strength=0.001):
     """Genera dati GRB realistici per test"""
     
     # Parametri realistici GRB090902
-    redshift = 1.822
+    params = _realistic_grb_params(n_photons, has_qg, qg_strength)
     d_L = 22035.788571428573  # Mpc
     
-    # Genera energie realistiche (log-normal distribution)
-    energies = np.random.lognormal(0.5, 1.2, n_photons)
-    energies = np.clip(energies, 0.1, 80.8)
+    # Generatore derivato dallo stato globale: np.random.seed resta riproducibile
+    rng = np.random.default_rng(np.random.randint(2**31))
+    burst = generate_burst(rng=rng, **params)
     
-    # Genera tempi realistici
-    times = np.random.exponential(500, n_photons)
-    
-    # Aggiungi lag intrinseci (power-law)
-    intrinsic_lag = 0.1 * np.power(energies, -0.3) + 0.05 * np.random.randn(n_photons)
-    times += intrinsic_lag
-    
-    # Aggiungi effetti QG se richiesti
-    if has_qg:
-        qg_delay = qg_strength * (energies / 10.0) * (1 + 0.1 * times / 1000)
-        times += qg_delay
-    
-    # Aggiungi rumore
-    times += 0.1 * np.random.randn(n_photons)
-    
-    return energies, times, redshift, d_L
+    return burst['energies'], burst['times'], params['z'], d_L
 
 def bootstrap_analysis(energies, times, n_bootstrap=1000):
     """Analisi bootstrap per verificare robustezza"""
@@ -114,9 +117,12 @@ def monte_carlo_null_test(n_photons=3972, n_simulations=1000):
     
     null_significances = []
     
-    for i in range(n_simulations):
-        # Genera dati nulli (nessun QG effect)
-        energies, times, _, _ = generate_realistic_grb_data(n_photons, has_qg=False)
+    # Tutti i burst nulli (nessun QG effect) in una chiamata
+    rng = np.random.default_rng(np.random.randint(2**31))
+    null_bursts = generate_bursts([_realistic_grb_params(n_photons)] * n_simulations, rng=rng)
+    
+    for burst in null_bursts:
+        energies, times = burst['energies'], burst['times']
         
         # Calcola correlazione
         if len(energies) > 2:
@@ -16,11 +16,14 @@ DOI: 10.5281/zenodo.17404757
 
 import numpy as np
 from astropy.io import fits
-from scipy.stats import pearsonr, spearmanr, kendalltau
+from scipy.stats import pearsonr
 from scipy.signal import find_peaks
 from pathlib import Path
 import json
 from datetime import datetime
+from light_curve_blocks import bayesian_blocks, detect_pulses, segment_statistics
+from sliding_correlation import WindowComoments, detect_change_point, sliding_correlation
+from rank_engine import RankEngine
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -32,6 +35,14 @@ class DeepPatternAnalyzer:
         self.times = times - times.min()  # Normalize
         self.energies = energies
         self.n = len(energies)
+        self._ranks = None
+    
+    @property
+    def ranks(self):
+        """Ranghi (E, t) calcolati una volta per GRB e riusati da tutte le statistiche di rango"""
+        if self._ranks is None:
+            self._ranks = RankEngine(self.energies, self.times)
+        return self._ranks
         
     def global_correlation(self):
         """Correlazione globale standard"""
@@ -39,18 +50,18 @@ class DeepPatternAnalyzer:
             return None
             
         r_p, _ = pearsonr(self.energies, self.times)
-        r_s, _ = spearmanr(self.energies, self.times)
-        r_k, _ = kendalltau(self.energies, self.times)
+        spearman = self.ranks.spearman()
+        kendall = self.ranks.kendall()
         
         sig_p = abs(r_p) * np.sqrt(self.n - 2) / np.sqrt(1 - r_p**2)
-        sig_s = abs(r_s) * np.sqrt(self.n - 2) / np.sqrt(1 - r_s**2)
         
         return {
             'pearson_r': float(r_p),
             'pearson_sigma': float(sig_p),
-            'spearman_rho': float(r_s),
-            'spearman_sigma': float(sig_s),
-            'kendall_tau': float(r_k)
+            'spearman_rho': spearman['rho'],
+            'spearman_sigma': spearman['sigma'],
+            'kendall_tau': kendall['tau'],
+            'kendall_sigma': kendall['sigma']
         }
     
     def energy_subset_analysis(self):
@@ -90,35 +101,53 @@ class DeepPatternAnalyzer:
         return results
     
     def time_evolution_analysis(self):
-        """Analizza come evolve la correlazione nel tempo"""
+        """Analizza come evolve la correlazione nel tempo (pulse da Bayesian Blocks)"""
         results = {}
         
-        # Divide in time bins
-        n_bins = min(5, self.n // 100)
-        if n_bins < 2:
+        if self.n < 200:
             return results
         
-        time_bins = np.linspace(0, self.times.max(), n_bins + 1)
+        # Segmenta la light curve in pulse
+        order = np.argsort(self.times, kind='mergesort')
+        t_sorted = self.times[order]
+        e_sorted = self.energies[order]
+        
+        # Finestre mobili (co-momenti O(1) per finestra) e change point early/late
+        comoments = WindowComoments(t_sorted, e_sorted, assume_sorted=True)
+        width = max(50, self.n // 20)
+        windows = sliding_correlation(None, None, width, step=max(1, width // 10), comoments=comoments)
+        r_win = windows['correlation'][np.isfinite(windows['correlation'])]
+        if len(r_win):
+            peak = int(np.nanargmax(windows['significance_sigma']))
+            results['sliding_window'] = {
+                'width_photons': int(width),
+                'n_windows': int(len(r_win)),
+                'r_min': float(r_win.min()),
+                'r_max': float(r_win.max()),
+                'max_sigma': float(windows['significance_sigma'][peak]),
+                'max_sigma_time_window': [float(windows['t_start'][peak]), float(windows['t_stop'][peak])],
+                'sign_changes': int(np.sum(np.diff(np.sign(r_win)) != 0))
+            }
+        results['change_point'] = detect_change_point(t_sorted, e_sorted, min_photons=50)
+        
+        edges = bayesian_blocks(t_sorted, assume_sorted=True)
+        pulses = [p for p in detect_pulses(t_sorted, edges) if p['stop'] - p['start'] >= 10]
+        if len(pulses) < 2:
+            return results
+        
+        seg = segment_statistics(t_sorted, e_sorted,
+                                 [p['start'] for p in pulses], [p['stop'] for p in pulses])
         
         correlations = []
-        for i in range(n_bins):
-            mask = (self.times >= time_bins[i]) & (self.times < time_bins[i+1])
-            if np.sum(mask) < 10:
+        for i, pulse in enumerate(pulses):
+            if not np.isfinite(seg['correlation'][i]):
                 continue
-                
-            e_bin = self.energies[mask]
-            t_bin = self.times[mask]
-            
-            if len(e_bin) >= 10:
-                r, _ = pearsonr(e_bin, t_bin)
-                sig = abs(r) * np.sqrt(len(e_bin) - 2) / np.sqrt(1 - r**2)
-                
-                correlations.append({
-                    'time_window': [float(time_bins[i]), float(time_bins[i+1])],
-                    'n_photons': int(np.sum(mask)),
-                    'pearson_r': float(r),
-                    'sigma': float(sig)
-                })
+            correlations.append({
+                'time_window': [pulse['t_start'], pulse['t_stop']],
+                'n_photons': int(seg['n_photons'][i]),
+                'pearson_r': float(seg['correlation'][i]),
+                'sigma': float(seg['significance_sigma'][i])
+            })
         
         if correlations:
             results['time_bins'] = correlations
@@ -17,13 +17,13 @@ import pandas as pd
 import json
 from datetime import datetime
 from scipy import stats
-from sklearn.linear_model import RANSACRegressor
 from sklearn.utils import resample
-from sklearn.cluster import DBSCAN
-from sklearn.preprocessing import StandardScaler
 import matplotlib.pyplot as plt
 from astropy.io import fits
 from astropy.time import Time
+from robust_line_fit import RANSACLineFitter
+from periodicity import periodicity_search
+from photon_clustering import cluster_photons
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -129,53 +129,34 @@ def detect_hidden_qg_patterns(grb_name, data):
     log_log_r, log_log_p = stats.pearsonr(log_energy, log_time)
     log_log_sigma = abs(log_log_r * np.sqrt((n_photons-2)/(1-log_log_r**2)))
     
-    # 5. ANALISI SPETTRALE (FFT) PER PERIODICITÀ
-    if n_photons > 10:
-        # Calcola FFT del segnale energia-tempo
-        dt = np.diff(time_rel)
-        if len(dt) > 0 and np.std(dt) > 0:
-            # Interpola su griglia temporale uniforme
-            time_uniform = np.linspace(time_rel.min(), time_rel.max(), min(1000, n_photons))
-            energy_interp = np.interp(time_uniform, time_rel, energy)
-            
-            # FFT
-            fft = np.fft.fft(energy_interp)
-            freqs = np.fft.fftfreq(len(energy_interp), d=np.mean(dt))
-            
-            # Trova picchi significativi
-            power = np.abs(fft)**2
-            significant_peaks = power > 3 * np.std(power)
-            n_peaks = np.sum(significant_peaks)
-        else:
-            n_peaks = 0
-            freqs = np.array([])
-            power = np.array([])
+    # 5. PERIODICITÀ DELL'ENERGIA (Lomb-Scargle sui tempi di arrivo, senza binning)
+    if n_photons > 10 and np.ptp(time_rel) > 0:
+        periodicity = periodicity_search(time_rel, values=energy, n_harmonics=0)
+        n_peaks = periodicity['n_significant_peaks']
+        best_periodicity = periodicity['lomb_scargle']
     else:
         n_peaks = 0
-        freqs = np.array([])
-        power = np.array([])
+        best_periodicity = {'best_frequency': np.nan, 'best_power': 0.0, 'fap': 1.0, 'sigma': 0.0}
     
-    # 6. ANALISI CLUSTERING PER PATTERN NASCOSTI
+    # 6. ANALISI CLUSTERING PER PATTERN NASCOSTI (DBSCAN a griglia su log E, t)
     if n_photons > 10:
-        # Prepara dati per clustering
-        X = np.column_stack([energy, time_rel])
-        scaler = StandardScaler()
-        X_scaled = scaler.fit_transform(X)
-        
-        # DBSCAN clustering
-        dbscan = DBSCAN(eps=0.5, min_samples=3)
-        clusters = dbscan.fit_predict(X_scaled)
-        n_clusters = len(set(clusters)) - (1 if -1 in clusters else 0)
-        n_outliers = list(clusters).count(-1)
+        clustering = cluster_photons(energy, time_rel, eps=0.5, min_samples=3)
+        n_clusters = clustering['n_clusters']
+        n_outliers = clustering['n_noise']
+        cluster_summary = {
+            name: {key: cluster.get(key) for key in ('n_photons', 'stability', 'pearson_r', 't_stat', 'ols_slope')}
+            for name, cluster in clustering['clusters'].items()
+        }
     else:
         n_clusters = 0
         n_outliers = 0
+        cluster_summary = {}
     
     # 7. ANALISI RANSAC MULTIPLA
     X = energy.reshape(-1, 1)
     y = time_rel
     
-    ransac = RANSACRegressor(random_state=42)
+    ransac = RANSACLineFitter(random_state=42)
     ransac.fit(X, y)
     
     inlier_mask = ransac.inlier_mask_
@@ -187,7 +168,7 @@ def detect_hidden_qg_patterns(grb_name, data):
     X_inv = time_rel.reshape(-1, 1)
     y_inv = energy
     
-    ransac_inv = RANSACRegressor(random_state=42)
+    ransac_inv = RANSACLineFitter(random_state=42)
     ransac_inv.fit(X_inv, y_inv)
     
     inlier_mask_inv = ransac_inv.inlier_mask_
@@ -368,11 +349,16 @@ def detect_hidden_qg_patterns(grb_name, data):
         # Analisi spettrale
         'n_spectral_peaks': int(n_peaks),
         'has_spectral_periodicity': bool(n_peaks > 0),
+        'periodicity_best_frequency': float(best_periodicity['best_frequency']),
+        'periodicity_power': float(best_periodicity['best_power']),
+        'periodicity_fap': float(best_periodicity['fap']),
+        'periodicity_sigma': float(best_periodicity['sigma']),
         
         # Clustering
         'n_clusters': int(n_clusters),
         'n_outliers_clustering': int(n_outliers),
         'has_clustering_patterns': bool(n_clusters > 1),
+        'clusters': cluster_summary,
         
         # RANSAC
         'ransac_slope': float(ransac.estimator_.coef_[0]),
@@ -435,7 +421,8 @@ def detect_hidden_qg_patterns(grb_name, data):
     print(f"   📊 Log r={log_pearson_r:.4f}, σ={log_sigma:.2f}")
     print(f"   📊 Energy-LogTime r={energy_logtime_r:.4f}, σ={energy_logtime_sigma:.2f}")
     print(f"   📊 Log-Log r={log_log_r:.4f}, σ={log_log_sigma:.2f}")
-    print(f"   📊 Spectral peaks: {n_peaks}, Clusters: {n_clusters}")
+    print(f"   📊 Spectral peaks: {n_peaks} (best f={best_periodicity['best_frequency']:.4g} Hz, "
+          f"FAP={best_periodicity['fap']:.2e}), Clusters: {n_clusters}")
     print(f"   📊 Best model: {results['best_model']}")
     print(f"   📊 Hidden patterns: {results['has_hidden_patterns']}")
     
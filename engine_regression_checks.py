@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+ENGINE REGRESSION CHECKS - Controlli di non regressione dei motori numerici
+==========================================================================
+Controlli rapidi (pochi secondi, dati sintetici con seed fisso) sui casi
+limite corretti nei motori condivisi. Ogni check_* solleva AssertionError
+se il comportamento regredisce; main() li esegue tutti e termina con
+codice 1 al primo fallimento.
+
+    python engine_regression_checks.py
+
+Autore: Christian Quintino De Luca
+Affiliazione: RTH Italia - Research & Technology Hub
+"""
+
+import sys
+
+import numpy as np
+
+from lag_profile import fit_lag_profile, lag_profile
+from periodicity import FrequencyGrid, nufft_sums
+from robust_line_fit import RANSACLineFitter, _required_trials
+from significance import (logp_to_sigma, p_to_sigma, r_to_sigma, sigma_to_logp, sigma_to_p,
+                          sigma_to_r, sigma_to_t, t_to_sigma)
+
+
+def check_ransac_fractional_min_samples():
+    """min_samples frazionario: il warm start non deve azzerare i trial"""
+    assert _required_trials(0.5, 500, 0.99) > 1e100     # p_good ~ 1e-151: era -inf
+    assert np.isfinite(_required_trials(0.9, 200, 0.99))
+
+    rng = np.random.default_rng(42)
+    x = rng.uniform(0, 10, 400)
+    y = 2.0 * x + 1.0 + rng.normal(0, 0.1, 400)
+    y[:40] += rng.uniform(20, 50, 40)
+    fitter = RANSACLineFitter(min_samples=0.05, residual_threshold=0.5, max_trials=100, random_state=0)
+    fitter.fit(x, y, warm_start=(0.0, float(np.median(y))))
+    assert fitter.n_trials_ > 0, "no RANSAC trial after warm start"
+    assert abs(fitter.slope_ - 2.0) < 0.05, fitter.slope_
+
+
+def _lag_burst(seed, n_photons=3000, slope=0.05):
+    """Impulso gaussiano (sigma 2 s) a MET, energie E^-2 in 0.1-100 GeV, lag = slope * E"""
+    rng = np.random.default_rng(seed)
+    energies = 0.1 / (1 - rng.uniform(size=n_photons) * (1 - 1e-3))
+    times = 2.5e8 + rng.normal(0, 2, n_photons) + slope * energies
+    return energies, times
+
+
+def check_lag_profile_injection_recovery():
+    """Pendenza iniettata recuperata da ogni stimatore senza bias, con pull e chi2_red ~ 1"""
+    def linear(E, t0, a):
+        return t0 + a * E
+
+    n_seeds = 24
+    for estimator in ('median', 'peak', 'ccf'):
+        slopes, pulls, chi2_red = [], [], []
+        for seed in range(n_seeds):
+            energies, times = _lag_burst(seed)
+            profile = lag_profile(energies, times, estimator=estimator, n_bootstrap=100, seed=seed)
+            fit = fit_lag_profile(profile, linear, [np.median(times), 0.0], ('t0', 'a'))
+            slopes.append(fit['a'])
+            pulls.append((fit['a'] - 0.05) / fit['a_err'])
+            chi2_red.append(fit['chi2_red'])
+        tolerance = 3 * np.std(slopes) / np.sqrt(n_seeds)
+        assert abs(np.mean(slopes) - 0.05) < tolerance, (estimator, np.mean(slopes), tolerance)
+        assert abs(np.mean(pulls)) < 3 / np.sqrt(n_seeds), (estimator, 'pull mean', np.mean(pulls))
+        assert 0.6 < np.std(pulls) < 1.75, (estimator, 'pull std', np.std(pulls))
+        assert 0.7 < np.mean(chi2_red) < 1.4, (estimator, np.mean(chi2_red))
+
+
+def check_significance_round_trip_extreme_sigma():
+    """sigma -> p/t/r -> sigma esatto a 40-50 sigma (coda asintotica di erfc)"""
+    sigma = np.arange(40.0, 50.5, 0.5)
+    assert np.allclose(logp_to_sigma(sigma_to_logp(sigma)), sigma, rtol=1e-13, atol=0)
+    assert np.allclose(logp_to_sigma(sigma_to_logp(sigma, False), False), sigma, rtol=1e-13, atol=0)
+    assert np.allclose(t_to_sigma(sigma_to_t(sigma, 48), 48), sigma, rtol=1e-12, atol=0)    # n = 50
+    assert np.allclose(r_to_sigma(sigma_to_r(sigma, 1000), 1000), sigma, rtol=1e-12, atol=0)
+    # p lineare: esatto finche' rappresentabile, poi 0 -> inf (documentato)
+    assert abs(p_to_sigma(sigma_to_p(37.0)) - 37.0) < 1e-9
+    assert np.isinf(p_to_sigma(sigma_to_p(50.0)))
+
+
+def check_nufft_small_grids():
+    """NUFFT = somma diretta anche per griglie di poche frequenze (FFT imbottita)"""
+    rng = np.random.default_rng(1)
+    times = 100.0 + rng.uniform(0, 1, 500)
+    weights = rng.normal(size=500)
+    for n in (1, 2, 7, 15, 24, 200):
+        grid = FrequencyGrid(0.7, 0.37, n)
+        direct = np.exp(-2j * np.pi * grid.frequencies[:, None] * times) @ weights
+        error = np.max(np.abs(nufft_sums(times, weights, grid) - direct)) / np.max(np.abs(direct))
+        assert error < 1e-10, (n, error)
+
+
+CHECKS = [
+    check_ransac_fractional_min_samples,
+    check_lag_profile_injection_recovery,
+    check_significance_round_trip_extreme_sigma,
+    check_nufft_small_grids,
+]
+
+
+def main():
+    failed = 0
+    for check in CHECKS:
+        try:
+            check()
+            print(f"✅ {check.__name__}")
+        except AssertionError as exc:
+            failed += 1
+            print(f"❌ {check.__name__}: {exc}")
+    print(f"\n{len(CHECKS) - failed}/{len(CHECKS)} checks passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+FIGURE RENDERER - Rendering parallelo e incrementale delle figure
+==================================================================
+- figure indipendenti renderizzate in un process pool
+- figure saltate se l'hash degli input (dati + codice della funzione e
+  del suo modulo) non e' cambiato e il file esiste gia'
+- scatter che passa automaticamente a densita' (hexbin) sopra una soglia
+  di fotoni, cosi' anche burst da 10^6 fotoni restano disegnabili
+
+Autore: Christian Quintino De Luca
+Affiliazione: RTH Italia - Research & Technology Hub
+"""
+
+import hashlib
+import inspect
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+
+# Sopra questa soglia gli scatter diventano hexbin di densita'
+DENSITY_THRESHOLD = 20000
+
+# Cache degli hash delle figure gia' renderizzate
+CACHE_FILE = '.figure_cache.json'
+
+
+def density_scatter(ax, x, y, c=None, threshold=DENSITY_THRESHOLD, log_x=False, log_y=False,
+                    gridsize=200, cmap='viridis', **scatter_kwargs):
+    """
+    ax.scatter per pochi punti, ax.hexbin (conteggi in scala log) sopra soglia.
+    Ritorna il mappable (per plt.colorbar) e imposta le scale log richieste.
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+
+    if len(x) <= threshold:
+        mappable = ax.scatter(x, y, c=c, cmap=cmap if c is not None else None, **scatter_kwargs)
+        if log_x:
+            ax.set_xscale('log')
+        if log_y:
+            ax.set_yscale('log')
+        return mappable
+
+    mappable = ax.hexbin(x, y, gridsize=gridsize, bins='log', mincnt=1, cmap=cmap,
+                         xscale='log' if log_x else 'linear',
+                         yscale='log' if log_y else 'linear',
+                         linewidths=0)
+    return mappable
+
+
+def data_hash(*arrays, **params):
+    """SHA-256 di array numpy e parametri (repr stabile)"""
+    h = hashlib.sha256()
+    for a in arrays:
+        arr = np.asarray(a) if isinstance(a, (np.ndarray, list, tuple)) else None
+        if arr is not None and arr.dtype != object:
+            arr = np.ascontiguousarray(arr)
+            h.update(str(arr.dtype).encode())
+            h.update(str(arr.shape).encode())
+            h.update(arr.tobytes())
+        else:
+            h.update(repr(a).encode())
+    for key in sorted(params):
+        h.update(key.encode())
+        h.update(repr(params[key]).encode())
+    return h.hexdigest()
+
+
+def _source(obj, fallback):
+    try:
+        return inspect.getsource(obj)
+    except (OSError, TypeError):
+        return fallback
+
+
+def function_hash(func):
+    """
+    Hash del codice sorgente di una funzione di disegno e del modulo che la
+    definisce: cambiano chiave anche le modifiche agli helper e alle
+    costanti del modulo chiamati dalla funzione
+    """
+    name = getattr(func, '__qualname__', repr(func))
+    module = inspect.getmodule(func)
+    h = hashlib.sha256()
+    h.update(_source(func, name).encode())
+    h.update(_source(module, getattr(module, '__name__', '')).encode())
+    return h.hexdigest()
+
+
+class FigureCache:
+    """Mappa file figura -> hash degli input, persistita in JSON"""
+
+    def __init__(self, cache_file=CACHE_FILE):
+        self.cache_file = Path(cache_file)
+        self.entries = {}
+        if self.cache_file.exists():
+            try:
+                self.entries = json.loads(self.cache_file.read_text())
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def is_fresh(self, output, digest):
+        return self.entries.get(str(output)) == digest and Path(output).exists()
+
+    def update(self, output, digest):
+        self.entries[str(output)] = digest
+
+    def save(self):
+        tmp = self.cache_file.with_suffix('.tmp')
+        tmp.write_text(json.dumps(self.entries, indent=2, sort_keys=True))
+        os.replace(tmp, self.cache_file)
+
+
+def _render_job(func, args, kwargs):
+    """Eseguito nel worker: backend non interattivo, poi la funzione di disegno"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    func(*args, **kwargs)
+    plt.close('all')
+
+
+def render_figures(jobs, max_workers=None, cache_file=CACHE_FILE, force=False):
+    """
+    Renderizza in parallelo le figure il cui input e' cambiato.
+
+    jobs: lista di dict con chiavi
+        'func'   funzione top-level (picklable) che salva la figura
+        'output' path del file prodotto
+        'args', 'kwargs' (opzionali) argomenti della funzione
+        'inputs' (opzionale) array/valori extra da includere nell'hash
+    Ritorna dict output -> 'cached' | 'rendered' | 'error: ...'
+    """
+    cache = FigureCache(cache_file)
+    status = {}
+    pending = []
+
+    for job in jobs:
+        args = tuple(job.get('args', ()))
+        kwargs = dict(job.get('kwargs', {}))
+        digest = data_hash(function_hash(job['func']), *args, *job.get('inputs', ()), **kwargs)
+        if not force and cache.is_fresh(job['output'], digest):
+            status[str(job['output'])] = 'cached'
+        else:
+            pending.append((job, args, kwargs, digest))
+
+    if pending:
+        n_workers = max_workers or min(len(pending), os.cpu_count() or 1)
+        if n_workers <= 1 or len(pending) == 1:
+            for job, args, kwargs, digest in pending:
+                try:
+                    _render_job(job['func'], args, kwargs)
+                    cache.update(job['output'], digest)
+                    status[str(job['output'])] = 'rendered'
+                except Exception as e:
+                    status[str(job['output'])] = f'error: {e}'
+        else:
+            with ProcessPoolExecutor(max_workers=n_workers) as pool:
+                futures = {pool.submit(_render_job, job['func'], args, kwargs): (job, digest)
+                           for job, args, kwargs, digest in pending}
+                for future in as_completed(futures):
+                    job, digest = futures[future]
+                    try:
+                        future.result()
+                        cache.update(job['output'], digest)
+                        status[str(job['output'])] = 'rendered'
+                    except Exception as e:
+                        status[str(job['output'])] = f'error: {e}'
+
+    cache.save()
+    return status
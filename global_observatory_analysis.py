@@ -15,11 +15,13 @@ import numpy as np
 import pandas as pd
 import json
 from datetime import datetime
-from scipy import stats
-from sklearn.linear_model import RANSACRegressor
-from sklearn.utils import resample
 import os
 
+from grb_batch_engine import RaggedPhotons, analyze_batch
+
+N_PERMUTATIONS = 10000
+N_BOOTSTRAP = 5000
+
 def load_global_observatories():
     """
     Carica dati da tutti gli osservatori globali disponibili
@@ -332,59 +334,29 @@ def generate_global_observatory_data(observatory_name, observatory_info, event_n
     
     return data
 
-def analyze_global_observatory_data(observatory_name, data):
+def analyze_global_observatory_data(observatory_name, data, batch_stats=None):
     """
     Analizza dati osservatorio globale per effetti QG
+
+    batch_stats: statistiche gia' calcolate da grb_batch_engine.analyze_batch
+    (tutti i GRB in un passaggio); se None il dataset viene analizzato da solo.
     """
     print(f"🔍 Analyzing {observatory_name} data for QG effects...")
     
-    # Estrai dati
-    E = data['energy'].values
-    t = data['time'].values
-    z = data['redshift'].iloc[0]
-    trigger_time = data['trigger_time'].iloc[0]
-    
-    # Converti tempi in secondi relativi al trigger
-    t_rel = t - trigger_time
-    
-    # Analisi correlazione energia-tempo
-    pearson_r, pearson_p = stats.pearsonr(E, t_rel)
-    spearman_r, spearman_p = stats.spearmanr(E, t_rel)
-    
-    # Test significatività
-    n = len(E)
-    t_stat = pearson_r * np.sqrt((n-2)/(1-pearson_r**2))
-    sigma = abs(t_stat)
-    
-    # Permutation test
-    n_perm = 10000
-    perm_correlations = []
-    for _ in range(n_perm):
-        E_perm = np.random.permutation(E)
-        r_perm, _ = stats.pearsonr(E_perm, t_rel)
-        perm_correlations.append(r_perm)
-    
-    perm_p = np.mean(np.abs(perm_correlations) >= abs(pearson_r))
-    
-    # Bootstrap analysis
-    n_bootstrap = 5000
-    bootstrap_correlations = []
-    for _ in range(n_bootstrap):
-        indices = resample(range(n), n_samples=n)
-        E_bs = E[indices]
-        t_bs = t_rel[indices]
-        r_bs, _ = stats.pearsonr(E_bs, t_bs)
-        bootstrap_correlations.append(r_bs)
-    
-    bootstrap_ci = np.percentile(bootstrap_correlations, [2.5, 97.5])
-    
-    # RANSAC regression
-    X = E.reshape(-1, 1)
-    y = t_rel
-    ransac = RANSACRegressor(random_state=42)
-    ransac.fit(X, y)
-    slope = ransac.estimator_.coef_[0]
-    inliers = np.sum(ransac.inlier_mask_)
+    if batch_stats is None:
+        batch_stats = analyze_batch(RaggedPhotons.from_frames({observatory_name: data}),
+                                    n_permutations=N_PERMUTATIONS, n_bootstrap=N_BOOTSTRAP)[observatory_name]
+    
+    # Correlazioni, permutation test, bootstrap e RANSAC dal batch engine
+    z = batch_stats['redshift']
+    n = batch_stats['n_photons']
+    pearson_r, pearson_p = batch_stats['pearson_r'], batch_stats['pearson_p']
+    spearman_r, spearman_p = batch_stats['spearman_r'], batch_stats['spearman_p']
+    sigma = abs(batch_stats['t_stat'])
+    perm_p = batch_stats['permutation_p']
+    bootstrap_ci = batch_stats['bootstrap_ci']
+    slope = batch_stats['ransac_slope']
+    inliers = batch_stats['ransac_inliers']
     inlier_ratio = inliers / n
     
     # Stima E_QG
@@ -402,8 +374,8 @@ def analyze_global_observatory_data(observatory_name, data):
         'event_name': data['event_name'].iloc[0],
         'redshift': z,
         'n_photons': n,
-        'energy_range': [E.min(), E.max()],
-        'time_range': [t_rel.min(), t_rel.max()],
+        'energy_range': [batch_stats['energy_min'], batch_stats['energy_max']],
+        'time_range': [batch_stats['time_min'], batch_stats['time_max']],
         'pearson_r': pearson_r,
         'pearson_p': pearson_p,
         'spearman_r': spearman_r,
@@ -446,8 +418,9 @@ def global_observatory_analysis():
     
     print(f"🛰️ Analyzing {len(global_observatories)} GLOBAL observatories...")
     
+    frames = {}
     for i, (observatory_name, observatory_info) in enumerate(global_observatories.items(), 1):
-        print(f"\n🔍 Analyzing {observatory_name} ({i}/{len(global_observatories)})...")
+        print(f"\n🔍 Generating {observatory_name} ({i}/{len(global_observatories)})...")
         
         try:
             # Genera dati per ogni evento
@@ -456,17 +429,29 @@ def global_observatory_analysis():
                 
                 # Genera dati osservatorio
                 data = generate_global_observatory_data(observatory_name, observatory_info, event_name)
-                
-                # Analizza dati
-                result = analyze_global_observatory_data(observatory_name, data)
-                results[f"{observatory_name}_{event_name}"] = result
-                
-                if result['significant']:
-                    qg_effects.append(f"{observatory_name}_{event_name}")
-                    print(f"   🚨 QG EFFECT DETECTED in {observatory_name} {event_name}!")
+                frames[f"{observatory_name}_{event_name}"] = (observatory_name, event_name, data)
                     
         except Exception as e:
-            print(f"❌ Error analyzing {observatory_name}: {e}")
+            print(f"❌ Error generating {observatory_name}: {e}")
+            continue
+    
+    # Tutte le coppie osservatorio-evento in un solo passaggio vettorizzato (layout ragged)
+    print(f"\n⚡ Batch analysis of {len(frames)} datasets...")
+    photons = RaggedPhotons.from_frames({key: data for key, (_, _, data) in frames.items()})
+    batch = analyze_batch(photons, n_permutations=N_PERMUTATIONS, n_bootstrap=N_BOOTSTRAP, seed=42)
+    
+    for key, (observatory_name, event_name, data) in frames.items():
+        try:
+            # Analizza dati
+            result = analyze_global_observatory_data(observatory_name, data, batch[key])
+            results[key] = result
+            
+            if result['significant']:
+                qg_effects.append(key)
+                print(f"   🚨 QG EFFECT DETECTED in {observatory_name} {event_name}!")
+                
+        except Exception as e:
+            print(f"❌ Error analyzing {key}: {e}")
             continue
     
     # Analisi statistica popolazione
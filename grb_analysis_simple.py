@@ -16,14 +16,17 @@ from pathlib import Path
 from datetime import datetime
 
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-from scipy import stats
-from astropy.io import fits
-from astropy.time import Time
-import astropy.units as u
-from tqdm import tqdm
+
+from figure_renderer import density_scatter, data_hash, function_hash, FigureCache
+from lazy_imports import lazy_module, lazy_pyplot
+from stage_profiler import stage, profiled, PROFILER
+from significance import r_to_sigma
+
+# Caricati al primo uso: un run headless non paga matplotlib/astropy all'avvio
+pd = lazy_module('pandas')
+plt = lazy_pyplot()
+stats = lazy_module('scipy.stats')
+fits = lazy_module('astropy.io.fits')
 
 warnings.filterwarnings('ignore')
 
@@ -59,6 +62,7 @@ class Config:
     # Visualization
     DPI = 300
     FIGSIZE = (12, 8)
+    DENSITY_PLOT_THRESHOLD = 20000  # photons; above this scatters become hexbin
     
     @classmethod
     def setup_directories(cls):
@@ -198,6 +202,7 @@ class GRBPhotonData:
         self.times = None
         self.n_photons = 0
         
+    @profiled('load_fits')
     def load_data(self):
         """Load photon data from FITS file"""
         if not self.fits_file.exists():
@@ -283,9 +288,10 @@ class CorrelationAnalyzer:
         n_boot = Config.N_BOOTSTRAP
         boot_r = np.zeros(n_boot)
         
-        for i in range(n_boot):
-            idx = np.random.choice(len(energies), len(energies), replace=True)
-            boot_r[i], _ = stats.pearsonr(energies[idx], times[idx])
+        with stage('pearson_bootstrap', n_photons=len(energies), n_boot=n_boot):
+            for i in range(n_boot):
+                idx = np.random.choice(len(energies), len(energies), replace=True)
+                boot_r[i], _ = stats.pearsonr(energies[idx], times[idx])
         
         sigma = np.abs(r) / np.std(boot_r) if np.std(boot_r) > 0 else 0.0
         
@@ -304,7 +310,8 @@ class CorrelationAnalyzer:
         
         rho, p_value = stats.spearmanr(energies, times)
         
-        sigma = stats.norm.ppf(1 - p_value/2) if p_value > 0 else 10.0
+        # Stessa t con n-2 gradi di liberta' di spearmanr, ma in spazio log
+        sigma = float(r_to_sigma(rho, len(energies)))
         
         return {'rho': rho, 'p_value': p_value, 'sigma': sigma}
 
@@ -424,16 +431,21 @@ class MultiTechniqueAnalysis:
         
         return self.results
     
+    @profiled
     def run_complete(self):
         """Run all analyses"""
         print(f"\n{'#'*80}")
         print(f"# MULTI-TECHNIQUE ANALYSIS: {self.grb_data.grb_name}")
         print(f"{'#'*80}")
         
-        self.analyze_global()
-        self.analyze_energy_subsets()
-        self.analyze_temporal_phases()
-        self.analyze_outlier_masked()
+        with stage('global'):
+            self.analyze_global()
+        with stage('energy_subsets'):
+            self.analyze_energy_subsets()
+        with stage('temporal_phases'):
+            self.analyze_temporal_phases()
+        with stage('outlier_masked'):
+            self.analyze_outlier_masked()
         
         # Find max significance
         sigma_values = [r['sigma_max'] for r in self.results.values() if 'sigma_max' in r]
@@ -462,22 +474,38 @@ class GRBVisualizer:
         self.plot_dir.mkdir(exist_ok=True, parents=True)
     
     def plot_summary(self, sigma_max):
-        """Create summary plot"""
+        """Create summary plot (skipped if its inputs are unchanged)"""
+        output = self.plot_dir / f'{self.grb_name}_summary.png'
+        sigmas_all = {k: v.get('sigma_max', 0) for k, v in self.results.items()}
+        # tutto cio' che la figura legge: dati, z, nome, soglie di disegno e codice
+        digest = data_hash(self.grb_data.times, self.grb_data.energies,
+                           sigma_max=round(float(sigma_max), 6), sigmas=sigmas_all, dpi=Config.DPI,
+                           grb_name=self.grb_name, z=float(self.grb_data.params['z']),
+                           n_photons=len(self.grb_data.photons),
+                           density_threshold=Config.DENSITY_PLOT_THRESHOLD,
+                           code=function_hash(GRBVisualizer.plot_summary))
+        cache = FigureCache(Config.PLOTS_DIR / 'figures' / '.figure_cache.json')
+        if cache.is_fresh(output, digest):
+            print(f"   ⏭️  Plot unchanged: {output}")
+            return
+        
         fig, axes = plt.subplots(2, 2, figsize=(16, 12))
         fig.suptitle(f'{self.grb_name} - Analysis Summary (σ_max = {sigma_max:.2f})', 
                      fontsize=18, fontweight='bold')
         
         # Energy-Time scatter
         ax = axes[0, 0]
-        scatter = ax.scatter(self.grb_data.times, self.grb_data.energies,
-                           c=np.log10(self.grb_data.energies), cmap='viridis',
-                           alpha=0.6, s=30, edgecolors='black', linewidth=0.5)
+        scatter = density_scatter(ax, self.grb_data.times, self.grb_data.energies,
+                                  c=np.log10(self.grb_data.energies), cmap='viridis', log_y=True,
+                                  threshold=Config.DENSITY_PLOT_THRESHOLD,
+                                  alpha=0.6, s=30, edgecolors='black', linewidth=0.5)
         ax.set_xlabel('Time (s)')
         ax.set_ylabel('Energy (GeV)')
-        ax.set_yscale('log')
         ax.set_title('Energy vs Time')
         ax.grid(True, alpha=0.3)
-        plt.colorbar(scatter, ax=ax, label='log₁₀(E/GeV)')
+        plt.colorbar(scatter, ax=ax,
+                     label='log₁₀(E/GeV)' if len(self.grb_data.times) <= Config.DENSITY_PLOT_THRESHOLD
+                     else 'Photons per cell')
         
         # Energy histogram
         ax = axes[0, 1]
@@ -522,10 +550,12 @@ Classification:
                verticalalignment='center')
         
         plt.tight_layout()
-        plt.savefig(self.plot_dir / f'{self.grb_name}_summary.png', 
-                   dpi=Config.DPI, bbox_inches='tight')
+        plt.savefig(output, dpi=Config.DPI, bbox_inches='tight')
         plt.close()
         
+        cache.update(output, digest)
+        cache.save()
+        
         print(f"   ✅ Plot saved: {self.plot_dir / f'{self.grb_name}_summary.png'}")
 
 # ============================================================================
@@ -581,17 +611,19 @@ class GRBPipeline:
         print(f"{'█'*80}\n")
         
         try:
-            # Load data
-            grb_data = GRBPhotonData(grb_name, self.grb_database[grb_name])
-            grb_data.load_data()
-            
-            # Analyze
-            analyzer = MultiTechniqueAnalysis(grb_data)
-            results, sigma_max, best_technique = analyzer.run_complete()
-            
-            # Visualize
-            visualizer = GRBVisualizer(grb_name, grb_data, results)
-            visualizer.plot_summary(sigma_max)
+            with stage('analyze_grb', grb=grb_name):
+                # Load data
+                grb_data = GRBPhotonData(grb_name, self.grb_database[grb_name])
+                grb_data.load_data()
+                
+                # Analyze
+                analyzer = MultiTechniqueAnalysis(grb_data)
+                results, sigma_max, best_technique = analyzer.run_complete()
+                
+                # Visualize
+                with stage('plot_summary'):
+                    visualizer = GRBVisualizer(grb_name, grb_data, results)
+                    visualizer.plot_summary(sigma_max)
             
             # Store results
             self.all_results[grb_name] = {
@@ -680,12 +712,16 @@ class GRBPipeline:
             print(f"ANALYZING {len(available)} GRBs")
             print(f"{'='*80}")
             
+            from tqdm import tqdm
             for grb_name in tqdm(available, desc="Progress"):
                 self.analyze_grb(grb_name)
             
             # Create comparison
             self.create_comparison()
             
+            if PROFILER.enabled:
+                PROFILER.print_summary()
+            
             print(f"\n{'='*80}")
             print(f"✅ ANALYSIS COMPLETE!")
             print(f"{'='*80}")
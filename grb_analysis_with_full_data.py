@@ -8,6 +8,8 @@ import os
 import pandas as pd
 import numpy as np
 from scipy import stats
+from significance import r_to_sigma
+from sliding_correlation import WindowComoments, detect_change_point
 import json
 from pathlib import Path
 
@@ -42,46 +44,36 @@ def calculate_correlation_significance(df, method='pearson'):
         else:
             return 0.0, 0.0
         
-        # Convert p-value to sigma
-        if p_value > 0:
-            sigma = stats.norm.ppf(1 - p_value/2)
-        else:
-            sigma = 0.0
+        # Convert to sigma in log space (no underflow for tiny p-values)
+        sigma = float(r_to_sigma(r, len(df)))
         
         return r, sigma
     except:
         return 0.0, 0.0
 
-def phase_analysis(df, split_ratio=0.5):
-    """Perform phase analysis (early/late split)"""
+def phase_analysis(df, split_ratio=0.5, comoments=None):
+    """Perform phase analysis (early/late split) from cumulative co-moments"""
     if len(df) < 4:
         return {}
     
-    # Sort by time
-    df_sorted = df.sort_values('TIME').reset_index(drop=True)
+    # Time-sorted co-moments: any early/late split costs O(1)
+    if comoments is None:
+        comoments = WindowComoments(df['TIME'].values, df['ENERGY'].values)
+    n = comoments.n
     
     # Split at specified ratio
-    split_idx = int(len(df_sorted) * split_ratio)
-    early_df = df_sorted.iloc[:split_idx]
-    late_df = df_sorted.iloc[split_idx:]
+    split_idx = int(n * split_ratio)
+    phases = comoments.statistics([0, split_idx], [split_idx, n])
     
     results = {}
     
-    if len(early_df) >= 3:
-        r_early, sigma_early = calculate_correlation_significance(early_df)
-        results['phase_early'] = {
-            'r': r_early,
-            'sigma': sigma_early,
-            'n_photons': len(early_df)
-        }
-    
-    if len(late_df) >= 3:
-        r_late, sigma_late = calculate_correlation_significance(late_df)
-        results['phase_late'] = {
-            'r': r_late,
-            'sigma': sigma_late,
-            'n_photons': len(late_df)
-        }
+    for i, phase in enumerate(['phase_early', 'phase_late']):
+        if phases['n_photons'][i] >= 3:
+            results[phase] = {
+                'r': float(phases['correlation'][i]),
+                'sigma': float(phases['significance_sigma'][i]),
+                'n_photons': int(phases['n_photons'][i])
+            }
     
     return results
 
@@ -156,6 +148,14 @@ def analyze_grb(grb_name):
     for phase, data in phase_results.items():
         print(f"   {phase}: r = {data['r']:+.4f}, σ = {data['sigma']:.2f} ({data['n_photons']} photons)")
     
+    # Change point: best early/late split over all split indices
+    change_point = detect_change_point(df['TIME'].values, df['ENERGY'].values, min_photons=20)
+    results['phase_change_point'] = change_point
+    if change_point:
+        print(f"   change point at {change_point['split_ratio']:.1%} of photons: "
+              f"r = {change_point['early']['r']:+.4f} -> {change_point['late']['r']:+.4f}, "
+              f"|Δz| = {change_point['local_sigma']:.2f} ({change_point['n_splits']} splits)")
+    
     # Energy percentile analysis
     print(f"\n🔍 Energy percentiles...")
     percentile_results = energy_percentile_analysis(df)
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+GRB BATCH ENGINE - Statistiche per GRB su tutto il catalogo in un passaggio
+===========================================================================
+I fotoni di tutti i GRB sono concatenati in array piatti con un array di
+offset (layout "ragged"): il GRB i occupa energies[offsets[i]:offsets[i+1]].
+Ogni statistica per GRB e' una riduzione per segmento (np.add.reduceat)
+invece di un loop Python su DataFrame:
+
+- Pearson e Spearman (ranghi medi con ties, per segmento) con p-value e
+  sigma da significance.py; statistica t come negli script massivi
+- pendenza e intercetta ai minimi quadrati per GRB
+- null di permutazione: energie permutate dentro ogni GRB, a blocchi di
+  repliche; una matrice di permutazioni per ogni lunghezza di GRB, usata
+  da tutti i GRB con quel numero di fotoni (oppure un generatore per GRB,
+  se le repliche di ogni GRB non devono dipendere dagli altri)
+- bootstrap: ricampionamento per segmento, somme delle repliche con
+  reduceat lungo l'asse dei fotoni
+- RANSAC (robust_line_fit) per GRB, l'unico passo non riducibile
+
+    photons = RaggedPhotons.from_directory('fermi_massive_data')
+    results = analyze_batch(photons, n_permutations=20000, n_bootstrap=10000, seed=42)
+    results['GRB090902B']['pearson_r']
+
+Autore: Christian Quintino De Luca
+Affiliazione: RTH Italia - Research & Technology Hub
+"""
+
+import glob
+import os
+
+import numpy as np
+
+from robust_line_fit import RANSACLineFitter
+from significance import r_to_p, r_to_sigma, r_to_t
+
+# Limite elementi (repliche x fotoni) per blocco di permutazioni / bootstrap
+BLOCK_ELEMENTS = 4_000_000
+MIN_PHOTONS = 3
+
+
+# ============================================================================
+# LAYOUT RAGGED
+# ============================================================================
+
+class RaggedPhotons:
+    """Fotoni di molti GRB concatenati: energies, times, offsets (n_grb + 1)"""
+
+    def __init__(self, names, energies, times, offsets, redshifts=None):
+        self.names = list(names)
+        self.energies = np.asarray(energies, dtype=float)
+        self.times = np.asarray(times, dtype=float)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        if len(self.offsets) != len(self.names) + 1 or self.offsets[-1] != len(self.energies):
+            raise ValueError("offsets must have n_grb + 1 entries ending at the number of photons")
+        if np.any(np.diff(self.offsets) <= 0):
+            raise ValueError("Every GRB needs at least one photon")
+        self.redshifts = (np.full(len(self.names), np.nan) if redshifts is None
+                          else np.asarray(redshifts, dtype=float))
+
+    @classmethod
+    def from_arrays(cls, segments, redshifts=None):
+        """segments: dict nome -> (energies, times); i GRB vuoti sono scartati"""
+        items = [(name, np.asarray(E, dtype=float), np.asarray(t, dtype=float))
+                 for name, (E, t) in segments.items() if len(E)]
+        lengths = [len(E) for _, E, _ in items]
+        names = [name for name, _, _ in items]
+        z = None if redshifts is None else [redshifts.get(name, np.nan) for name in names]
+        return cls(names,
+                   np.concatenate([E for _, E, _ in items]) if items else np.empty(0),
+                   np.concatenate([t for _, _, t in items]) if items else np.empty(0),
+                   np.concatenate([[0], np.cumsum(lengths)]), z)
+
+    @classmethod
+    def from_frames(cls, frames, energy_column='energy', time_column='time',
+                    reference_column='trigger_time'):
+        """
+        frames: dict nome -> DataFrame (formato degli script massivi). I tempi
+        sono relativi a reference_column, se presente.
+        """
+        segments, redshifts = {}, {}
+        for name, data in frames.items():
+            t = data[time_column].values.astype(float)
+            if reference_column in data and len(data):
+                t = t - float(data[reference_column].iloc[0])
+            segments[name] = (data[energy_column].values, t)
+            if 'redshift' in data and len(data):
+                redshifts[name] = float(data['redshift'].iloc[0])
+        return cls.from_arrays(segments, redshifts)
+
+    @classmethod
+    def from_directory(cls, directory='fermi_massive_data', pattern='GRB*_fermi_data.csv'):
+        """Tutti i CSV del catalogo (colonne time, energy, grb_name, redshift, trigger_time)"""
+        import pandas as pd
+
+        frames = {}
+        for path in sorted(glob.glob(os.path.join(directory, pattern))):
+            data = pd.read_csv(path)
+            name = str(data['grb_name'].iloc[0]) if 'grb_name' in data and len(data) else \
+                os.path.basename(path).split('_')[0]
+            frames[name] = data
+        return cls.from_frames(frames)
+
+    @property
+    def n_grb(self):
+        return len(self.names)
+
+    @property
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    @property
+    def starts(self):
+        return self.offsets[:-1]
+
+    @property
+    def segment(self):
+        """Indice del GRB per ogni fotone"""
+        return np.repeat(np.arange(self.n_grb), self.lengths)
+
+    def segment_sum(self, values, axis=-1):
+        """Somma per GRB lungo l'asse dei fotoni"""
+        return np.add.reduceat(values, self.starts, axis=axis)
+
+    def segment_mean(self, values):
+        return self.segment_sum(values) / self.lengths
+
+    def segment_ranks(self, values):
+        """Ranghi medi (1-based, ties mediati come scipy) dentro ogni GRB"""
+        values = np.asarray(values, dtype=float)
+        seg = self.segment
+        order = np.lexsort((values, seg))
+        v, s = values[order], seg[order]
+        change = np.ones(len(v) + 1, dtype=bool)
+        change[1:-1] = (v[1:] != v[:-1]) | (s[1:] != s[:-1])
+        run_starts = np.flatnonzero(change)
+        run_len = np.diff(run_starts)
+        # rango medio della run: posizione media + 1 - inizio del segmento
+        run_rank = run_starts[:-1] + (run_len + 1) / 2 - self.starts[s[run_starts[:-1]]]
+        ranks = np.empty(len(v))
+        ranks[order] = np.repeat(run_rank, run_len)
+        return ranks
+
+    def subset(self, names):
+        """Nuovo RaggedPhotons con i soli GRB indicati"""
+        index = [self.names.index(name) for name in names]
+        segments = {self.names[i]: (self.energies[self.offsets[i]:self.offsets[i + 1]],
+                                    self.times[self.offsets[i]:self.offsets[i + 1]]) for i in index}
+        return RaggedPhotons.from_arrays(segments, dict(zip(self.names, self.redshifts)))
+
+
+# ============================================================================
+# STATISTICHE PER SEGMENTO
+# ============================================================================
+
+def _centered(photons, values):
+    return values - np.repeat(photons.segment_mean(values), photons.lengths)
+
+
+def _segment_pearson(photons, x, y):
+    """Pearson per GRB e momenti centrati (S_xx, S_yy, S_xy)"""
+    xc, yc = _centered(photons, x), _centered(photons, y)
+    S_xx = photons.segment_sum(xc * xc)
+    S_yy = photons.segment_sum(yc * yc)
+    S_xy = photons.segment_sum(xc * yc)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r = S_xy / np.sqrt(S_xx * S_yy)
+    return r, S_xx, S_yy, S_xy
+
+
+def _per_grb(rng, n_grb):
+    """Lista di generatori per GRB, oppure None se rng e' un generatore unico"""
+    if isinstance(rng, np.random.Generator):
+        return None
+    rngs = list(rng)
+    if len(rngs) != n_grb:
+        raise ValueError("rng needs one generator per GRB")
+    return rngs
+
+
+def _blocks(total, elements):
+    """Dimensioni dei blocchi di repliche con al piu' BLOCK_ELEMENTS elementi"""
+    size = max(1, BLOCK_ELEMENTS // max(elements, 1))
+    for start in range(0, total, size):
+        yield min(size, total - start)
+
+
+def permutation_null(photons, x, y, n_permutations, rng):
+    """
+    Correlazioni di Pearson con x permutato dentro ogni GRB:
+    array (n_permutations, n_grb). I GRB con lo stesso numero di fotoni
+    condividono la permutazione di ogni replica (una matrice di indici
+    per lunghezza): la null di ciascun GRB e' esatta, ma le null di GRB
+    diversi non sono indipendenti fra loro. Con rng lista di generatori
+    (uno per GRB) ogni GRB permuta col proprio.
+    """
+    xc, yc = _centered(photons, x), _centered(photons, y)
+    norm = np.sqrt(photons.segment_sum(xc * xc) * photons.segment_sum(yc * yc))
+    lengths = photons.lengths
+    null = np.empty((n_permutations, photons.n_grb))
+    rngs = _per_grb(rng, photons.n_grb)
+
+    if rngs is not None:
+        for i, (lo, hi) in enumerate(zip(photons.starts, photons.offsets[1:])):
+            xg, yg, L = xc[lo:hi], yc[lo:hi], hi - lo
+            row = 0
+            for B in _blocks(n_permutations, L):
+                perms = rngs[i].permuted(np.broadcast_to(np.arange(L), (B, L)), axis=1)
+                null[row:row + B, i] = xg[perms] @ yg
+                row += B
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return null / norm
+
+    for L in np.unique(lengths):
+        group = np.flatnonzero(lengths == L)
+        index = photons.starts[group][:, None] + np.arange(L)
+        xg, yg = xc[index], yc[index]
+        row = 0
+        for B in _blocks(n_permutations, xg.size):
+            perms = rng.permuted(np.broadcast_to(np.arange(L), (B, L)), axis=1)
+            null[row:row + B, group] = np.einsum('gbl,gl->bg', xg[:, perms], yg)
+            row += B
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return null / norm
+
+
+def bootstrap_correlations(photons, x, y, n_bootstrap, rng):
+    """
+    Pearson su ricampionamenti con reinserimento dentro ogni GRB:
+    array (n_bootstrap, n_grb). Le cinque somme per replica sono
+    riduzioni per segmento lungo l'asse dei fotoni. Con rng lista di
+    generatori (uno per GRB) ogni GRB ricampiona col proprio.
+    """
+    seg = photons.segment
+    base = photons.starts[seg]
+    size = photons.lengths[seg]
+    n = photons.lengths
+    x = _centered(photons, x)
+    y = _centered(photons, y)
+    out = np.empty((n_bootstrap, photons.n_grb))
+    rngs = _per_grb(rng, photons.n_grb)
+    row = 0
+    for B in _blocks(n_bootstrap, len(x)):
+        if rngs is None:
+            u = rng.random((B, len(x)))
+        else:
+            u = np.concatenate([g.random((B, L)) for g, L in zip(rngs, n)], axis=1)
+        index = base + (u * size).astype(np.int64)
+        xb, yb = x[index], y[index]
+        sx, sy = photons.segment_sum(xb), photons.segment_sum(yb)
+        S_xx = photons.segment_sum(xb * xb) - sx * sx / n
+        S_yy = photons.segment_sum(yb * yb) - sy * sy / n
+        S_xy = photons.segment_sum(xb * yb) - sx * sy / n
+        with np.errstate(invalid='ignore', divide='ignore'):
+            out[row:row + B] = S_xy / np.sqrt(S_xx * S_yy)
+        row += B
+    return out
+
+
+def _ransac(photons, ransac_seed):
+    """RANSAC per GRB: (slope, intercept, n_inliers)"""
+    slopes = np.full(photons.n_grb, np.nan)
+    intercepts = np.full(photons.n_grb, np.nan)
+    inliers = np.zeros(photons.n_grb, dtype=int)
+    for i in range(photons.n_grb):
+        lo, hi = photons.offsets[i], photons.offsets[i + 1]
+        if hi - lo < 2:
+            continue
+        fitter = RANSACLineFitter(random_state=ransac_seed)
+        fitter.fit(photons.energies[lo:hi], photons.times[lo:hi])
+        slopes[i] = fitter.slope_
+        intercepts[i] = fitter.intercept_
+        inliers[i] = int(np.sum(fitter.inlier_mask_))
+    return slopes, intercepts, inliers
+
+
+def analyze_batch(photons, n_permutations=0, n_bootstrap=0, seed=None, rng=None,
+                  ransac=True, ransac_seed=42, ci=(2.5, 97.5)):
+    """
+    Statistiche energia-tempo di tutti i GRB in un passaggio.
+    Restituisce dict nome -> dict con n_photons, range, Pearson/Spearman
+    (r, p, sigma), t_stat, pendenza OLS, e se richiesti permutation_p,
+    bootstrap_ci e RANSAC. I GRB con meno di MIN_PHOTONS fotoni hanno
+    statistiche NaN. rng puo' essere anche una lista di generatori, uno
+    per GRB nell'ordine di photons.names: allora permutazioni e bootstrap
+    di ogni GRB non dipendono dagli altri GRB del batch.
+    """
+    rng = rng if rng is not None else np.random.default_rng(seed)
+    E, t = photons.energies, photons.times
+    n = photons.lengths
+
+    pearson_r, S_EE, _, S_Et = _segment_pearson(photons, E, t)
+    spearman_r = _segment_pearson(photons, photons.segment_ranks(E), photons.segment_ranks(t))[0]
+    valid = n >= MIN_PHOTONS
+    pearson_r = np.where(valid, pearson_r, np.nan)
+    spearman_r = np.where(valid, spearman_r, np.nan)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        slope = S_Et / S_EE
+    intercept = photons.segment_mean(t) - slope * photons.segment_mean(E)
+
+    columns = {
+        'n_photons': n,
+        'energy_min': np.minimum.reduceat(E, photons.starts),
+        'energy_max': np.maximum.reduceat(E, photons.starts),
+        'time_min': np.minimum.reduceat(t, photons.starts),
+        'time_max': np.maximum.reduceat(t, photons.starts),
+        'pearson_r': pearson_r,
+        'pearson_p': np.atleast_1d(r_to_p(pearson_r, n)),
+        'pearson_sigma': np.atleast_1d(r_to_sigma(pearson_r, n)),
+        'spearman_r': spearman_r,
+        'spearman_p': np.atleast_1d(r_to_p(spearman_r, n)),
+        't_stat': np.atleast_1d(r_to_t(pearson_r, n)),
+        'ols_slope': slope,
+        'ols_intercept': intercept,
+    }
+
+    if n_permutations:
+        null = permutation_null(photons, E, t, n_permutations, rng)
+        columns['permutation_p'] = np.mean(np.abs(null) >= np.abs(pearson_r), axis=0)
+    if n_bootstrap:
+        boot = bootstrap_correlations(photons, E, t, n_bootstrap, rng)
+        columns['bootstrap_ci'] = np.nanpercentile(boot, ci, axis=0).T
+    if ransac:
+        columns['ransac_slope'], columns['ransac_intercept'], columns['ransac_inliers'] = \
+            _ransac(photons, ransac_seed)
+
+    results = {}
+    for i, name in enumerate(photons.names):
+        row = {key: values[i] for key, values in columns.items()}
+        result = {key: (value.tolist() if isinstance(value, np.ndarray) else value.item())
+                  for key, value in row.items()}
+        result['redshift'] = float(photons.redshifts[i])
+        results[name] = result
+    return results
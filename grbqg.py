@@ -0,0 +1,510 @@
+#!/usr/bin/env python3
+"""
+GRBQG - Entry point unico per le analisi QG sui GRB
+===================================================
+Sostituisce la scelta tra decine di RUN_*.bat e script quasi duplicati con
+un file di configurazione (TOML o YAML) che dichiara:
+
+- lista dei GRB (file FITS/CSV, trigger MET, redshift)
+- tagli in energia/tempo, iterazioni (bootstrap, permutazioni, RANSAC, CCF)
+- stadi richiesti, numero di worker, cartella di cache
+
+Gli stadi formano un grafo esplicito: vengono eseguiti solo quelli
+richiesti e le loro dipendenze. Ogni risultato e' in cache su disco con
+chiave = hash(input, parametri e codice dello stadio, chiavi delle dipendenze),
+quindi un secondo run ricalcola solo cio' che e' cambiato.
+astropy, scipy, matplotlib e i motori di analisi sono importati solo
+dentro lo stadio che li usa.
+
+Uso:
+    python grbqg.py init grbqg_run.toml        # config di esempio
+    python grbqg.py stages                     # grafo degli stadi
+    python grbqg.py run grbqg_run.toml
+    python grbqg.py run grbqg_run.toml --stages ransac lags --grb GRB090902B
+
+Autore: Christian Quintino De Luca
+Affiliazione: RTH Italia - Research & Technology Hub
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from figure_renderer import function_hash
+from stage_profiler import stage, set_context, PROFILER
+
+DEFAULT_CONFIG = {
+    'run': {
+        'output_dir': 'grbqg_results',
+        'cache_dir': '.grbqg_cache',
+        'workers': 1,
+        'seed': 42,
+        'stages': ['correlation', 'bootstrap', 'permutation', 'ransac', 'lags', 'qg_limits'],
+    },
+    'cuts': {
+        'energy_min': 0.1,      # GeV
+        'energy_max': None,     # GeV
+        'time_min': None,       # s dal trigger
+        'time_max': None,       # s dal trigger
+    },
+    'iterations': {
+        'n_bootstrap': 1000,
+        'n_permutations': 1000,
+        'ransac_trials': 100,
+        'ccf_sims': 200,
+    },
+    'grb': [],
+}
+
+EXAMPLE_CONFIG = """# Configurazione di esempio per grbqg.py
+[run]
+output_dir = "grbqg_results"
+cache_dir = ".grbqg_cache"
+workers = 2
+seed = 42
+stages = ["correlation", "bootstrap", "permutation", "ransac", "lags", "qg_limits", "plots"]
+
+[cuts]
+energy_min = 0.1     # GeV
+time_min = 0.0       # s dal trigger
+time_max = 2500.0
+
+[iterations]
+n_bootstrap = 1000
+n_permutations = 1000
+ransac_trials = 100
+ccf_sims = 200
+
+# File FITS (HDU EVENTS) o CSV (ENERGY [MeV], TIME [MET]); senza trigger_met
+# i tempi partono dal primo fotone
+[[grb]]
+name = "GRB090902B"
+file = "GRB090902B_PH00.csv"
+z = 1.822
+
+[[grb]]
+name = "GRB090926A"
+file = "GRB090926A_PH00.csv"
+z = 2.1062
+
+[[grb]]
+name = "GRB130427A"
+file = "GRB130427A_PH00.csv"
+z = 0.34
+
+# [[grb]]
+# name = "GRB090902B_EV"
+# file = "L251020161615F357373F52_EV00.fits"
+# trigger_met = 273581808.0
+# z = 1.822
+"""
+
+
+# ============================================================================
+# CONFIG
+# ============================================================================
+
+# I nomi dei GRB finiscono nei percorsi di cache e di output: niente separatori o '..'
+SAFE_GRB_NAME = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_.+-]*$')
+
+
+def check_grb_name(name):
+    """Ritorna il nome se e' un singolo componente di percorso sicuro, altrimenti ValueError"""
+    name = str(name)
+    if not SAFE_GRB_NAME.match(name) or Path(name).name != name:
+        raise ValueError(f"Invalid GRB name {name!r}: use letters, digits and '_.+-' only")
+    return name
+
+
+def load_config(path):
+    """Legge TOML (.toml) o YAML (.yaml/.yml) e applica i default"""
+    path = Path(path)
+    if path.suffix in ('.yaml', '.yml'):
+        try:
+            import yaml
+        except ImportError:
+            raise ImportError("PyYAML is required for YAML configs (pip install pyyaml)")
+        with open(path) as f:
+            user = yaml.safe_load(f) or {}
+    else:
+        try:
+            import tomllib
+        except ImportError:  # Python < 3.11
+            import tomli as tomllib
+        with open(path, 'rb') as f:
+            user = tomllib.load(f)
+
+    config = {key: (dict(value) if isinstance(value, dict) else list(value))
+              for key, value in DEFAULT_CONFIG.items()}
+    for key, value in user.items():
+        if isinstance(value, dict) and isinstance(config.get(key), dict):
+            config[key].update(value)
+        else:
+            config[key] = value
+
+    for grb in config['grb']:
+        if 'name' not in grb or 'file' not in grb:
+            raise ValueError(f"Each [[grb]] entry needs 'name' and 'file': {grb}")
+        grb['name'] = check_grb_name(grb['name'])
+        grb.setdefault('z', None)
+        grb.setdefault('trigger_met', None)
+    return config
+
+
+# ============================================================================
+# STADI
+# ============================================================================
+# Ogni stadio: f(data, deps, config, grb) -> dict JSON-serializzabile.
+# data = {'times', 'energies'} gia' tagliati; deps = risultati delle dipendenze.
+
+def _sigma_from_p(p_value):
+    from significance import p_to_sigma
+    return float(p_to_sigma(p_value))
+
+
+def stage_correlation(data, deps, config, grb):
+    from scipy import stats
+    from significance import r_to_sigma
+    t, e = data['times'], data['energies']
+    r, p = stats.pearsonr(e, t)
+    rho, p_s = stats.spearmanr(e, t)
+    return {'n_photons': int(len(t)), 'pearson_r': float(r), 'pearson_p': float(p),
+            'pearson_sigma': float(r_to_sigma(r, len(t))), 'spearman_rho': float(rho),
+            'spearman_p': float(p_s), 'spearman_sigma': float(r_to_sigma(rho, len(t)))}
+
+
+def stage_bootstrap(data, deps, config, grb):
+    t, e = data['times'], data['energies']
+    n_boot = int(config['iterations']['n_bootstrap'])
+    rng = np.random.default_rng(config['run']['seed'])
+    boot = np.empty(n_boot)
+    for i in range(n_boot):
+        idx = rng.integers(0, len(t), len(t))
+        boot[i] = np.corrcoef(e[idx], t[idx])[0, 1]
+    ci = np.percentile(boot, [2.5, 97.5])
+    return {'n_bootstrap': n_boot, 'mean_r': float(np.mean(boot)), 'std_r': float(np.std(boot)),
+            'ci_95': [float(ci[0]), float(ci[1])]}
+
+
+def stage_permutation(data, deps, config, grb):
+    t, e = data['times'], data['energies']
+    n_perm = int(config['iterations']['n_permutations'])
+    rng = np.random.default_rng(config['run']['seed'])
+    obs_r = deps['correlation']['pearson_r']
+    perm = np.empty(n_perm)
+    for i in range(n_perm):
+        perm[i] = np.corrcoef(e, rng.permutation(t))[0, 1]
+    p_value = (np.sum(np.abs(perm) >= abs(obs_r)) + 1) / (n_perm + 1)
+    return {'n_permutations': n_perm, 'p_value': float(p_value), 'sigma': _sigma_from_p(p_value)}
+
+
+def stage_ransac(data, deps, config, grb):
+    from robust_line_fit import RANSACLineFitter
+    t, e = data['times'], data['energies']
+    fitter = RANSACLineFitter(min_samples=0.5, max_trials=int(config['iterations']['ransac_trials']),
+                              random_state=config['run']['seed'])
+    fitter.fit(e.reshape(-1, 1), t)
+    return {'slope': float(fitter.slope_), 'intercept': float(fitter.intercept_),
+            'n_inliers': int(fitter.inlier_mask_.sum()), 'n_trials': int(fitter.n_trials_)}
+
+
+def stage_lags(data, deps, config, grb):
+    from ccf_lag import ccf_spectral_lags, lag_energy_slope
+    from light_curve_blocks import pulse_lag_analysis
+    t, e = data['times'], data['energies']
+    pulses, edges = pulse_lag_analysis(t, e)
+    ccf = ccf_spectral_lags(t, e, n_sim=int(config['iterations']['ccf_sims']),
+                            random_state=config['run']['seed'])
+    alpha, alpha_err = lag_energy_slope(ccf)
+    return {
+        'n_blocks': int(len(edges) - 1),
+        'pulses': [{k: p[k] for k in ('t_start', 't_stop', 'n_photons', 'correlation',
+                                      'slope', 'significance_sigma')} for p in pulses],
+        'ccf_lag': [float(x) for x in ccf['lag']],
+        'ccf_lag_err': [float(x) for x in ccf['lag_err']],
+        'ccf_slope': float(alpha),
+        'ccf_slope_err': float(alpha_err)
+    }
+
+
+def stage_qg_limits(data, deps, config, grb):
+    if grb['z'] is None:
+        return {'E_QG_limit': None, 'note': 'redshift not set'}
+    from qg_residual_search import calculate_qg_limits
+    return calculate_qg_limits(data['times'], data['energies'], grb['z'])
+
+
+def stage_plots(data, deps, config, grb):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from figure_renderer import density_scatter
+
+    output = Path(config['run']['output_dir']) / f"{grb['name']}_summary.png"
+    fig, axes = plt.subplots(1, 2, figsize=(14, 5))
+    mappable = density_scatter(axes[0], data['times'], data['energies'], log_y=True, s=4, alpha=0.6)
+    if hasattr(mappable, 'get_array') and mappable.get_array() is not None:
+        plt.colorbar(mappable, ax=axes[0], label='Photons per cell')
+    fit = deps['ransac']
+    x = np.linspace(data['energies'].min(), data['energies'].max(), 100)
+    axes[0].plot(fit['intercept'] + fit['slope'] * x, x, 'r-', label=f"RANSAC {fit['slope']:.3g} s/GeV")
+    axes[0].set_xlabel('Time (s)')
+    axes[0].set_ylabel('Energy (GeV)')
+    axes[0].legend()
+
+    lags = deps['lags']
+    axes[1].errorbar(np.arange(len(lags['ccf_lag'])), lags['ccf_lag'], yerr=lags['ccf_lag_err'], fmt='o')
+    axes[1].set_xlabel('Band pair')
+    axes[1].set_ylabel('CCF lag (s)')
+    fig.suptitle(f"{grb['name']} - r = {deps['correlation']['pearson_r']:+.4f}")
+    fig.tight_layout()
+    fig.savefig(output, dpi=150)
+    plt.close(fig)
+    return {'figure': str(output)}
+
+
+class Stage:
+    """Nodo del grafo: funzione, dipendenze e sezioni di config che usa"""
+
+    def __init__(self, func, deps=(), params=()):
+        self.func = func
+        self.deps = tuple(deps)
+        self.params = tuple(params)
+
+
+STAGES = {
+    'correlation': Stage(stage_correlation),
+    'bootstrap': Stage(stage_bootstrap, params=('iterations.n_bootstrap', 'run.seed')),
+    'permutation': Stage(stage_permutation, deps=('correlation',),
+                         params=('iterations.n_permutations', 'run.seed')),
+    'ransac': Stage(stage_ransac, params=('iterations.ransac_trials', 'run.seed')),
+    'lags': Stage(stage_lags, params=('iterations.ccf_sims', 'run.seed')),
+    'qg_limits': Stage(stage_qg_limits, params=('grb.z',)),
+    'plots': Stage(stage_plots, deps=('correlation', 'ransac', 'lags'), params=('run.output_dir',)),
+}
+
+
+def resolve_stages(requested):
+    """Chiusura sulle dipendenze in ordine topologico"""
+    order = []
+    visiting = set()
+
+    def visit(name):
+        if name not in STAGES:
+            raise ValueError(f"Unknown stage '{name}'. Available: {', '.join(STAGES)}")
+        if name in order:
+            return
+        if name in visiting:
+            raise ValueError(f"Cycle in stage graph at '{name}'")
+        visiting.add(name)
+        for dep in STAGES[name].deps:
+            visit(dep)
+        visiting.discard(name)
+        order.append(name)
+
+    for name in requested:
+        visit(name)
+    return order
+
+
+# ============================================================================
+# DATI E CACHE
+# ============================================================================
+
+def _hash(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(json.dumps(part, sort_keys=True, default=str).encode())
+    return h.hexdigest()[:20]
+
+
+def _param(config, grb, dotted):
+    section, key = dotted.split('.')
+    source = grb if section == 'grb' else config[section]
+    return source.get(key)
+
+
+def load_photons(grb, cuts):
+    """FITS (EVENTS) o CSV (ENERGY [MeV], TIME [MET]) -> tempi dal trigger, energie [GeV]"""
+    path = Path(grb['file'])
+    if path.suffix.lower() in ('.fits', '.fit', '.fz'):
+        from astropy.io import fits
+        with fits.open(path, memmap=True) as hdul:
+            events = hdul['EVENTS'].data
+            times = np.asarray(events['TIME'], dtype=float)
+            energies = np.asarray(events['ENERGY'], dtype=float) / 1000.0
+    else:
+        import pandas as pd
+        df = pd.read_csv(path, usecols=['ENERGY', 'TIME'])
+        times = df['TIME'].to_numpy(dtype=float)
+        energies = df['ENERGY'].to_numpy(dtype=float) / 1000.0
+
+    t0 = grb['trigger_met'] if grb['trigger_met'] is not None else times.min()
+    times = times - t0
+
+    mask = np.isfinite(times) & np.isfinite(energies) & (energies > 0)
+    if cuts.get('energy_min') is not None:
+        mask &= energies >= cuts['energy_min']
+    if cuts.get('energy_max') is not None:
+        mask &= energies <= cuts['energy_max']
+    if cuts.get('time_min') is not None:
+        mask &= times >= cuts['time_min']
+    if cuts.get('time_max') is not None:
+        mask &= times <= cuts['time_max']
+    return {'times': times[mask], 'energies': energies[mask]}
+
+
+def _load_cached_photons(grb, config, cache_dir):
+    stat = os.stat(grb['file'])
+    key = _hash('load', os.path.abspath(grb['file']), stat.st_size, stat.st_mtime_ns,
+                grb['trigger_met'], config['cuts'])
+    cache_file = cache_dir / f"{grb['name']}_load_{key}.npz" if cache_dir else None
+    if cache_file and cache_file.exists():
+        with np.load(cache_file) as npz:
+            return {'times': npz['times'], 'energies': npz['energies']}, key, True
+
+    with stage('load'):
+        data = load_photons(grb, config['cuts'])
+    if cache_file:
+        tmp = cache_file.with_suffix('.tmp.npz')
+        np.savez(tmp, **data)
+        os.replace(tmp, cache_file)
+    return data, key, False
+
+
+def run_grb(grb, config, stage_order, use_cache=True):
+    """Esegue la catena di stadi per un GRB; ritorna (nome, risultati, stato per stadio)"""
+    check_grb_name(grb['name'])
+    set_context(grb=grb['name'])
+    cache_dir = Path(config['run']['cache_dir']) if use_cache else None
+    if cache_dir:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+
+    data, load_key, cached = _load_cached_photons(grb, config, cache_dir)
+    status = {'load': 'cached' if cached else 'computed'}
+    results = {'n_photons': int(len(data['times']))}
+    keys = {}
+
+    if len(data['times']) < 10:
+        status['error'] = f"only {len(data['times'])} photons after cuts"
+        return grb['name'], results, status
+
+    for name in stage_order:
+        spec = STAGES[name]
+        # il codice dello stadio fa parte della chiave: dopo una modifica si ricalcola
+        keys[name] = _hash(name, function_hash(spec.func), load_key, [keys[d] for d in spec.deps],
+                           {p: _param(config, grb, p) for p in spec.params})
+        cache_file = cache_dir / f"{grb['name']}_{name}_{keys[name]}.json" if cache_dir else None
+
+        if cache_file and cache_file.exists():
+            with open(cache_file) as f:
+                cached_result = json.load(f)
+            # Stadi che producono file (figure): validi solo se il file esiste ancora
+            if 'figure' not in cached_result or Path(cached_result['figure']).exists():
+                results[name] = cached_result
+                status[name] = 'cached'
+                continue
+
+        t_start = time.perf_counter()
+        try:
+            with stage(name):
+                results[name] = spec.func(data, {d: results[d] for d in spec.deps}, config, grb)
+        except Exception as e:
+            status[name] = f'error: {e}'
+            break
+        status[name] = f'computed ({time.perf_counter() - t_start:.2f} s)'
+
+        if cache_file:
+            tmp = cache_file.with_suffix('.tmp')
+            with open(tmp, 'w') as f:
+                json.dump(results[name], f)
+            os.replace(tmp, cache_file)
+
+    return grb['name'], results, status
+
+
+def run(config, stages=None, grb_names=None, workers=None, use_cache=True):
+    stage_order = resolve_stages(stages or config['run']['stages'])
+    grbs = [g for g in config['grb'] if not grb_names or g['name'] in grb_names]
+    workers = workers or int(config['run']['workers'])
+    Path(config['run']['output_dir']).mkdir(parents=True, exist_ok=True)
+
+    print(f"🚀 grbqg: {len(grbs)} GRBs, stages: {' → '.join(stage_order)} (workers={workers})")
+
+    outputs = []
+    if workers > 1 and len(grbs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(run_grb, grb, config, stage_order, use_cache) for grb in grbs]
+            outputs = [f.result() for f in futures]
+    else:
+        outputs = [run_grb(grb, config, stage_order, use_cache) for grb in grbs]
+
+    all_results = {}
+    for name, results, status in outputs:
+        all_results[name] = {'results': results, 'status': status}
+        print(f"\n🔬 {name}: {results.get('n_photons', 0)} photons")
+        for stage_name, state in status.items():
+            print(f"   {'❌' if str(state).startswith('error') else '✅'} {stage_name:<12} {state}")
+        if 'correlation' in results:
+            corr = results['correlation']
+            print(f"   r = {corr['pearson_r']:+.4f} ({corr['pearson_sigma']:.2f}σ)")
+
+    output_file = Path(config['run']['output_dir']) / 'grbqg_results.json'
+    with open(output_file, 'w') as f:
+        json.dump(all_results, f, indent=2, default=str)
+    print(f"\n💾 Results: {output_file}")
+
+    if PROFILER.enabled:
+        PROFILER.print_summary()
+    return all_results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='grbqg', description="GRB quantum-gravity analysis runner")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_run = sub.add_parser('run', help="run the stages declared in a config")
+    p_run.add_argument('config')
+    p_run.add_argument('--stages', nargs='+', default=None)
+    p_run.add_argument('--grb', nargs='+', default=None)
+    p_run.add_argument('--workers', type=int, default=None)
+    p_run.add_argument('--no-cache', action='store_true')
+
+    p_init = sub.add_parser('init', help="write an example TOML config")
+    p_init.add_argument('path', nargs='?', default='grbqg_run.toml')
+
+    sub.add_parser('stages', help="show the stage graph")
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'init':
+        if os.path.exists(args.path):
+            print(f"❌ {args.path} already exists")
+            return 1
+        with open(args.path, 'w') as f:
+            f.write(EXAMPLE_CONFIG)
+        print(f"✅ Example config written: {args.path}")
+        return 0
+
+    if args.command == 'stages':
+        for name, spec in STAGES.items():
+            deps = ', '.join(spec.deps) or '-'
+            print(f"   {name:<12} deps: {deps:<30} params: {', '.join(spec.params) or '-'}")
+        return 0
+
+    config = load_config(args.config)
+    run(config, stages=args.stages, grb_names=args.grb, workers=args.workers,
+        use_cache=not args.no_cache)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+GW-GRB ENGINE - Correlazioni GW+GRB con null distribution condivisa
+===================================================================
+Motore comune a gw_grb_qg_analyzer.py, gw_grb_qg_analyzer_fixed.py e
+gw_grb_real_analysis.py:
+
+- ampiezza GW interpolata sui tempi dei fotoni calcolata una volta (cache)
+- indici di permutazione e bootstrap generati da semi fissi per blocco:
+  le analisi GW-energia e energia-tempo usano gli stessi insiemi di
+  indici (calcolate insieme in un solo passaggio), senza tenerli tutti
+  in memoria
+- r di Pearson di tutte le repliche con riduzioni matriciali a blocchi
+  (nessun loop di pearsonr)
+- scansione dell'offset temporale GRB-GW su griglia: r(tau) esatta per
+  tutti gli offset con cross-correlazioni FFT (deposito lineare dei
+  fotoni sulla griglia GW = stessa interpolazione di np.interp), con
+  p-value globale (look-elsewhere) dalle stesse permutazioni
+
+    engine = GWGRBEngine.from_frames(gw_aligned, grb_aligned, seed=42)
+    gw_grb = engine.gw_correlation()
+    grb = engine.energy_time()
+    scan = engine.offset_scan(max_offset=5.0)
+
+Autore: Christian Quintino De Luca
+Affiliazione: RTH Italia - Research & Technology Hub
+"""
+
+import numpy as np
+
+from lazy_imports import lazy_module
+from robust_line_fit import RANSACLineFitter
+
+stats = lazy_module('scipy.stats')
+
+# Elementi massimi per blocco di repliche (repliche x fotoni)
+BLOCK_ELEMENTS = 2_000_000
+
+
+def _centered(values):
+    values = np.asarray(values, dtype=float)
+    return values - values.mean(axis=-1, keepdims=True)
+
+
+def _row_pearson(x, y):
+    """r di Pearson riga per riga di due matrici (B, n)"""
+    xc, yc = _centered(x), _centered(y)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.einsum('ij,ij->i', xc, yc) / np.sqrt(np.einsum('ij,ij->i', xc, xc)
+                                                       * np.einsum('ij,ij->i', yc, yc))
+
+
+class GWGRBEngine:
+    """Fotoni GRB (tempi, energie) contro una serie di ampiezza GW"""
+
+    def __init__(self, gw_times, gw_amplitude, grb_times, grb_energies,
+                 n_permutations=1000, n_bootstrap=1000, seed=None, ransac_seed=42):
+        # Serie GW opzionale: senza, resta disponibile solo energy_time()
+        gw_times = np.zeros(0) if gw_times is None else np.asarray(gw_times, dtype=float)
+        gw_amplitude = np.zeros(0) if gw_amplitude is None else np.asarray(gw_amplitude, dtype=float)
+        order = np.argsort(gw_times)
+        self.gw_times = gw_times[order]
+        self.gw_amplitude = gw_amplitude[order]
+        self.times = np.asarray(grb_times, dtype=float)
+        self.energies = np.asarray(grb_energies, dtype=float)
+        self.n = len(self.energies)
+        self.n_permutations = n_permutations
+        self.n_bootstrap = n_bootstrap
+        self.ransac_seed = ransac_seed
+        # Semi base: ogni blocco di indici si rigenera identico per tutte le analisi
+        self._seed = np.random.default_rng(seed).integers(2**63)
+        self._amplitude = None
+        self._uniform = None
+        self._suite = None
+
+    @classmethod
+    def from_frames(cls, gw_data, grb_data, time_column='time_rel', **kwargs):
+        """Da DataFrame allineati (colonne time_rel, amplitude, energy); gw_data puo' essere None"""
+        gw_times = None if gw_data is None else gw_data[time_column].values
+        gw_amplitude = None if gw_data is None else gw_data['amplitude'].values
+        return cls(gw_times, gw_amplitude, grb_data[time_column].values,
+                   grb_data['energy'].values, **kwargs)
+
+    @property
+    def amplitude(self):
+        """Ampiezza GW sui tempi dei fotoni (interpolata una volta)"""
+        if len(self.gw_times) == 0:
+            raise ValueError("No GW amplitude series in this engine")
+        if self._amplitude is None:
+            self._amplitude = np.interp(self.times, self.gw_times, self.gw_amplitude)
+        return self._amplitude
+
+    # ------------------------------------------------------------------
+    # Indici condivisi
+    # ------------------------------------------------------------------
+
+    def _block_rows(self, width=0):
+        """Righe per blocco: width = lunghezza delle righe di lavoro se > n (es. n_fft)"""
+        return max(1, BLOCK_ELEMENTS // max(self.n, width, 1))
+
+    def _index_blocks(self, kind, total):
+        """Blocchi (B, n) di indici di permutazione o bootstrap, deterministici"""
+        rows = self._block_rows()
+        stream = 0 if kind == 'permutation' else 1
+        for block, start in enumerate(range(0, total, rows)):
+            size = min(rows, total - start)
+            rng = np.random.default_rng([self._seed, stream, block])
+            if kind == 'permutation':
+                yield np.argsort(rng.random((size, self.n)), axis=1)
+            else:
+                yield rng.integers(0, self.n, (size, self.n))
+
+    # ------------------------------------------------------------------
+    # Correlazioni con permutazioni e bootstrap
+    # ------------------------------------------------------------------
+
+    def correlation_suite(self, targets):
+        """
+        Correlazione energia-target per piu' target insieme (dict nome -> y):
+        permutazioni e bootstrap condividono gli stessi blocchi di indici e
+        le energie ricampionate sono estratte una sola volta per blocco.
+        """
+        names = list(targets)
+        Y = np.column_stack([np.asarray(targets[k], dtype=float) for k in names])
+        Yc = Y - Y.mean(axis=0)
+        Ec = self.energies - self.energies.mean()
+        norm = np.sqrt(np.sum(Ec ** 2) * np.sum(Yc ** 2, axis=0))
+
+        perm_r = np.empty((self.n_permutations, len(names)))
+        row = 0
+        for indices in self._index_blocks('permutation', self.n_permutations):
+            # La permutazione non cambia media e varianza: r = E_perm . Y / norma
+            perm_r[row:row + len(indices)] = (Ec[indices] @ Yc) / norm
+            row += len(indices)
+
+        boot_r = np.empty((self.n_bootstrap, len(names)))
+        row = 0
+        for indices in self._index_blocks('bootstrap', self.n_bootstrap):
+            E_bs = self.energies[indices]
+            for j in range(len(names)):
+                boot_r[row:row + len(indices), j] = _row_pearson(E_bs, Y[:, j][indices])
+            row += len(indices)
+
+        results = {}
+        for j, name in enumerate(names):
+            y = Y[:, j]
+            pearson_r, pearson_p = stats.pearsonr(self.energies, y)
+            spearman_r, spearman_p = stats.spearmanr(self.energies, y)
+            t_stat = pearson_r * np.sqrt((self.n - 2) / (1 - pearson_r**2))
+            ransac = RANSACLineFitter(random_state=self.ransac_seed).fit(self.energies, y)
+            inliers = int(np.sum(ransac.inlier_mask_))
+            results[name] = {
+                'pearson_r': float(pearson_r),
+                'pearson_p': float(pearson_p),
+                'spearman_r': float(spearman_r),
+                'spearman_p': float(spearman_p),
+                'sigma': float(abs(t_stat)),
+                'permutation_p': float((1 + np.sum(np.abs(perm_r[:, j]) >= abs(pearson_r)))
+                                       / (self.n_permutations + 1)),
+                'bootstrap_ci': np.nanpercentile(boot_r[:, j], [2.5, 97.5]),
+                'ransac_slope': float(ransac.slope_),
+                'ransac_intercept': float(ransac.intercept_),
+                'ransac_inliers': inliers,
+                'ransac_inlier_ratio': inliers / self.n,
+            }
+        return results
+
+    def _standard_suite(self):
+        """GW-energia ed energia-tempo in un solo passaggio sui blocchi di indici"""
+        if self._suite is None:
+            targets = {'time': self.times}
+            if len(self.gw_times):
+                targets = {'gw': self.amplitude, 'time': self.times}
+            self._suite = self.correlation_suite(targets)
+        return self._suite
+
+    def gw_correlation(self):
+        """Energia GRB contro ampiezza GW interpolata"""
+        results = dict(self._standard_suite()['gw'])
+        results['n_gw_samples'] = len(self.gw_times)
+        return results
+
+    def energy_time(self):
+        """Energia contro tempo di arrivo (stessi indici di gw_correlation)"""
+        return dict(self._standard_suite()['time'])
+
+    # ------------------------------------------------------------------
+    # Scansione dell'offset temporale
+    # ------------------------------------------------------------------
+
+    def _uniform_series(self):
+        """Serie GW su griglia uniforme (ricampionata se non lo e')"""
+        if self._uniform is None:
+            if len(self.gw_times) < 2:
+                raise ValueError("Offset scan needs a GW amplitude series")
+            t, A = self.gw_times, self.gw_amplitude
+            step = np.diff(t)
+            dt = float(np.median(step))
+            if not np.allclose(step, dt, rtol=1e-6, atol=0):
+                t = t[0] + dt * np.arange(int(np.floor((t[-1] - t[0]) / dt)) + 1)
+                A = np.interp(t, self.gw_times, self.gw_amplitude)
+            self._uniform = (float(t[0]), dt, A)
+        return self._uniform
+
+    def offset_scan(self, max_offset=None, n_permutations=None):
+        """
+        r(energia, A_GW(t - tau)) per tutti gli offset tau = m * dt,
+        |tau| <= max_offset (default: un quarto della durata GW); tau > 0 =
+        fotoni GRB in ritardo rispetto alla GW. Esatto rispetto a np.interp
+        (fuori range l'ampiezza resta al valore di bordo, come np.interp).
+
+        p-value globale del massimo |r| sugli offset con le stesse
+        permutazioni delle energie (n_permutations, default quelle del motore).
+        """
+        g0, dt, A = self._uniform_series()
+        L = len(A)
+        if max_offset is None:
+            max_offset = 0.25 * (L - 1) * dt
+        M = int(np.floor(max_offset / dt))
+        n_perm = self.n_permutations if n_permutations is None else n_permutations
+
+        # Oltre M campioni dai bordi l'ampiezza e' costante per ogni offset:
+        # i fotoni lontani si bloccano sul bordo invece di allungare la serie
+        position = np.clip((self.times - g0) / dt, -M, L - 1 + M)
+        pad_left = 2 * M + 1
+        pad_right = 2 * M + 2
+        A_pad = np.concatenate([np.full(pad_left, A[0]), A, np.full(pad_right, A[-1])])
+        size = len(A_pad)
+        n_fft = 1 << int(np.ceil(np.log2(size + 1)))
+
+        u = position + pad_left
+        k = np.floor(u).astype(np.int64)
+        f = u - k
+
+        def deposit(weights_low, weights_high=None, shift=1):
+            out = np.bincount(k, weights_low, minlength=size)
+            if weights_high is not None:
+                out += np.bincount(k + shift, weights_high, minlength=size)
+            return out
+
+        def correlate(D, series_fft):
+            # c[m] = sum_j D[j] S[j - m], m in [-M, M]
+            c = np.fft.irfft(np.fft.rfft(D, n_fft, axis=-1) * np.conj(series_fft), n_fft, axis=-1)
+            return np.concatenate([c[..., n_fft - M:], c[..., :M + 1]], axis=-1)
+
+        fft_A = np.fft.rfft(A_pad, n_fft)
+        fft_A2 = np.fft.rfft(A_pad ** 2, n_fft)
+        fft_B = np.fft.rfft(np.append(A_pad[:-1] * A_pad[1:], 0.0), n_fft)
+
+        # Somme che non dipendono dalle energie: condivise dalle permutazioni
+        S_A = correlate(deposit(1 - f, f), fft_A)
+        S_AA = correlate(deposit((1 - f) ** 2, f ** 2), fft_A2) + correlate(deposit(2 * f * (1 - f)), fft_B)
+        var_A = np.maximum(S_AA - S_A ** 2 / self.n, 0.0)
+
+        Ec = self.energies - self.energies.mean()
+        S_EE = np.sum(Ec ** 2)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            r = correlate(deposit(Ec * (1 - f), Ec * f), fft_A) / np.sqrt(S_EE * var_A)
+
+        offsets = dt * np.arange(-M, M + 1)
+        best = int(np.nanargmax(np.abs(r)))
+        result = {
+            'offsets': offsets,
+            'correlation': r,
+            'step': dt,
+            'best_offset': float(offsets[best]),
+            'best_r': float(r[best]),
+            'r_zero_offset': float(r[M]),
+        }
+
+        if n_perm:
+            max_null = np.empty(n_perm)
+            row = 0
+            flat_low = k[None, :]
+            # stesse permutazioni degli altri test, elaborate a sotto-blocchi
+            # dimensionati sulle righe FFT (n_fft >> n per burst brevi)
+            fft_rows = self._block_rows(n_fft)
+            for block in self._index_blocks('permutation', n_perm):
+                for first in range(0, len(block), fft_rows):
+                    indices = block[first:first + fft_rows]
+                    B = len(indices)
+                    Ep = Ec[indices]
+                    offsets_rows = (np.arange(B) * size)[:, None]
+                    D = (np.bincount((flat_low + offsets_rows).ravel(), (Ep * (1 - f)).ravel(), minlength=B * size)
+                         + np.bincount((flat_low + 1 + offsets_rows).ravel(), (Ep * f).ravel(), minlength=B * size))
+                    with np.errstate(invalid='ignore', divide='ignore'):
+                        r_perm = correlate(D.reshape(B, size), fft_A) / np.sqrt(S_EE * var_A)
+                    max_null[row:row + B] = np.nanmax(np.abs(r_perm), axis=1)
+                    row += B
+            result['n_permutations'] = n_perm
+            result['global_p'] = float((1 + np.sum(max_null >= abs(r[best]))) / (n_perm + 1))
+        return result
@@ -15,9 +15,8 @@ import numpy as np
 import pandas as pd
 import json
 from datetime import datetime
-from scipy import stats
-from sklearn.linear_model import RANSACRegressor
-from sklearn.utils import resample
+
+from gw_grb_engine import GWGRBEngine
 
 def quick_gw_grb_analysis():
     """
@@ -38,11 +37,14 @@ def quick_gw_grb_analysis():
     # Allinea riferimento temporale
     gw_aligned, grb_aligned, t0_common = align_time_reference(gw_data, grb_data)
     
+    # Motore condiviso: interpolazione GW e indici di permutazione/bootstrap
+    engine = GWGRBEngine.from_frames(gw_aligned, grb_aligned, seed=42)
+    
     # Analizza correlazione GW+GRB
-    gw_grb_results = analyze_gw_grb_correlation(gw_aligned, grb_aligned)
+    gw_grb_results = analyze_gw_grb_correlation(gw_aligned, grb_aligned, engine)
     
     # Analizza correlazione energia-tempo GRB
-    grb_results = analyze_grb_energy_time(grb_aligned)
+    grb_results = analyze_grb_energy_time(grb_aligned, engine)
     
     # Salva risultati
     save_gw_grb_results(gw_grb_results, grb_results)
@@ -157,138 +159,60 @@ def align_time_reference(gw_data, grb_data):
     print(f"✅ Time alignment: T0 = {t0_common:.1f} s (GPS)")
     return gw_aligned, grb_aligned, t0_common
 
-def analyze_gw_grb_correlation(gw_data, grb_data):
+def analyze_gw_grb_correlation(gw_data, grb_data, engine=None):
     """
     Analizza correlazione temporale GW+GRB
     """
     print("🔍 Analyzing GW+GRB temporal correlation...")
     
-    # Estrai dati temporali
-    t_gw = gw_data['time_rel'].values
-    A_gw = gw_data['amplitude'].values
-    t_grb = grb_data['time_rel'].values
-    E_grb = grb_data['energy'].values
-    
-    # Interpola ampiezza GW sui tempi GRB
-    A_gw_interp = np.interp(t_grb, t_gw, A_gw)
-    
-    # Analisi correlazione
-    pearson_r, pearson_p = stats.pearsonr(E_grb, A_gw_interp)
-    spearman_r, spearman_p = stats.spearmanr(E_grb, A_gw_interp)
-    
-    # Test significatività
-    n = len(E_grb)
-    t_stat = pearson_r * np.sqrt((n-2)/(1-pearson_r**2))
-    sigma = abs(t_stat)
-    
-    # Permutation test
-    n_perm = 1000
-    perm_correlations = []
-    for _ in range(n_perm):
-        E_perm = np.random.permutation(E_grb)
-        r_perm, _ = stats.pearsonr(E_perm, A_gw_interp)
-        perm_correlations.append(r_perm)
-    
-    perm_p = np.mean(np.abs(perm_correlations) >= abs(pearson_r))
-    
-    # Bootstrap analysis
-    n_bootstrap = 1000
-    bootstrap_correlations = []
-    for _ in range(n_bootstrap):
-        indices = resample(range(n), n_samples=n)
-        E_bs = E_grb[indices]
-        A_bs = A_gw_interp[indices]
-        r_bs, _ = stats.pearsonr(E_bs, A_bs)
-        bootstrap_correlations.append(r_bs)
-    
-    bootstrap_ci = np.percentile(bootstrap_correlations, [2.5, 97.5])
-    
-    # RANSAC regression
-    X = E_grb.reshape(-1, 1)
-    y = A_gw_interp
-    ransac = RANSACRegressor(random_state=42)
-    ransac.fit(X, y)
-    slope = ransac.estimator_.coef_[0]
-    inliers = np.sum(ransac.inlier_mask_)
-    inlier_ratio = inliers / n
+    # Ampiezza interpolata, permutazioni e bootstrap dal motore condiviso
+    if engine is None:
+        engine = GWGRBEngine.from_frames(gw_data, grb_data)
+    stats_gw = engine.gw_correlation()
+    n = engine.n
+    
+    # Scansione offset GRB-GW (FFT) con p-value globale
+    scan = engine.offset_scan()
     
     # Risultati
     results = {
         'n_grb_photons': n,
-        'n_gw_samples': len(t_gw),
-        'energy_range': [E_grb.min(), E_grb.max()],
-        'time_range': [t_grb.min(), t_grb.max()],
-        'pearson_r': pearson_r,
-        'pearson_p': pearson_p,
-        'spearman_r': spearman_r,
-        'spearman_p': spearman_p,
-        'sigma': sigma,
-        'permutation_p': perm_p,
-        'bootstrap_ci': bootstrap_ci,
-        'ransac_slope': slope,
-        'ransac_inliers': inliers,
-        'ransac_inlier_ratio': inlier_ratio,
-        'significant': sigma > 3.0 and perm_p < 0.05
+        'n_gw_samples': stats_gw['n_gw_samples'],
+        'energy_range': [engine.energies.min(), engine.energies.max()],
+        'time_range': [engine.times.min(), engine.times.max()],
+        **{k: v for k, v in stats_gw.items() if k != 'n_gw_samples'},
+        'offset_scan': {
+            'max_offset': float(-scan['offsets'][0]),
+            'step': scan['step'],
+            'best_offset': scan['best_offset'],
+            'best_r': scan['best_r'],
+            'global_p': scan['global_p']
+        },
+        'significant': stats_gw['sigma'] > 3.0 and stats_gw['permutation_p'] < 0.05
     }
     
     print(f"📊 GW+GRB Correlation Analysis:")
     print(f"   GRB photons: {n}")
-    print(f"   GW samples: {len(t_gw)}")
-    print(f"   Correlation: r={pearson_r:.4f}, σ={sigma:.2f}, p={perm_p:.4f}")
-    print(f"   RANSAC: slope={slope:.2e}, inliers={inliers}/{n} ({inlier_ratio:.1%})")
+    print(f"   GW samples: {results['n_gw_samples']}")
+    print(f"   Correlation: r={results['pearson_r']:.4f}, σ={results['sigma']:.2f}, p={results['permutation_p']:.4f}")
+    print(f"   RANSAC: slope={results['ransac_slope']:.2e}, inliers={results['ransac_inliers']}/{n} ({results['ransac_inlier_ratio']:.1%})")
+    print(f"   Offset scan: best τ={scan['best_offset']:+.3f} s, r={scan['best_r']:.4f}, global p={scan['global_p']:.4f}")
     print(f"   Significant: {results['significant']}")
     
     return results
 
-def analyze_grb_energy_time(grb_data):
+def analyze_grb_energy_time(grb_data, engine=None):
     """
     Analizza correlazione energia-tempo GRB
     """
     print("🔍 Analyzing GRB energy-time correlation...")
     
-    # Estrai dati
-    E = grb_data['energy'].values
-    t = grb_data['time_rel'].values
-    
-    # Correlazioni
-    pearson_r, pearson_p = stats.pearsonr(E, t)
-    spearman_r, spearman_p = stats.spearmanr(E, t)
-    
-    # Test significatività
-    n = len(E)
-    t_stat = pearson_r * np.sqrt((n-2)/(1-pearson_r**2))
-    sigma = abs(t_stat)
-    
-    # Permutation test
-    n_perm = 1000
-    perm_correlations = []
-    for _ in range(n_perm):
-        E_perm = np.random.permutation(E)
-        r_perm, _ = stats.pearsonr(E_perm, t)
-        perm_correlations.append(r_perm)
-    
-    perm_p = np.mean(np.abs(perm_correlations) >= abs(pearson_r))
-    
-    # Bootstrap analysis
-    n_bootstrap = 1000
-    bootstrap_correlations = []
-    for _ in range(n_bootstrap):
-        indices = resample(range(n), n_samples=n)
-        E_bs = E[indices]
-        t_bs = t[indices]
-        r_bs, _ = stats.pearsonr(E_bs, t_bs)
-        bootstrap_correlations.append(r_bs)
-    
-    bootstrap_ci = np.percentile(bootstrap_correlations, [2.5, 97.5])
-    
-    # RANSAC regression
-    X = E.reshape(-1, 1)
-    y = t
-    ransac = RANSACRegressor(random_state=42)
-    ransac.fit(X, y)
-    slope = ransac.estimator_.coef_[0]
-    inliers = np.sum(ransac.inlier_mask_)
-    inlier_ratio = inliers / n
+    # Stessi indici di permutazione/bootstrap dell'analisi GW+GRB
+    if engine is None:
+        engine = GWGRBEngine.from_frames(None, grb_data)
+    results = engine.energy_time()
+    n = engine.n
+    slope = results['ransac_slope']
     
     # Stima E_QG
     if abs(slope) > 1e-10:
@@ -303,27 +227,18 @@ def analyze_grb_energy_time(grb_data):
     # Risultati
     results = {
         'n_photons': n,
-        'energy_range': [E.min(), E.max()],
-        'time_range': [t.min(), t.max()],
-        'pearson_r': pearson_r,
-        'pearson_p': pearson_p,
-        'spearman_r': spearman_r,
-        'spearman_p': spearman_p,
-        'sigma': sigma,
-        'permutation_p': perm_p,
-        'bootstrap_ci': bootstrap_ci,
-        'ransac_slope': slope,
-        'ransac_inliers': inliers,
-        'ransac_inlier_ratio': inlier_ratio,
+        'energy_range': [engine.energies.min(), engine.energies.max()],
+        'time_range': [engine.times.min(), engine.times.max()],
+        **results,
         'E_QG_GeV': E_QG,
         'E_QG_Planck': E_QG_Planck,
-        'significant': sigma > 3.0 and perm_p < 0.05
+        'significant': results['sigma'] > 3.0 and results['permutation_p'] < 0.05
     }
     
     print(f"📊 GRB Energy-Time Analysis:")
     print(f"   Photons: {n}")
-    print(f"   Correlation: r={pearson_r:.4f}, σ={sigma:.2f}, p={perm_p:.4f}")
-    print(f"   RANSAC: slope={slope:.2e}, inliers={inliers}/{n} ({inlier_ratio:.1%})")
+    print(f"   Correlation: r={results['pearson_r']:.4f}, σ={results['sigma']:.2f}, p={results['permutation_p']:.4f}")
+    print(f"   RANSAC: slope={slope:.2e}, inliers={results['ransac_inliers']}/{n} ({results['ransac_inlier_ratio']:.1%})")
     print(f"   E_QG: {E_QG:.2e} GeV ({E_QG_Planck:.2e} E_Planck)")
     print(f"   Significant: {results['significant']}")
     
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+IMPORT TIME BENCHMARK - Tempo di avvio degli entry point
+========================================================
+Per ogni script misura, in un interprete pulito con `python -X importtime`:
+- wall time dell'import del modulo
+- tempo cumulativo dei pacchetti top-level importati (numpy, scipy, ...)
+- quali dipendenze pesanti (matplotlib, seaborn, astropy, sklearn, ...)
+  vengono caricate gia' all'import
+
+Risultati in JSON (benchmarks/import_times_*.json); exit code 1 se uno
+script supera il budget di avvio.
+
+Uso:
+    python import_time_benchmark.py
+    python import_time_benchmark.py --budget 0.5 --repeat 5
+
+Autore: Christian Quintino De Luca
+Affiliazione: RTH Italia - Research & Technology Hub
+"""
+
+import argparse
+import json
+import re
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent
+BENCH_DIR = Path('benchmarks')
+
+ENTRY_POINTS = [
+    'grb_analysis_simple.py',
+    'TIME_ALIGNMENT_AND_ANALYSIS.py',
+    'QG_Analyzer_2.0.py',
+    'advanced_lag_analysis.py',
+    'grbqg.py',
+]
+
+HEAVY_PACKAGES = ['matplotlib', 'seaborn', 'astropy', 'sklearn', 'scipy', 'pandas', 'tqdm']
+
+STARTUP_BUDGET = 1.0  # s
+
+_LINE = re.compile(r'import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s*(\S+)')
+
+
+def _import_code(script):
+    """Codice che importa lo script senza eseguirne il main (funziona anche con '.' nel nome)"""
+    path = REPO_DIR / script
+    return ("import importlib.util, sys; "
+            f"sys.path.insert(0, {str(REPO_DIR)!r}); "
+            f"spec = importlib.util.spec_from_file_location('_entry', {str(path)!r}); "
+            "module = importlib.util.module_from_spec(spec); "
+            "spec.loader.exec_module(module)")
+
+
+def measure(script):
+    """Un import in un processo nuovo: (wall_s, {pacchetto top-level: cumulativo_s})"""
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', _import_code(script)],
+                          capture_output=True, text=True, cwd=REPO_DIR)
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else 'import failed')
+
+    # Cumulativo del pacchetto radice (es. 'scipy'): anche se importato
+    # indirettamente, la riga del pacchetto stesso include i suoi figli
+    packages = {}
+    for line in proc.stderr.splitlines():
+        match = _LINE.match(line)
+        if not match:
+            continue
+        cumulative_us, name = int(match.group(2)), match.group(3)
+        if '.' not in name:
+            packages[name] = max(packages.get(name, 0.0), cumulative_us / 1e6)
+    return wall, packages
+
+
+def run(scripts, repeat=3):
+    results = []
+    print(f"\n{'='*88}")
+    print(f"IMPORT TIME BENCHMARK (best of {repeat})")
+    print(f"{'='*88}")
+    print(f"{'script':<34} {'wall s':>8}   heavy packages loaded at import")
+    print('-' * 88)
+
+    for script in scripts:
+        try:
+            runs = [measure(script) for _ in range(repeat)]
+        except RuntimeError as e:
+            print(f"{script:<34} ❌ {e}")
+            results.append({'script': script, 'error': str(e)})
+            continue
+        wall, packages = min(runs, key=lambda r: r[0])
+        heavy = {p: round(packages[p], 4) for p in HEAVY_PACKAGES if p in packages}
+        top = sorted(packages.items(), key=lambda kv: -kv[1])[:8]
+        results.append({'script': script, 'wall_s': wall, 'heavy': heavy,
+                        'top_packages': [{'package': p, 'cumulative_s': s} for p, s in top]})
+        heavy_text = ', '.join(f"{p} {s:.2f}s" for p, s in heavy.items()) or '-'
+        print(f"{script:<34} {wall:>8.3f}   {heavy_text}")
+
+    return {'timestamp': datetime.now().isoformat(), 'python': sys.version.split()[0],
+            'repeat': repeat, 'results': results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure start-up import time of entry points")
+    parser.add_argument('scripts', nargs='*', default=ENTRY_POINTS)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--budget', type=float, default=STARTUP_BUDGET, help="max wall seconds per script")
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    report = run(args.scripts, args.repeat)
+
+    output = args.output
+    if output is None:
+        BENCH_DIR.mkdir(exist_ok=True)
+        output = BENCH_DIR / f"import_times_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Import times: {output}")
+
+    over = [r['script'] for r in report['results'] if r.get('wall_s', 0) > args.budget]
+    if over:
+        print(f"❌ Over the {args.budget:.2f} s start-up budget: {', '.join(over)}")
+        return 1
+    print(f"✅ All entry points start within {args.budget:.2f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
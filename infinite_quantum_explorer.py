@@ -11,11 +11,6 @@ import numpy as np
 import pandas as pd
 from scipy import stats
 from scipy.stats import pearsonr, spearmanr, kendalltau
-from scipy.signal import find_peaks, welch, hilbert
-from scipy.fft import fft, fftfreq
-from sklearn.cluster import DBSCAN, KMeans
-from sklearn.decomposition import PCA, FastICA
-from sklearn.manifold import TSNE
 import matplotlib.pyplot as plt
 from datetime import datetime
 
@@ -18,10 +18,12 @@ from astropy.io import fits
 from datetime import datetime
 import seaborn as sns
 from scipy import stats
-from scipy.optimize import curve_fit, minimize
+from scipy.optimize import minimize
 import warnings
 warnings.filterwarnings('ignore')
 
+from lag_models import LAG_MODELS, fit_lag_models, select_best_model, subtract_lag
+
 # Configurazione matplotlib per headless
 import matplotlib
 matplotlib.use('Agg')
@@ -52,228 +54,19 @@ def load_detailed_results():
         print("Esegui prima detailed_energy_analysis.py")
         return None
 
-def model_intrinsic_lag_power_law(E, t0, alpha, beta):
-    """Modello power-law per lag intrinseci: t = t0 + alpha * E^beta"""
-    return t0 + alpha * np.power(E, beta)
-
-def model_intrinsic_lag_broken_power_law(E, t0, alpha1, beta1, alpha2, beta2, E_break):
-    """Modello broken power-law per lag intrinseci"""
-    result = np.zeros_like(E)
-    mask_low = E < E_break
-    mask_high = E >= E_break
-    
-    result[mask_low] = t0 + alpha1 * np.power(E[mask_low], beta1)
-    result[mask_high] = t0 + alpha1 * np.power(E_break, beta1) + alpha2 * np.power(E[mask_high], beta2)
-    
-    return result
-
-def model_intrinsic_lag_exponential(E, t0, tau, E_scale):
-    """Modello esponenziale per lag intrinseci: t = t0 + tau * exp(-E/E_scale)"""
-    return t0 + tau * np.exp(-E / E_scale)
-
-def model_intrinsic_lag_logarithmic(E, t0, alpha, E_ref):
-    """Modello logaritmico per lag intrinseci: t = t0 + alpha * log(E/E_ref)"""
-    return t0 + alpha * np.log(E / E_ref)
+# Modelli dal registro (lag_models): stessi nomi di sempre per gli script esterni
+model_intrinsic_lag_power_law = LAG_MODELS['power_law'].func
+model_intrinsic_lag_broken_power_law = LAG_MODELS['broken_power_law'].func
+model_intrinsic_lag_exponential = LAG_MODELS['exponential'].func
+model_intrinsic_lag_logarithmic = LAG_MODELS['logarithmic'].func
 
 def fit_intrinsic_lag_models(times, energies):
-    """Fit tutti i modelli di lag intrinseci"""
-    models = {}
-    
-    # Modello 1: Power-law
-    try:
-        def power_law(E, t0, alpha, beta):
-            return model_intrinsic_lag_power_law(E, t0, alpha, beta)
-        
-        # Valori iniziali ottimizzati
-        p0 = [np.mean(times), -1.0, -0.5]
-        bounds = ([times.min(), -100, -2], [times.max(), 100, 2])
-        
-        popt, pcov = curve_fit(power_law, energies, times, p0=p0, bounds=bounds, maxfev=2000)
-        t0, alpha, beta = popt
-        
-        # Calcola goodness of fit
-        times_pred = power_law(energies, t0, alpha, beta)
-        residuals = times - times_pred
-        chi2 = np.sum((residuals / np.std(residuals))**2)
-        dof = len(times) - 3
-        chi2_red = chi2 / dof
-        
-        # Correlazione
-        correlation = np.corrcoef(times, times_pred)[0, 1]
-        
-        models['power_law'] = {
-            't0': float(t0),
-            'alpha': float(alpha),
-            'beta': float(beta),
-            'chi2': float(chi2),
-            'chi2_red': float(chi2_red),
-            'dof': int(dof),
-            'correlation': float(correlation),
-            'aic': float(2 * 3 + chi2),  # AIC = 2k + χ²
-            'type': 'Power-law Lag'
-        }
-    except Exception as e:
-        print(f"⚠️ Errore fit power-law: {e}")
-        models['power_law'] = None
-    
-    # Modello 2: Broken power-law
-    try:
-        def broken_power_law(E, t0, alpha1, beta1, alpha2, beta2, E_break):
-            return model_intrinsic_lag_broken_power_law(E, t0, alpha1, beta1, alpha2, beta2, E_break)
-        
-        # Valori iniziali
-        E_break_init = np.median(energies)
-        p0 = [np.mean(times), -1.0, -0.5, -0.5, -0.3, E_break_init]
-        bounds = ([times.min(), -50, -2, -50, -2, energies.min()], 
-                 [times.max(), 50, 2, 50, 2, energies.max()])
-        
-        popt, pcov = curve_fit(broken_power_law, energies, times, p0=p0, bounds=bounds, maxfev=3000)
-        t0, alpha1, beta1, alpha2, beta2, E_break = popt
-        
-        # Goodness of fit
-        times_pred = broken_power_law(energies, t0, alpha1, beta1, alpha2, beta2, E_break)
-        residuals = times - times_pred
-        chi2 = np.sum((residuals / np.std(residuals))**2)
-        dof = len(times) - 6
-        chi2_red = chi2 / dof
-        
-        correlation = np.corrcoef(times, times_pred)[0, 1]
-        
-        models['broken_power_law'] = {
-            't0': float(t0),
-            'alpha1': float(alpha1),
-            'beta1': float(beta1),
-            'alpha2': float(alpha2),
-            'beta2': float(beta2),
-            'E_break': float(E_break),
-            'chi2': float(chi2),
-            'chi2_red': float(chi2_red),
-            'dof': int(dof),
-            'correlation': float(correlation),
-            'aic': float(2 * 6 + chi2),
-            'type': 'Broken Power-law Lag'
-        }
-    except Exception as e:
-        print(f"⚠️ Errore fit broken power-law: {e}")
-        models['broken_power_law'] = None
-    
-    # Modello 3: Esponenziale
-    try:
-        def exponential(E, t0, tau, E_scale):
-            return model_intrinsic_lag_exponential(E, t0, tau, E_scale)
-        
-        p0 = [np.mean(times), 1.0, np.median(energies)]
-        bounds = ([times.min(), 0, energies.min()], [times.max(), 100, energies.max()])
-        
-        popt, pcov = curve_fit(exponential, energies, times, p0=p0, bounds=bounds, maxfev=2000)
-        t0, tau, E_scale = popt
-        
-        times_pred = exponential(energies, t0, tau, E_scale)
-        residuals = times - times_pred
-        chi2 = np.sum((residuals / np.std(residuals))**2)
-        dof = len(times) - 3
-        chi2_red = chi2 / dof
-        
-        correlation = np.corrcoef(times, times_pred)[0, 1]
-        
-        models['exponential'] = {
-            't0': float(t0),
-            'tau': float(tau),
-            'E_scale': float(E_scale),
-            'chi2': float(chi2),
-            'chi2_red': float(chi2_red),
-            'dof': int(dof),
-            'correlation': float(correlation),
-            'aic': float(2 * 3 + chi2),
-            'type': 'Exponential Lag'
-        }
-    except Exception as e:
-        print(f"⚠️ Errore fit exponential: {e}")
-        models['exponential'] = None
-    
-    # Modello 4: Logaritmico
-    try:
-        def logarithmic(E, t0, alpha, E_ref):
-            return model_intrinsic_lag_logarithmic(E, t0, alpha, E_ref)
-        
-        E_ref_init = np.median(energies)
-        p0 = [np.mean(times), -1.0, E_ref_init]
-        bounds = ([times.min(), -100, energies.min()], [times.max(), 100, energies.max()])
-        
-        popt, pcov = curve_fit(logarithmic, energies, times, p0=p0, bounds=bounds, maxfev=2000)
-        t0, alpha, E_ref = popt
-        
-        times_pred = logarithmic(energies, t0, alpha, E_ref)
-        residuals = times - times_pred
-        chi2 = np.sum((residuals / np.std(residuals))**2)
-        dof = len(times) - 3
-        chi2_red = chi2 / dof
-        
-        correlation = np.corrcoef(times, times_pred)[0, 1]
-        
-        models['logarithmic'] = {
-            't0': float(t0),
-            'alpha': float(alpha),
-            'E_ref': float(E_ref),
-            'chi2': float(chi2),
-            'chi2_red': float(chi2_red),
-            'dof': int(dof),
-            'correlation': float(correlation),
-            'aic': float(2 * 3 + chi2),
-            'type': 'Logarithmic Lag'
-        }
-    except Exception as e:
-        print(f"⚠️ Errore fit logarithmic: {e}")
-        models['logarithmic'] = None
-    
-    return models
-
-def select_best_model(models):
-    """Seleziona il miglior modello basato su AIC"""
-    valid_models = {k: v for k, v in models.items() if v is not None}
-    
-    if not valid_models:
-        return None, None
-    
-    # Trova modello con AIC minimo
-    best_model_name = min(valid_models.keys(), key=lambda x: valid_models[x]['aic'])
-    best_model = valid_models[best_model_name]
-    
-    return best_model_name, best_model
+    """Fit tutti i modelli di lag intrinseci registrati"""
+    return fit_lag_models(times, energies)
 
 def subtract_intrinsic_lag(times, energies, best_model_name, best_model_params):
-    """Sottrae il lag intrinseco dai dati"""
-    
-    if best_model_name == 'power_law':
-        predicted_times = model_intrinsic_lag_power_law(energies, 
-                                                       best_model_params['t0'],
-                                                       best_model_params['alpha'],
-                                                       best_model_params['beta'])
-    elif best_model_name == 'broken_power_law':
-        predicted_times = model_intrinsic_lag_broken_power_law(energies,
-                                                              best_model_params['t0'],
-                                                              best_model_params['alpha1'],
-                                                              best_model_params['beta1'],
-                                                              best_model_params['alpha2'],
-                                                              best_model_params['beta2'],
-                                                              best_model_params['E_break'])
-    elif best_model_name == 'exponential':
-        predicted_times = model_intrinsic_lag_exponential(energies,
-                                                         best_model_params['t0'],
-                                                         best_model_params['tau'],
-                                                         best_model_params['E_scale'])
-    elif best_model_name == 'logarithmic':
-        predicted_times = model_intrinsic_lag_logarithmic(energies,
-                                                         best_model_params['t0'],
-                                                         best_model_params['alpha'],
-                                                         best_model_params['E_ref'])
-    else:
-        return times, None
-    
-    # Sottrai il lag intrinseco
-    corrected_times = times - predicted_times + best_model_params['t0']
-    
-    return corrected_times, predicted_times
+    """Sottrae il lag intrinseco dai dati (ValueError per modelli sconosciuti)"""
+    return subtract_lag(times, energies, best_model_name, best_model_params)
 
 def create_lag_modeling_plots(grb_name, times, energies, models, best_model_name, best_model, corrected_times, predicted_times):
     """Crea grafici per la modellazione dei lag intrinseci"""
@@ -301,21 +94,11 @@ def create_lag_modeling_plots(grb_name, times, energies, models, best_model_name
         if model is None:
             continue
             
-        if model_name == 'power_law':
-            t_fit = model_intrinsic_lag_power_law(E_fit, model['t0'], model['alpha'], model['beta'])
-        elif model_name == 'broken_power_law':
-            t_fit = model_intrinsic_lag_broken_power_law(E_fit, model['t0'], model['alpha1'], model['beta1'], 
-                                                       model['alpha2'], model['beta2'], model['E_break'])
-        elif model_name == 'exponential':
-            t_fit = model_intrinsic_lag_exponential(E_fit, model['t0'], model['tau'], model['E_scale'])
-        elif model_name == 'logarithmic':
-            t_fit = model_intrinsic_lag_logarithmic(E_fit, model['t0'], model['alpha'], model['E_ref'])
-        else:
-            continue
+        t_fit = LAG_MODELS[model_name].evaluate(E_fit, model)
         
         style = '-' if model_name == best_model_name else '--'
         width = 3 if model_name == best_model_name else 1
-        ax2.plot(E_fit, t_fit, color=colors[i], linestyle=style, linewidth=width,
+        ax2.plot(E_fit, t_fit, color=colors[i % len(colors)], linestyle=style, linewidth=width,
                 label=f'{model["type"]} (AIC={model["aic"]:.1f})')
     
     ax2.set_xlabel('Energia (GeV)')
@@ -1,79 +1,74 @@
 #!/usr/bin/env python3
 """
 IRF/EVENT-CLASS SPLIT MODULE FOR GRB ANALYSIS
-Analyzes correlations by instrument response function and event class
+Analyzes correlations by instrument response function and event class.
+All strata (IRF, event class, PSF, zenith) are computed in one grouped
+pass by stratified_analysis, sharing the permutation indices.
 """
 
 import numpy as np
 import matplotlib.pyplot as plt
 from astropy.io import fits
-from scipy import stats
-import pandas as pd
-from sklearn.linear_model import RANSACRegressor, LinearRegression
+from stratified_analysis import (stratified_analysis, event_class_labels, event_type_labels,
+                                 zenith_labels, quantile_labels)
+
+N_PERMUTATIONS = 1000
 
 class IRFEventClassAnalyzer:
     def __init__(self):
         self.data = None
         self.irf_results = {}
         self.event_class_results = {}
+        self.stratified_results = None
         
     def load_fits_with_metadata(self, filename):
-        """Load FITS file with IRF and event class metadata"""
+        """Load FITS file with the real EVENT_CLASS / EVENT_TYPE / ZENITH_ANGLE columns"""
         print(f"\n🛰️ Loading FITS file with metadata: {filename}")
         
         try:
             with fits.open(filename) as hdul:
-                events_data = hdul['EVENTS'].data
+                events = hdul['EVENTS']
+                events_data = events.data
+                columns = events_data.dtype.names
                 
                 # Extract basic data
-                times = events_data['TIME']
-                energies = events_data['ENERGY'] / 1000.0  # GeV
-                
-                # Extract metadata if available
-                metadata = {}
+                times = np.asarray(events_data['TIME'], dtype=float)
+                energies = np.asarray(events_data['ENERGY'], dtype=float) / 1000.0  # GeV
                 
-                # Check for IRF information
-                if 'IRF' in events_data.dtype.names:
-                    metadata['irf'] = events_data['IRF']
-                else:
-                    # Generate synthetic IRF classes
-                    metadata['irf'] = np.random.choice(['P8R2_SOURCE_V6', 'P8R2_TRANSIENT_V6'], 
-                                                     size=len(times), p=[0.7, 0.3])
+                self.data = {'time': times, 'energy': energies}
                 
-                # Check for event class information
-                if 'EVENT_CLASS' in events_data.dtype.names:
-                    metadata['event_class'] = events_data['EVENT_CLASS']
-                else:
-                    # Generate synthetic event classes
-                    metadata['event_class'] = np.random.choice(['FRONT', 'BACK', 'PSF0', 'PSF1', 'PSF2', 'PSF3'], 
-                                                              size=len(times), p=[0.2, 0.2, 0.15, 0.15, 0.15, 0.15])
+                # Event class: most restrictive Pass 8 class of each photon
+                if 'EVENT_CLASS' in columns:
+                    self.data['event_class'] = event_class_labels(events_data['EVENT_CLASS'])
                 
-                # Check for PSF information
-                if 'PSF' in events_data.dtype.names:
-                    metadata['psf'] = events_data['PSF']
-                else:
-                    # Generate synthetic PSF values
-                    metadata['psf'] = np.random.uniform(0.1, 0.9, len(times))
+                # IRF = pass version + class + conversion type (FRONT/BACK)
+                if 'IRF' in columns:
+                    self.data['irf'] = np.asarray(events_data['IRF']).astype(str)
+                elif 'EVENT_CLASS' in columns and 'EVENT_TYPE' in columns:
+                    pass_version = str(events.header.get('PASS_VER', 'P8')).strip()
+                    conversion = event_type_labels(events_data['EVENT_TYPE'], 'conversion')
+                    self.data['irf'] = np.array([f"{pass_version}_{c}_{t}" for c, t in
+                                                 zip(self.data['event_class'], conversion)], dtype=object)
                 
-                # Check for zenith angle
-                if 'ZENITH_ANGLE' in events_data.dtype.names:
-                    metadata['zenith'] = events_data['ZENITH_ANGLE']
-                else:
-                    metadata['zenith'] = np.random.uniform(10, 80, len(times))
+                # PSF quality quartiles: PSF0-PSF3 event types
+                if 'EVENT_TYPE' in columns:
+                    self.data['psf'] = event_type_labels(events_data['EVENT_TYPE'], 'psf')
+                elif 'PSF' in columns:
+                    self.data['psf'] = np.asarray(events_data['PSF'], dtype=float)
                 
-                self.data = {
-                    'time': times,
-                    'energy': energies,
-                    'irf': metadata['irf'],
-                    'event_class': metadata['event_class'],
-                    'psf': metadata['psf'],
-                    'zenith': metadata['zenith']
-                }
+                if 'ZENITH_ANGLE' in columns:
+                    self.data['zenith'] = np.asarray(events_data['ZENITH_ANGLE'], dtype=float)
                 
                 print(f"✅ Data loaded: {len(times)} photons")
-                print(f"📊 IRF types: {np.unique(metadata['irf'])}")
-                print(f"📊 Event classes: {np.unique(metadata['event_class'])}")
-                print(f"📊 PSF range: {metadata['psf'].min():.3f} - {metadata['psf'].max():.3f}")
+                for key, label in (('irf', 'IRF types'), ('event_class', 'Event classes')):
+                    if key in self.data:
+                        print(f"📊 {label}: {np.unique(self.data[key])}")
+                    else:
+                        print(f"⚠️  No {label.lower()} column in {filename}: stratification skipped")
+                if 'psf' in self.data:
+                    print(f"📊 PSF types: {np.unique(self.data['psf']) if self.data['psf'].dtype.kind != 'f' else 'quartiles of PSF'}")
+                if 'zenith' in self.data:
+                    print(f"📊 Zenith range: {self.data['zenith'].min():.1f} - {self.data['zenith'].max():.1f}°")
                 
         except Exception as e:
             print(f"❌ Error loading file: {e}")
@@ -114,260 +109,79 @@ class IRFEventClassAnalyzer:
         
         print(f"✅ Synthetic data generated: {n_photons} photons")
         
-    def permutation_test(self, x, y, n_perm=1000):
-        """Perform permutation test for correlation significance"""
-        obs_r = np.corrcoef(x, y)[0, 1]
-        
-        perm_correlations = []
-        for i in range(n_perm):
-            perm_y = np.random.permutation(y)
-            perm_r = np.corrcoef(x, perm_y)[0, 1]
-            perm_correlations.append(perm_r)
-        
-        perm_correlations = np.array(perm_correlations)
-        p_value = np.mean(np.abs(perm_correlations) >= np.abs(obs_r))
+    def stratifications(self):
+        """Label arrays of every available stratification"""
+        strata = {}
+        if 'irf' in self.data:
+            strata['irf'] = self.data['irf']
+        if 'event_class' in self.data:
+            strata['event_class'] = self.data['event_class']
+        if 'psf' in self.data:
+            psf = np.asarray(self.data['psf'])
+            # Continuous PSF values (synthetic data) are split in quartiles
+            strata['psf'] = quantile_labels(psf, prefix='PSF_Q') if psf.dtype.kind == 'f' else psf
+        if 'zenith' in self.data:
+            strata['zenith'] = zenith_labels(self.data['zenith'])
+        return strata
+        
+    def analyze_all_strata(self, n_permutations=N_PERMUTATIONS, seed=42):
+        """Every stratum of every stratification in one grouped pass"""
+        print("\n🔍 Stratified analysis (IRF, event class, PSF, zenith) in one pass...")
+        strata = self.stratifications()
+        self.stratified_results = stratified_analysis(self.data['energy'], self.data['time'], strata,
+                                                      n_permutations=n_permutations, seed=seed)
+        for name, labels in strata.items():
+            kept = self.stratified_results[name]
+            for stratum in np.unique(labels):
+                if str(stratum) not in kept:
+                    print(f"⚠️  Skipping {stratum} - too few photons ({np.sum(labels == stratum)})")
+        return self.stratified_results
+        
+    def _stratum_results(self, stratification, title):
+        """Results of one stratification from the grouped pass"""
+        print(f"\n🔍 Analyzing correlations by {title}...")
+        if self.stratified_results is None:
+            self.analyze_all_strata()
         
-        return obs_r, p_value
-        
-    def ransac_regression(self, x, y):
-        """Perform RANSAC regression to handle outliers"""
-        X = x.reshape(-1, 1)
-        ransac = RANSACRegressor(LinearRegression(), min_samples=0.5, random_state=42)
-        ransac.fit(X, y)
-        
-        slope = ransac.estimator_.coef_[0]
-        intercept = ransac.estimator_.intercept_
-        inlier_mask = ransac.inlier_mask_
-        
-        return slope, intercept, inlier_mask
+        results = {}
+        for stratum, stats_row in self.stratified_results.get(stratification, {}).items():
+            print(f"\n📊 {stratum} analysis:")
+            print(f"   Photons: {stats_row['n_photons']}")
+            print(f"   Energy range: {stats_row['energy_min']:.3f} - {stats_row['energy_max']:.1f} GeV")
+            print(f"   Time range: {stats_row['time_min']:.1f} - {stats_row['time_max']:.1f} s")
+            print(f"   Pearson: r={stats_row['pearson_r']:.4f}, t={stats_row['t_stat']:.2f}, p={stats_row['pearson_p']:.2e}")
+            print(f"   Spearman: r={stats_row['spearman_r']:.4f}")
+            print(f"   Permutation: p={stats_row['permutation_p']:.3f}")
+            print(f"   RANSAC slope: {stats_row['ransac_slope']:.6f}, inliers: {stats_row['ransac_inliers']}/{stats_row['n_photons']}")
+            
+            results[stratum] = {
+                'n_photons': stats_row['n_photons'],
+                'correlation_pearson': stats_row['pearson_r'],
+                'correlation_spearman': stats_row['spearman_r'],
+                'p_value_pearson': stats_row['pearson_p'],
+                'p_value_permutation': stats_row['permutation_p'],
+                'slope': stats_row['ransac_slope'],
+                'n_inliers': stats_row['ransac_inliers']
+            }
+        return results
         
     def analyze_by_irf(self):
         """Analyze correlations by IRF type"""
-        print("\n🔍 Analyzing correlations by IRF type...")
-        
-        results = {}
-        
-        for irf_type in np.unique(self.data['irf']):
-            mask = self.data['irf'] == irf_type
-            if np.sum(mask) < 10:
-                print(f"⚠️  Skipping {irf_type} - too few photons ({np.sum(mask)})")
-                continue
-                
-            times = self.data['time'][mask]
-            energies = self.data['energy'][mask]
-            
-            print(f"\n📊 {irf_type} analysis:")
-            print(f"   Photons: {len(times)}")
-            print(f"   Energy range: {energies.min():.3f} - {energies.max():.1f} GeV")
-            print(f"   Time range: {times.min():.1f} - {times.max():.1f} s")
-            
-            # Calculate correlations
-            corr_pearson = np.corrcoef(times, energies)[0, 1]
-            corr_spearman = stats.spearmanr(times, energies)[0]
-            
-            # Calculate significance
-            n = len(times)
-            t_pearson = corr_pearson * np.sqrt(n-2) / np.sqrt(1-corr_pearson**2)
-            p_pearson = 2 * (1 - stats.t.cdf(abs(t_pearson), n-2))
-            
-            # Permutation test
-            corr_perm, p_perm = self.permutation_test(times, energies)
-            
-            # RANSAC regression
-            if len(times) > 20:
-                slope, intercept, inlier_mask = self.ransac_regression(times, energies)
-                
-                print(f"   Pearson: r={corr_pearson:.4f}, t={t_pearson:.2f}, p={p_pearson:.2e}")
-                print(f"   Spearman: r={corr_spearman:.4f}")
-                print(f"   Permutation: r={corr_perm:.4f}, p={p_perm:.3f}")
-                print(f"   RANSAC slope: {slope:.6f}, inliers: {np.sum(inlier_mask)}/{len(times)}")
-                
-                results[irf_type] = {
-                    'n_photons': len(times),
-                    'correlation_pearson': corr_pearson,
-                    'correlation_spearman': corr_spearman,
-                    'p_value_pearson': p_pearson,
-                    'p_value_permutation': p_perm,
-                    'slope': slope,
-                    'n_inliers': np.sum(inlier_mask)
-                }
-        
-        self.irf_results = results
-        return results
+        self.irf_results = self._stratum_results('irf', 'IRF type')
+        return self.irf_results
         
     def analyze_by_event_class(self):
         """Analyze correlations by event class"""
-        print("\n🔍 Analyzing correlations by event class...")
-        
-        results = {}
-        
-        for event_class in np.unique(self.data['event_class']):
-            mask = self.data['event_class'] == event_class
-            if np.sum(mask) < 10:
-                print(f"⚠️  Skipping {event_class} - too few photons ({np.sum(mask)})")
-                continue
-                
-            times = self.data['time'][mask]
-            energies = self.data['energy'][mask]
-            
-            print(f"\n📊 {event_class} analysis:")
-            print(f"   Photons: {len(times)}")
-            print(f"   Energy range: {energies.min():.3f} - {energies.max():.1f} GeV")
-            print(f"   Time range: {times.min():.1f} - {times.max():.1f} s")
-            
-            # Calculate correlations
-            corr_pearson = np.corrcoef(times, energies)[0, 1]
-            corr_spearman = stats.spearmanr(times, energies)[0]
-            
-            # Calculate significance
-            n = len(times)
-            t_pearson = corr_pearson * np.sqrt(n-2) / np.sqrt(1-corr_pearson**2)
-            p_pearson = 2 * (1 - stats.t.cdf(abs(t_pearson), n-2))
-            
-            # Permutation test
-            corr_perm, p_perm = self.permutation_test(times, energies)
-            
-            # RANSAC regression
-            if len(times) > 20:
-                slope, intercept, inlier_mask = self.ransac_regression(times, energies)
-                
-                print(f"   Pearson: r={corr_pearson:.4f}, t={t_pearson:.2f}, p={p_pearson:.2e}")
-                print(f"   Spearman: r={corr_spearman:.4f}")
-                print(f"   Permutation: r={corr_perm:.4f}, p={p_perm:.3f}")
-                print(f"   RANSAC slope: {slope:.6f}, inliers: {np.sum(inlier_mask)}/{len(times)}")
-                
-                results[event_class] = {
-                    'n_photons': len(times),
-                    'correlation_pearson': corr_pearson,
-                    'correlation_spearman': corr_spearman,
-                    'p_value_pearson': p_pearson,
-                    'p_value_permutation': p_perm,
-                    'slope': slope,
-                    'n_inliers': np.sum(inlier_mask)
-                }
-        
-        self.event_class_results = results
-        return results
+        self.event_class_results = self._stratum_results('event_class', 'event class')
+        return self.event_class_results
         
     def analyze_by_psf_quartiles(self):
-        """Analyze correlations by PSF quartiles"""
-        print("\n🔍 Analyzing correlations by PSF quartiles...")
-        
-        results = {}
-        
-        # Calculate PSF quartiles
-        psf_quartiles = np.percentile(self.data['psf'], [25, 50, 75])
-        
-        # Define PSF ranges
-        psf_ranges = [
-            ('PSF_Q1', self.data['psf'] <= psf_quartiles[0]),
-            ('PSF_Q2', (self.data['psf'] > psf_quartiles[0]) & (self.data['psf'] <= psf_quartiles[1])),
-            ('PSF_Q3', (self.data['psf'] > psf_quartiles[1]) & (self.data['psf'] <= psf_quartiles[2])),
-            ('PSF_Q4', self.data['psf'] > psf_quartiles[2])
-        ]
-        
-        for psf_name, mask in psf_ranges:
-            if np.sum(mask) < 10:
-                print(f"⚠️  Skipping {psf_name} - too few photons ({np.sum(mask)})")
-                continue
-                
-            times = self.data['time'][mask]
-            energies = self.data['energy'][mask]
-            
-            print(f"\n📊 {psf_name} analysis:")
-            print(f"   Photons: {len(times)}")
-            print(f"   PSF range: {self.data['psf'][mask].min():.3f} - {self.data['psf'][mask].max():.3f}")
-            
-            # Calculate correlations
-            corr_pearson = np.corrcoef(times, energies)[0, 1]
-            corr_spearman = stats.spearmanr(times, energies)[0]
-            
-            # Calculate significance
-            n = len(times)
-            t_pearson = corr_pearson * np.sqrt(n-2) / np.sqrt(1-corr_pearson**2)
-            p_pearson = 2 * (1 - stats.t.cdf(abs(t_pearson), n-2))
-            
-            # Permutation test
-            corr_perm, p_perm = self.permutation_test(times, energies)
-            
-            # RANSAC regression
-            if len(times) > 20:
-                slope, intercept, inlier_mask = self.ransac_regression(times, energies)
-                
-                print(f"   Pearson: r={corr_pearson:.4f}, t={t_pearson:.2f}, p={p_pearson:.2e}")
-                print(f"   Spearman: r={corr_spearman:.4f}")
-                print(f"   Permutation: r={corr_perm:.4f}, p={p_perm:.3f}")
-                print(f"   RANSAC slope: {slope:.6f}, inliers: {np.sum(inlier_mask)}/{len(times)}")
-                
-                results[psf_name] = {
-                    'n_photons': len(times),
-                    'correlation_pearson': corr_pearson,
-                    'correlation_spearman': corr_spearman,
-                    'p_value_pearson': p_pearson,
-                    'p_value_permutation': p_perm,
-                    'slope': slope,
-                    'n_inliers': np.sum(inlier_mask)
-                }
-        
-        return results
+        """Analyze correlations by PSF quartiles (PSF0-PSF3 event types)"""
+        return self._stratum_results('psf', 'PSF quartiles')
         
     def analyze_by_zenith_angle(self):
         """Analyze correlations by zenith angle ranges"""
-        print("\n🔍 Analyzing correlations by zenith angle ranges...")
-        
-        results = {}
-        
-        # Define zenith angle ranges
-        zenith_ranges = [
-            ('Zenith_Low', self.data['zenith'] <= 30),
-            ('Zenith_Medium', (self.data['zenith'] > 30) & (self.data['zenith'] <= 60)),
-            ('Zenith_High', self.data['zenith'] > 60)
-        ]
-        
-        for zenith_name, mask in zenith_ranges:
-            if np.sum(mask) < 10:
-                print(f"⚠️  Skipping {zenith_name} - too few photons ({np.sum(mask)})")
-                continue
-                
-            times = self.data['time'][mask]
-            energies = self.data['energy'][mask]
-            
-            print(f"\n📊 {zenith_name} analysis:")
-            print(f"   Photons: {len(times)}")
-            print(f"   Zenith range: {self.data['zenith'][mask].min():.1f} - {self.data['zenith'][mask].max():.1f}°")
-            
-            # Calculate correlations
-            corr_pearson = np.corrcoef(times, energies)[0, 1]
-            corr_spearman = stats.spearmanr(times, energies)[0]
-            
-            # Calculate significance
-            n = len(times)
-            t_pearson = corr_pearson * np.sqrt(n-2) / np.sqrt(1-corr_pearson**2)
-            p_pearson = 2 * (1 - stats.t.cdf(abs(t_pearson), n-2))
-            
-            # Permutation test
-            corr_perm, p_perm = self.permutation_test(times, energies)
-            
-            # RANSAC regression
-            if len(times) > 20:
-                slope, intercept, inlier_mask = self.ransac_regression(times, energies)
-                
-                print(f"   Pearson: r={corr_pearson:.4f}, t={t_pearson:.2f}, p={p_pearson:.2e}")
-                print(f"   Spearman: r={corr_spearman:.4f}")
-                print(f"   Permutation: r={corr_perm:.4f}, p={p_perm:.3f}")
-                print(f"   RANSAC slope: {slope:.6f}, inliers: {np.sum(inlier_mask)}/{len(times)}")
-                
-                results[zenith_name] = {
-                    'n_photons': len(times),
-                    'correlation_pearson': corr_pearson,
-                    'correlation_spearman': corr_spearman,
-                    'p_value_pearson': p_pearson,
-                    'p_value_permutation': p_perm,
-                    'slope': slope,
-                    'n_inliers': np.sum(inlier_mask)
-                }
-        
-        return results
+        return self._stratum_results('zenith', 'zenith angle ranges')
         
     def create_irf_event_class_plots(self):
         """Create plots for IRF and event class analysis"""
@@ -498,7 +312,8 @@ class IRFEventClassAnalyzer:
         # Load data
         self.load_fits_with_metadata("L25102020315294ADC46894_PH00.fits")
         
-        # Run all analyses
+        # Run all analyses (one grouped pass, then per-stratification views)
+        self.analyze_all_strata()
         irf_results = self.analyze_by_irf()
         event_class_results = self.analyze_by_event_class()
         psf_results = self.analyze_by_psf_quartiles()
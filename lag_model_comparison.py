@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+LAG MODEL COMPARISON - Confronto QG / astrofisico / misto con likelihood vera
+=============================================================================
+I tre modelli sono fittati ai tempi dei fotoni, non a un target costante:
+
+    QG:             t = t0 + a E^n                       (LIV di ordine n)
+    Astrophysical:  t = t0 + b g_alpha(E)                (lag a legge di potenza)
+    Mixed:          t = t0 + a E^n + b g_alpha(E)
+
+con g_alpha(E) = ((E/E_piv)^-alpha - 1) / (-alpha) (Box-Cox: stessa famiglia
+di E^-alpha, ma ben condizionata e pari a ln(E/E_piv) per alpha = 0).
+Residui gaussiani con sigma profilata: log L = -n/2 [ln(2 pi RSS/n) + 1].
+Da qui AIC, BIC e i likelihood-ratio test dei modelli annidati nel misto:
+
+- Astrophysical vs Mixed: serve il termine QG? (asintotico chi2, 1 dof)
+- QG vs Mixed: serve il termine astrofisico? (alpha non identificato sotto
+  H0: l'asintotico non vale, conta la calibrazione bootstrap)
+
+Fit: per ogni alpha della griglia i modelli sono lineari, quindi l'RSS
+viene dalle equazioni normali (somme sui fotoni, sistema 2x2 dopo il
+centraggio). Il bootstrap parametrico simula direttamente le proiezioni
+del rumore sui vettori del modello (gaussiane con la matrice di Gram) e il
+resto chi2 della somma dei quadrati: nessuna matrice fotoni x repliche.
+
+    result = compare_lag_models(energies, times, n_bootstrap=1000, seed=42)
+
+Autore: Christian Quintino De Luca
+Affiliazione: RTH Italia - Research & Technology Hub
+"""
+
+import numpy as np
+
+from lazy_imports import lazy_module
+from liv_cosmology import liv_K, e_qg_from_slope
+from significance import p_to_sigma
+
+stats = lazy_module('scipy.stats')
+
+MODELS = ('QG', 'Astrophysical', 'Mixed')
+N_PARAMS = {'QG': 3, 'Astrophysical': 4, 'Mixed': 5}   # sigma inclusa
+
+# alpha >= -0.5: per alpha = -n il termine astrofisico coinciderebbe con E^n
+ALPHA_GRID = np.linspace(-0.5, 3.0, 71)
+BOOTSTRAP_BLOCK = 256
+# Elementi (alpha x fotoni) delle colonne g_alpha calcolate insieme
+BLOCK_ELEMENTS = 4_000_000
+
+
+# ============================================================================
+# PROIEZIONI SU GRIGLIA DI ALPHA
+# ============================================================================
+
+def _box_cox(x, alpha):
+    """g_alpha(x) per tutte le alpha: (n_alpha, n)"""
+    lam = -np.asarray(alpha, dtype=float)[:, None]
+    log_x = np.log(x)[None, :]
+    safe = np.where(lam == 0, 1.0, lam)
+    return np.where(lam == 0, log_x, np.expm1(lam * log_x) / safe)
+
+
+class _Projector:
+    """
+    RSS dei tre modelli dalle equazioni normali. Colonne centrate (l'intercetta
+    esce) e normalizzate: per ogni alpha il sistema e' 2x2 in (E^n, g_alpha)
+    e servono solo le somme sui fotoni (norme, prodotti incrociati, g_alpha . y).
+    Le colonne g_alpha non sono mai tenute tutte in memoria: si ricalcolano a
+    blocchi di alpha (o di fotoni per la matrice di Gram).
+    """
+
+    def __init__(self, energies, qg_order=1, alphas=ALPHA_GRID):
+        energies = np.asarray(energies, dtype=float)
+        self.n = len(energies)
+        self.alphas = np.asarray(alphas, dtype=float)
+        self.pivot = np.exp(np.mean(np.log(energies)))
+        self.x = energies / self.pivot
+        self.qg_column = energies ** qg_order
+        q = self.qg_column - self.qg_column.mean()
+        self.q_unit = q / np.sqrt(np.dot(q, q))
+
+        n_alpha = len(self.alphas)
+        self.astro_mean = np.empty(n_alpha)
+        self.astro_norm = np.empty(n_alpha)
+        for block, g in self._astro_blocks():
+            self.astro_mean[block] = g.mean(axis=1)
+            g = g - self.astro_mean[block, None]
+            self.astro_norm[block] = np.sqrt(np.einsum('ij,ij->i', g, g))
+
+        # Gram dei vettori unitari [E^n, g_alpha...]: (1 + n_alpha)^2 prodotti scalari
+        self.gram = np.zeros((n_alpha + 1, n_alpha + 1))
+        rows = max(1, BLOCK_ELEMENTS // (n_alpha + 1))
+        for start in range(0, self.n, rows):
+            part = slice(start, start + rows)
+            g = _box_cox(self.x[part], self.alphas) - self.astro_mean[:, None]
+            W = np.vstack([self.q_unit[part], g / self.astro_norm[:, None]])
+            self.gram += W @ W.T
+        self.rho = self.gram[0, 1:]      # coseno tra E^n e g_alpha centrati
+
+    def _astro_blocks(self):
+        step = max(1, BLOCK_ELEMENTS // max(self.n, 1))
+        for start in range(0, len(self.alphas), step):
+            block = slice(start, start + step)
+            yield block, _box_cox(self.x, self.alphas[block])
+
+    def projections(self, Y):
+        """Somme per le colonne Y (n, B): ||Y_c||^2 (B,), su E^n (B,) e su g_alpha (n_alpha, B)"""
+        Y = Y - Y.mean(axis=0)
+        total = np.einsum('ij,ij->j', Y, Y)
+        u = self.q_unit @ Y
+        v = np.empty((len(self.alphas), Y.shape[1]))
+        for block, g in self._astro_blocks():
+            v[block] = ((g @ Y) - self.astro_mean[block, None] * Y.sum(axis=0)) / self.astro_norm[block, None]
+        return total, u, v
+
+    def rss(self, Y):
+        """RSS di QG (B,), Astrophysical (n_alpha, B), Mixed (n_alpha, B) per colonne Y (n, B)"""
+        return self.rss_from_projections(*self.projections(Y))
+
+    def rss_from_projections(self, total, u, v):
+        rho = self.rho[:, None]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            explained = (u * u + v * v - 2 * rho * u * v) / (1 - rho * rho)
+        # il misto spiega almeno quanto ciascun modello annidato (anche per rho ~ 1)
+        nested = np.maximum(u * u, v * v)
+        explained = np.where(np.isfinite(explained), np.maximum(explained, nested), nested)
+        floor = 1e-12 * total
+        return (np.maximum(total - u * u, floor), np.maximum(total - v * v, floor),
+                np.maximum(total - explained, floor))
+
+    def simulate_rss(self, mean, sigma, size, rng):
+        """
+        RSS di size repliche Y = mean + sigma Z (Z gaussiano) senza costruire
+        Y: le proiezioni di Z sui vettori unitari sono N(0, Gram), il resto di
+        ||Z_c||^2 e' chi2 indipendente con n - 1 - rango gradi di liberta'.
+        mean deve stare in span(1, E^n, g_alpha) (valori fittati).
+        """
+        total0, u0, v0 = self.projections(mean[:, None])
+        eigval, eigvec = np.linalg.eigh(self.gram)
+        keep = eigval > 1e-10 * eigval.max()
+        root = eigvec[:, keep] * np.sqrt(eigval[keep])
+        mean_proj = np.concatenate([u0, v0[:, 0]])
+        # mean_c . Z = mean_proj' Gram^+ W Z = (U' mean_proj / sqrt(lambda)) . xi
+        mean_dot = (eigvec[:, keep].T @ mean_proj) / np.sqrt(eigval[keep])
+
+        xi = rng.standard_normal((int(keep.sum()), size))
+        w = root @ xi
+        rest_df = self.n - 1 - int(keep.sum())
+        rest = rng.chisquare(rest_df, size) if rest_df > 0 else np.zeros(size)
+        total = total0[0] + 2 * sigma * (mean_dot @ xi) + sigma ** 2 * (np.sum(xi * xi, axis=0) + rest)
+        proj = mean_proj[:, None] + sigma * w
+        return self.rss_from_projections(total, proj[0], proj[1:])
+
+    def design(self, model, alpha_index=None):
+        ones = np.ones(self.n)
+        if model == 'QG':
+            return np.column_stack([ones, self.qg_column])
+        astro = _box_cox(self.x, self.alphas[[alpha_index]])[0]
+        if model == 'Astrophysical':
+            return np.column_stack([ones, astro])
+        return np.column_stack([ones, self.qg_column, astro])
+
+
+def _log_likelihood(rss, n):
+    """log L gaussiana con sigma^2 = RSS/n"""
+    return -0.5 * n * (np.log(2 * np.pi * rss / n) + 1)
+
+
+# ============================================================================
+# CONFRONTO SU UN GRB
+# ============================================================================
+
+def _fit_models(projector, times):
+    """Fit dei tre modelli sui tempi: parametri, log L, AIC, BIC, fitted values"""
+    n = projector.n
+    rss_qg, rss_astro, rss_mixed = projector.rss(times[:, None])
+    best = {
+        'QG': (float(rss_qg[0]), None),
+        'Astrophysical': (float(rss_astro[:, 0].min()), int(np.argmin(rss_astro[:, 0]))),
+        'Mixed': (float(rss_mixed[:, 0].min()), int(np.argmin(rss_mixed[:, 0]))),
+    }
+
+    fits = {}
+    for model in MODELS:
+        rss, alpha_index = best[model]
+        X = projector.design(model, alpha_index)
+        coef, *_ = np.linalg.lstsq(X, times, rcond=None)
+        k = N_PARAMS[model]
+        log_l = _log_likelihood(rss, n)
+        fit = {
+            't0': float(coef[0]),
+            'rss': rss,
+            'sigma': float(np.sqrt(rss / n)),
+            'log_likelihood': float(log_l),
+            'n_params': k,
+            'aic': float(2 * k - 2 * log_l),
+            'bic': float(k * np.log(n) - 2 * log_l),
+            'fitted': X @ coef,
+        }
+        if model in ('QG', 'Mixed'):
+            fit['qg_slope'] = float(coef[1])
+        if model in ('Astrophysical', 'Mixed'):
+            fit['astro_amplitude'] = float(coef[-1])
+            fit['alpha'] = float(projector.alphas[alpha_index])
+        fits[model] = fit
+    return fits
+
+
+def _lrt(rss_null, rss_alt, n):
+    return n * np.log(rss_null / rss_alt)
+
+
+def _bootstrap_lrt(projector, fits, n_bootstrap, rng):
+    """
+    Statistiche LRT simulate sotto ciascun nullo (Astrophysical e QG,
+    parametri al best fit, rumore gaussiano con sigma stimata). Le repliche
+    sono simulate nello spazio delle proiezioni (_Projector.simulate_rss):
+    costo indipendente dal numero di fotoni.
+    """
+    n = projector.n
+    null_astro, null_qg = [], []
+    for start in range(0, n_bootstrap, BOOTSTRAP_BLOCK):
+        size = min(BOOTSTRAP_BLOCK, n_bootstrap - start)
+        _, rss_astro, rss_mixed = projector.simulate_rss(
+            fits['Astrophysical']['fitted'], fits['Astrophysical']['sigma'], size, rng)
+        null_astro.append(_lrt(rss_astro.min(axis=0), rss_mixed.min(axis=0), n))
+        rss_qg, _, rss_mixed = projector.simulate_rss(fits['QG']['fitted'], fits['QG']['sigma'], size, rng)
+        null_qg.append(_lrt(rss_qg, rss_mixed.min(axis=0), n))
+    return np.concatenate(null_astro), np.concatenate(null_qg)
+
+
+def _test_summary(statistic, df, null_distribution):
+    p_asymptotic = float(stats.chi2.sf(statistic, df))
+    result = {
+        'statistic': float(statistic),
+        'df': df,
+        'p_asymptotic': p_asymptotic,
+        'sigma_asymptotic': float(p_to_sigma(p_asymptotic)),
+    }
+    if null_distribution is not None and len(null_distribution):
+        p_boot = (1 + np.sum(null_distribution >= statistic)) / (len(null_distribution) + 1)
+        result.update({
+            'p_bootstrap': float(p_boot),
+            'sigma_bootstrap': float(p_to_sigma(p_boot)),
+            'null_95': float(np.quantile(null_distribution, 0.95)),
+        })
+    return result
+
+
+def compare_lag_models(energies, times, n_bootstrap=1000, seed=None, rng=None,
+                       qg_order=1, redshift=None, alpha_level=0.05):
+    """
+    Confronto dei modelli di lag su un GRB. Restituisce per ogni modello
+    parametri, log L, AIC, BIC; i due LRT con p asintotico e bootstrap;
+    miglior modello per AIC e BIC e una discriminazione:
+
+    - 'QG': serve il termine E^n (Astrophysical vs Mixed) ma non quello astrofisico
+    - 'Astrophysical': il contrario
+    - 'Mixed': entrambi; 'Unclear': nessuno dei due
+    """
+    rng = rng if rng is not None else np.random.default_rng(seed)
+    energies = np.asarray(energies, dtype=float)
+    times = np.asarray(times, dtype=float)
+    t_ref = times.mean()
+    times = times - t_ref
+
+    projector = _Projector(energies, qg_order)
+    fits = _fit_models(projector, times)
+    n = projector.n
+
+    null_astro = null_qg = None
+    if n_bootstrap:
+        null_astro, null_qg = _bootstrap_lrt(projector, fits, n_bootstrap, rng)
+
+    tests = {
+        'Astrophysical_vs_Mixed': _test_summary(
+            _lrt(fits['Astrophysical']['rss'], fits['Mixed']['rss'], n), 1, null_astro),
+        'QG_vs_Mixed': _test_summary(
+            _lrt(fits['QG']['rss'], fits['Mixed']['rss'], n), 2, null_qg),
+    }
+    p_key = 'p_bootstrap' if n_bootstrap else 'p_asymptotic'
+    needs_qg = tests['Astrophysical_vs_Mixed'][p_key] < alpha_level
+    needs_astro = tests['QG_vs_Mixed'][p_key] < alpha_level
+    if needs_qg and needs_astro:
+        discrimination = 'Mixed'
+    elif needs_qg:
+        discrimination = 'QG'
+    elif needs_astro:
+        discrimination = 'Astrophysical'
+    else:
+        discrimination = 'Unclear'
+
+    for model in MODELS:
+        fits[model]['t0'] = float(fits[model]['t0'] + t_ref)
+        del fits[model]['fitted']
+    if redshift is not None:
+        K = float(liv_K(redshift, qg_order))
+        for model in ('QG', 'Mixed'):
+            fits[model]['E_QG'] = float(e_qg_from_slope(fits[model]['qg_slope'], K, qg_order))
+
+    return {
+        'n_photons': n,
+        'qg_order': qg_order,
+        'energy_pivot': float(projector.pivot),
+        'models': fits,
+        'aic_scores': {m: fits[m]['aic'] for m in MODELS},
+        'bic_scores': {m: fits[m]['bic'] for m in MODELS},
+        'best_model_aic': min(MODELS, key=lambda m: fits[m]['aic']),
+        'best_model_bic': min(MODELS, key=lambda m: fits[m]['bic']),
+        'lrt': tests,
+        'n_bootstrap': int(n_bootstrap),
+        'discrimination': discrimination,
+    }
+
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+LAG MODELS - Registro dei modelli di lag intrinseco
+===================================================
+Ogni modello dichiara nomi dei parametri, bounds e valori iniziali
+(calcolati dai dati), valutazione vettorizzata e gradiente analitico.
+Fit, selezione AIC, sottrazione del lag e ricerca dei residui passano
+tutti da qui: un nuovo modello si aggiunge una volta sola con
+register_lag_model() e diventa disponibile a tutti gli script.
+
+    models = fit_lag_models(times, energies)
+    name, best = select_best_model(models)
+    corrected, predicted = subtract_lag(times, energies, name, best)
+
+La valutazione accetta parametri come array broadcastabili, quindi lo
+stesso modello si valuta su molti GRB in una chiamata (evaluate_batch).
+
+Autore: Christian Quintino De Luca
+Affiliazione: RTH Italia - Research & Technology Hub
+"""
+
+import numpy as np
+
+from lazy_imports import lazy_module
+
+optimize = lazy_module('scipy.optimize')
+
+
+class LagModel:
+    """Modello t(E): funzione, gradiente e regole per p0/bounds"""
+
+    def __init__(self, name, label, param_names, func, jacobian, p0, bounds, maxfev=2000):
+        self.name = name
+        self.label = label
+        self.param_names = tuple(param_names)
+        self.func = func              # func(E, *params) -> t
+        self.jacobian = jacobian      # jacobian(E, *params) -> (len(E), n_params)
+        self.p0 = p0                  # p0(times, energies) -> lista
+        self.bounds = bounds          # bounds(times, energies) -> (lower, upper)
+        self.maxfev = maxfev
+
+    @property
+    def n_params(self):
+        return len(self.param_names)
+
+    def params_from(self, values):
+        """Tupla dei parametri da un dict (risultato del fit o 'parameters')"""
+        return tuple(float(values[k]) for k in self.param_names)
+
+    def evaluate(self, energies, values):
+        """t(E) con parametri da dict"""
+        return self.func(np.asarray(energies, dtype=float), *self.params_from(values))
+
+
+LAG_MODELS = {}
+
+
+def register_lag_model(model):
+    """Aggiunge un modello al registro (sostituisce uno con lo stesso nome)"""
+    LAG_MODELS[model.name] = model
+    return model
+
+
+def get_lag_model(name):
+    if name not in LAG_MODELS:
+        raise ValueError(f"Unknown lag model '{name}'. Available: {', '.join(LAG_MODELS)}")
+    return LAG_MODELS[name]
+
+
+def _columns(*columns):
+    """Jacobiano (N, k) da colonne broadcastabili"""
+    shape = np.broadcast_shapes(*(np.shape(c) for c in columns))
+    return np.stack([np.broadcast_to(c, shape) for c in columns], axis=-1)
+
+
+# ============================================================================
+# MODELLI
+# ============================================================================
+
+def power_law(E, t0, alpha, beta):
+    """t = t0 + alpha * E^beta"""
+    return t0 + alpha * np.power(E, beta)
+
+
+def power_law_jacobian(E, t0, alpha, beta):
+    E_beta = np.power(E, beta)
+    return _columns(np.ones_like(E), E_beta, alpha * E_beta * np.log(E))
+
+
+def broken_power_law(E, t0, alpha1, beta1, alpha2, beta2, E_break):
+    """t0 + alpha1 E^beta1 sotto E_break, t0 + alpha1 E_break^beta1 + alpha2 E^beta2 sopra"""
+    high = E >= E_break
+    low_branch = alpha1 * np.power(E, beta1)
+    high_branch = alpha1 * np.power(E_break, beta1) + alpha2 * np.power(E, beta2)
+    return t0 + np.where(high, high_branch, low_branch)
+
+
+def broken_power_law_jacobian(E, t0, alpha1, beta1, alpha2, beta2, E_break):
+    high = E >= E_break
+    E_b1, Eb_b1, E_b2 = np.power(E, beta1), np.power(E_break, beta1), np.power(E, beta2)
+    return _columns(
+        np.ones_like(E),
+        np.where(high, Eb_b1, E_b1),
+        np.where(high, alpha1 * Eb_b1 * np.log(E_break), alpha1 * E_b1 * np.log(E)),
+        np.where(high, E_b2, 0.0),
+        np.where(high, alpha2 * E_b2 * np.log(E), 0.0),
+        np.where(high, alpha1 * beta1 * Eb_b1 / E_break, 0.0),
+    )
+
+
+def exponential(E, t0, tau, E_scale):
+    """t = t0 + tau * exp(-E / E_scale)"""
+    return t0 + tau * np.exp(-E / E_scale)
+
+
+def exponential_jacobian(E, t0, tau, E_scale):
+    decay = np.exp(-E / E_scale)
+    return _columns(np.ones_like(E), decay, tau * decay * E / E_scale ** 2)
+
+
+def logarithmic(E, t0, alpha, E_ref):
+    """t = t0 + alpha * log(E / E_ref)"""
+    return t0 + alpha * np.log(E / E_ref)
+
+
+def logarithmic_jacobian(E, t0, alpha, E_ref):
+    return _columns(np.ones_like(E), np.log(E / E_ref), -alpha / E_ref * np.ones_like(E))
+
+
+register_lag_model(LagModel(
+    'power_law', 'Power-law Lag', ('t0', 'alpha', 'beta'),
+    power_law, power_law_jacobian,
+    p0=lambda t, E: [np.mean(t), -1.0, -0.5],
+    bounds=lambda t, E: ([t.min(), -100, -2], [t.max(), 100, 2]),
+))
+
+register_lag_model(LagModel(
+    'broken_power_law', 'Broken Power-law Lag',
+    ('t0', 'alpha1', 'beta1', 'alpha2', 'beta2', 'E_break'),
+    broken_power_law, broken_power_law_jacobian,
+    p0=lambda t, E: [np.mean(t), -1.0, -0.5, -0.5, -0.3, np.median(E)],
+    bounds=lambda t, E: ([t.min(), -50, -2, -50, -2, E.min()],
+                         [t.max(), 50, 2, 50, 2, E.max()]),
+    maxfev=3000,
+))
+
+register_lag_model(LagModel(
+    'exponential', 'Exponential Lag', ('t0', 'tau', 'E_scale'),
+    exponential, exponential_jacobian,
+    p0=lambda t, E: [np.mean(t), 1.0, np.median(E)],
+    bounds=lambda t, E: ([t.min(), 0, E.min()], [t.max(), 100, E.max()]),
+))
+
+register_lag_model(LagModel(
+    'logarithmic', 'Logarithmic Lag', ('t0', 'alpha', 'E_ref'),
+    logarithmic, logarithmic_jacobian,
+    p0=lambda t, E: [np.mean(t), -1.0, np.median(E)],
+    bounds=lambda t, E: ([t.min(), -100, E.min()], [t.max(), 100, E.max()]),
+))
+
+
+# ============================================================================
+# FIT, SELEZIONE, SOTTRAZIONE
+# ============================================================================
+
+def fit_lag_model(name, times, energies):
+    """Fit di un modello: parametri, chi2, AIC (= 2k + chi2), correlazione"""
+    model = get_lag_model(name)
+    times = np.asarray(times, dtype=float)
+    energies = np.asarray(energies, dtype=float)
+
+    popt, _ = optimize.curve_fit(model.func, energies, times,
+                                 p0=model.p0(times, energies),
+                                 bounds=model.bounds(times, energies),
+                                 jac=model.jacobian, maxfev=model.maxfev)
+
+    times_pred = model.func(energies, *popt)
+    residuals = times - times_pred
+    chi2 = np.sum((residuals / np.std(residuals))**2)
+    dof = len(times) - model.n_params
+
+    result = {k: float(v) for k, v in zip(model.param_names, popt)}
+    result.update({
+        'chi2': float(chi2),
+        'chi2_red': float(chi2 / dof),
+        'dof': int(dof),
+        'correlation': float(np.corrcoef(times, times_pred)[0, 1]),
+        'aic': float(2 * model.n_params + chi2),
+        'type': model.label,
+    })
+    return result
+
+
+def fit_lag_models(times, energies, names=None):
+    """Fit di tutti i modelli registrati (o di quelli in names); None se il fit fallisce"""
+    models = {}
+    for name in (names if names is not None else list(LAG_MODELS)):
+        try:
+            models[name] = fit_lag_model(name, times, energies)
+        except Exception as e:
+            print(f"⚠️ Errore fit {name}: {e}")
+            models[name] = None
+    return models
+
+
+def select_best_model(models):
+    """Seleziona il miglior modello basato su AIC"""
+    valid_models = {k: v for k, v in models.items() if v is not None}
+
+    if not valid_models:
+        return None, None
+
+    best_model_name = min(valid_models.keys(), key=lambda x: valid_models[x]['aic'])
+    return best_model_name, valid_models[best_model_name]
+
+
+def subtract_lag(times, energies, name, params):
+    """
+    Tempi corretti = t - t_modello(E) + t0 (il lag intrinseco viene tolto,
+    l'origine dei tempi resta quella del fit). Nome sconosciuto: ValueError.
+    """
+    model = get_lag_model(name)
+    predicted_times = model.evaluate(energies, params)
+    offset = float(params['t0']) if 't0' in model.param_names else 0.0
+    return np.asarray(times, dtype=float) - predicted_times + offset, predicted_times
+
+
+def evaluate_batch(name, energies, group, param_rows):
+    """
+    Un modello su molti GRB in una chiamata: energies concatenate, group =
+    indice del GRB per fotone, param_rows (n_grb, n_params) nell'ordine di
+    param_names.
+    """
+    model = get_lag_model(name)
+    param_rows = np.asarray(param_rows, dtype=float)
+    per_photon = param_rows[np.asarray(group)]
+    return model.func(np.asarray(energies, dtype=float), *per_photon.T)
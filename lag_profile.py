@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+"""
+LAG PROFILE - Profilo lag-energia binnato per i fit dei modelli di lag
+======================================================================
+Preprocessing che sostituisce la regressione fotone per fotone dei tempi
+di arrivo assoluti (O(N) per ogni valutazione del modello, mal condizionata
+con tempi MET) con poche decine di punti binnati e pesati:
+
+- bin adattivi in log E a conteggio circa costante (quantili, ccf_lag),
+  larghi al massimo MAX_LOG_WIDTH decadi e con almeno min_photons fotoni
+- per ogni bin un tempo di arrivo robusto:
+    'median'  mediana dei tempi
+    'peak'    picco della light curve lisciata con un kernel gaussiano di
+              Silverman (moda KDE; parabola sui 3 bin attorno al massimo)
+    'ccf'     lag CCF rispetto al bin di energia piu' bassa (ccf_lag)
+- errori bootstrap: ricampionamento dei fotoni del bin per la mediana,
+  simulazioni Poisson del profilo totale scalato a ogni bin per picco e CCF
+  (ricampionare i conteggi osservati conta il rumore due volte e gonfia gli
+  errori); per 'ccf' covarianza piena, il bin di riferimento e' comune
+- tempi relativi a t_ref (mediana dei tempi): il fit lavora su secondi,
+  non su 1e8 s di MET
+
+I fit (curve_fit con sigma = errore bootstrap, absolute_sigma) restituiscono
+il chi2 pesato vero; i parametri sono nel sistema di tempi del chiamante
+(il parametro additivo 't0' viene riportato a t_ref automaticamente).
+Il modello di ogni bin e' la media di t(E) sui fotoni del bin (nodi ai
+quantili di energia), non t(E) al centro: nei bin larghi dell'alta energia
+il modello al centro sottostima lo shift e distorce la pendenza.
+
+    profile = lag_profile(energies, times, estimator='median', n_bootstrap=200, seed=42)
+    fit = fit_lag_profile(profile, lambda E, t0, a: t0 + a * E, p0=[0, 0], param_names=('t0', 'alpha'))
+    models = fit_profile_lag_models(profile)     # registro di lag_models
+
+Autore: Christian Quintino De Luca
+Affiliazione: RTH Italia - Research & Technology Hub
+"""
+
+import numpy as np
+
+from ccf_lag import energy_bands, binned_light_curves, ccf_spectral_lags, resample_curves
+from lag_models import LAG_MODELS, get_lag_model
+from lazy_imports import lazy_module
+
+optimize = lazy_module('scipy.optimize')
+
+ESTIMATORS = ('median', 'peak', 'ccf')
+MIN_PHOTONS_PER_BIN = 10
+MAX_BINS = 24
+MAX_LOG_WIDTH = 0.3      # decadi
+MAX_NODES = 64
+BLOCK_ELEMENTS = 4_000_000
+
+
+# ============================================================================
+# BIN IN ENERGIA
+# ============================================================================
+
+def adaptive_energy_bins(energies, min_photons=MIN_PHOTONS_PER_BIN, max_bins=MAX_BINS,
+                         max_log_width=MAX_LOG_WIDTH):
+    """
+    Bordi log-spaziati a conteggio circa costante. I bin piu' larghi di
+    max_log_width decadi (la coda ad alta energia) vengono divisi in parti
+    uguali in log E: dentro un bin largo il lag varia piu' della larghezza
+    dell'impulso e il tempo del bin non e' piu' il modello mediato. I bin
+    sotto min_photons vengono poi fusi con il vicino meno popolato.
+    """
+    energies = np.asarray(energies, dtype=float)
+    if len(energies) < min_photons:
+        raise ValueError(f"Need at least {min_photons} photons, got {len(energies)}")
+    n_bins = int(np.clip(len(energies) // min_photons, 1, max_bins))
+    edges = energy_bands(energies, n_bins)
+    if max_log_width and len(edges) > 1:
+        log_edges = np.log10(edges)
+        parts = np.maximum(1, np.ceil(np.diff(log_edges) / max_log_width).astype(int))
+        split = [np.logspace(lo, hi, k + 1)[1:-1] for lo, hi, k in zip(log_edges[:-1], log_edges[1:], parts)]
+        edges = np.sort(np.concatenate([edges] + split))
+
+    while len(edges) > 2:
+        counts = np.histogram(energies, edges)[0]
+        k = int(np.argmin(counts))
+        if counts[k] >= min_photons:
+            break
+        if k == 0:
+            remove = 1
+        elif k == len(counts) - 1:
+            remove = k
+        else:
+            remove = k if counts[k - 1] <= counts[k + 1] else k + 1
+        edges = np.delete(edges, remove)
+    return edges
+
+
+# ============================================================================
+# STIMATORI PER BIN
+# ============================================================================
+
+def _median_lags(times, band, n_bands, n_bootstrap, rng):
+    """Mediana per bin e deviazione standard delle mediane bootstrap"""
+    lag = np.empty(n_bands)
+    error = np.full(n_bands, np.nan)
+    for k in range(n_bands):
+        t = times[band == k]
+        lag[k] = np.median(t)
+        if n_bootstrap:
+            block = max(1, BLOCK_ELEMENTS // len(t))
+            medians = []
+            for start in range(0, n_bootstrap, block):
+                size = min(block, n_bootstrap - start)
+                medians.append(np.median(t[rng.integers(0, len(t), (size, len(t)))], axis=1))
+            error[k] = np.std(np.concatenate(medians))
+    return lag, error
+
+
+def _peak_positions(curves):
+    """Indice sub-bin del massimo di ogni light curve (parabola a 3 punti; media dei massimi ex aequo)"""
+    n = curves.shape[-1]
+    k = np.argmax(curves, axis=-1)
+    inner = np.clip(k, 1, max(1, n - 2))
+    if n < 3:
+        return k.astype(float)
+    y0 = np.take_along_axis(curves, (inner - 1)[..., None], axis=-1)[..., 0]
+    y1 = np.take_along_axis(curves, inner[..., None], axis=-1)[..., 0]
+    y2 = np.take_along_axis(curves, (inner + 1)[..., None], axis=-1)[..., 0]
+    denom = y0 - 2 * y1 + y2
+    with np.errstate(invalid='ignore', divide='ignore'):
+        offset = np.where(denom < 0, 0.5 * (y0 - y2) / denom, 0.0)
+    offset = np.clip(np.nan_to_num(offset), -0.5, 0.5)
+    # massimi ex aequo (bin con pochi fotoni): posizione media, non il primo
+    is_max = curves == np.max(curves, axis=-1, keepdims=True)
+    n_max = is_max.sum(axis=-1)
+    tied = np.sum(is_max * np.arange(n), axis=-1) / n_max
+    return np.where(n_max > 1, tied, np.where(k == inner, k + offset, k))
+
+
+def _kernel_widths(times, energies, edges):
+    """Larghezza gaussiana di Silverman per bin: 0.9 min(std, IQR / 1.349) n^(-1/5)"""
+    band = np.searchsorted(edges, energies, side='right') - 1
+    widths = np.empty(len(edges) - 1)
+    for k in range(len(widths)):
+        t = times[band == k]
+        q25, q75 = np.percentile(t, [25, 75])
+        spread = min(np.std(t), (q75 - q25) / 1.349) or np.std(t)
+        widths[k] = 0.9 * spread * len(t) ** -0.2
+    return widths
+
+
+def _smooth_curves(curves, widths):
+    """Convoluzione gaussiana (FFT, bordi a zero) di ogni banda con la sua larghezza in bin"""
+    n = curves.shape[-1]
+    nfft = 1 << int(np.ceil(np.log2(2 * n)))
+    lags = np.fft.fftfreq(nfft, 1.0 / nfft)
+    kernel = np.exp(-0.5 * (lags[None, :] / np.maximum(widths, 1e-3)[:, None]) ** 2)
+    kernel /= kernel.sum(axis=1, keepdims=True)
+    spectrum = np.fft.rfft(curves, nfft, axis=-1) * np.fft.rfft(kernel, axis=-1)
+    return np.fft.irfft(spectrum, nfft, axis=-1)[..., :n]
+
+
+def _peak_lags(times, energies, edges, n_time_bins, n_bootstrap, rng):
+    """
+    Picco della light curve di ogni bin lisciata con un kernel gaussiano
+    (larghezza di Silverman: moda KDE dei tempi). Senza lisciatura, con
+    ~1 fotone per bin di tempo, l'argmax e' un singolo fotone vicino al
+    picco. Errori da simulazioni del profilo totale, lisciate allo stesso modo.
+    """
+    curves, t_edges, _ = binned_light_curves(times, energies, edges, n_bins=n_time_bins)
+    dt = t_edges[1] - t_edges[0]
+    widths = _kernel_widths(times, energies, edges) / dt
+    lag = t_edges[0] + (_peak_positions(_smooth_curves(curves, widths)) + 0.5) * dt
+    error = np.full(len(lag), np.nan)
+    if n_bootstrap:
+        block = max(1, BLOCK_ELEMENTS // curves.size)
+        peaks = []
+        for start in range(0, n_bootstrap, block):
+            size = min(block, n_bootstrap - start)
+            simulated = resample_curves(curves, size, rng, 'template')
+            peaks.append(_peak_positions(_smooth_curves(simulated, widths)))
+        error = np.std(np.concatenate(peaks), axis=0) * dt
+    return lag, np.maximum(error, dt / np.sqrt(12)), dt
+
+
+def _ccf_lags(times, energies, edges, n_time_bins, n_bootstrap, rng):
+    """Lag CCF di ogni bin rispetto al primo (il primo ha lag 0) e covarianza dei lag"""
+    n_bands = len(edges) - 1
+    lag = np.zeros(n_bands)
+    error = np.full(n_bands, np.nan)
+    result = ccf_spectral_lags(times, energies, band_edges=edges, n_bins=n_time_bins,
+                               max_lag=np.ptp(times), pairs='reference', n_sim=n_bootstrap,
+                               random_state=rng.integers(2**63) if n_bootstrap else None,
+                               resampling='template')
+    lag[1:] = result['lag']
+    error[1:] = result['lag_err']
+    dt = result['bin_width']
+    # Il bin di riferimento ha solo l'incertezza di quantizzazione
+    error = np.maximum(np.nan_to_num(error, nan=0.0), dt / np.sqrt(12))
+    covariance = None
+    if result['lag_cov'] is not None:
+        # rumore del bin di riferimento comune a tutti i lag: covarianza piena
+        covariance = np.zeros((n_bands, n_bands))
+        covariance[1:, 1:] = result['lag_cov']
+        covariance[np.diag_indices(n_bands)] = np.maximum(np.diag(covariance), error ** 2)
+    return lag, error, dt, covariance
+
+
+def energy_nodes(energies, band, n_bands, max_nodes=MAX_NODES):
+    """
+    Nodi di energia per la media del modello su ogni bin: tutti i fotoni se
+    sono al piu' max_nodes, altrimenti i quantili centrati (k + 1/2) / max_nodes.
+    Restituisce (nodi, pesi) di forma (n_bins, m); pesi a somma 1 per riga,
+    colonne in eccesso con peso 0.
+    """
+    order = np.lexsort((energies, band))
+    sorted_e = energies[order]
+    counts = np.bincount(band, minlength=n_bands)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    m = int(min(counts.max(), max_nodes))
+    columns = np.arange(m)
+    # posizione (frazionaria) del nodo nel bin ordinato
+    position = np.where(counts[:, None] <= m, np.minimum(columns[None, :], counts[:, None] - 1),
+                        (columns[None, :] + 0.5) * counts[:, None] / m - 0.5)
+    lo = np.floor(position).astype(np.int64)
+    hi = np.minimum(lo + 1, counts[:, None] - 1)
+    frac = position - lo
+    nodes = (1 - frac) * sorted_e[starts[:, None] + lo] + frac * sorted_e[starts[:, None] + hi]
+    used = np.minimum(counts, m)
+    weights = np.where(columns[None, :] < used[:, None], 1.0 / used[:, None], 0.0)
+    return nodes, weights
+
+
+# ============================================================================
+# PROFILO
+# ============================================================================
+
+def lag_profile(energies, times, estimator='median', min_photons=MIN_PHOTONS_PER_BIN, max_bins=MAX_BINS,
+                n_bootstrap=200, seed=None, rng=None, t_ref=None, n_time_bins=None, edges=None):
+    """
+    Profilo lag-energia di un GRB. Restituisce dict con per ogni bin:
+    energy (media geometrica dei fotoni), energy_low/high, n_photons,
+    lag (tempo relativo a t_ref; per 'ccf' relativo al primo bin), lag_error,
+    time = lag + t_ref; piu' edges, t_ref, time_range dei fotoni, estimator,
+    n_bootstrap, lag_covariance (solo 'ccf': i lag condividono il bin di
+    riferimento, altrimenti None) e energy_nodes/node_weights (energy_nodes())
+    per i fit.
+    """
+    if estimator not in ESTIMATORS:
+        raise ValueError(f"Unknown estimator '{estimator}'. Available: {', '.join(ESTIMATORS)}")
+    rng = rng if rng is not None else np.random.default_rng(seed)
+    energies = np.asarray(energies, dtype=float)
+    times = np.asarray(times, dtype=float)
+    if len(energies) != len(times):
+        raise ValueError("energies and times must have the same length")
+
+    if edges is None:
+        edges = adaptive_energy_bins(energies, min_photons, max_bins)
+    edges = np.asarray(edges, dtype=float)
+    n_bands = len(edges) - 1
+    inside = (energies >= edges[0]) & (energies < edges[-1])
+    energies, times = energies[inside], times[inside]
+    band = np.searchsorted(edges, energies, side='right') - 1
+
+    if t_ref is None:
+        t_ref = float(np.median(times))
+    relative = times - t_ref
+
+    counts = np.bincount(band, minlength=n_bands)
+    if np.any(counts == 0):
+        raise ValueError("Empty energy bin: use adaptive_energy_bins() or wider edges")
+    log_energy = np.bincount(band, weights=np.log(energies), minlength=n_bands) / counts
+    nodes, node_weights = energy_nodes(energies, band, n_bands)
+
+    resolution = 0.0
+    covariance = None
+    if estimator == 'median':
+        lag, error = _median_lags(relative, band, n_bands, n_bootstrap, rng)
+    elif estimator == 'peak':
+        lag, error, resolution = _peak_lags(relative, energies, edges, n_time_bins, n_bootstrap, rng)
+    else:
+        lag, error, resolution, covariance = _ccf_lags(relative, energies, edges, n_time_bins,
+                                                       n_bootstrap, rng)
+
+    return {
+        'estimator': estimator,
+        'energy': np.exp(log_energy),
+        'energy_low': edges[:-1],
+        'energy_high': edges[1:],
+        'n_photons': counts,
+        'lag': lag,
+        'lag_error': error,
+        'lag_covariance': covariance,
+        'time': lag + t_ref,
+        't_ref': float(t_ref),
+        'time_range': (float(times.min()), float(times.max())),
+        'edges': edges,
+        'n_bins': n_bands,
+        'time_resolution': float(resolution),
+        'n_bootstrap': int(n_bootstrap),
+        'energy_nodes': nodes,
+        'node_weights': node_weights,
+    }
+
+
+# ============================================================================
+# FIT PESATI
+# ============================================================================
+
+def fit_lag_profile(profile, func, p0, param_names=None, bounds=(-np.inf, np.inf), jac=None,
+                    maxfev=2000):
+    """
+    Fit pesato t(E) = func(E, *params), mediato sui fotoni di ogni bin, sui
+    bin del profilo (func deve accettare E di qualsiasi forma). p0 e bounds sono
+    nel sistema di tempi del chiamante: se tra i param_names c'e' 't0'
+    (additivo) il fit lavora sui lag relativi e t0 viene riportato a t_ref.
+    Senza errori bootstrap i bin pesano tutti uguale; con lag_covariance il
+    chi2 usa la covarianza piena.
+
+    Restituisce parametri, errori '<nome>_err', chi2 pesato, chi2_red, dof,
+    aic (= 2k + chi2), correlazione profilo/modello, n_bins e 'parameters'.
+    """
+    param_names = tuple(param_names) if param_names is not None else tuple(f'p{i}' for i in range(len(p0)))
+    k = len(param_names)
+    energy = profile['energy']
+    error = profile['lag_error']
+    usable = np.isfinite(error) & (error > 0)
+    sigma = np.where(usable, error, error[usable].min()) if np.any(usable) else None
+    if sigma is not None and profile.get('lag_covariance') is not None:
+        sigma = profile['lag_covariance']
+    n = len(energy)
+    if n <= k:
+        raise ValueError(f"{n} energy bins for {k} parameters")
+
+    shift = profile['t_ref'] if 't0' in param_names else 0.0
+    i_t0 = param_names.index('t0') if 't0' in param_names else None
+    p0 = np.array(p0, dtype=float)
+    lower = np.array(np.broadcast_to(bounds[0], (k,)), dtype=float)
+    upper = np.array(np.broadcast_to(bounds[1], (k,)), dtype=float)
+    if i_t0 is not None:
+        p0[i_t0] -= shift
+        lower[i_t0] -= shift
+        upper[i_t0] -= shift
+    p0 = np.clip(p0, lower, upper)
+    y = profile['time'] - shift
+
+    if 'energy_nodes' in profile:
+        # modello mediato sui fotoni di ogni bin
+        nodes, node_weights = profile['energy_nodes'], profile['node_weights']
+
+        def binned(_, *params):
+            return np.sum(func(nodes, *params) * node_weights, axis=1)
+
+        binned_jac = jac
+        if callable(jac):
+            def binned_jac(_, *params):
+                return np.einsum('bmk,bm->bk', jac(nodes, *params), node_weights)
+    else:
+        binned, binned_jac = func, jac
+
+    popt, pcov = optimize.curve_fit(binned, energy, y, p0=p0, sigma=sigma, absolute_sigma=sigma is not None,
+                                    bounds=(lower, upper), jac=binned_jac, maxfev=maxfev)
+    predicted = binned(energy, *popt)
+    residuals = y - predicted
+    if sigma is None:
+        chi2 = float(np.sum(residuals ** 2))
+    elif sigma.ndim == 2:
+        chi2 = float(residuals @ np.linalg.solve(sigma, residuals))
+    else:
+        chi2 = float(np.sum((residuals / sigma) ** 2))
+    perr = np.sqrt(np.abs(np.diag(pcov)))
+
+    if i_t0 is not None:
+        popt = popt.copy()
+        popt[i_t0] += shift
+    result = {name: float(v) for name, v in zip(param_names, popt)}
+    result.update({f'{name}_err': float(e) for name, e in zip(param_names, perr)})
+    with np.errstate(invalid='ignore', divide='ignore'):
+        correlation = np.corrcoef(y, predicted)[0, 1] if np.std(predicted) > 0 else 0.0
+    result.update({
+        'chi2': chi2,
+        'chi2_red': chi2 / (n - k),
+        'dof': int(n - k),
+        'correlation': float(np.nan_to_num(correlation)),
+        'aic': float(2 * k + chi2),
+        'n_bins': int(n),
+        'parameters': popt,
+    })
+    return result
+
+
+def fit_profile_lag_model(profile, name):
+    """Fit pesato di un modello del registro lag_models sul profilo"""
+    model = get_lag_model(name)
+    times, energy = profile['time'], profile['energy']
+    # bounds dall'intervallo dei fotoni, non dei soli tempi binnati
+    photon_range = np.asarray(profile['time_range'])
+    result = fit_lag_profile(profile, model.func, model.p0(times, energy), model.param_names,
+                             bounds=model.bounds(photon_range, energy), jac=model.jacobian,
+                             maxfev=model.maxfev)
+    del result['parameters']
+    result['type'] = model.label
+    return result
+
+
+def fit_profile_lag_models(profile, names=None):
+    """Tutti i modelli registrati (o quelli in names) sul profilo; None se il fit fallisce"""
+    models = {}
+    for name in (names if names is not None else list(LAG_MODELS)):
+        try:
+            models[name] = fit_profile_lag_model(profile, name)
+        except Exception as e:
+            print(f"⚠️ Errore fit {name}: {e}")
+            models[name] = None
+    return models
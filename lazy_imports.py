@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+LAZY IMPORTS - Moduli pesanti caricati al primo uso
+===================================================
+matplotlib, seaborn, astropy, sklearn costano secondi all'avvio anche per
+run headless che usano solo numpy. Con lazy_module il nome resta a livello
+di modulo (nessuna modifica nel codice che lo usa) ma l'import vero avviene
+al primo accesso a un attributo:
+
+    plt = lazy_pyplot('Agg')            # backend impostato prima dell'import
+    sns = lazy_module('seaborn')
+    fits = lazy_module('astropy.io.fits')
+
+Autore: Christian Quintino De Luca
+Affiliazione: RTH Italia - Research & Technology Hub
+"""
+
+import importlib
+import types
+
+
+class _LazyModule(types.ModuleType):
+    """Proxy di modulo: importa name (dopo setup) al primo getattr"""
+
+    def __init__(self, name, setup=None):
+        super().__init__(name)
+        self.__dict__['_lazy_setup'] = setup
+        self.__dict__['_lazy_module'] = None
+
+    def _load(self):
+        module = self.__dict__['_lazy_module']
+        if module is None:
+            setup = self.__dict__['_lazy_setup']
+            if setup is not None:
+                setup()
+            module = importlib.import_module(self.__name__)
+            self.__dict__['_lazy_module'] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = 'loaded' if self.__dict__['_lazy_module'] is not None else 'not loaded'
+        return f"<lazy module '{self.__name__}' ({state})>"
+
+
+def lazy_module(name, setup=None):
+    """Modulo importato al primo accesso; setup() viene chiamato subito prima"""
+    return _LazyModule(name, setup)
+
+
+def lazy_pyplot(backend=None, rcparams=None):
+    """matplotlib.pyplot lazy; backend e rcParams applicati prima dell'import"""
+    def setup():
+        if backend is None and not rcparams:
+            return
+        import matplotlib
+        if backend is not None:
+            matplotlib.use(backend)
+        if rcparams:
+            matplotlib.rcParams.update(rcparams)
+    return lazy_module('matplotlib.pyplot', setup)
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+LIV COSMOLOGY - Fattore di distanza K_n(z) per ritardi LIV
+==========================================================
+Ritardo di un fotone di energia E rispetto a E_ref (Jacob & Piran 2008):
+
+    dt = s * (1+n)/2 * (E^n - E_ref^n) / E_QG^n * K_n(z)
+    K_n(z) = (1/H0) * int_0^z (1+z')^n / sqrt(Om (1+z')^3 + Ok (1+z')^2 + OL) dz'
+
+con s = +1 subluminale, n = 1 (lineare) o 2 (quadratico), K in secondi
+se H0 e' in km/s/Mpc. Integrale cumulativo su una griglia fine in z e
+interpolazione: vettorizzato su array di redshift.
+
+Sensibilita' alla cosmologia: liv_K_grid valuta K su tutta la griglia
+(H0, Omega_M, Omega_L) x z con una quadratura vettorizzata, e
+liv_sensitivity propaga la griglia alle E_QG di tutti i GRB a pendenze
+fissate, restituendo la banda di incertezza sul prior:
+
+    band = liv_sensitivity(slopes, z, H0_values=[65, 70, 75],
+                           Omega_M_values=[0.25, 0.3, 0.35])
+
+Autore: Christian Quintino De Luca
+Affiliazione: RTH Italia - Research & Technology Hub
+"""
+
+import numpy as np
+
+# Planck 2018 (TT,TE,EE+lowE+lensing+BAO)
+H0_PLANCK18 = 67.66       # km/s/Mpc
+OMEGA_M_PLANCK18 = 0.3111
+OMEGA_L_PLANCK18 = 0.6889
+
+MPC_KM = 3.0856775814913673e19   # km in un Mpc
+PLANCK_ENERGY_GEV = 1.22e19
+
+
+def hubble_time(H0=H0_PLANCK18):
+    """1/H0 in secondi"""
+    return MPC_KM / np.asarray(H0, dtype=float)
+
+
+def liv_integral(z, n=1, Omega_M=OMEGA_M_PLANCK18, Omega_L=OMEGA_L_PLANCK18, n_grid=4096):
+    """int_0^z (1+z')^n / E(z') dz', vettorizzato su z (trapezi su griglia fine)"""
+    z = np.asarray(z, dtype=float)
+    z_max = float(np.max(z)) if z.size else 0.0
+    if z_max <= 0:
+        return np.zeros_like(z)
+    grid = np.linspace(0.0, z_max, n_grid)
+    one_plus = 1 + grid
+    Omega_k = 1 - Omega_M - Omega_L
+    integrand = one_plus ** n / np.sqrt(Omega_M * one_plus ** 3 + Omega_k * one_plus ** 2 + Omega_L)
+    cumulative = np.concatenate([[0.0], np.cumsum(0.5 * (integrand[1:] + integrand[:-1]) * np.diff(grid))])
+    return np.interp(z, grid, cumulative)
+
+
+def liv_K(z, n=1, H0=H0_PLANCK18, Omega_M=OMEGA_M_PLANCK18, Omega_L=OMEGA_L_PLANCK18):
+    """K_n(z) in secondi"""
+    return hubble_time(H0) * liv_integral(z, n, Omega_M, Omega_L)
+
+
+def liv_delay(energies, z, E_QG, n=1, E_ref=0.0, sign=1, K=None):
+    """Ritardo LIV (s) per energie in GeV; K precalcolato opzionale"""
+    energies = np.asarray(energies, dtype=float)
+    if K is None:
+        K = liv_K(z, n)
+    return sign * (1 + n) / 2 * (energies ** n - E_ref ** n) / np.asarray(E_QG, dtype=float) ** n * K
+
+
+# ============================================================================
+# GRIGLIA DI PARAMETRI COSMOLOGICI
+# ============================================================================
+
+def liv_K_grid(z, n=1, H0_values=H0_PLANCK18, Omega_M_values=OMEGA_M_PLANCK18,
+               Omega_L_values=OMEGA_L_PLANCK18, n_nodes=64):
+    """
+    K_n(z) in secondi su tutta la griglia (H0, Omega_M, Omega_L) x z in una
+    chiamata: quadratura di Gauss-Legendre su z' = x z, x in [0, 1]
+    (integrando liscio, 64 nodi bastano a ~1e-12 relativo).
+    Restituisce un array (n_H0, n_M, n_L) + z.shape.
+    """
+    z = np.asarray(z, dtype=float)
+    H0 = np.atleast_1d(np.asarray(H0_values, dtype=float))
+    Omega_M = np.atleast_1d(np.asarray(Omega_M_values, dtype=float))[:, None]
+    Omega_L = np.atleast_1d(np.asarray(Omega_L_values, dtype=float))[None, :]
+    Omega_M = Omega_M.reshape(Omega_M.shape + (1,) * (z.ndim + 1))
+    Omega_L = Omega_L.reshape(Omega_L.shape + (1,) * (z.ndim + 1))
+
+    x, w = np.polynomial.legendre.leggauss(n_nodes)
+    x, w = 0.5 * (x + 1), 0.5 * w
+    one_plus = 1 + z[..., None] * x                          # z.shape + (nodi,)
+    Omega_k = 1 - Omega_M - Omega_L
+    integrand = one_plus ** n / np.sqrt(Omega_M * one_plus ** 3 + Omega_k * one_plus ** 2 + Omega_L)
+    integral = z * (integrand @ w)                           # (n_M, n_L) + z.shape
+    return hubble_time(H0).reshape((-1,) + (1,) * (integral.ndim)) * integral
+
+
+def e_qg_from_slope(slope, K, n=1):
+    """E_QG (GeV) da una pendenza fissata dt/d(E^n) (s/GeV^n) e K_n (s)"""
+    slope = np.abs(np.asarray(slope, dtype=float))
+    with np.errstate(divide='ignore'):
+        return ((1 + n) / 2 * np.asarray(K, dtype=float) / slope) ** (1.0 / n)
+
+
+def _weighted_quantiles(values, weights, quantiles):
+    """Quantili pesati lungo l'asse 0 (values: (n_grid, n_grb)), interpolati"""
+    order = np.argsort(values, axis=0)
+    sorted_values = np.take_along_axis(values, order, axis=0)
+    w = weights[order]
+    cumulative = np.cumsum(w, axis=0)
+    cumulative = (cumulative - 0.5 * w) / cumulative[-1]
+    columns = np.arange(values.shape[1])
+    out = []
+    for q in quantiles:
+        hi = np.clip((cumulative < q).sum(axis=0), 1, len(values) - 1)
+        c0, c1 = cumulative[hi - 1, columns], cumulative[hi, columns]
+        v0, v1 = sorted_values[hi - 1, columns], sorted_values[hi, columns]
+        frac = np.clip(np.divide(q - c0, c1 - c0, out=np.zeros_like(c0), where=c1 > c0), 0, 1)
+        out.append(v0 + frac * (v1 - v0))
+    return np.array(out)
+
+
+def liv_sensitivity(slopes, z, n=1, H0_values=H0_PLANCK18, Omega_M_values=OMEGA_M_PLANCK18,
+                    Omega_L_values=OMEGA_L_PLANCK18, prior=None, quantiles=(0.16, 0.5, 0.84)):
+    """
+    Propaga la griglia cosmologica alle stime di E_QG di tutti i GRB insieme,
+    con le pendenze dei fit tenute fisse (i dati non si rigenerano).
+
+    slopes, z: array per GRB; prior: pesi sulla griglia (n_H0, n_M, n_L),
+    uniforme se None. Restituisce K ed E_QG su griglia x GRB, E_QG con la
+    cosmologia Planck 2018 e la banda (min, quantili, max) sul prior.
+    """
+    slopes = np.atleast_1d(np.asarray(slopes, dtype=float))
+    z = np.broadcast_to(np.asarray(z, dtype=float), slopes.shape)
+
+    K = liv_K_grid(z, n, H0_values, Omega_M_values, Omega_L_values)
+    E_QG = e_qg_from_slope(slopes, K, n)
+    grid_shape = K.shape[:3]
+
+    weights = np.ones(grid_shape) if prior is None else np.broadcast_to(np.asarray(prior, dtype=float), grid_shape)
+    flat = E_QG.reshape(-1, len(slopes))
+    band = _weighted_quantiles(flat, weights.ravel(), quantiles)
+
+    return {
+        'H0': np.atleast_1d(np.asarray(H0_values, dtype=float)),
+        'Omega_M': np.atleast_1d(np.asarray(Omega_M_values, dtype=float)),
+        'Omega_L': np.atleast_1d(np.asarray(Omega_L_values, dtype=float)),
+        'K': K,
+        'E_QG': E_QG,
+        'E_QG_reference': e_qg_from_slope(slopes, liv_K(z, n), n),
+        'E_QG_min': flat.min(axis=0),
+        'E_QG_max': flat.max(axis=0),
+        'quantiles': tuple(quantiles),
+        'E_QG_quantiles': band,
+    }
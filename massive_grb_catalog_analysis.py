@@ -13,13 +13,21 @@ DOI: 10.5281/zenodo.17404757
 
 import numpy as np
 import pandas as pd
-import json
 from datetime import datetime
-from scipy import stats
-from sklearn.linear_model import RANSACRegressor
-from sklearn.utils import resample
 import os
 
+from grb_batch_engine import RaggedPhotons, analyze_batch
+
+from figure_renderer import function_hash
+from results_journal import ResultsJournal, fingerprint, write_json_report, write_csv_report
+from liv_cosmology import PLANCK_ENERGY_GEV
+from synthetic_bursts import generate_burst
+
+JOURNAL_FILE = 'massive_grb_catalog_journal.jsonl'
+N_PERMUTATIONS = 20000  # Più permutazioni per analisi massiva
+N_BOOTSTRAP = 10000  # Più bootstrap per analisi massiva
+BATCH_GRBS = 8  # GRB per passaggio del batch engine (journal a fine blocco)
+
 def load_massive_grb_catalog():
     """
     Carica catalogo massivo di GRB reali
@@ -140,7 +148,7 @@ def load_massive_grb_catalog():
     print(f"✅ MASSIVE GRB Catalog loaded: {len(massive_catalog)} GRBs")
     return massive_catalog
 
-def generate_massive_grb_data(grb_name, grb_info):
+def generate_massive_grb_data(grb_name, grb_info, rng=None):
     """
     Genera dati GRB massivi basati su parametri reali
     """
@@ -157,33 +165,20 @@ def generate_massive_grb_data(grb_name, grb_info):
     n_photons = max(200, int(fluence * 1e7))  # Più fotoni per analisi massiva
     n_photons = min(n_photons, 20000)  # Limite realistico per dati reali
     
-    # Genera energia (distribuzione power-law realistica)
-    alpha = -2.0  # Indice spettrale tipico
-    E_min = 0.1   # GeV
-    E_max = 100.0 # GeV
-    
-    # Distribuzione power-law
-    u = np.random.uniform(0, 1, n_photons)
-    E = E_min * (1 - u + u * (E_max/E_min)**(alpha + 1))**(1/(alpha + 1))
-    
-    # Genera tempi (profilo temporale GRB realistico)
-    t_start = trigger_time
-    t_end = trigger_time + t90 * 2  # Estende oltre t90
-    
-    # Profilo temporale (fast-rise, exponential-decay)
-    t_peak = t90 * 0.1
-    t = np.random.exponential(t_peak, n_photons)
-    t = t[t <= t90 * 1.5]
-    t += t_start
-    
-    # Aggiungi effetti QG REALI solo per GRB090902B
-    if grb_name == 'GRB090902B':
-        # Effetto QG: ritardo temporale proporzionale all'energia
-        E_QG = 1e19  # GeV (scala Planck)
-        K_z = (1 + z) * z / 70  # Fattore cosmologico
-        dt_qg = (E / E_QG) * K_z
-        t += dt_qg
-        print(f"   ⚡ REAL QG effects added: E_QG = {E_QG:.2e} GeV")
+    # Profilo FRED (picco a 0.05 t90, decadimento 0.1 t90) e power-law E^-2
+    # in 0.1-100 GeV; LIV lineare con K(z) cosmologico solo per GRB090902B
+    liv = grb_name == 'GRB090902B'
+    burst = generate_burst(
+        n_photons=n_photons, z=z,
+        pulse_peaks=[0.05 * t90], rise=0.005 * t90, decay=0.1 * t90,
+        index=-2.0, E_min=0.1, E_max=100.0,
+        E_QG=PLANCK_ENERGY_GEV if liv else None,
+        rng=rng,
+    )
+    E = burst['energies']
+    t = burst['times'] + trigger_time
+    if liv:
+        print(f"   ⚡ REAL QG effects added: E_QG = {PLANCK_ENERGY_GEV:.2e} GeV")
     
     # Crea DataFrame
     data = pd.DataFrame({
@@ -207,59 +202,29 @@ def generate_massive_grb_data(grb_name, grb_info):
     
     return data
 
-def analyze_massive_grb_data(grb_name, data):
+def analyze_massive_grb_data(grb_name, data, batch_stats=None):
     """
     Analizza dati GRB massivi per effetti QG
+
+    batch_stats: statistiche gia' calcolate da grb_batch_engine.analyze_batch
+    (tutti i GRB in un passaggio); se None il dataset viene analizzato da solo.
     """
     print(f"🔍 Analyzing MASSIVE {grb_name} data for QG effects...")
     
-    # Estrai dati
-    E = data['energy'].values
-    t = data['time'].values
-    z = data['redshift'].iloc[0]
-    trigger_time = data['trigger_time'].iloc[0]
-    
-    # Converti tempi in secondi relativi al trigger
-    t_rel = t - trigger_time
-    
-    # Analisi correlazione energia-tempo
-    pearson_r, pearson_p = stats.pearsonr(E, t_rel)
-    spearman_r, spearman_p = stats.spearmanr(E, t_rel)
-    
-    # Test significatività
-    n = len(E)
-    t_stat = pearson_r * np.sqrt((n-2)/(1-pearson_r**2))
-    sigma = abs(t_stat)
-    
-    # Permutation test (più permutazioni per analisi massiva)
-    n_perm = 20000  # Più permutazioni per analisi massiva
-    perm_correlations = []
-    for _ in range(n_perm):
-        E_perm = np.random.permutation(E)
-        r_perm, _ = stats.pearsonr(E_perm, t_rel)
-        perm_correlations.append(r_perm)
-    
-    perm_p = np.mean(np.abs(perm_correlations) >= abs(pearson_r))
-    
-    # Bootstrap analysis (più bootstrap per analisi massiva)
-    n_bootstrap = 10000  # Più bootstrap per analisi massiva
-    bootstrap_correlations = []
-    for _ in range(n_bootstrap):
-        indices = resample(range(n), n_samples=n)
-        E_bs = E[indices]
-        t_bs = t_rel[indices]
-        r_bs, _ = stats.pearsonr(E_bs, t_bs)
-        bootstrap_correlations.append(r_bs)
-    
-    bootstrap_ci = np.percentile(bootstrap_correlations, [2.5, 97.5])
-    
-    # RANSAC regression
-    X = E.reshape(-1, 1)
-    y = t_rel
-    ransac = RANSACRegressor(random_state=42)
-    ransac.fit(X, y)
-    slope = ransac.estimator_.coef_[0]
-    inliers = np.sum(ransac.inlier_mask_)
+    if batch_stats is None:
+        batch_stats = analyze_batch(RaggedPhotons.from_frames({grb_name: data}),
+                                    n_permutations=N_PERMUTATIONS, n_bootstrap=N_BOOTSTRAP)[grb_name]
+    
+    # Correlazioni, permutation test, bootstrap e RANSAC dal batch engine
+    z = batch_stats['redshift']
+    n = batch_stats['n_photons']
+    pearson_r, pearson_p = batch_stats['pearson_r'], batch_stats['pearson_p']
+    spearman_r, spearman_p = batch_stats['spearman_r'], batch_stats['spearman_p']
+    sigma = abs(batch_stats['t_stat'])
+    perm_p = batch_stats['permutation_p']
+    bootstrap_ci = batch_stats['bootstrap_ci']
+    slope = batch_stats['ransac_slope']
+    inliers = batch_stats['ransac_inliers']
     inlier_ratio = inliers / n
     
     # Stima E_QG
@@ -276,8 +241,8 @@ def analyze_massive_grb_data(grb_name, data):
         'grb_name': grb_name,
         'redshift': z,
         'n_photons': n,
-        'energy_range': [E.min(), E.max()],
-        'time_range': [t_rel.min(), t_rel.max()],
+        'energy_range': [batch_stats['energy_min'], batch_stats['energy_max']],
+        'time_range': [batch_stats['time_min'], batch_stats['time_max']],
         'pearson_r': pearson_r,
         'pearson_p': pearson_p,
         'spearman_r': spearman_r,
@@ -300,9 +265,15 @@ def analyze_massive_grb_data(grb_name, data):
     
     return results
 
-def massive_grb_catalog_analysis():
+def massive_grb_catalog_analysis(journal_path=JOURNAL_FILE, resume=True):
     """
     Analisi massiva catalogo GRB
+
+    I GRB mancanti vengono generati e analizzati dal batch engine a blocchi
+    di BATCH_GRBS; ogni blocco viene scritto nel journal appena analizzato;
+    con resume=True
+    i GRB gia' completati (stessi parametri di catalogo e stesso codice di
+    analisi) vengono saltati.
     """
     print("🚀 MASSIVE GRB CATALOG ANALYSIS")
     print("=" * 60)
@@ -314,88 +285,125 @@ def massive_grb_catalog_analysis():
     # Carica catalogo massivo
     massive_catalog = load_massive_grb_catalog()
     
-    # Analizza ogni GRB
-    results = {}
-    qg_effects = []
+    # Journal per GRB: la configurazione e' il codice di generazione + analisi
+    journal = ResultsJournal(journal_path, config={
+        'generator': function_hash(generate_massive_grb_data),
+        'analysis': function_hash(analyze_massive_grb_data)
+    })
     
     print(f"🛰️ Analyzing {len(massive_catalog)} MASSIVE GRBs...")
     
-    for i, (grb_name, grb_info) in enumerate(massive_catalog.items(), 1):
-        print(f"\n🔍 Analyzing MASSIVE {grb_name} ({i}/{len(massive_catalog)})...")
-        
-        try:
-            # Genera dati massivi
-            data = generate_massive_grb_data(grb_name, grb_info)
+    # Blocchi di GRB: generazione, analisi vettorizzata e journal blocco per
+    # blocco, cosi' un crash perde al piu' il blocco in corso. Ogni GRB ha un
+    # generatore seminato dal proprio input_hash (dati, permutazioni e
+    # bootstrap): i risultati non dipendono dal blocco ne' dal resume
+    names = list(massive_catalog)
+    current = {grb_name: fingerprint(grb_info) for grb_name, grb_info in massive_catalog.items()}
+    for start in range(0, len(names), BATCH_GRBS):
+        pending = {}
+        for i, grb_name in enumerate(names[start:start + BATCH_GRBS], start + 1):
+            grb_info = massive_catalog[grb_name]
+            input_hash = current[grb_name]
+            if resume and journal.is_done(grb_name, input_hash):
+                print(f"\n⏭️  {grb_name} ({i}/{len(names)}) already in journal, skipping")
+                continue
             
-            # Analizza GRB
-            result = analyze_massive_grb_data(grb_name, data)
-            results[grb_name] = result
+            print(f"\n🔍 Generating MASSIVE {grb_name} ({i}/{len(names)})...")
             
-            if result['significant']:
-                qg_effects.append(grb_name)
-                print(f"   🚨 QG EFFECT DETECTED in {grb_name}!")
-                
-        except Exception as e:
-            print(f"❌ Error analyzing {grb_name}: {e}")
+            try:
+                rng = np.random.default_rng(int(input_hash[:16], 16))
+                pending[grb_name] = (generate_massive_grb_data(grb_name, grb_info, rng), input_hash, rng)
+            except Exception as e:
+                print(f"❌ Error generating {grb_name}: {e}")
+                journal.record(grb_name, {'error': str(e)}, status='FAILED', input_hash=input_hash)
+        
+        if not pending:
             continue
+        
+        # Un solo passaggio vettorizzato per il blocco (layout ragged)
+        print(f"\n⚡ Batch analysis of {len(pending)} GRBs "
+              f"({N_PERMUTATIONS} permutations, {N_BOOTSTRAP} bootstrap)...")
+        photons = RaggedPhotons.from_frames({name: data for name, (data, _, _) in pending.items()})
+        batch = analyze_batch(photons, n_permutations=N_PERMUTATIONS, n_bootstrap=N_BOOTSTRAP,
+                              rng=[pending[name][2] for name in photons.names])
+        
+        for grb_name, (data, input_hash, _) in pending.items():
+            try:
+                result = analyze_massive_grb_data(grb_name, data, batch[grb_name])
+                journal.record(grb_name, result, input_hash=input_hash)
+                
+                if result['significant']:
+                    print(f"   🚨 QG EFFECT DETECTED in {grb_name}!")
+                    
+            except Exception as e:
+                print(f"❌ Error analyzing {grb_name}: {e}")
+                journal.record(grb_name, {'error': str(e)}, status='FAILED', input_hash=input_hash)
+    
+    # Analisi statistica popolazione (in streaming sul journal, solo il catalogo attuale)
+    n_total = 0
+    qg_effects = []
+    for grb_name, result in journal.results(current=current):
+        n_total += 1
+        if result['significant']:
+            qg_effects.append(grb_name)
     
-    # Analisi statistica popolazione
     print(f"\n📊 MASSIVE POPULATION ANALYSIS:")
-    print(f"   Total GRBs: {len(results)}")
+    print(f"   Total GRBs: {n_total}")
     print(f"   QG Effects Detected: {len(qg_effects)}")
-    print(f"   Success Rate: {len(qg_effects)/len(results):.1%}")
+    print(f"   Success Rate: {len(qg_effects)/max(n_total, 1):.1%}")
     
     if qg_effects:
         print(f"   🚨 QG EFFECTS FOUND in: {', '.join(qg_effects)}")
     
     # Salva risultati
-    save_massive_results(results, qg_effects)
+    save_massive_results(journal, n_total, qg_effects, current)
     
     print("=" * 60)
     print("🎉 MASSIVE GRB CATALOG ANALYSIS COMPLETE!")
     print("📊 Check generated files for MASSIVE results")
     print("=" * 60)
 
-def save_massive_results(results, qg_effects):
+def save_massive_results(journal, n_total, qg_effects, current=None):
     """
-    Salva risultati analisi massiva
+    Salva risultati analisi massiva, leggendo in streaming dal journal
+    (current: GRB del catalogo attuale -> input_hash, vedi ResultsJournal.results)
     """
     print("💾 Saving MASSIVE GRB catalog analysis results...")
     
     # Salva risultati JSON
-    results_data = {
+    header = {
         'analysis_date': datetime.now().isoformat(),
         'analysis_type': 'MASSIVE_GRB_CATALOG',
-        'total_grbs': len(results),
+        'total_grbs': n_total,
         'qg_effects_detected': len(qg_effects),
-        'success_rate': len(qg_effects) / len(results),
-        'qg_effects': qg_effects,
-        'grb_results': results
+        'success_rate': len(qg_effects) / max(n_total, 1),
+        'qg_effects': qg_effects
     }
-    
-    with open('massive_grb_catalog_results.json', 'w') as f:
-        json.dump(results_data, f, indent=2, default=str)
+    write_json_report('massive_grb_catalog_results.json', header, journal.results(current=current),
+                      items_key='grb_results')
     
     # Salva summary CSV
-    summary_data = []
-    for grb_name, result in results.items():
-        summary_data.append({
-            'GRB': grb_name,
-            'Redshift': result['redshift'],
-            'Photons': result['n_photons'],
-            'Correlation': result['pearson_r'],
-            'Significance': result['sigma'],
-            'P_value': result['permutation_p'],
-            'RANSAC_slope': result['ransac_slope'],
-            'RANSAC_inliers': result['ransac_inliers'],
-            'RANSAC_inlier_ratio': result['ransac_inlier_ratio'],
-            'E_QG_GeV': result['E_QG_GeV'],
-            'E_QG_Planck': result['E_QG_Planck'],
-            'Significant': result['significant']
-        })
-    
-    df_summary = pd.DataFrame(summary_data)
-    df_summary.to_csv('massive_grb_catalog_summary.csv', index=False)
+    def summary_rows():
+        for grb_name, result in journal.results(current=current):
+            yield {
+                'GRB': grb_name,
+                'Redshift': result['redshift'],
+                'Photons': result['n_photons'],
+                'Correlation': result['pearson_r'],
+                'Significance': result['sigma'],
+                'P_value': result['permutation_p'],
+                'RANSAC_slope': result['ransac_slope'],
+                'RANSAC_inliers': result['ransac_inliers'],
+                'RANSAC_inlier_ratio': result['ransac_inlier_ratio'],
+                'E_QG_GeV': result['E_QG_GeV'],
+                'E_QG_Planck': result['E_QG_Planck'],
+                'Significant': result['significant']
+            }
+    
+    write_csv_report('massive_grb_catalog_summary.csv', summary_rows(),
+                     ['GRB', 'Redshift', 'Photons', 'Correlation', 'Significance', 'P_value',
+                      'RANSAC_slope', 'RANSAC_inliers', 'RANSAC_inlier_ratio', 'E_QG_GeV',
+                      'E_QG_Planck', 'Significant'])
     
     print("✅ Results saved: massive_grb_catalog_results.json, massive_grb_catalog_summary.csv")
 
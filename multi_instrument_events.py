@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+MULTI-INSTRUMENT EVENT TABLE
+============================
+
+Contenitore colonnare per fotoni di piu' strumenti (Fermi LAT, Swift, LHAASO).
+Ogni strumento e' un blocco di colonne separato; unita' di energia e offset
+temporali sono metadati applicati solo in lettura, quindi combinare strumenti
+non copia i dati. Il codice strumento e' un intero (categorico), e le
+statistiche per strumento sono un unico group-by vettoriale.
+
+Autore: Christian Quintino De Luca
+Affiliazione: RTH Italia - Research & Technology Hub
+"""
+
+import numpy as np
+
+from lazy_imports import lazy_module
+
+pd = lazy_module('pandas')
+
+# Fattori di conversione verso GeV
+ENERGY_UNITS_TO_GEV = {
+    'keV': 1e-6,
+    'MeV': 1e-3,
+    'GeV': 1.0,
+    'TeV': 1e3,
+}
+
+
+class MultiInstrumentEventTable:
+    """
+    Tabella eventi multi-strumento con normalizzazione lazy di unita' e tempi
+    """
+
+    def __init__(self, t0=None):
+        self.t0 = t0
+        self.blocks = {}
+        self.metadata = {}
+        self.instrument_names = []
+
+    def add_instrument(self, name, time, energy, energy_unit='GeV', time_offset=0.0, **columns):
+        """
+        Registra un blocco di colonne per uno strumento (senza copia)
+        """
+        if energy_unit not in ENERGY_UNITS_TO_GEV:
+            raise ValueError(f"Unknown energy unit: {energy_unit}")
+
+        time = np.asarray(time)
+        energy = np.asarray(energy)
+        if len(time) != len(energy):
+            raise ValueError(f"{name}: time and energy lengths differ")
+
+        block = {'time': time, 'energy': energy}
+        for key, values in columns.items():
+            block[key] = np.asarray(values)
+
+        if name not in self.blocks:
+            self.instrument_names.append(name)
+        self.blocks[name] = block
+        self.metadata[name] = {
+            'energy_unit': energy_unit,
+            'energy_scale': ENERGY_UNITS_TO_GEV[energy_unit],
+            'time_offset': float(time_offset),
+        }
+        return self
+
+    @classmethod
+    def from_dataframes(cls, data_list, energy_units=None, time_offsets=None, t0=None):
+        """
+        Costruisce la tabella da DataFrame con colonne 'time', 'energy', 'instrument'
+        """
+        energy_units = energy_units or {}
+        time_offsets = time_offsets or {}
+        table = cls(t0=t0)
+        for df in data_list:
+            name = str(df['instrument'].iloc[0])
+            extra = {col: df[col].to_numpy() for col in df.columns
+                     if col not in ('time', 'energy', 'instrument')}
+            table.add_instrument(name, df['time'].to_numpy(), df['energy'].to_numpy(),
+                                 energy_unit=energy_units.get(name, 'GeV'),
+                                 time_offset=time_offsets.get(name, 0.0), **extra)
+        if t0 is None:
+            table.t0 = table.earliest_time()
+        return table
+
+    def earliest_time(self):
+        """Primo fotone (con offset applicati) tra tutti gli strumenti"""
+        return min(block['time'].min() + self.metadata[name]['time_offset']
+                   for name, block in self.blocks.items() if len(block['time']) > 0)
+
+    def set_time_offset(self, instrument, offset):
+        """Aggiorna l'offset temporale di uno strumento (nessun ricalcolo)"""
+        self.metadata[instrument]['time_offset'] = float(offset)
+
+    def __len__(self):
+        return sum(len(block['time']) for block in self.blocks.values())
+
+    def counts(self):
+        """Numero di fotoni per strumento"""
+        return {name: len(self.blocks[name]['time']) for name in self.instrument_names}
+
+    def _read_block(self, name, column):
+        block = self.blocks[name]
+        meta = self.metadata[name]
+        if column == 'energy_GeV':
+            return block['energy'] * meta['energy_scale']
+        if column == 'time_rel':
+            t0 = self.t0 if self.t0 is not None else 0.0
+            return block['time'] + (meta['time_offset'] - t0)
+        if column == 'time_aligned':
+            return block['time'] + meta['time_offset']
+        return block[column]
+
+    def column(self, column, instrument=None):
+        """
+        Legge una colonna normalizzata ('energy_GeV', 'time_rel', 'time_aligned'
+        o colonna grezza) per uno strumento o per tutti
+        """
+        if instrument is not None:
+            return self._read_block(instrument, column)
+        return np.concatenate([self._read_block(name, column) for name in self.instrument_names])
+
+    @property
+    def instrument_codes(self):
+        """Codici interi dello strumento per fotone (ordine di inserimento)"""
+        counts = [len(self.blocks[name]['time']) for name in self.instrument_names]
+        return np.repeat(np.arange(len(counts), dtype=np.int16), counts)
+
+    @property
+    def instrument(self):
+        """Etichetta strumento come pd.Categorical (confrontabile con stringhe)"""
+        return pd.Categorical.from_codes(self.instrument_codes, categories=self.instrument_names)
+
+    def to_dict(self, columns=('time_rel', 'energy_GeV')):
+        """Dizionario di array concatenati, con 'instrument' categorico"""
+        data = {col: self.column(col) for col in columns}
+        data['instrument'] = self.instrument
+        return data
+
+    def to_dataframe(self, columns=None):
+        """DataFrame combinato con colonne grezze e normalizzate"""
+        if columns is None:
+            shared = set.intersection(*(set(block) for block in self.blocks.values()))
+            raw = [col for col in self.blocks[self.instrument_names[0]] if col in shared]
+            columns = raw + ['time_rel', 'energy_GeV']
+        df = pd.DataFrame({col: self.column(col) for col in columns})
+        df['instrument'] = self.instrument
+        return df
+
+    def grouped_stats(self, x='energy_GeV', y='time_rel'):
+        """
+        Statistiche per strumento in un unico group-by vettoriale:
+        n, medie, deviazioni standard e correlazione di Pearson tra x e y
+        """
+        codes = self.instrument_codes
+        xv = self.column(x)
+        yv = self.column(y)
+        n_groups = len(self.instrument_names)
+
+        n = np.bincount(codes, minlength=n_groups).astype(float)
+        safe_n = np.maximum(n, 1)
+        mean_x = np.bincount(codes, weights=xv, minlength=n_groups) / safe_n
+        mean_y = np.bincount(codes, weights=yv, minlength=n_groups) / safe_n
+
+        dx = xv - mean_x[codes]
+        dy = yv - mean_y[codes]
+        sxx = np.bincount(codes, weights=dx * dx, minlength=n_groups)
+        syy = np.bincount(codes, weights=dy * dy, minlength=n_groups)
+        sxy = np.bincount(codes, weights=dx * dy, minlength=n_groups)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            r = sxy / np.sqrt(sxx * syy)
+
+        return pd.DataFrame({
+            'instrument': self.instrument_names,
+            'n_photons': n.astype(int),
+            f'mean_{x}': mean_x,
+            f'mean_{y}': mean_y,
+            f'std_{x}': np.sqrt(sxx / safe_n),
+            f'std_{y}': np.sqrt(syy / safe_n),
+            'pearson_r': r,
+        })
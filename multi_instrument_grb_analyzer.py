@@ -26,6 +26,7 @@ import json
 import os
 from datetime import datetime
 import warnings
+from multi_instrument_events import MultiInstrumentEventTable
 warnings.filterwarnings('ignore')
 
 # Configurazione plotting
@@ -40,6 +41,8 @@ class MultiInstrumentGRBAnalyzer:
     def __init__(self):
         self.instruments = {}
         self.combined_data = None
+        self.event_table = None
+        self.t0_common = None
         self.results = {}
         
     def load_fermi_lat_data(self):
@@ -195,15 +198,11 @@ class MultiInstrumentGRBAnalyzer:
         # Trova T0 comune (primo fotone)
         t0_common = min([df['time'].min() for df in data_list])
         
-        # Allinea tutti i dati
-        aligned_data = []
-        for df in data_list:
-            df_aligned = df.copy()
-            df_aligned['time_rel'] = df_aligned['time'] - t0_common
-            aligned_data.append(df_aligned)
+        # time_rel viene calcolato in lettura dalla event table (nessuna copia)
+        self.t0_common = t0_common
         
         print(f"✅ Time alignment: T0 = {t0_common:.1f} s")
-        return aligned_data, t0_common
+        return data_list, t0_common
     
     def combine_instruments(self, data_list):
         """
@@ -211,16 +210,13 @@ class MultiInstrumentGRBAnalyzer:
         """
         print("🔗 Combining data from all instruments...")
         
-        # Combina tutti i DataFrame
-        combined = pd.concat(data_list, ignore_index=True)
-        
-        # Converti unità energia in GeV
-        combined['energy_GeV'] = combined['energy'].copy()
-        combined.loc[combined['instrument'] == 'LHAASO', 'energy_GeV'] *= 1000  # TeV to GeV
+        # Blocchi per strumento; conversione TeV -> GeV e T0 applicati in lettura
+        self.event_table = MultiInstrumentEventTable.from_dataframes(
+            data_list, energy_units={'LHAASO': 'TeV'}, t0=self.t0_common)
+        combined = self.event_table.to_dataframe()
         
         print(f"✅ Combined dataset: {len(combined)} total photons")
-        for instrument in combined['instrument'].unique():
-            n = len(combined[combined['instrument'] == instrument])
+        for instrument, n in self.event_table.counts().items():
             print(f"   {instrument}: {n} photons")
         
         return combined
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+PACKAGE BUILDER - Pacchetti Zenodo deduplicati e compressi in parallelo
+=======================================================================
+- deduplicazione per hash SHA-256 del contenuto: file identici presenti in
+  piu' cartelle (zenodo_package_v2/, zenodo_complete_submission_package/, ...)
+  vengono compressi una sola volta e il blob viene riscritto per ogni path.
+  Lo ZIP contiene sempre l'albero completo (un membro ZIP non puo'
+  condividere i dati di un altro); nel manifest i duplicati puntano al path
+  canonico con duplicate_of
+- compressione deflate per membro in parallelo (thread: zlib rilascia il GIL)
+- STORED per formati gia' compressi (PNG, JPG, ZIP, GZ, ...)
+- manifest JSON con checksum SHA-256 incluso nello ZIP
+- rebuild incrementali: i blob compressi sono in cache per hash, quindi
+  solo i membri cambiati vengono ricompressi
+
+Uso:
+    python package_builder.py quantum-gravity-discovery-v1.1.0.zip zenodo_package_v2 zenodo_quantum_gravity_discovery
+
+Autore: Christian Quintino De Luca
+Affiliazione: RTH Italia - Research & Technology Hub
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import struct
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# Formati gia' compressi: nessun guadagno dal deflate
+STORED_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.zip', '.gz', '.bz2', '.xz', '.7z', '.xlsx', '.docx'}
+
+CACHE_DIR = '.package_cache'
+MANIFEST_NAME = 'MANIFEST.sha256.json'
+
+METHOD_STORED = 0
+METHOD_DEFLATED = 8
+
+
+def sha256_file(path, chunk_size=1 << 20):
+    """SHA-256 di un file a blocchi"""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def collect_files(sources, base_dir, exclude=(CACHE_DIR, '__pycache__', '.git')):
+    """Lista (path, arcname) di tutti i file delle sorgenti, ordinata"""
+    entries = []
+    for source in sources:
+        if os.path.isfile(source):
+            entries.append((source, os.path.relpath(source, base_dir)))
+            continue
+        for root, dirs, files in os.walk(source):
+            dirs[:] = sorted(d for d in dirs if d not in exclude)
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                entries.append((path, os.path.relpath(path, base_dir)))
+    return [(p, a.replace(os.sep, '/')) for p, a in entries]
+
+
+def _compress_member(path, digest, method, level, cache_dir):
+    """Comprime un membro (o lo legge dalla cache). Ritorna (crc, size, blob, cached)"""
+    # Il livello fa parte della chiave: lo stesso contenuto a un altro livello e' un altro blob
+    suffix = f'deflate{level}' if method == METHOD_DEFLATED else 'stored'
+    cache_path = os.path.join(cache_dir, f"{digest}.{suffix}") if cache_dir else None
+    meta_path = cache_path + '.json' if cache_path else None
+
+    if cache_path and os.path.exists(cache_path) and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        with open(cache_path, 'rb') as f:
+            return meta['crc'], meta['size'], f.read(), True
+
+    with open(path, 'rb') as f:
+        data = f.read()
+    crc = zlib.crc32(data) & 0xffffffff
+    if method == METHOD_DEFLATED:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        blob = compressor.compress(data) + compressor.flush()
+    else:
+        blob = data
+
+    if cache_path:
+        tmp = cache_path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(blob)
+        os.replace(tmp, cache_path)
+        with open(meta_path, 'w') as f:
+            json.dump({'crc': crc, 'size': len(data)}, f)
+
+    return crc, len(data), blob, False
+
+
+def _dos_datetime(timestamp):
+    t = time.localtime(max(timestamp, 315532800))  # ZIP non rappresenta date < 1980
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    dos_date = ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    return dos_time, dos_date
+
+
+class _ZipWriter:
+    """Scrittore ZIP minimale per blob gia' compressi (niente ZIP64: < 4 GB)"""
+
+    def __init__(self, fileobj):
+        self.f = fileobj
+        self.central = []
+
+    def add(self, arcname, method, crc, size, blob, mtime):
+        name = arcname.encode('utf-8')
+        if len(blob) >= 0xffffffff or size >= 0xffffffff or self.f.tell() >= 0xffffffff:
+            raise ValueError("Package too large for non-ZIP64 archive")
+        offset = self.f.tell()
+        dos_time, dos_date = _dos_datetime(mtime)
+        flags = 0x800  # nomi UTF-8
+        self.f.write(struct.pack('<IHHHHHIIIHH', 0x04034b50, 20, flags, method, dos_time, dos_date,
+                                 crc, len(blob), size, len(name), 0))
+        self.f.write(name)
+        self.f.write(blob)
+        self.central.append(struct.pack('<IHHHHHHIIIHHHHHII', 0x02014b50, 20, 20, flags, method,
+                                        dos_time, dos_date, crc, len(blob), size, len(name),
+                                        0, 0, 0, 0, (0o644 << 16), offset) + name)
+
+    def close(self):
+        cd_offset = self.f.tell()
+        for entry in self.central:
+            self.f.write(entry)
+        cd_size = self.f.tell() - cd_offset
+        n = len(self.central)
+        self.f.write(struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, n, n, cd_size, cd_offset, 0))
+
+
+def build_package(sources, zip_path, base_dir='.', workers=None, level=6,
+                  cache_dir=CACHE_DIR, version=None, verbose=True):
+    """
+    Costruisce lo ZIP (tutti i path, contenuti duplicati compressi una volta)
+    con manifest SHA-256.
+
+    Ritorna il manifest (dict).
+    """
+    entries = collect_files(sources, base_dir)
+    workers = workers or min(32, (os.cpu_count() or 1) + 4)
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+
+    # 1. Hash di tutti i file in parallelo
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        digests = list(pool.map(sha256_file, [p for p, _ in entries]))
+
+    # 2. Deduplicazione: il primo path per contenuto e' quello canonico
+    canonical = {}
+    files = []
+    for (path, arcname), digest in zip(entries, digests):
+        ext = os.path.splitext(arcname)[1].lower()
+        method = METHOD_STORED if ext in STORED_EXTENSIONS else METHOD_DEFLATED
+        is_duplicate = digest in canonical
+        if not is_duplicate:
+            canonical[digest] = arcname
+        files.append({
+            'path': arcname,
+            'sha256': digest,
+            'size': os.path.getsize(path),
+            'method': 'stored' if method == METHOD_STORED else 'deflated',
+            'duplicate_of': canonical[digest] if is_duplicate else None,
+            '_source': path,
+            '_method': method,
+            '_unique': not is_duplicate
+        })
+
+    unique = [f for f in files if f['_unique']]
+
+    # 3. Compressione per membro in parallelo (con cache per hash)
+    def compress(entry):
+        return _compress_member(entry['_source'], entry['sha256'], entry['_method'], level, cache_dir)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        blobs = dict(zip((f['sha256'] for f in unique), pool.map(compress, unique)))
+
+    # 4. Scrittura ZIP + manifest
+    manifest = {
+        'version': version,
+        'created': datetime.now().isoformat(),
+        'n_files': len(files),
+        'n_unique': len(unique),
+        'total_bytes': sum(f['size'] for f in files),
+        'unique_bytes': sum(f['size'] for f in unique),
+        'files': [{k: v for k, v in f.items() if not k.startswith('_')} for f in files]
+    }
+
+    n_recompressed = 0
+    tmp_zip = zip_path + '.tmp'
+    with open(tmp_zip, 'wb') as out:
+        writer = _ZipWriter(out)
+        for entry in files:
+            crc, size, blob, cached = blobs[entry['sha256']]
+            n_recompressed += entry['_unique'] and not cached
+            writer.add(entry['path'], entry['_method'], crc, size, blob, os.path.getmtime(entry['_source']))
+            if verbose:
+                mark = '🔗' if not entry['_unique'] else ('♻️ ' if cached else '✅')
+                print(f"   {mark} {entry['path']}")
+
+        manifest_bytes = json.dumps(manifest, indent=2).encode('utf-8')
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        writer.add(MANIFEST_NAME, METHOD_DEFLATED, zlib.crc32(manifest_bytes) & 0xffffffff,
+                   len(manifest_bytes), compressor.compress(manifest_bytes) + compressor.flush(),
+                   time.time())
+        writer.close()
+    os.replace(tmp_zip, zip_path)
+
+    manifest_path = os.path.splitext(zip_path)[0] + '.manifest.json'
+    with open(manifest_path, 'w') as f:
+        f.write(manifest_bytes.decode('utf-8'))
+
+    if verbose:
+        print(f"📦 {zip_path}: {len(files)} files ({len(unique)} unique contents), "
+              f"{n_recompressed} compressed, {len(unique) - n_recompressed} from cache")
+        print(f"📊 Compression skipped for duplicates: "
+              f"{(manifest['total_bytes'] - manifest['unique_bytes']) / 1e6:.1f} MB")
+
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a deduplicated Zenodo ZIP package")
+    parser.add_argument('zip_path')
+    parser.add_argument('sources', nargs='+')
+    parser.add_argument('--version', default=None)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--no-cache', action='store_true')
+    args = parser.parse_args()
+
+    build_package(args.sources, args.zip_path, workers=args.workers, version=args.version,
+                  cache_dir=None if args.no_cache else CACHE_DIR)
+
+
+if __name__ == "__main__":
+    main()
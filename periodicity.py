@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+PERIODICITY - Ricerca di periodicita' su tempi di arrivo non binnati
+====================================================================
+Niente interpolazione su griglia uniforme: tutte le potenze sono somme
+trigonometriche sui fotoni, sum_j w_j exp(-2 pi i f t_j), valutate su una
+griglia uniforme di frequenze con una NUFFT di tipo 1 (gridding gaussiano,
+Greengard & Lee 2004; numpy/scipy.fft, accuratezza ~1e-12):
+
+- Rayleigh / Z^2_n (Buccheri et al. 1983) sui tempi di arrivo:
+  Z^2_n = 2/N sum_{h=1..n} |sum_j exp(-2 pi i h f t_j)|^2, chi2 con 2n dof
+  (rate costante come ipotesi nulla, finestra rettangolare sottratta:
+  per un burst f_min va messa sopra la scala di variabilita' della curva
+  di luce)
+- Lomb-Scargle generalizzato (media libera, normalizzazione standard)
+  di un valore per fotone (es. energia) ai tempi di arrivo: tre NUFFT
+  (y a f, 1 a f, 1 a 2f), stesse formule del metodo veloce di Press & Rybicki
+- false alarm probability corrette per i trial sull'intera banda:
+  Lomb-Scargle con l'approssimazione di Baluev (2008), Z^2_n con la
+  stessa costruzione (attraversamenti di Davies per un processo chi2)
+
+10^5 fotoni su 10^6 frequenze: pochi secondi (una FFT da ~2^21 punti
+per somma).
+
+    result = periodicity_search(times, values=energies, f_max=50.0)
+    result['z2n']['fap'], result['lomb_scargle']['best_frequency']
+
+Autore: Christian Quintino De Luca
+Affiliazione: RTH Italia - Research & Technology Hub
+"""
+
+import numpy as np
+
+from lazy_imports import lazy_module
+from significance import logp_to_sigma
+
+fft = lazy_module('scipy.fft')
+special = lazy_module('scipy.special')
+stats = lazy_module('scipy.stats')
+
+# Gridding gaussiano: oversampling della griglia FFT e semi-ampiezza del kernel
+NUFFT_OVERSAMPLING = 2
+NUFFT_SPREAD = 12
+# Elementi (fotoni x punti del kernel) per blocco di spreading
+SPREAD_BLOCK = 4_000_000
+
+DEFAULT_OVERSAMPLE = 5
+MAX_FREQUENCIES = 1 << 22
+FAP_THRESHOLD = 0.0027       # 3 sigma
+
+
+# ============================================================================
+# GRIGLIA DI FREQUENZE
+# ============================================================================
+
+class FrequencyGrid:
+    """Griglia uniforme f_k = f_min + k df, k = 0..n-1"""
+
+    def __init__(self, f_min, df, n):
+        self.f_min = float(f_min)
+        self.df = float(df)
+        self.n = int(n)
+
+    @classmethod
+    def for_times(cls, times, f_min=None, f_max=None, oversample=DEFAULT_OVERSAMPLE,
+                  n_frequencies=None):
+        """
+        Griglia standard per tempi di arrivo su una durata T: passo
+        1 / (oversample T), da 1/T fino a f_max (default N / 2T, il Nyquist
+        della frequenza media dei fotoni), al piu' MAX_FREQUENCIES punti.
+        """
+        times = np.asarray(times, dtype=float)
+        span = float(times.max() - times.min())
+        if span <= 0:
+            raise ValueError("Periodicity search needs photons at different times")
+        f_min = 1.0 / span if f_min is None else float(f_min)
+        f_max = 0.5 * len(times) / span if f_max is None else float(f_max)
+        if f_max <= f_min:
+            raise ValueError(f"f_max ({f_max}) must be larger than f_min ({f_min})")
+        if n_frequencies is None:
+            df = 1.0 / (oversample * span)
+            n_frequencies = min(int((f_max - f_min) / df) + 1, MAX_FREQUENCIES)
+        df = (f_max - f_min) / max(n_frequencies - 1, 1)
+        return cls(f_min, df, n_frequencies)
+
+    @property
+    def f_max(self):
+        return self.f_min + (self.n - 1) * self.df
+
+    @property
+    def frequencies(self):
+        return self.f_min + self.df * np.arange(self.n)
+
+    def harmonic(self, h):
+        """Griglia delle frequenze h f_k"""
+        return FrequencyGrid(h * self.f_min, h * self.df, self.n)
+
+
+# ============================================================================
+# NUFFT
+# ============================================================================
+
+def nufft_sums(times, weights, grid):
+    """
+    S_k = sum_j w_j exp(-2 pi i f_k t_j) su tutta la griglia (pesi reali o
+    complessi). NUFFT di tipo 1: spreading con kernel gaussiano su una
+    griglia periodica sovracampionata, FFT, deconvoluzione del kernel.
+    """
+    t = np.asarray(times, dtype=float)
+    w = np.broadcast_to(np.asarray(weights), t.shape)
+    M = grid.n
+    half = M // 2
+    R, spread = NUFFT_OVERSAMPLING, NUFFT_SPREAD
+
+    # Fase riferita al centro dell'intervallo (numeri piccoli), frequenze
+    # centrate: k = -half .. M - half - 1 attorno a f_center
+    t_ref = 0.5 * (t.min() + t.max())
+    tc = t - t_ref
+    f_center = grid.f_min + half * grid.df
+    c = w * np.exp(-2j * np.pi * f_center * tc)
+    x = np.mod(2 * np.pi * grid.df * tc, 2 * np.pi)
+
+    # Griglie piccole: il kernel vuole almeno 4 spread punti, quindi i modi
+    # sono imbottiti a M_pad; tau segue il sovracampionamento reale size / M_pad
+    # (next_fast_len puo' allargare la griglia), i modi extra non si usano
+    M_pad = max(M, -(-4 * spread // R))
+    size = fft.next_fast_len(R * M_pad)
+    r_eff = size / M_pad
+    h = 2 * np.pi / size
+    tau = np.pi * spread / (M_pad * M_pad * r_eff * (r_eff - 0.5))
+
+    offsets = np.arange(-spread + 1, spread + 1)
+    grid_values = np.zeros(size, dtype=complex)
+    step = max(1, SPREAD_BLOCK // len(offsets))
+    for start in range(0, len(x), step):
+        xs, cs = x[start:start + step], c[start:start + step]
+        m = np.floor(xs / h).astype(np.int64)[:, None] + offsets
+        kernel = np.exp(-(xs[:, None] - m * h) ** 2 / (4 * tau))
+        index = (m % size).ravel()
+        values = (cs[:, None] * kernel).ravel()
+        grid_values += (np.bincount(index, values.real, minlength=size)
+                        + 1j * np.bincount(index, values.imag, minlength=size))
+
+    k = np.arange(-half, M - half)
+    F = fft.fft(grid_values)[k % size] / size
+    sums = np.sqrt(np.pi / tau) * np.exp(k * k * tau) * F
+    # fase assoluta: exp(-2 pi i f t) = exp(-2 pi i f tc) exp(-2 pi i f t_ref)
+    return sums * np.exp(-2j * np.pi * grid.frequencies * t_ref)
+
+
+# ============================================================================
+# POTENZE
+# ============================================================================
+
+def z2n_power(times, grid, n_harmonics=1):
+    """
+    Z^2_n dei tempi di arrivo (n_harmonics = 1: test di Rayleigh). La somma
+    attesa per rate costante nella finestra [t_min, t_max],
+    N exp(-2 pi i f t_mid) sinc(f T), e' sottratta: senza, le frequenze
+    vicine a 1/T risultano significative per il solo effetto di finestra.
+    """
+    times = np.asarray(times, dtype=float)
+    N = len(times)
+    t_mid = 0.5 * (times.min() + times.max())
+    span = times.max() - times.min()
+    power = np.zeros(grid.n)
+    for h in range(1, n_harmonics + 1):
+        harmonic = grid.harmonic(h)
+        f = harmonic.frequencies
+        window = N * np.exp(-2j * np.pi * f * t_mid) * np.sinc(f * span)
+        power += np.abs(nufft_sums(times, 1.0, harmonic) - window) ** 2
+    return 2.0 / N * power
+
+
+def rayleigh_power(times, grid):
+    return z2n_power(times, grid, 1)
+
+
+def lomb_scargle_power(times, values, grid):
+    """
+    Lomb-Scargle generalizzato (media libera) di values(t), normalizzazione
+    standard (potenza in [0, 1], frazione di varianza spiegata).
+    """
+    times = np.asarray(times, dtype=float)
+    y = np.asarray(values, dtype=float)
+    w = np.full(len(times), 1.0 / len(times))
+    y = y - np.dot(w, y)
+    YY = np.dot(w, y * y)
+
+    # sum w exp(-i w t) = C - i S
+    first = nufft_sums(times, w, grid)
+    second = nufft_sums(times, w, grid.harmonic(2))
+    weighted = nufft_sums(times, w * y, grid)
+    C, S = first.real, -first.imag
+    C2, S2 = second.real, -second.imag
+    Ch, Sh = weighted.real, -weighted.imag
+
+    tan_2omega_tau = (S2 - 2 * S * C) / (C2 - (C * C - S * S))
+    S2w = tan_2omega_tau / np.sqrt(1 + tan_2omega_tau ** 2)
+    C2w = 1 / np.sqrt(1 + tan_2omega_tau ** 2)
+    Cw = np.sqrt(0.5) * np.sqrt(1 + C2w)
+    Sw = np.sqrt(0.5) * np.sign(S2w) * np.sqrt(1 - C2w)
+
+    YC = Ch * Cw + Sh * Sw
+    YS = Sh * Cw - Ch * Sw
+    CC = 0.5 * (1 + C2 * C2w + S2 * S2w) - (C * Cw + S * Sw) ** 2
+    SS = 0.5 * (1 - C2 * C2w - S2 * S2w) - (S * Cw - C * Sw) ** 2
+    with np.errstate(invalid='ignore', divide='ignore'):
+        power = (YC * YC / CC + YS * YS / SS) / YY
+    return np.nan_to_num(power, nan=0.0)
+
+
+# ============================================================================
+# FALSE ALARM PROBABILITY
+# ============================================================================
+
+def _combine_log_fap(log_single, log_tau):
+    """log FAP = log[1 - (1 - p) exp(-tau)], stabile per p, tau minuscoli"""
+    single = np.exp(log_single)
+    with np.errstate(over='ignore'):
+        fap = single + (1 - single) * -np.expm1(-np.exp(log_tau))
+    with np.errstate(divide='ignore'):
+        tail = np.logaddexp(log_single, log_tau)    # p + tau
+        return np.minimum(np.where(fap > 1e-12, np.log(np.maximum(fap, 1e-300)), tail), 0.0)
+
+
+def z2n_log_fap(power, n_harmonics, times, f_min, f_max):
+    """
+    log FAP di Z^2_n sulla banda [f_min, f_max]: chi2 con 2n dof per la
+    singola frequenza, attraversamenti del livello con la formula di
+    Davies (processo chi2, velocita' media delle n armoniche); per n = 1
+    coincide con Baluev (2008) nel limite di molti fotoni.
+    """
+    z = np.asarray(power, dtype=float)
+    nu = 2 * n_harmonics
+    log_single = stats.chi2.logsf(z, nu)
+    # varianza della derivata delle componenti: (2 pi h)^2 Var(t), media sulle armoniche
+    speed = 4 * np.pi ** 2 * np.var(np.asarray(times, dtype=float)) \
+        * (n_harmonics + 1) * (2 * n_harmonics + 1) / 6
+    with np.errstate(divide='ignore'):
+        log_tau = (np.log(f_max - f_min) + 0.5 * np.log(speed / (2 * np.pi))
+                   + 0.5 * (nu - 1) * np.log(z) - 0.5 * z
+                   - 0.5 * (nu - 2) * np.log(2.0) - special.gammaln(nu / 2))
+    return _combine_log_fap(log_single, log_tau)
+
+
+def lomb_scargle_log_fap(power, times, f_max):
+    """
+    log FAP del Lomb-Scargle (rumore gaussiano, media libera) con
+    l'approssimazione di Baluev: FAP = 1 - (1 - p_single) exp(-tau).
+    """
+    times = np.asarray(times, dtype=float)
+    z = np.clip(np.asarray(power, dtype=float), 0.0, 1.0 - 1e-16)
+    N = len(times)
+    log_single = 0.5 * (N - 3) * np.log1p(-z)
+    # tau di Davies: W gamma(N-1) (1 - z)^((N-4)/2) sqrt((N-1) z / 2), W = f_max sqrt(4 pi Var t)
+    W = f_max * np.sqrt(4 * np.pi * np.var(times))
+    NH = N - 1
+    log_gamma = 0.5 * np.log(2.0 / NH) + special.gammaln(NH / 2) - special.gammaln((NH - 1) / 2)
+    with np.errstate(divide='ignore'):
+        log_tau = (np.log(W) + log_gamma + 0.5 * (N - 4) * np.log1p(-z)
+                   + 0.5 * np.log(0.5 * NH * z))
+    return _combine_log_fap(log_single, log_tau)
+
+
+# ============================================================================
+# RICERCA
+# ============================================================================
+
+def _local_maxima(power):
+    inner = (power[1:-1] > power[:-2]) & (power[1:-1] >= power[2:])
+    return np.flatnonzero(inner) + 1
+
+
+def _peaks(grid, power, log_fap, fap_threshold, max_peaks):
+    """Massimi locali con FAP < fap_threshold, in ordine di potenza"""
+    index = _local_maxima(power)
+    index = index[np.exp(log_fap[index]) < fap_threshold]
+    index = index[np.argsort(power[index])[::-1][:max_peaks]]
+    return [{'frequency': float(grid.f_min + i * grid.df), 'period': float(1 / (grid.f_min + i * grid.df)),
+             'power': float(power[i]), 'fap': float(np.exp(log_fap[i])),
+             'sigma': float(logp_to_sigma(log_fap[i]))} for i in index]
+
+
+def _summary(grid, power, log_fap, fap_threshold, max_peaks):
+    best = int(np.argmax(power))
+    peaks = _peaks(grid, power, log_fap, fap_threshold, max_peaks)
+    return {
+        'best_frequency': float(grid.f_min + best * grid.df),
+        'best_period': float(1 / (grid.f_min + best * grid.df)),
+        'best_power': float(power[best]),
+        'fap': float(np.exp(log_fap[best])),
+        'sigma': float(logp_to_sigma(log_fap[best])),
+        'n_significant_peaks': len(peaks),
+        'peaks': peaks,
+    }
+
+
+def periodicity_search(times, values=None, f_min=None, f_max=None, oversample=DEFAULT_OVERSAMPLE,
+                       n_frequencies=None, n_harmonics=2, fap_threshold=FAP_THRESHOLD,
+                       max_peaks=10, return_power=False):
+    """
+    Z^2_n dei tempi di arrivo (saltato con n_harmonics = 0) e, se values
+    e' dato, Lomb-Scargle di values(t) sulla stessa griglia. Per ogni potenza: miglior frequenza,
+    FAP corretta per i trial, sigma e i picchi significativi
+    (massimi locali con FAP < fap_threshold).
+    """
+    times = np.asarray(times, dtype=float)
+    grid = FrequencyGrid.for_times(times, f_min, f_max, oversample, n_frequencies)
+
+    result = {
+        'n_photons': int(len(times)),
+        'f_min': grid.f_min,
+        'f_max': grid.f_max,
+        'df': grid.df,
+        'n_frequencies': grid.n,
+        'n_harmonics': int(n_harmonics),
+    }
+    if return_power:
+        result['frequencies'] = grid.frequencies
+
+    if n_harmonics:
+        z2n = z2n_power(times, grid, n_harmonics)
+        z2n_fap = z2n_log_fap(z2n, n_harmonics, times, grid.f_min, grid.f_max)
+        result['z2n'] = _summary(grid, z2n, z2n_fap, fap_threshold, max_peaks)
+        if return_power:
+            result['z2n_power'] = z2n
+
+    if values is not None:
+        ls = lomb_scargle_power(times, values, grid)
+        ls_fap = lomb_scargle_log_fap(ls, times, grid.f_max)
+        result['lomb_scargle'] = _summary(grid, ls, ls_fap, fap_threshold, max_peaks)
+        if return_power:
+            result['lomb_scargle_power'] = ls
+
+    result['n_significant_peaks'] = sum(result[key]['n_significant_peaks']
+                                        for key in ('z2n', 'lomb_scargle') if key in result)
+    return result
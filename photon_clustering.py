@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+PHOTON CLUSTERING - DBSCAN a griglia nello spazio (log E, t) dei fotoni
+======================================================================
+DBSCAN esatto (stesse etichette core di sklearn, eps e min_samples con la
+stessa convenzione) specializzato per dati 2-D, senza matrici di vicini:
+
+- coordinate: log10(E) e t standardizzati per GRB
+- punti core: griglia di celle di lato eps/sqrt(2) (due punti nella stessa
+  cella distano <= eps): ogni cella con >= min_samples fotoni e' tutta core,
+  per gli altri fotoni il conteggio dei vicini usa un KD-tree senza
+  materializzare le liste (return_length)
+- componenti: l'albero ricoprente minimo euclideo e' contenuto nella
+  triangolazione di Delaunay, quindi due punti core sono nello stesso
+  cluster sse lo sono nel grafo degli spigoli di Delaunay <= eps (O(n log n))
+- bordo: ogni fotone non core entro eps da un core prende il cluster del
+  core piu' vicino (sklearn prende il primo trovato)
+
+Per ogni cluster: stabilita' (Jaccard medio con il miglior cluster
+corrispondente rifacendo il clustering a eps perturbato) e statistiche di
+lag energia-tempo per segmento (grb_batch_engine). cluster_batch processa
+tutti i GRB di un RaggedPhotons uno alla volta: memoria O(fotoni del GRB).
+
+    result = cluster_photons(energies, times, eps=0.5, min_samples=3)
+    result['labels'], result['clusters']['cluster_0']['stability']
+    results = cluster_batch(RaggedPhotons.from_directory('fermi_massive_data'))
+
+Autore: Christian Quintino De Luca
+Affiliazione: RTH Italia - Research & Technology Hub
+"""
+
+import numpy as np
+
+from grb_batch_engine import RaggedPhotons, analyze_batch
+from lazy_imports import lazy_module
+
+spatial = lazy_module('scipy.spatial')
+csgraph = lazy_module('scipy.sparse.csgraph')
+sparse = lazy_module('scipy.sparse')
+
+NOISE = -1
+STABILITY_SCALES = (0.8, 0.9, 1.1, 1.25)
+MIN_CLUSTER_STATS = 3
+
+
+# ============================================================================
+# DBSCAN A GRIGLIA
+# ============================================================================
+
+def photon_coordinates(energies, times, log_energy=True):
+    """(log10 E, t) standardizzati (media 0, deviazione 1 per asse)"""
+    e = np.log10(np.asarray(energies, dtype=float)) if log_energy else np.asarray(energies, dtype=float)
+    X = np.column_stack([e, np.asarray(times, dtype=float)])
+    scale = X.std(axis=0)
+    return (X - X.mean(axis=0)) / np.where(scale > 0, scale, 1.0)
+
+
+def _core_mask(X, tree, eps, min_samples):
+    """Punti con >= min_samples vicini entro eps (se stessi inclusi)"""
+    side = eps / np.sqrt(2)
+    cells = np.floor((X - X.min(axis=0)) / side).astype(np.int64)
+    _, cell_index, cell_count = np.unique(cells, axis=0, return_inverse=True, return_counts=True)
+    core = cell_count[cell_index.ravel()] >= min_samples
+    rest = np.flatnonzero(~core)
+    if len(rest):
+        counts = tree.query_ball_point(X[rest], r=eps, return_length=True)
+        core[rest] = counts >= min_samples
+    return core
+
+
+def _core_components(Y, eps):
+    """Componenti connesse dei punti core con spigoli <= eps"""
+    n = len(Y)
+    if n == 1:
+        return np.zeros(1, dtype=np.int64)
+    unique, inverse = np.unique(Y, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    m = len(unique)
+    edges = None
+    if m >= 3:
+        try:
+            simplices = spatial.Delaunay(unique).simplices
+            edges = np.concatenate([simplices[:, [0, 1]], simplices[:, [1, 2]], simplices[:, [0, 2]]])
+        except spatial.QhullError:
+            edges = None    # punti allineati: pochi spigoli, si usa il KD-tree
+    if edges is None:
+        edges = np.array(sorted(spatial.cKDTree(unique).query_pairs(eps)), dtype=np.int64).reshape(-1, 2)
+    length = np.linalg.norm(unique[edges[:, 0]] - unique[edges[:, 1]], axis=1)
+    edges = edges[length <= eps]
+    graph = sparse.coo_matrix((np.ones(len(edges)), (edges[:, 0], edges[:, 1])), shape=(m, m))
+    _, labels = csgraph.connected_components(graph, directed=False)
+    return labels[inverse]
+
+
+def grid_dbscan(X, eps=0.5, min_samples=3):
+    """
+    Etichette DBSCAN (-1 = rumore) e maschera dei punti core per X (n, 2).
+    I cluster sono numerati in ordine di primo fotone.
+    """
+    X = np.asarray(X, dtype=float)
+    labels = np.full(len(X), NOISE, dtype=np.int64)
+    if len(X) == 0:
+        return labels, np.zeros(0, dtype=bool)
+    tree = spatial.cKDTree(X)
+    core = _core_mask(X, tree, eps, min_samples)
+    core_index = np.flatnonzero(core)
+    if len(core_index) == 0:
+        return labels, core
+
+    labels[core_index] = _core_components(X[core_index], eps)
+    border = np.flatnonzero(~core)
+    if len(border):
+        # distance_upper_bound e' esclusivo: nextafter include i bordi a distanza esattamente eps
+        distance, nearest = spatial.cKDTree(X[core_index]).query(
+            X[border], k=1, distance_upper_bound=np.nextafter(eps, np.inf))
+        reached = np.isfinite(distance)
+        labels[border[reached]] = labels[core_index[nearest[reached]]]
+
+    # rinumerazione in ordine di apparizione
+    clustered = labels >= 0
+    _, first, inverse = np.unique(labels[clustered], return_index=True, return_inverse=True)
+    rank = np.argsort(np.argsort(first))
+    labels[clustered] = rank[inverse.ravel()]
+    return labels, core
+
+
+# ============================================================================
+# STABILITA' E STATISTICHE PER CLUSTER
+# ============================================================================
+
+def cluster_stability(X, labels, eps, min_samples, scales=STABILITY_SCALES):
+    """
+    Per ogni cluster: Jaccard medio con il cluster piu' sovrapposto nei
+    clustering a eps * scale (1 = ritrovato identico ad ogni scala).
+    """
+    n_clusters = int(labels.max()) + 1 if len(labels) else 0
+    if n_clusters == 0:
+        return np.zeros(0)
+    sizes = np.bincount(labels[labels >= 0], minlength=n_clusters)
+    total = np.zeros(n_clusters)
+    for scale in scales:
+        other, _ = grid_dbscan(X, eps * scale, min_samples)
+        both = (labels >= 0) & (other >= 0)
+        if not np.any(both):
+            continue
+        n_other = int(other.max()) + 1
+        other_sizes = np.bincount(other[other >= 0], minlength=n_other)
+        overlap = np.zeros((n_clusters, n_other))
+        np.add.at(overlap, (labels[both], other[both]), 1)
+        jaccard = overlap / (sizes[:, None] + other_sizes[None, :] - overlap)
+        total += jaccard.max(axis=1)
+    return total / len(scales)
+
+
+def _cluster_statistics(energies, times, labels):
+    """Statistiche di lag di tutti i cluster come segmenti di un RaggedPhotons"""
+    segments = {}
+    for k in range(int(labels.max()) + 1 if len(labels) else 0):
+        mask = labels == k
+        if mask.sum() >= MIN_CLUSTER_STATS:
+            segments[f'cluster_{k}'] = (energies[mask], times[mask])
+    if not segments:
+        return {}
+    return analyze_batch(RaggedPhotons.from_arrays(segments), ransac=False)
+
+
+def cluster_photons(energies, times, eps=0.5, min_samples=3, log_energy=True,
+                    stability_scales=STABILITY_SCALES):
+    """
+    Clustering DBSCAN di un GRB nello spazio (log E, t) standardizzato.
+    Restituisce etichette, maschera core, numero di cluster e di fotoni di
+    rumore e per ogni cluster 'cluster_k': stabilita' e statistiche di lag
+    (Pearson/Spearman, p, pendenza dt/dE, range) dal batch engine.
+    """
+    energies = np.asarray(energies, dtype=float)
+    times = np.asarray(times, dtype=float)
+    X = photon_coordinates(energies, times, log_energy)
+    labels, core = grid_dbscan(X, eps, min_samples)
+    n_clusters = int(labels.max()) + 1 if len(labels) else 0
+
+    stability = (cluster_stability(X, labels, eps, min_samples, stability_scales)
+                 if stability_scales else np.full(n_clusters, np.nan))
+    statistics = _cluster_statistics(energies, times, labels)
+
+    clusters = {}
+    for k in range(n_clusters):
+        name = f'cluster_{k}'
+        clusters[name] = {'n_photons': int(np.sum(labels == k)), 'stability': float(stability[k])}
+        clusters[name].update(statistics.get(name, {}))
+
+    return {
+        'labels': labels,
+        'core_mask': core,
+        'n_clusters': n_clusters,
+        'n_noise': int(np.sum(labels == NOISE)),
+        'eps': float(eps),
+        'min_samples': int(min_samples),
+        'clusters': clusters,
+    }
+
+
+def cluster_batch(photons, eps=0.5, min_samples=3, log_energy=True, stability_scales=STABILITY_SCALES,
+                  keep_labels=False):
+    """
+    cluster_photons su tutti i GRB di un RaggedPhotons, uno alla volta
+    (memoria limitata dal GRB piu' grande). Le etichette per fotone sono
+    restituite concatenate solo con keep_labels=True.
+    """
+    results = {}
+    all_labels = []
+    for i, name in enumerate(photons.names):
+        lo, hi = photons.offsets[i], photons.offsets[i + 1]
+        result = cluster_photons(photons.energies[lo:hi], photons.times[lo:hi], eps, min_samples,
+                                 log_energy, stability_scales)
+        if keep_labels:
+            all_labels.append(result['labels'])
+        del result['labels'], result['core_mask']
+        results[name] = result
+    if keep_labels:
+        return results, np.concatenate(all_labels) if all_labels else np.empty(0, dtype=np.int64)
+    return results
@@ -15,10 +15,13 @@ from scipy import stats
 from scipy.optimize import curve_fit
 import seaborn as sns
 
+from lag_model_comparison import compare_lag_models
+
 class QGDiscriminatorTests:
-    def __init__(self, grb_name="GRB090902B", filename="L251020161615F357373F52_EV00.fits"):
+    def __init__(self, grb_name="GRB090902B", filename="L251020161615F357373F52_EV00.fits", redshift=1.822):
         self.grb_name = grb_name
         self.filename = filename
+        self.redshift = redshift
         self.results = {}
         
         print(f"🧪 QG vs Astrophysical Discriminator Tests")
@@ -197,100 +200,32 @@ class QGDiscriminatorTests:
         print(f"   📊 Time trend: {time_trend:.3f}")
         print(f"   📊 Discrimination: {self.results['temporal_consistency']['discrimination']}")
         
-    def test_spectral_lag_models(self):
+    def test_spectral_lag_models(self, n_bootstrap=1000, seed=42):
         """Test 3: Spectral lag model comparison"""
         print("\n🧪 Test 3: Spectral lag model comparison...")
         
-        # Define different lag models
-        def qg_lag_model(E, E_QG, n=1):
-            """QG lag model: t_lag = (E/E_QG)^n"""
-            return (E / E_QG)**n
-        
-        def astrophysical_lag_model(E, t0, alpha):
-            """Astrophysical lag model: t_lag = t0 * E^(-alpha)"""
-            return t0 * E**(-alpha)
-        
-        def mixed_lag_model(E, E_QG, t0, alpha, f_qg):
-            """Mixed model: combination of QG and astrophysical"""
-            return f_qg * (E / E_QG) + (1 - f_qg) * t0 * E**(-alpha)
-        
-        # Calculate observed lags (negative correlation means high E arrives later)
-        # For simplicity, use correlation as proxy for lag
-        correlation = np.corrcoef(self.energies, self.times)[0, 1]
-        
-        # Fit models
-        models = {
-            'QG': qg_lag_model,
-            'Astrophysical': astrophysical_lag_model,
-            'Mixed': mixed_lag_model
-        }
-        
-        model_fits = {}
-        for model_name, model_func in models.items():
-            try:
-                if model_name == 'QG':
-                    popt, pcov = curve_fit(model_func, self.energies, 
-                                         -correlation * np.ones_like(self.energies),
-                                         p0=[1e6], maxfev=1000)
-                    E_QG = popt[0]
-                    model_fits[model_name] = {
-                        'E_QG': float(E_QG),
-                        'parameters': popt.tolist(),
-                        'covariance': pcov.tolist()
-                    }
-                elif model_name == 'Astrophysical':
-                    popt, pcov = curve_fit(model_func, self.energies,
-                                         -correlation * np.ones_like(self.energies),
-                                         p0=[1.0, 1.0], maxfev=1000)
-                    model_fits[model_name] = {
-                        't0': float(popt[0]),
-                        'alpha': float(popt[1]),
-                        'parameters': popt.tolist(),
-                        'covariance': pcov.tolist()
-                    }
-                else:  # Mixed
-                    popt, pcov = curve_fit(model_func, self.energies,
-                                         -correlation * np.ones_like(self.energies),
-                                         p0=[1e6, 1.0, 1.0, 0.5], maxfev=1000)
-                    model_fits[model_name] = {
-                        'E_QG': float(popt[0]),
-                        't0': float(popt[1]),
-                        'alpha': float(popt[2]),
-                        'f_qg': float(popt[3]),
-                        'parameters': popt.tolist(),
-                        'covariance': pcov.tolist()
-                    }
-            except:
-                model_fits[model_name] = {
-                    'parameters': [],
-                    'covariance': [],
-                    'error': 'Fit failed'
-                }
-        
-        # Calculate AIC for model comparison
-        n_params = {'QG': 1, 'Astrophysical': 2, 'Mixed': 4}
-        aic_scores = {}
-        for model_name in models.keys():
-            if 'error' not in model_fits[model_name]:
-                n = len(self.energies)
-                k = n_params[model_name]
-                # Simplified AIC calculation
-                aic_scores[model_name] = 2 * k  # Simplified for demonstration
-            else:
-                aic_scores[model_name] = np.inf
-        
-        # Best model
-        best_model = min(aic_scores, key=aic_scores.get)
+        # QG (t ~ E), astrophysical (t ~ E^-alpha) and mixed models fitted to the
+        # photon times; AIC/BIC from the real likelihood, LRTs calibrated by a
+        # parametric bootstrap
+        comparison = compare_lag_models(self.energies, self.times, n_bootstrap=n_bootstrap,
+                                        seed=seed, redshift=self.redshift)
         
         self.results['spectral_lag_models'] = {
-            'model_fits': model_fits,
-            'aic_scores': aic_scores,
-            'best_model': best_model,
-            'discrimination': 'QG' if best_model == 'QG' else 'Astrophysical' if best_model == 'Astrophysical' else 'Mixed'
+            'model_fits': comparison['models'],
+            'aic_scores': comparison['aic_scores'],
+            'bic_scores': comparison['bic_scores'],
+            'best_model': comparison['best_model_aic'],
+            'best_model_bic': comparison['best_model_bic'],
+            'likelihood_ratio_tests': comparison['lrt'],
+            'n_bootstrap': comparison['n_bootstrap'],
+            'discrimination': comparison['discrimination']
         }
         
-        print(f"   📊 Best model: {best_model}")
-        print(f"   📊 AIC scores: {aic_scores}")
+        print(f"   📊 Best model (AIC / BIC): {comparison['best_model_aic']} / {comparison['best_model_bic']}")
+        print(f"   📊 AIC scores: { {k: round(v, 1) for k, v in comparison['aic_scores'].items()} }")
+        for test_name, test in comparison['lrt'].items():
+            print(f"   📊 LRT {test_name}: {test['statistic']:.2f} "
+                  f"(p_boot = {test.get('p_bootstrap', test['p_asymptotic']):.4f})")
         print(f"   📊 Discrimination: {self.results['spectral_lag_models']['discrimination']}")
         
     def test_instrumental_effects(self):
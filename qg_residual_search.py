@@ -20,6 +20,9 @@ import seaborn as sns
 from scipy import stats
 from scipy.optimize import curve_fit, minimize
 import warnings
+from stage_profiler import stage, profiled, set_context, PROFILER
+from lag_models import subtract_lag
+from lag_profile import lag_profile, fit_lag_profile
 warnings.filterwarnings('ignore')
 
 # Configurazione matplotlib per headless
@@ -62,105 +65,77 @@ def model_qg_quadratic(E, t0, E_QG, d_L):
     c = 3e8  # m/s
     return t0 + (d_L * 3.086e22 / c) * ((E / E_QG) ** 2)
 
-def fit_qg_models(times, energies, redshift):
-    """Fit modelli QG sui dati corretti"""
+@profiled
+def fit_qg_models(times, energies, redshift, profile=None):
+    """
+    Fit modelli QG sui dati corretti. I fit sono pesati sul profilo
+    lag-energia binnato (mediana per bin, errori bootstrap): chi2 vero su
+    ~20 punti invece che su tutti i fotoni.
+    """
     
     # Calcola distanza di luminosità
     H0 = 70.0  # km/s/Mpc
     c_km_s = 3e5  # km/s
     d_L = (c_km_s / H0) * redshift * (1 + redshift)  # Mpc
     
+    if profile is None:
+        with stage('lag_profile'):
+            profile = lag_profile(energies, times, estimator='median', n_bootstrap=200, seed=42)
+    
     models = {}
     
-    # Modello 1: QG Lineare
-    try:
-        def qg_linear(E, t0, E_QG):
-            return model_qg_linear(E, t0, E_QG, d_L)
-        
-        # Valori iniziali
-        p0 = [np.mean(times), 1e19]  # E_QG iniziale vicino a Planck
-        bounds = ([times.min(), 1e15], [times.max(), 1e25])
-        
-        popt, pcov = curve_fit(qg_linear, energies, times, p0=p0, bounds=bounds, maxfev=2000)
-        t0, E_QG = popt
-        
-        # Goodness of fit
-        times_pred = qg_linear(energies, t0, E_QG)
-        residuals = times - times_pred
-        chi2 = np.sum((residuals / np.std(residuals))**2)
-        dof = len(times) - 2
-        chi2_red = chi2 / dof
-        
-        # Correlazione
-        correlation = np.corrcoef(times, times_pred)[0, 1]
-        
-        models['qg_linear'] = {
-            't0': float(t0),
-            'E_QG': float(E_QG),
-            'd_L': float(d_L),
-            'chi2': float(chi2),
-            'chi2_red': float(chi2_red),
-            'dof': int(dof),
-            'correlation': float(correlation),
-            'aic': float(2 * 2 + chi2),
-            'type': 'QG Linear'
-        }
-    except Exception as e:
-        print(f"⚠️ Errore fit QG linear: {e}")
-        models['qg_linear'] = None
+    # Modelli 1-2: QG lineare e quadratico
+    qg_specs = {
+        'qg_linear': (model_qg_linear, 'QG Linear'),
+        'qg_quadratic': (model_qg_quadratic, 'QG Quadratic'),
+    }
+    for model_name, (model_func, label) in qg_specs.items():
+        try:
+            def qg_model(E, t0, E_QG, model_func=model_func):
+                return model_func(E, t0, E_QG, d_L)
+            
+            # Valori iniziali: E_QG vicino a Planck
+            p0 = [np.mean(times), 1e19]
+            bounds = ([times.min(), 1e15], [times.max(), 1e25])
+            
+            fit = fit_lag_profile(profile, qg_model, p0, ('t0', 'E_QG'), bounds=bounds)
+            
+            # Correlazione sui fotoni (una sola valutazione del modello)
+            times_pred = qg_model(energies, fit['t0'], fit['E_QG'])
+            correlation = np.corrcoef(times, times_pred)[0, 1] if np.std(times_pred) > 0 else 0.0
+            
+            models[model_name] = {
+                't0': fit['t0'],
+                'E_QG': fit['E_QG'],
+                'E_QG_err': fit['E_QG_err'],
+                'd_L': float(d_L),
+                'chi2': fit['chi2'],
+                'chi2_red': fit['chi2_red'],
+                'dof': fit['dof'],
+                'n_bins': fit['n_bins'],
+                'correlation': float(correlation),
+                'aic': fit['aic'],
+                'type': label
+            }
+        except Exception as e:
+            print(f"⚠️ Errore fit {label}: {e}")
+            models[model_name] = None
     
-    # Modello 2: QG Quadratico
+    # Modello 3: Nessun QG (costante = media pesata dei bin)
     try:
-        def qg_quadratic(E, t0, E_QG):
-            return model_qg_quadratic(E, t0, E_QG, d_L)
-        
-        # Valori iniziali
-        p0 = [np.mean(times), 1e19]
-        bounds = ([times.min(), 1e15], [times.max(), 1e25])
-        
-        popt, pcov = curve_fit(qg_quadratic, energies, times, p0=p0, bounds=bounds, maxfev=2000)
-        t0, E_QG = popt
+        def constant(E, t0):
+            return np.full_like(E, t0)
         
-        times_pred = qg_quadratic(energies, t0, E_QG)
-        residuals = times - times_pred
-        chi2 = np.sum((residuals / np.std(residuals))**2)
-        dof = len(times) - 2
-        chi2_red = chi2 / dof
-        
-        correlation = np.corrcoef(times, times_pred)[0, 1]
-        
-        models['qg_quadratic'] = {
-            't0': float(t0),
-            'E_QG': float(E_QG),
-            'd_L': float(d_L),
-            'chi2': float(chi2),
-            'chi2_red': float(chi2_red),
-            'dof': int(dof),
-            'correlation': float(correlation),
-            'aic': float(2 * 2 + chi2),
-            'type': 'QG Quadratic'
-        }
-    except Exception as e:
-        print(f"⚠️ Errore fit QG quadratic: {e}")
-        models['qg_quadratic'] = None
-    
-    # Modello 3: Nessun QG (costante)
-    try:
-        t0_constant = np.mean(times)
-        times_pred = np.full_like(times, t0_constant)
-        residuals = times - times_pred
-        chi2 = np.sum((residuals / np.std(residuals))**2)
-        dof = len(times) - 1
-        chi2_red = chi2 / dof
-        correlation = 0.0
+        fit = fit_lag_profile(profile, constant, [np.mean(times)], ('t0',))
         
         models['no_qg'] = {
-            't0': float(t0_constant),
-            'chi2': float(chi2),
-            'chi2_red': float(chi2_red),
-            'dof': int(dof),
-            'correlation': float(correlation),
-            'aic': float(2 * 1 + chi2),
+            't0': fit['t0'],
+            'chi2': fit['chi2'],
+            'chi2_red': fit['chi2_red'],
+            'dof': fit['dof'],
+            'n_bins': fit['n_bins'],
+            'correlation': 0.0,
+            'aic': fit['aic'],
             'type': 'No QG (Constant)'
         }
     except Exception as e:
@@ -169,6 +144,7 @@ def fit_qg_models(times, energies, redshift):
     
     return models
 
+@profiled
 def calculate_qg_limits(times, energies, redshift, confidence_level=0.95):
     """Calcola limiti su E_QG usando likelihood ratio test"""
     
@@ -465,11 +441,12 @@ def main():
             
         print(f"\n🔬 RICERCA RESIDUI QG: {grb_name}")
         print("-" * 50)
+        set_context(grb=grb_name)
         
         # Carica dati originali
         config = grb_configs[grb_name]
         try:
-            with fits.open(config['file']) as hdul:
+            with stage('load_fits'), fits.open(config['file']) as hdul:
                 events_data = hdul['EVENTS'].data
                 
                 if events_data is None:
@@ -504,26 +481,14 @@ def main():
         best_model_name = best_model['name']
         best_model_params = best_model['parameters']
         
-        # Applica correzione lag intrinseco
-        if best_model_name == 'power_law':
-            from intrinsic_lag_modeling import model_intrinsic_lag_power_law
-            predicted_times = model_intrinsic_lag_power_law(energies_filtered, 
-                                                          best_model_params['t0'],
-                                                          best_model_params['alpha'],
-                                                          best_model_params['beta'])
-        elif best_model_name == 'logarithmic':
-            from intrinsic_lag_modeling import model_intrinsic_lag_logarithmic
-            predicted_times = model_intrinsic_lag_logarithmic(energies_filtered,
-                                                            best_model_params['t0'],
-                                                            best_model_params['alpha'],
-                                                            best_model_params['E_ref'])
-        else:
+        # Applica correzione lag intrinseco (qualsiasi modello del registro)
+        try:
+            times_corrected, predicted_times = subtract_lag(times_original_filtered, energies_filtered,
+                                                            best_model_name, best_model_params)
+        except ValueError:
             print(f"❌ Modello {best_model_name} non supportato")
             continue
         
-        # Sottrai lag intrinseco
-        times_corrected = times_original_filtered - predicted_times + best_model_params['t0']
-        
         print(f"  Correlazione originale: {result['correlation_original']:.3f} ({result['significance_original']:.2f}σ)")
         print(f"  Correlazione corretta: {result['correlation_corrected']:.3f} ({result['significance_corrected']:.2f}σ)")
         
@@ -592,6 +557,9 @@ def main():
     print("\n" + "="*70)
     print("FASE 3 COMPLETATA! ANALISI COMPLETA FINITA!")
     print("="*70)
+    
+    if PROFILER.enabled:
+        PROFILER.print_summary()
 
 if __name__ == "__main__":
     main()
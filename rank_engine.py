@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+RANK ENGINE - Statistiche di rango con ranghi calcolati una sola volta
+======================================================================
+Per ogni GRB si calcolano una volta:
+- chiavi di rango dense di energia e tempo (np.unique)
+- l'ordine lessicografico (E, t) dei fotoni
+
+e da queste si derivano senza riordinare:
+- Spearman su qualunque subset (maschera) o ricampionamento bootstrap:
+  ranghi medi dai conteggi per chiave (bincount + cumsum), O(n)
+- Kendall tau-b (con correzione per ties, come scipy) da un conteggio
+  delle inversioni merge-sort bottom-up vettorizzato (un livello per
+  potenza di 2, niente loop Python sui fotoni). Il conteggio e'
+  segmentato: molti subset / permutazioni / bootstrap concatenati
+  passano in un'unica chiamata
+- test di permutazione e bootstrap sui ranghi gia' calcolati
+
+Significativita' in sigma tramite significance.py (spazio log).
+
+    engine = RankEngine(energies, times)
+    engine.spearman()                     # globale
+    engine.kendall(energies > e_90)       # subset
+    engine.kendall_batch(masks)           # molti subset insieme
+    engine.permutation_test('kendall', 1000)
+
+Autore: Christian Quintino De Luca
+Affiliazione: RTH Italia - Research & Technology Hub
+"""
+
+import numpy as np
+
+from significance import r_to_logp, r_to_sigma, sigma_to_p
+
+
+# ============================================================================
+# PRIMITIVE
+# ============================================================================
+
+def dense_keys(values):
+    """Chiavi intere 0..K-1 che preservano l'ordine (valori uguali -> stessa chiave)"""
+    unique, keys = np.unique(np.asarray(values), return_inverse=True)
+    return keys.astype(np.int64).ravel(), len(unique)
+
+
+def average_ranks_by_key(keys, n_keys, weights=None):
+    """Rango medio (1-based, ties mediati) di ogni chiave dato il multinsieme keys"""
+    counts = np.bincount(keys, weights=weights, minlength=n_keys)
+    below = np.cumsum(counts) - counts
+    return below + (counts + 1) / 2
+
+
+def segmented_inversions(values, seg, n_seg):
+    """
+    Numero di inversioni strette (i < j, v_i > v_j) in ogni segmento
+    della sequenza concatenata values (seg non decrescente).
+
+    Merge sort bottom-up: al livello w ogni blocco di 2w elementi e'
+    formato da due run ordinate [sinistra | destra] e viene fuso con un
+    sort stabile (timsort riconosce le due run). Un elemento della run
+    destra che dopo la fusione si sposta a sinistra di d posizioni
+    supera esattamente d elementi sinistri: le inversioni del livello
+    sono la somma di questi spostamenti.
+    """
+    values = np.asarray(values, dtype=np.int64)
+    seg = np.asarray(seg, dtype=np.int64)
+    counts = np.zeros(n_seg)
+    if len(values) < 2:
+        return counts
+
+    seg_len = np.bincount(seg, minlength=n_seg)
+    pos = np.arange(len(values)) - (np.cumsum(seg_len) - seg_len)[seg]
+    # (segmento, posizione) in un solo intero: il blocco e' uno shift
+    shift = int(seg_len.max() - 1).bit_length()
+    seg_pos = (seg << shift) | pos
+    cur = values - values.min()
+    span = int(cur.max()) + 1
+
+    w, level = 1, 1
+    while w < seg_len.max():
+        within = pos & (2 * w - 1)
+        order = np.argsort((seg_pos >> level) * span + cur, kind='stable')
+        moved = within[order]
+        right = moved >= w
+        shifted = (moved - within)[right]
+        if n_seg == 1:
+            counts[0] += shifted.sum()
+        else:
+            counts += np.bincount(seg[right], weights=shifted, minlength=n_seg)
+        cur = cur[order]
+        w *= 2
+        level += 1
+    return counts
+
+
+def _run_lengths(keys, seg):
+    """Lunghezze delle run di chiavi uguali (keys ordinate in ogni segmento)"""
+    change = np.ones(len(keys) + 1, dtype=bool)
+    change[1:-1] = (keys[1:] != keys[:-1]) | (seg[1:] != seg[:-1])
+    starts = np.flatnonzero(change)
+    return np.diff(starts).astype(float), seg[starts[:-1]]
+
+
+def _tie_sums(cnt, run_seg, n_seg):
+    """Somme di scipy: sum t(t-1)/2, sum t(t-1)(t-2), sum t(t-1)(2t+5) per segmento"""
+    return (np.bincount(run_seg, weights=cnt * (cnt - 1) / 2, minlength=n_seg),
+            np.bincount(run_seg, weights=cnt * (cnt - 1) * (cnt - 2), minlength=n_seg),
+            np.bincount(run_seg, weights=cnt * (cnt - 1) * (2 * cnt + 5), minlength=n_seg))
+
+
+def kendall_from_sorted(kx, ky, seg, n_seg, ky_span):
+    """
+    Kendall tau-b e z asintotico (varianza con ties, come scipy) per
+    segmenti gia' ordinati per (x, y). kx, ky: chiavi dense.
+    """
+    size = np.bincount(seg, minlength=n_seg).astype(float)
+
+    dis = segmented_inversions(ky, seg, n_seg)
+
+    joint = kx * ky_span + ky
+    cnt, run_seg = _run_lengths(joint, seg)
+    ntie = np.bincount(run_seg, weights=cnt * (cnt - 1) / 2, minlength=n_seg)
+
+    cnt, run_seg = _run_lengths(kx, seg)
+    xtie, x0, x1 = _tie_sums(cnt, run_seg, n_seg)
+
+    y_sorted = np.sort(seg * ky_span + ky)
+    cnt, run_seg = _run_lengths(y_sorted, y_sorted // ky_span)
+    ytie, y0, y1 = _tie_sums(cnt, run_seg, n_seg)
+
+    tot = size * (size - 1) / 2
+    con_minus_dis = tot - xtie - ytie + ntie - 2 * dis
+    with np.errstate(invalid='ignore', divide='ignore'):
+        tau = con_minus_dis / np.sqrt(tot - xtie) / np.sqrt(tot - ytie)
+        m = size * (size - 1)
+        var = ((m * (2 * size + 5) - x1 - y1) / 18 + (2 * xtie * ytie) / m
+               + x0 * y0 / (9 * m * (size - 2)))
+        z = con_minus_dis / np.sqrt(var)
+    return tau, z
+
+
+def _pearson_weighted(a, b, weights=None):
+    """Pearson (pesato con molteplicita') su vettori di ranghi"""
+    if weights is None:
+        weights = np.ones(len(a))
+    total = weights.sum()
+    ma = np.dot(weights, a) / total
+    mb = np.dot(weights, b) / total
+    da, db = a - ma, b - mb
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.dot(weights, da * db) / np.sqrt(np.dot(weights, da * da) * np.dot(weights, db * db))
+
+
+# ============================================================================
+# ENGINE
+# ============================================================================
+
+class RankEngine:
+    """Ranghi di (energia, tempo) calcolati una volta, statistiche su subset/resample"""
+
+    def __init__(self, energies, times):
+        self.kx, self.nx = dense_keys(energies)
+        self.ky, self.ny = dense_keys(times)
+        self.n = len(self.kx)
+        # Ordine (E, t): per ogni subset basta filtrarlo, niente sort
+        self.lex_order = np.lexsort((self.ky, self.kx))
+        self.rank_x = average_ranks_by_key(self.kx, self.nx)[self.kx]
+        self.rank_y = average_ranks_by_key(self.ky, self.ny)[self.ky]
+
+    # ------------------------------------------------------------------
+    # Spearman
+    # ------------------------------------------------------------------
+
+    def subset_ranks(self, mask):
+        """Ranghi (E, t) dentro il subset, nell'ordine originale dei fotoni"""
+        kx, ky = self.kx[mask], self.ky[mask]
+        return (average_ranks_by_key(kx, self.nx)[kx],
+                average_ranks_by_key(ky, self.ny)[ky])
+
+    def _spearman_result(self, rho, n):
+        return {'rho': float(rho), 'n': int(n),
+                'p_value': float(np.exp(r_to_logp(rho, n))),
+                'sigma': float(r_to_sigma(rho, n))}
+
+    def spearman(self, mask=None):
+        """Spearman rho con p-value e sigma (t con n-2 gradi, come scipy)"""
+        if mask is None:
+            rx, ry = self.rank_x, self.rank_y
+        else:
+            rx, ry = self.subset_ranks(mask)
+        return self._spearman_result(_pearson_weighted(rx, ry), len(rx))
+
+    def spearman_batch(self, masks):
+        """rho, n, p_value, sigma come array per una lista di maschere"""
+        rho = np.array([_pearson_weighted(*self.subset_ranks(m)) if m.sum() > 2 else np.nan
+                        for m in masks])
+        n = np.array([m.sum() for m in masks])
+        return {'rho': rho, 'n': n, 'p_value': np.exp(r_to_logp(rho, n)),
+                'sigma': r_to_sigma(rho, n)}
+
+    # ------------------------------------------------------------------
+    # Kendall
+    # ------------------------------------------------------------------
+
+    def _sequences(self, selections):
+        """Concatena le sequenze (E, t)-ordinate di piu' selezioni di indici"""
+        seqs = [self.lex_order if sel is None else sel for sel in selections]
+        seg = np.repeat(np.arange(len(seqs)), [len(s) for s in seqs])
+        order = np.concatenate(seqs)
+        return self.kx[order], self.ky[order], seg
+
+    def _kendall_results(self, selections):
+        kx, ky, seg = self._sequences(selections)
+        tau, z = kendall_from_sorted(kx, ky, seg, len(selections), self.ny)
+        return tau, z, np.bincount(seg, minlength=len(selections))
+
+    def _ordered_subset(self, mask):
+        return None if mask is None else self.lex_order[mask[self.lex_order]]
+
+    def kendall(self, mask=None):
+        """Kendall tau-b con p-value asintotico e sigma"""
+        tau, z, n = self._kendall_results([self._ordered_subset(mask)])
+        return {'tau': float(tau[0]), 'n': int(n[0]),
+                'p_value': float(sigma_to_p(z[0])), 'sigma': float(abs(z[0]))}
+
+    def kendall_batch(self, masks):
+        """tau, n, p_value, sigma come array; un solo conteggio segmentato"""
+        tau, z, n = self._kendall_results([self._ordered_subset(m) for m in masks])
+        return {'tau': tau, 'n': n, 'p_value': sigma_to_p(z), 'sigma': np.abs(z)}
+
+    def rank_suite(self, masks=None):
+        """Spearman + Kendall globali e (opzionale) per una lista/dict di subset"""
+        result = {'spearman': self.spearman(), 'kendall': self.kendall()}
+        if masks:
+            names = list(masks) if isinstance(masks, dict) else list(range(len(masks)))
+            mask_list = list(masks.values()) if isinstance(masks, dict) else list(masks)
+            sp, kd = self.spearman_batch(mask_list), self.kendall_batch(mask_list)
+            result['subsets'] = {
+                name: {'n': int(sp['n'][i]), 'spearman_rho': float(sp['rho'][i]),
+                       'spearman_sigma': float(sp['sigma'][i]), 'kendall_tau': float(kd['tau'][i]),
+                       'kendall_sigma': float(kd['sigma'][i])}
+                for i, name in enumerate(names)
+            }
+        return result
+
+    # ------------------------------------------------------------------
+    # Permutazioni e bootstrap sui ranghi in cache
+    # ------------------------------------------------------------------
+
+    def _statistic(self, statistic):
+        if statistic not in ('spearman', 'kendall'):
+            raise ValueError(f"Unknown rank statistic: {statistic}")
+        return self.spearman()['rho'] if statistic == 'spearman' else self.kendall()['tau']
+
+    def permutation_null(self, statistic='spearman', n_permutations=1000, seed=None, chunk=64):
+        """Distribuzione nulla permutando i tempi rispetto alle energie"""
+        rng = np.random.default_rng(seed)
+        null = np.empty(n_permutations)
+
+        if statistic == 'spearman':
+            # I ranghi di una permutazione sono i ranghi permutati: basta il prodotto scalare
+            rx = self.rank_x - self.rank_x.mean()
+            ry = self.rank_y - self.rank_y.mean()
+            norm = np.sqrt(np.dot(rx, rx) * np.dot(ry, ry))
+            for start in range(0, n_permutations, chunk):
+                k = min(chunk, n_permutations - start)
+                perms = np.argsort(rng.random((k, self.n)), axis=1)
+                null[start:start + k] = ry[perms] @ rx / norm
+            return null
+
+        self._statistic(statistic)
+        for start in range(0, n_permutations, chunk):
+            k = min(chunk, n_permutations - start)
+            selections, kys = [], []
+            for _ in range(k):
+                ky = self.ky[rng.permutation(self.n)]
+                order = np.lexsort((ky, self.kx))
+                kys.append(ky[order])
+                selections.append(order)
+            seg = np.repeat(np.arange(k), self.n)
+            kx = np.concatenate([self.kx[o] for o in selections])
+            tau, _ = kendall_from_sorted(kx, np.concatenate(kys), seg, k, self.ny)
+            null[start:start + k] = tau
+        return null
+
+    def permutation_test(self, statistic='spearman', n_permutations=1000, seed=None):
+        """p-value di permutazione a due code (con correzione +1)"""
+        observed = self._statistic(statistic)
+        null = self.permutation_null(statistic, n_permutations, seed)
+        p_value = (np.sum(np.abs(null) >= abs(observed)) + 1) / (n_permutations + 1)
+        return {'statistic': statistic, 'observed': float(observed),
+                'n_permutations': n_permutations, 'p_value': float(p_value),
+                'null_mean': float(null.mean()), 'null_std': float(null.std())}
+
+    def bootstrap(self, statistic='spearman', n_bootstrap=1000, seed=None, chunk=64, ci=0.95):
+        """
+        Bootstrap senza materializzare i ricampionamenti: ogni resample e'
+        un vettore di molteplicita'; i ranghi vengono dai conteggi per
+        chiave e, per Kendall, la sequenza (E, t)-ordinata e' lex_order
+        ripetuto secondo le molteplicita'.
+        """
+        self._statistic(statistic)
+        rng = np.random.default_rng(seed)
+        values = np.empty(n_bootstrap)
+
+        for start in range(0, n_bootstrap, chunk):
+            k = min(chunk, n_bootstrap - start)
+            mult = [np.bincount(rng.integers(0, self.n, self.n), minlength=self.n) for _ in range(k)]
+            if statistic == 'spearman':
+                for i, m in enumerate(mult):
+                    rx = average_ranks_by_key(self.kx, self.nx, weights=m)[self.kx]
+                    ry = average_ranks_by_key(self.ky, self.ny, weights=m)[self.ky]
+                    values[start + i] = _pearson_weighted(rx, ry, m.astype(float))
+            else:
+                selections = [np.repeat(self.lex_order, m[self.lex_order]) for m in mult]
+                tau, _, _ = self._kendall_results(selections)
+                values[start:start + k] = tau
+
+        alpha = (1 - ci) / 2
+        return {'statistic': statistic, 'n_bootstrap': n_bootstrap,
+                'mean': float(values.mean()), 'std': float(values.std()),
+                'ci_low': float(np.quantile(values, alpha)),
+                'ci_high': float(np.quantile(values, 1 - alpha))}
@@ -15,12 +15,14 @@ import numpy as np
 import pandas as pd
 import json
 from datetime import datetime
-from scipy import stats
-from sklearn.linear_model import RANSACRegressor
-from sklearn.utils import resample
 import requests
 import os
 
+from grb_batch_engine import RaggedPhotons, analyze_batch
+
+N_PERMUTATIONS = 10000  # Più permutazioni per dati reali
+N_BOOTSTRAP = 5000  # Più bootstrap per dati reali
+
 def download_real_fermi_catalog():
     """
     Download catalogo Fermi LAT reale
@@ -135,59 +137,29 @@ def generate_realistic_fermi_data(grb_name, grb_info):
     
     return data
 
-def analyze_real_grb_data(grb_name, data):
+def analyze_real_grb_data(grb_name, data, batch_stats=None):
     """
     Analizza dati GRB reali per effetti QG
+
+    batch_stats: statistiche gia' calcolate da grb_batch_engine.analyze_batch
+    (tutti i GRB in un passaggio); se None il dataset viene analizzato da solo.
     """
     print(f"🔍 Analyzing REAL {grb_name} data for QG effects...")
     
-    # Estrai dati
-    E = data['energy'].values
-    t = data['time'].values
-    z = data['redshift'].iloc[0]
-    trigger_time = data['trigger_time'].iloc[0]
-    
-    # Converti tempi in secondi relativi al trigger
-    t_rel = t - trigger_time
-    
-    # Analisi correlazione energia-tempo
-    pearson_r, pearson_p = stats.pearsonr(E, t_rel)
-    spearman_r, spearman_p = stats.spearmanr(E, t_rel)
-    
-    # Test significatività
-    n = len(E)
-    t_stat = pearson_r * np.sqrt((n-2)/(1-pearson_r**2))
-    sigma = abs(t_stat)
-    
-    # Permutation test
-    n_perm = 10000  # Più permutazioni per dati reali
-    perm_correlations = []
-    for _ in range(n_perm):
-        E_perm = np.random.permutation(E)
-        r_perm, _ = stats.pearsonr(E_perm, t_rel)
-        perm_correlations.append(r_perm)
-    
-    perm_p = np.mean(np.abs(perm_correlations) >= abs(pearson_r))
-    
-    # Bootstrap analysis
-    n_bootstrap = 5000  # Più bootstrap per dati reali
-    bootstrap_correlations = []
-    for _ in range(n_bootstrap):
-        indices = resample(range(n), n_samples=n)
-        E_bs = E[indices]
-        t_bs = t_rel[indices]
-        r_bs, _ = stats.pearsonr(E_bs, t_bs)
-        bootstrap_correlations.append(r_bs)
-    
-    bootstrap_ci = np.percentile(bootstrap_correlations, [2.5, 97.5])
-    
-    # RANSAC regression
-    X = E.reshape(-1, 1)
-    y = t_rel
-    ransac = RANSACRegressor(random_state=42)
-    ransac.fit(X, y)
-    slope = ransac.estimator_.coef_[0]
-    inliers = np.sum(ransac.inlier_mask_)
+    if batch_stats is None:
+        batch_stats = analyze_batch(RaggedPhotons.from_frames({grb_name: data}),
+                                    n_permutations=N_PERMUTATIONS, n_bootstrap=N_BOOTSTRAP)[grb_name]
+    
+    # Correlazioni, permutation test, bootstrap e RANSAC dal batch engine
+    z = batch_stats['redshift']
+    n = batch_stats['n_photons']
+    pearson_r, pearson_p = batch_stats['pearson_r'], batch_stats['pearson_p']
+    spearman_r, spearman_p = batch_stats['spearman_r'], batch_stats['spearman_p']
+    sigma = abs(batch_stats['t_stat'])
+    perm_p = batch_stats['permutation_p']
+    bootstrap_ci = batch_stats['bootstrap_ci']
+    slope = batch_stats['ransac_slope']
+    inliers = batch_stats['ransac_inliers']
     inlier_ratio = inliers / n
     
     # Stima E_QG
@@ -204,8 +176,8 @@ def analyze_real_grb_data(grb_name, data):
         'grb_name': grb_name,
         'redshift': z,
         'n_photons': n,
-        'energy_range': [E.min(), E.max()],
-        'time_range': [t_rel.min(), t_rel.max()],
+        'energy_range': [batch_stats['energy_min'], batch_stats['energy_max']],
+        'time_range': [batch_stats['time_min'], batch_stats['time_max']],
         'pearson_r': pearson_r,
         'pearson_p': pearson_p,
         'spearman_r': spearman_r,
@@ -248,15 +220,25 @@ def massive_real_data_analysis():
     
     print(f"🛰️ Analyzing {len(grb_catalog)} REAL GRBs...")
     
+    frames = {}
     for grb_name, grb_info in grb_catalog.items():
-        print(f"\n🔍 Analyzing REAL {grb_name}...")
+        print(f"\n🔍 Generating REAL {grb_name}...")
         
         try:
             # Genera dati realistici
-            data = generate_realistic_fermi_data(grb_name, grb_info)
-            
+            frames[grb_name] = generate_realistic_fermi_data(grb_name, grb_info)
+        except Exception as e:
+            print(f"❌ Error generating {grb_name}: {e}")
+    
+    # Tutti i GRB in un solo passaggio vettorizzato (layout ragged)
+    print(f"\n⚡ Batch analysis of {len(frames)} GRBs...")
+    batch = analyze_batch(RaggedPhotons.from_frames(frames), n_permutations=N_PERMUTATIONS,
+                          n_bootstrap=N_BOOTSTRAP, seed=42)
+    
+    for grb_name, data in frames.items():
+        try:
             # Analizza GRB
-            result = analyze_real_grb_data(grb_name, data)
+            result = analyze_real_grb_data(grb_name, data, batch[grb_name])
             results[grb_name] = result
             
             if result['significant']:
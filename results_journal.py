@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+RESULTS JOURNAL - Checkpoint/resume per analisi batch lunghe
+============================================================
+Journal append-only in JSON lines, un record per GRB analizzato:
+
+    {"key": "GRB090902B", "status": "SUCCESS", "input_hash": ..., "config_hash": ...,
+     "timestamp": ..., "result": {...}}
+
+- ogni record e' scritto con una sola write su un file aperto in append
+  e poi fsync: un crash lascia al piu' una riga troncata, che viene
+  ignorata in lettura
+- al rerun i GRB gia' completati con stessi input e stessa configurazione
+  vengono saltati (is_done); se cambiano input o codice vengono rifatti
+- i report finali si costruiscono in streaming sull'ultimo record di
+  ogni GRB (iter_latest), senza tenere tutti i risultati in memoria;
+  results(current=...) esclude i GRB non piu' nel catalogo o con input
+  cambiati
+
+Autore: Christian Quintino De Luca
+Affiliazione: RTH Italia - Research & Technology Hub
+"""
+
+import csv
+import hashlib
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+
+def fingerprint(*parts):
+    """Hash stabile di dict/liste/valori (JSON ordinato)"""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(json.dumps(part, sort_keys=True, default=str).encode())
+    return h.hexdigest()[:24]
+
+
+def file_fingerprint(*paths):
+    """Identita' dei file di input: path, dimensione e mtime (None se mancante)"""
+    parts = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            parts.append([os.path.abspath(path), stat.st_size, stat.st_mtime_ns])
+        except OSError:
+            parts.append([os.path.abspath(path), None, None])
+    return fingerprint(parts)
+
+
+class ResultsJournal:
+    """Journal JSONL append-only con resume per chiave"""
+
+    def __init__(self, path, config=None, done_statuses=('SUCCESS',)):
+        self.path = Path(path)
+        self.config_hash = fingerprint(config) if config is not None else None
+        self.done_statuses = tuple(done_statuses)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._index = self._scan()
+
+    def _read_records(self):
+        """(offset, record) per ogni riga valida; righe troncate/corrotte ignorate"""
+        if not self.path.exists():
+            return
+        with open(self.path, 'rb') as f:
+            offset = 0
+            for line in f:
+                start = offset
+                offset += len(line)
+                if not line.endswith(b'\n'):
+                    break  # ultima riga troncata da un crash
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                yield start, record
+
+    def _scan(self):
+        """Indice chiave -> (offset, status, input_hash, config_hash) dell'ultimo record"""
+        index = {}
+        for offset, record in self._read_records():
+            index[record['key']] = (offset, record.get('status'), record.get('input_hash'),
+                                    record.get('config_hash'))
+        return index
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def is_done(self, key, input_hash=None):
+        """True se l'ultimo record di key e' completato con stessi input e config"""
+        entry = self._index.get(key)
+        if entry is None:
+            return False
+        _, status, rec_input, rec_config = entry
+        return (status in self.done_statuses and rec_input == input_hash
+                and rec_config == self.config_hash)
+
+    def record(self, key, result, status='SUCCESS', input_hash=None):
+        """Aggiunge un record (una write + fsync)"""
+        record = {
+            'key': key,
+            'status': status,
+            'input_hash': input_hash,
+            'config_hash': self.config_hash,
+            'timestamp': datetime.now().isoformat(),
+            'result': result
+        }
+        line = (json.dumps(record, default=_json_default) + '\n').encode('utf-8')
+
+        with open(self.path, 'ab') as f:
+            # Se l'ultima riga e' troncata (crash precedente) inizia su riga nuova
+            if f.tell() > 0:
+                with open(self.path, 'rb') as r:
+                    r.seek(-1, os.SEEK_END)
+                    if r.read(1) != b'\n':
+                        f.write(b'\n')
+            offset = f.tell()
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+        self._index[key] = (offset, status, input_hash, self.config_hash)
+        return record
+
+    def get(self, key):
+        """Ultimo record completo di key (None se assente)"""
+        entry = self._index.get(key)
+        if entry is None:
+            return None
+        with open(self.path, 'rb') as f:
+            f.seek(entry[0])
+            return json.loads(f.readline())
+
+    def iter_latest(self, statuses=None):
+        """Ultimo record per chiave, in ordine di inserimento, letto dal disco"""
+        latest = {offset for offset, *_ in self._index.values()}
+        for offset, record in self._read_records():
+            if offset in latest and (statuses is None or record.get('status') in statuses):
+                yield record
+
+    def results(self, statuses=('SUCCESS',), current=None):
+        """
+        Generatore di (key, result) per i record con status richiesto.
+        current (dict chiave -> input_hash): solo le chiavi del catalogo
+        attuale con stessi input e stessa configurazione, senza i record
+        rimasti da run precedenti
+        """
+        for record in self.iter_latest(statuses):
+            key = record['key']
+            if current is not None and (key not in current or record.get('input_hash') != current[key]
+                                        or record.get('config_hash') != self.config_hash):
+                continue
+            yield key, record['result']
+
+
+def _json_default(obj):
+    """numpy e altri tipi non JSON"""
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    if hasattr(obj, 'item'):
+        return obj.item()
+    return str(obj)
+
+
+def write_json_report(path, header, items, items_key='results'):
+    """
+    Scrive {header..., items_key: {key: value, ...}} in streaming da un
+    iteratore di (key, value); scrittura su file temporaneo + os.replace.
+    """
+    path = Path(path)
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write('{\n')
+        for name, value in header.items():
+            f.write(f'  {json.dumps(name)}: {json.dumps(value, default=_json_default)},\n')
+        f.write(f'  {json.dumps(items_key)}: {{')
+        first = True
+        for key, value in items:
+            f.write('\n' if first else ',\n')
+            f.write(f'    {json.dumps(key)}: {json.dumps(value, default=_json_default)}')
+            first = False
+        f.write('\n  }\n}\n')
+    os.replace(tmp, path)
+
+
+def write_csv_report(path, rows, fieldnames):
+    """CSV in streaming da un iteratore di dict; scrittura atomica"""
+    path = Path(path)
+    tmp = path.with_name(path.name + '.tmp')
+    n_rows = 0
+    with open(tmp, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction='ignore')
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            n_rows += 1
+    os.replace(tmp, path)
+    return n_rows
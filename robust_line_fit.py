@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+ROBUST LINE FIT (RANSAC 1-D)
+============================
+
+Regressione lineare robusta specializzata per dati energia-tempo.
+Sostituisce sklearn RANSACRegressor nelle analisi QG:
+
+- ipotesi generate e valutate a blocchi (vettoriale, nessun loop per trial)
+- arresto adattivo sul numero di trial (stop_probability)
+- warm start dal modello di consenso dell'insieme padre
+- fit di tutti i sottoinsiemi di un GRB (IRF, event class, PSF, zenith)
+  in una sola chiamata, ciascuno partendo dal consenso del GRB completo
+
+Uso come drop-in:
+    ransac = RANSACLineFitter(random_state=42)
+    ransac.fit(X, y)
+    slope = ransac.estimator_.coef_[0]
+    intercept = ransac.estimator_.intercept_
+    inlier_mask = ransac.inlier_mask_
+
+Autore: Christian Quintino De Luca
+Affiliazione: RTH Italia - Research & Technology Hub
+"""
+
+import numpy as np
+
+# Limite elementi della matrice residui (ipotesi x fotoni) per blocco
+MAX_BATCH_ELEMENTS = 4_000_000
+
+
+class LinearModel:
+    """Modello lineare con attributi compatibili sklearn (coef_, intercept_)"""
+
+    def __init__(self, slope, intercept):
+        self.coef_ = np.array([slope])
+        self.intercept_ = intercept
+
+    def predict(self, X):
+        x = np.asarray(X, dtype=float).reshape(-1)
+        return self.coef_[0] * x + self.intercept_
+
+
+def _least_squares(x, y):
+    """Retta ai minimi quadrati su array 1-D"""
+    x_mean = x.mean()
+    y_mean = y.mean()
+    dx = x - x_mean
+    sxx = np.dot(dx, dx)
+    if sxx == 0:
+        return 0.0, y_mean
+    slope = np.dot(dx, y - y_mean) / sxx
+    return slope, y_mean - slope * x_mean
+
+
+def _batched_hypotheses(x, y, indices):
+    """
+    Fit ai minimi quadrati di B sottoinsiemi (indices: B x m) in un colpo solo
+    """
+    xs = x[indices]
+    ys = y[indices]
+    m = indices.shape[1]
+    sx = xs.sum(axis=1)
+    sy = ys.sum(axis=1)
+    sxx = np.einsum('ij,ij->i', xs, xs)
+    sxy = np.einsum('ij,ij->i', xs, ys)
+    denom = m * sxx - sx * sx
+    valid = denom > 1e-12 * np.maximum(m * sxx, 1e-300)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        slopes = np.where(valid, (m * sxy - sx * sy) / denom, np.nan)
+    intercepts = (sy - slopes * sx) / m
+    return slopes, intercepts, valid
+
+
+def _required_trials(inlier_ratio, n_samples, stop_probability):
+    """Numero di trial richiesto per la probabilita' di arresto"""
+    if inlier_ratio <= 0:
+        return np.inf
+    p_good = inlier_ratio ** n_samples
+    if p_good >= 1:
+        return 1
+    if p_good <= 0:
+        return np.inf
+    # log1p: per p_good sotto l'epsilon di macchina log(1 - p_good) vale 0
+    denominator = np.log1p(-p_good)
+    if denominator == 0 or not np.isfinite(denominator):
+        return np.inf
+    return np.ceil(np.log(1 - stop_probability) / denominator)
+
+
+class RANSACLineFitter:
+    """
+    RANSAC per una retta y = slope * x + intercept
+
+    Parametri come sklearn.linear_model.RANSACRegressor:
+    min_samples (int o frazione), residual_threshold (default MAD di y),
+    max_trials, stop_probability, random_state.
+    """
+
+    def __init__(self, min_samples=None, residual_threshold=None, max_trials=100,
+                 stop_probability=0.99, random_state=None):
+        self.min_samples = min_samples
+        self.residual_threshold = residual_threshold
+        self.max_trials = max_trials
+        self.stop_probability = stop_probability
+        self.random_state = random_state
+
+    def _n_samples(self, n):
+        if self.min_samples is None:
+            return 2
+        if 0 < self.min_samples < 1:
+            return max(2, int(np.ceil(self.min_samples * n)))
+        return max(2, int(self.min_samples))
+
+    def fit(self, X, y, warm_start=None):
+        """
+        Fit robusto. warm_start = (slope, intercept) del modello padre,
+        valutato come prima ipotesi.
+        """
+        x = np.asarray(X, dtype=float).reshape(-1)
+        y = np.asarray(y, dtype=float).reshape(-1)
+        n = len(x)
+        if n < 2:
+            raise ValueError(f"RANSAC needs at least 2 samples, got {n}")
+
+        m = min(self._n_samples(n), n)
+        threshold = self.residual_threshold
+        if threshold is None:
+            threshold = np.median(np.abs(y - np.median(y)))
+
+        rng = np.random.RandomState(self.random_state)
+
+        best_count = -1
+        best_score = np.inf
+        best = None
+        n_trials = 0
+        max_trials = self.max_trials
+
+        if warm_start is not None:
+            slope0, intercept0 = warm_start
+            resid = np.abs(y - (slope0 * x + intercept0))
+            inliers = resid <= threshold
+            best_count = int(inliers.sum())
+            best_score = resid[inliers].sum()
+            best = (slope0, intercept0)
+            max_trials = min(max_trials, _required_trials(best_count / n, m, self.stop_probability))
+
+        batch = max(1, min(64, MAX_BATCH_ELEMENTS // max(n, m)))
+
+        while n_trials < max_trials:
+            b = int(min(batch, max_trials - n_trials))
+            n_trials += b
+
+            # Sottoinsiemi casuali senza ripetizione per riga
+            if m == 2:
+                i = rng.randint(0, n, size=b)
+                j = (i + rng.randint(1, n, size=b)) % n
+                indices = np.column_stack([i, j])
+            else:
+                indices = np.argsort(rng.random_sample((b, n)), axis=1)[:, :m]
+
+            slopes, intercepts, valid = _batched_hypotheses(x, y, indices)
+            if not valid.any():
+                continue
+            slopes = slopes[valid]
+            intercepts = intercepts[valid]
+
+            # Punteggio: numero di inlier, poi somma residui sugli inlier
+            resid = np.abs(y[None, :] - (slopes[:, None] * x[None, :] + intercepts[:, None]))
+            inliers = resid <= threshold
+            counts = inliers.sum(axis=1)
+            scores = np.where(inliers, resid, 0.0).sum(axis=1)
+
+            order = np.lexsort((scores, -counts))
+            k = order[0]
+            if counts[k] > best_count or (counts[k] == best_count and scores[k] < best_score):
+                best_count = int(counts[k])
+                best_score = scores[k]
+                best = (slopes[k], intercepts[k])
+                max_trials = min(max_trials, _required_trials(best_count / n, m, self.stop_probability))
+
+        if best is None:
+            raise ValueError("RANSAC could not find a valid consensus set")
+
+        # Modello finale: minimi quadrati sul consenso migliore
+        inlier_mask = np.abs(y - (best[0] * x + best[1])) <= threshold
+        if inlier_mask.sum() >= 2:
+            slope, intercept = _least_squares(x[inlier_mask], y[inlier_mask])
+        else:
+            slope, intercept = best
+
+        self.slope_ = float(slope)
+        self.intercept_ = float(intercept)
+        self.inlier_mask_ = inlier_mask
+        self.n_trials_ = n_trials
+        self.residual_threshold_ = threshold
+        self.estimator_ = LinearModel(self.slope_, self.intercept_)
+        return self
+
+    def predict(self, X):
+        return self.estimator_.predict(X)
+
+    def fit_subsets(self, x, y, subsets, min_photons=3):
+        """
+        Fit del GRB completo e di tutti i sottoinsiemi con warm start dal padre.
+
+        subsets: dict nome -> maschera booleana (o array di indici).
+        Ritorna (parent, {nome: (slope, intercept, inlier_mask)}).
+        """
+        x = np.asarray(x, dtype=float).reshape(-1)
+        y = np.asarray(y, dtype=float).reshape(-1)
+
+        parent = RANSACLineFitter(self.min_samples, self.residual_threshold, self.max_trials,
+                                  self.stop_probability, self.random_state).fit(x, y)
+        warm = (parent.slope_, parent.intercept_)
+
+        results = {}
+        for name, selection in subsets.items():
+            xs = x[selection]
+            if len(xs) < max(min_photons, 2):
+                continue
+            self.fit(xs, y[selection], warm_start=warm)
+            results[name] = (self.slope_, self.intercept_, self.inlier_mask_)
+
+        return parent, results
+
+
+def ransac_line(x, y, warm_start=None, **kwargs):
+    """Scorciatoia funzionale: ritorna (slope, intercept, inlier_mask)"""
+    fitter = RANSACLineFitter(**kwargs).fit(x, y, warm_start=warm_start)
+    return fitter.slope_, fitter.intercept_, fitter.inlier_mask_
@@ -23,6 +23,8 @@ from datetime import datetime
 import warnings
 warnings.filterwarnings('ignore')
 
+from liv_cosmology import liv_sensitivity
+
 # Configurazione matplotlib
 plt.style.use('default')
 plt.rcParams['figure.figsize'] = (12, 8)
@@ -77,69 +79,47 @@ def test_cosmological_parameters():
     Omega_M_values = [0.25, 0.30, 0.35, 0.40, 0.45]
     Omega_Lambda_values = [0.60, 0.70, 0.75, 0.80, 0.85]
     
-    results = {}
-    
-    # Test H0
-    print("  🔬 Testando H0...")
-    H0_results = []
-    for H0 in H0_values:
-        energies, times, redshift = generate_test_grb_data()
-        
-        # Calcola d_L con H0 diverso
-        c = 3e5  # km/s
-        d_L = (c / H0) * redshift * (1 + redshift)
-        
-        # Analisi QG
-        correlation = np.corrcoef(energies, times)[0, 1]
-        significance = abs(correlation) * np.sqrt(len(energies) - 2) / np.sqrt(1 - correlation**2)
-        
-        slope, _ = np.polyfit(energies, times, 1)
-        if abs(slope) > 1e-10:
-            E_QG = d_L * 3.086e22 / (c * abs(slope)) / 1e9
-        else:
-            E_QG = np.inf
-        
-        H0_results.append({
-            'H0': H0,
+    # Dati e fit una sola volta: la cosmologia entra solo in K(z), non in t(E)
+    energies, times, redshift = generate_test_grb_data()
+    correlation = np.corrcoef(energies, times)[0, 1]
+    significance = abs(correlation) * np.sqrt(len(energies) - 2) / np.sqrt(1 - correlation**2)
+    slope, _ = np.polyfit(energies, times, 1)
+    
+    # Intera griglia H0 x Omega_M x Omega_Lambda in una chiamata
+    print("  🔬 Griglia H0 x Omega_M x Omega_Lambda...")
+    grid = liv_sensitivity(slope, redshift, 1, H0_values, Omega_M_values, Omega_Lambda_values)
+    
+    def variation(key, values, **fixed):
+        # Sezione 1-D: gli altri parametri al valore di riferimento
+        E_QG = liv_sensitivity(slope, redshift, 1, **{f'{key}_values': values}, **fixed)['E_QG']
+        return [{
+            key: value,
             'correlation': correlation,
             'significance': significance,
-            'E_QG': E_QG
-        })
-    
-    results['H0_variation'] = H0_results
-    
-    # Test Omega_M
-    print("  🔬 Testando Omega_M...")
-    Omega_M_results = []
-    for Omega_M in Omega_M_values:
-        energies, times, redshift = generate_test_grb_data()
-        
-        # Calcola d_L con Omega_M diverso (approssimazione)
-        c = 3e5
-        H0 = 70.0
-        Omega_Lambda = 0.70
-        d_L = (c / H0) * redshift * (1 + redshift) * (1 + 0.1 * (Omega_M - 0.30))
-        
-        # Analisi QG
-        correlation = np.corrcoef(energies, times)[0, 1]
-        significance = abs(correlation) * np.sqrt(len(energies) - 2) / np.sqrt(1 - correlation**2)
-        
-        slope, _ = np.polyfit(energies, times, 1)
-        if abs(slope) > 1e-10:
-            E_QG = d_L * 3.086e22 / (c * abs(slope)) / 1e9
-        else:
-            E_QG = np.inf
-        
-        Omega_M_results.append({
-            'Omega_M': Omega_M,
-            'correlation': correlation,
-            'significance': significance,
-            'E_QG': E_QG
-        })
-    
-    results['Omega_M_variation'] = Omega_M_results
-    
-    return results
+            'E_QG': float(e)
+        } for value, e in zip(values, E_QG.ravel())]
+    
+    lo, median, hi = grid['E_QG_quantiles'][:, 0]
+    print(f"  E_QG (Planck 2018): {grid['E_QG_reference'][0]:.2e} GeV")
+    print(f"  E_QG banda 68%: {lo:.2e} - {hi:.2e} GeV (mediana {median:.2e})")
+    
+    return {
+        'H0_variation': variation('H0', H0_values),
+        'Omega_M_variation': variation('Omega_M', Omega_M_values),
+        'Omega_L_variation': variation('Omega_L', Omega_Lambda_values),
+        'grid': {
+            'H0': H0_values,
+            'Omega_M': Omega_M_values,
+            'Omega_L': Omega_Lambda_values,
+            'slope': slope,
+            'E_QG': grid['E_QG'][..., 0],
+            'E_QG_reference': grid['E_QG_reference'][0],
+            'E_QG_min': grid['E_QG_min'][0],
+            'E_QG_max': grid['E_QG_max'][0],
+            'E_QG_68': [lo, hi],
+            'E_QG_median': median
+        }
+    }
 
 def test_intrinsic_lag_models():
     """Test robustezza a modelli lag intrinseci"""
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+SLIDING CORRELATION - Correlazione energia-tempo su finestre mobili
+===================================================================
+Correlazione e significativita' come funzione continua di inizio e
+larghezza della finestra, su fotoni ordinati nel tempo:
+
+- i fotoni sono divisi in blocchi di CHUNK; dentro ogni blocco somme
+  cumulative dei valori centrati sulla media del blocco, fra blocchi somme
+  cumulative dei co-momenti dei blocchi
+- una finestra qualsiasi [start, stop) = coda di un blocco + blocchi interi
+  + testa di un blocco: tre co-momenti fusi con l'aggiornamento a coppie
+  (Chan et al.), O(1) per finestra e senza le cancellazioni delle somme
+  prefisse globali su finestre strette
+- finestre a numero di fotoni o a durata fissa, mappe su piu' larghezze,
+  scansione di tutti i punti di split early/late e change point (massima
+  differenza di Fisher z) in tempo lineare, con calibrazione opzionale
+  per permutazione del massimo della scansione
+
+    windows = sliding_correlation(times, energies, width=200, step=10)
+    scan = split_scan(times, energies, min_photons=20)
+    change = detect_change_point(times, energies, n_permutations=200, seed=42)
+
+Autore: Christian Quintino De Luca
+Affiliazione: RTH Italia - Research & Technology Hub
+"""
+
+import numpy as np
+
+from significance import p_to_sigma, r_to_logp, r_to_sigma
+
+CHUNK = 1024
+MIN_WINDOW_PHOTONS = 10
+
+
+# ============================================================================
+# CO-MOMENTI DI INTERVALLI
+# ============================================================================
+
+def _merge(a, b):
+    """Fusione a coppie di (n, media E, media t, C_ee, C_tt, C_et)"""
+    na, ma_e, ma_t, caa, cbb, cab = a
+    nb, mb_e, mb_t, daa, dbb, dab = b
+    n = na + nb
+    safe = np.maximum(n, 1)
+    d_e, d_t = mb_e - ma_e, mb_t - ma_t
+    w = na * nb / safe
+    return (n, ma_e + d_e * nb / safe, ma_t + d_t * nb / safe,
+            caa + daa + d_e * d_e * w, cbb + dbb + d_t * d_t * w, cab + dab + d_e * d_t * w)
+
+
+def _moments(n, anchor_e, anchor_t, s_e, s_t, s_ee, s_tt, s_et):
+    """Co-momenti da somme di valori centrati su un'ancora"""
+    safe = np.maximum(n, 1)
+    return (n, anchor_e + s_e / safe, anchor_t + s_t / safe,
+            s_ee - s_e * s_e / safe, s_tt - s_t * s_t / safe, s_et - s_e * s_t / safe)
+
+
+class WindowComoments:
+    """Co-momenti energia-tempo di qualsiasi intervallo di fotoni ordinati nel tempo in O(1)"""
+
+    def __init__(self, times, energies, chunk=CHUNK, assume_sorted=False):
+        times = np.asarray(times, dtype=float)
+        energies = np.asarray(energies, dtype=float)
+        if len(times) != len(energies):
+            raise ValueError("times and energies must have the same length")
+        if assume_sorted:
+            self.order = np.arange(len(times))
+        else:
+            self.order = np.argsort(times, kind='mergesort')
+        self.times = times[self.order]
+        self.energies = energies[self.order]
+        self.n = len(times)
+        self.chunk = int(chunk)
+
+        # blocchi (n_chunks + 1 righe: l'ultima vuota per stop = n multiplo di chunk)
+        n_chunks = -(-self.n // self.chunk)
+        size = (n_chunks + 1) * self.chunk
+        valid = np.zeros(size, dtype=bool)
+        valid[:self.n] = True
+        valid = valid.reshape(-1, self.chunk)
+        counts = valid.sum(axis=1)
+
+        def blocks(values):
+            padded = np.zeros(size)
+            padded[:self.n] = values
+            return padded.reshape(-1, self.chunk)
+
+        # Centra sulla media globale: medie dei pezzi piccole anche con tempi MET
+        self.mean_e = self.energies.mean() if self.n else 0.0
+        self.mean_t = self.times.mean() if self.n else 0.0
+        e, t = blocks(self.energies - self.mean_e), blocks(self.times - self.mean_t)
+        safe = np.maximum(counts, 1)
+        self.anchor_e = e.sum(axis=1) / safe
+        self.anchor_t = t.sum(axis=1) / safe
+        e = np.where(valid, e - self.anchor_e[:, None], 0.0)
+        t = np.where(valid, t - self.anchor_t[:, None], 0.0)
+
+        def local_prefix(values):
+            out = np.zeros((values.shape[0], self.chunk + 1))
+            np.cumsum(values, axis=1, out=out[:, 1:])
+            return out
+
+        self.local = [local_prefix(v) for v in (e, t, e * e, t * t, e * t)]
+
+        # co-momenti di ogni blocco, poi somme cumulative centrate sulla media globale
+        n_c, m_e, m_t, c_ee, c_tt, c_et = _moments(
+            counts.astype(float), self.anchor_e, self.anchor_t, *(p[:, -1] for p in self.local))
+        raw = (n_c, n_c * m_e, n_c * m_t, c_ee + n_c * m_e * m_e, c_tt + n_c * m_t * m_t,
+               c_et + n_c * m_e * m_t)
+        self.global_prefix = [np.concatenate([[0.0], np.cumsum(r)]) for r in raw]
+
+    def _local(self, c, lo, hi):
+        sums = [p[c, hi] - p[c, lo] for p in self.local]
+        return _moments((hi - lo).astype(float), self.anchor_e[c], self.anchor_t[c], *sums)
+
+    def _full_chunks(self, c0, c1):
+        n, s_e, s_t, s_ee, s_tt, s_et = [p[c1] - p[c0] for p in self.global_prefix]
+        return _moments(n, 0.0, 0.0, s_e, s_t, s_ee, s_tt, s_et)
+
+    def moments(self, starts, stops):
+        """
+        (n, media E, media t, C_ee, C_tt, C_et) per ogni finestra [start, stop);
+        medie relative a mean_e, mean_t (medie globali).
+        """
+        starts = np.asarray(starts, dtype=np.int64)
+        stops = np.maximum(np.asarray(stops, dtype=np.int64), starts)
+        c_a, pos_a = np.divmod(starts, self.chunk)
+        c_b, pos_b = np.divmod(stops, self.chunk)
+        same = c_a == c_b
+        # coda del primo blocco (tutta la finestra se sta in un blocco solo)
+        head = self._local(c_a, pos_a, np.where(same, pos_b, self.chunk))
+        middle = self._full_chunks(np.where(same, c_a, c_a + 1), np.where(same, c_a, c_b))
+        tail = self._local(c_b, np.zeros_like(pos_b), np.where(same, 0, pos_b))
+        return _merge(_merge(head, middle), tail)
+
+    def statistics(self, starts, stops):
+        """Pearson r, pendenza dt/dE, sigma e p per finestra (NaN sotto 3 fotoni)"""
+        starts = np.asarray(starts, dtype=np.int64)
+        stops = np.asarray(stops, dtype=np.int64)
+        n, _, _, c_ee, c_tt, c_et = self.moments(starts, stops)
+        valid = n >= 3
+        with np.errstate(invalid='ignore', divide='ignore'):
+            r = np.where(valid, np.clip(c_et / np.sqrt(c_ee * c_tt), -1, 1), np.nan)
+            slope = np.where(valid, c_et / c_ee, np.nan)
+            safe_n = np.where(valid, n, 3)
+            sigma = np.where(valid, r_to_sigma(r, safe_n), np.nan)
+            p_value = np.where(valid, np.exp(r_to_logp(r, safe_n)), np.nan)
+        last = np.clip(stops - 1, 0, max(self.n - 1, 0))
+        return {
+            'start': starts,
+            'stop': stops,
+            't_start': self.times[np.clip(starts, 0, max(self.n - 1, 0))],
+            't_stop': self.times[last],
+            'n_photons': n.astype(int),
+            'correlation': r,
+            'slope': slope,
+            'significance_sigma': sigma,
+            'p_value': p_value,
+        }
+
+
+# ============================================================================
+# FINESTRE
+# ============================================================================
+
+def count_windows(n, width, step=1):
+    """Finestre di width fotoni consecutivi ogni step fotoni"""
+    starts = np.arange(0, max(n - width, -1) + 1, max(1, int(step)))
+    return starts, starts + width
+
+
+def time_windows(times_sorted, width, step):
+    """Finestre [t, t + width) con t = t_min + k * step (secondi)"""
+    t = np.asarray(times_sorted, dtype=float)
+    t_left = np.arange(t[0], max(t[-1] - width, t[0]) + step / 2, step)
+    return np.searchsorted(t, t_left, side='left'), np.searchsorted(t, t_left + width, side='left')
+
+
+def sliding_correlation(times, energies, width, step=1, unit='photons', min_photons=MIN_WINDOW_PHOTONS,
+                        comoments=None):
+    """
+    Correlazione E-t su finestre mobili. unit='photons': width e step in
+    fotoni; unit='seconds': finestre di durata fissa. Restituisce le
+    statistiche per finestra (WindowComoments.statistics) con t_center; le
+    finestre con meno di min_photons fotoni sono escluse.
+    """
+    comoments = comoments if comoments is not None else WindowComoments(times, energies)
+    if unit == 'photons':
+        starts, stops = count_windows(comoments.n, int(width), step)
+    elif unit == 'seconds':
+        starts, stops = time_windows(comoments.times, float(width), float(step))
+    else:
+        raise ValueError(f"Unknown window unit '{unit}'. Available: photons, seconds")
+    keep = (stops - starts) >= min_photons
+    result = comoments.statistics(starts[keep], stops[keep])
+    result['t_center'] = 0.5 * (result['t_start'] + result['t_stop'])
+    result['width'] = width
+    result['unit'] = unit
+    return result
+
+
+def correlation_map(times, energies, widths, step_fraction=0.1, unit='photons',
+                    min_photons=MIN_WINDOW_PHOTONS):
+    """sliding_correlation per ogni larghezza (passo = step_fraction * larghezza), un solo preprocessing"""
+    comoments = WindowComoments(times, energies)
+    maps = {}
+    for width in widths:
+        step = max(1, int(width * step_fraction)) if unit == 'photons' else width * step_fraction
+        maps[width] = sliding_correlation(None, None, width, step, unit, min_photons, comoments)
+    return maps
+
+
+# ============================================================================
+# SPLIT EARLY/LATE E CHANGE POINT
+# ============================================================================
+
+def _fisher_difference(r1, n1, r2, n2):
+    """z della differenza fra due correlazioni indipendenti (Fisher)"""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z1 = np.arctanh(np.clip(r1, -1 + 1e-15, 1 - 1e-15))
+        z2 = np.arctanh(np.clip(r2, -1 + 1e-15, 1 - 1e-15))
+        return (z2 - z1) / np.sqrt(1.0 / (n1 - 3) + 1.0 / (n2 - 3))
+
+
+def split_scan(times, energies, min_photons=MIN_WINDOW_PHOTONS, comoments=None):
+    """
+    Tutti gli split early = [0, k), late = [k, N) con almeno min_photons per
+    parte (finestre che si espandono in avanti e all'indietro). Restituisce
+    split_index, split_time, split_ratio, early/late (statistiche) e z_diff.
+    """
+    comoments = comoments if comoments is not None else WindowComoments(times, energies)
+    n = comoments.n
+    min_photons = max(int(min_photons), 4)
+    split = np.arange(min_photons, n - min_photons + 1)
+    early = comoments.statistics(np.zeros_like(split), split)
+    late = comoments.statistics(split, np.full_like(split, n))
+    return {
+        'split_index': split,
+        'split_time': comoments.times[np.minimum(split, n - 1)],
+        'split_ratio': split / n,
+        'early': early,
+        'late': late,
+        'z_diff': _fisher_difference(early['correlation'], early['n_photons'],
+                                     late['correlation'], late['n_photons']),
+    }
+
+
+def _window_summary(stats, i):
+    return {
+        'n_photons': int(stats['n_photons'][i]),
+        'r': float(stats['correlation'][i]),
+        'sigma': float(stats['significance_sigma'][i]),
+        'slope': float(stats['slope'][i]),
+    }
+
+
+def detect_change_point(times, energies, min_photons=MIN_WINDOW_PHOTONS, n_permutations=0,
+                        seed=None, rng=None):
+    """
+    Split early/late con la massima differenza di correlazione (|z| di
+    Fisher) fra tutti gli split. local_sigma e' la significativita' del
+    singolo split; con n_permutations > 0 il massimo della scansione viene
+    calibrato permutando le energie (scan_p, scan_sigma), O(N) per replica.
+    """
+    comoments = WindowComoments(times, energies)
+    if comoments.n < 2 * max(int(min_photons), 4):
+        return {}
+    scan = split_scan(None, None, min_photons, comoments)
+    z = np.abs(np.nan_to_num(scan['z_diff']))
+    best = int(np.argmax(z))
+    result = {
+        'split_index': int(scan['split_index'][best]),
+        'split_time': float(scan['split_time'][best]),
+        'split_ratio': float(scan['split_ratio'][best]),
+        'z_diff': float(scan['z_diff'][best]),
+        'local_sigma': float(z[best]),
+        'n_splits': int(len(z)),
+        'early': _window_summary(scan['early'], best),
+        'late': _window_summary(scan['late'], best),
+    }
+    if n_permutations:
+        rng = rng if rng is not None else np.random.default_rng(seed)
+        exceed = 0
+        for _ in range(n_permutations):
+            permuted = WindowComoments(comoments.times, rng.permutation(comoments.energies),
+                                       assume_sorted=True)
+            null_z = np.abs(np.nan_to_num(split_scan(None, None, min_photons, permuted)['z_diff']))
+            exceed += null_z.max() >= z[best]
+        scan_p = (1 + exceed) / (n_permutations + 1)
+        result['scan_p'] = float(scan_p)
+        result['scan_sigma'] = float(p_to_sigma(scan_p))
+    return result
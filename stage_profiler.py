@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+STAGE PROFILER - Tempo e memoria per stadio di analisi
+======================================================
+- context manager stage('nome', grb=...) e decorator @profiled
+- per stadio: wall time, CPU time, picco tracemalloc (se attivo) e
+  aumento di RSS dello stadio (rss_increase_mb = picco durante lo stadio
+  meno RSS all'ingresso); process_peak_rss_mb e' il picco cumulativo del
+  processo (ru_maxrss), non attribuibile al singolo stadio
+- stadi annidati: il path registra la gerarchia ('run_complete/global')
+  e i tag (es. grb) vengono ereditati dallo stadio padre o, al primo
+  livello, da set_context(grb=...)
+- un record JSON per stadio in un file .jsonl per run, piu' una tabella
+  riassuntiva di dove va il tempo per GRB
+- disattivato di default: stage() ritorna un context nullo condiviso e
+  @profiled chiama direttamente la funzione
+
+Attivazione:
+    GRBQG_PROFILE=1 python grb_analysis_simple.py          (JSONL in profiles/)
+    GRBQG_PROFILE=1 GRBQG_PROFILE_MEMORY=1 python ...       (anche tracemalloc)
+oppure da codice: stage_profiler.enable(trace_memory=True)
+
+Autore: Christian Quintino De Luca
+Affiliazione: RTH Italia - Research & Technology Hub
+"""
+
+import functools
+import json
+import os
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import nullcontext
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PROFILE_DIR = Path('profiles')
+
+_NULL_CONTEXT = nullcontext()
+
+
+def _peak_rss_mb():
+    """Picco RSS del processo in MB (None se non disponibile)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss e' in kB su Linux, in byte su macOS
+    return peak / (1024 ** 2) if sys.platform == 'darwin' else peak / 1024
+
+
+def _current_rss_mb():
+    """RSS corrente in MB da /proc (Linux); None altrove"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+
+
+class _Stage:
+    """Stadio attivo: misura all'ingresso, registra all'uscita"""
+
+    __slots__ = ('profiler', 'name', 'tags', 'path', 'wall0', 'cpu0', 'mem0', 'mem_peak', 'rss0', 'peak0')
+
+    def __init__(self, profiler, name, tags):
+        self.profiler = profiler
+        self.name = name
+        self.tags = tags
+
+    def __enter__(self):
+        prof = self.profiler
+        parent = prof._stack[-1] if prof._stack else None
+        self.path = f"{parent.path}/{self.name}" if parent else self.name
+        self.tags = {**(parent.tags if parent else prof.context), **self.tags}
+
+        if prof.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if parent:
+                parent.mem_peak = max(parent.mem_peak, peak)
+            tracemalloc.reset_peak()
+            self.mem0 = current
+            self.mem_peak = current
+
+        self.peak0 = _peak_rss_mb()
+        current = _current_rss_mb()
+        self.rss0 = current if current is not None else self.peak0
+
+        prof._stack.append(self)
+        self.cpu0 = time.process_time()
+        self.wall0 = time.perf_counter()
+        return self
+
+    def _rss_increase_mb(self, peak):
+        """
+        Picco RSS durante lo stadio meno RSS all'ingresso. Se lo stadio alza
+        il picco del processo il suo picco e' esatto (ru_maxrss); altrimenti
+        resta sotto il picco precedente e si usa l'RSS all'uscita.
+        """
+        if peak is None:
+            return None
+        if peak > self.peak0:
+            stage_peak = peak
+        else:
+            current = _current_rss_mb()
+            stage_peak = current if current is not None else self.rss0
+        return max(stage_peak - self.rss0, 0.0)
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self.wall0
+        cpu = time.process_time() - self.cpu0
+        prof = self.profiler
+        prof._stack.pop()
+        peak_rss = _peak_rss_mb()
+
+        record = {
+            'run_id': prof.run_id,
+            'stage': self.name,
+            'path': self.path,
+            'depth': len(prof._stack),
+            **self.tags,
+            'wall_s': wall,
+            'cpu_s': cpu,
+            'rss_increase_mb': self._rss_increase_mb(peak_rss),
+            'process_peak_rss_mb': peak_rss,
+            'ok': exc_type is None
+        }
+
+        if prof.trace_memory:
+            peak = max(self.mem_peak, tracemalloc.get_traced_memory()[1])
+            record['peak_traced_mb'] = (peak - self.mem0) / 1024 ** 2
+            if prof._stack:
+                parent = prof._stack[-1]
+                parent.mem_peak = max(parent.mem_peak, peak)
+            tracemalloc.reset_peak()
+
+        prof._record(record)
+        return False
+
+
+class StageProfiler:
+    """Raccoglie i record degli stadi e li scrive in JSON lines"""
+
+    def __init__(self):
+        self.enabled = False
+        self.trace_memory = False
+        self.run_id = None
+        self.output = None
+        self.records = []
+        self.context = {}
+        self._stack = []
+        self._file = None
+
+    def enable(self, output=None, trace_memory=False, run_id=None):
+        """Attiva il profiling (output: path .jsonl, default profiles/<run_id>.jsonl)"""
+        self.run_id = run_id or datetime.now().strftime('%Y%m%d_%H%M%S')
+        if output is None:
+            PROFILE_DIR.mkdir(exist_ok=True)
+            output = PROFILE_DIR / f"profile_{self.run_id}.jsonl"
+        self.output = Path(output)
+        self._file = open(self.output, 'a', encoding='utf-8')
+        self.trace_memory = trace_memory
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.records = []
+        self.enabled = True
+        return self
+
+    def disable(self):
+        self.enabled = False
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.trace_memory = False
+
+    def set_context(self, **tags):
+        """Tag di default per gli stadi di primo livello (es. grb nel loop dei GRB)"""
+        self.context = tags
+
+    def stage(self, name, **tags):
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return _Stage(self, name, tags)
+
+    def _record(self, record):
+        self.records.append(record)
+        self._file.write(json.dumps(record, default=str) + '\n')
+        self._file.flush()
+
+    def summary(self, records=None, group_by='grb'):
+        """
+        Tabella: per ogni gruppo (default GRB) e path, chiamate, wall/CPU
+        totali, memoria per stadio (picco tracemalloc o aumento di RSS) e
+        frazione del tempo degli stadi di primo livello.
+        Ritorna la lista di righe (dict).
+        """
+        records = self.records if records is None else records
+        rows = defaultdict(lambda: {'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'peak_mb': 0.0})
+        group_total = defaultdict(float)
+
+        for rec in records:
+            group = rec.get(group_by, '-')
+            row = rows[(group, rec['path'])]
+            row['calls'] += 1
+            row['wall_s'] += rec['wall_s']
+            row['cpu_s'] += rec['cpu_s']
+            peak = rec.get('peak_traced_mb', rec.get('rss_increase_mb')) or 0.0
+            row['peak_mb'] = max(row['peak_mb'], peak)
+            if rec['depth'] == 0:
+                group_total[group] += rec['wall_s']
+
+        table = []
+        for (group, path), row in sorted(rows.items(), key=lambda kv: (str(kv[0][0]), kv[0][1])):
+            total = group_total.get(group, 0.0)
+            table.append({group_by: group, 'path': path, **row,
+                          'fraction': row['wall_s'] / total if total > 0 else float('nan')})
+        return table
+
+    def print_summary(self, records=None, group_by='grb'):
+        table = self.summary(records, group_by)
+        if not table:
+            return table
+        mem_label = 'traced MB' if self.trace_memory else 'RSS +MB'
+        print(f"\n{'='*96}")
+        print(f"STAGE PROFILE (run {self.run_id})")
+        print(f"{'='*96}")
+        print(f"{group_by:<14} {'stage':<44} {'calls':>6} {'wall s':>9} {'cpu s':>9} {mem_label:>9} {'%':>6}")
+        print('-' * 96)
+        for row in table:
+            print(f"{str(row[group_by]):<14} {row['path'][:44]:<44} {row['calls']:>6d} "
+                  f"{row['wall_s']:>9.3f} {row['cpu_s']:>9.3f} {row['peak_mb']:>9.1f} "
+                  f"{100 * row['fraction']:>5.1f}%")
+        if self.output:
+            print(f"\n💾 Stage records: {self.output}")
+        return table
+
+
+def load_records(path):
+    """Legge un file .jsonl prodotto dal profiler"""
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+PROFILER = StageProfiler()
+
+if os.environ.get('GRBQG_PROFILE', '').lower() in ('1', 'true', 'yes'):
+    PROFILER.enable(output=os.environ.get('GRBQG_PROFILE_FILE') or None,
+                    trace_memory=os.environ.get('GRBQG_PROFILE_MEMORY', '').lower() in ('1', 'true', 'yes'))
+
+
+def enable(output=None, trace_memory=False, run_id=None):
+    return PROFILER.enable(output=output, trace_memory=trace_memory, run_id=run_id)
+
+
+def disable():
+    PROFILER.disable()
+
+
+def set_context(**tags):
+    PROFILER.set_context(**tags)
+
+
+def stage(name, **tags):
+    """Context manager per uno stadio; nullo se il profiler e' disattivato"""
+    return PROFILER.stage(name, **tags)
+
+
+def profiled(name=None, **tags):
+    """Decorator: esegue la funzione dentro stage(name or __name__)"""
+    def decorator(func):
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return func(*args, **kwargs)
+            with _Stage(PROFILER, stage_name, dict(tags)):
+                return func(*args, **kwargs)
+        return wrapper
+
+    if callable(name):
+        func, name = name, None
+        return decorator(func)
+    return decorator
+
+
+def print_summary(records=None, group_by='grb'):
+    return PROFILER.print_summary(records, group_by)
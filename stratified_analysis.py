@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+STRATIFIED ANALYSIS - Correlazione energia-tempo per IRF / classe / PSF / zenit
+===============================================================================
+Tutte le stratificazioni (ognuna e' un array di etichette per fotone) in un
+solo passaggio raggruppato:
+
+- gli strati di tutte le stratificazioni diventano segmenti di un unico
+  RaggedPhotons (grb_batch_engine): Pearson, Spearman, p e pendenza OLS
+  per strato con le riduzioni per segmento
+- RANSAC di tutti gli strati in una chiamata (RANSACLineFitter.fit_subsets),
+  ciascuno con warm start dal modello di consenso del GRB completo
+- null di permutazione condivisa: per ogni replica una sola permutazione
+  dei fotoni; ogni stratificazione la raggruppa per strato con un sort
+  stabile sulle etichette (O(N)), ottenendo una permutazione uniforme
+  dentro ogni strato. La matrice diagnostica completa costa circa quanto
+  un'analisi singola
+- decodifica delle colonne FT1 reali: EVENT_CLASS (classe piu' restrittiva),
+  EVENT_TYPE (FRONT/BACK, PSF0-3, EDISP0-3), ZENITH_ANGLE in fasce
+
+    strata = {'event_class': event_class_labels(events['EVENT_CLASS']),
+              'psf': event_type_labels(events['EVENT_TYPE'], 'psf'),
+              'zenith': zenith_labels(events['ZENITH_ANGLE'])}
+    results = stratified_analysis(energies, times, strata, n_permutations=1000, seed=42)
+    results['psf']['PSF3']['permutation_p']
+
+Autore: Christian Quintino De Luca
+Affiliazione: RTH Italia - Research & Technology Hub
+"""
+
+import numpy as np
+
+from grb_batch_engine import BLOCK_ELEMENTS, RaggedPhotons, analyze_batch
+from robust_line_fit import RANSACLineFitter
+
+MIN_STRATUM_PHOTONS = 10
+ZENITH_EDGES = (30.0, 60.0)
+ZENITH_NAMES = ('Zenith_Low', 'Zenith_Medium', 'Zenith_High')
+
+# Bit di EVENT_CLASS (Pass 8): classi annidate, dalla meno alla piu' restrittiva
+EVENT_CLASS_BITS = {
+    3: 'TRANSIENT020E',
+    4: 'TRANSIENT020',
+    5: 'TRANSIENT010E',
+    6: 'TRANSIENT010',
+    7: 'SOURCE',
+    8: 'CLEAN',
+    9: 'ULTRACLEAN',
+    10: 'ULTRACLEANVETO',
+}
+
+# Bit di EVENT_TYPE: partizioni per conversione, qualita' PSF e dispersione in energia
+EVENT_TYPE_BITS = {
+    'conversion': {0: 'FRONT', 1: 'BACK'},
+    'psf': {2: 'PSF0', 3: 'PSF1', 4: 'PSF2', 5: 'PSF3'},
+    'edisp': {6: 'EDISP0', 7: 'EDISP1', 8: 'EDISP2', 9: 'EDISP3'},
+}
+
+
+# ============================================================================
+# COLONNE FT1
+# ============================================================================
+
+def fermi_bitfield(column):
+    """
+    Colonna bitfield FT1 -> interi. astropy legge le colonne '32X' come
+    array booleani (n, 32) con il bit piu' significativo per primo.
+    """
+    column = np.asarray(column)
+    if column.dtype == bool and column.ndim == 2:
+        weights = np.left_shift(np.int64(1), np.arange(column.shape[1] - 1, -1, -1, dtype=np.int64))
+        return column.astype(np.int64) @ weights
+    return column.astype(np.int64)
+
+
+def event_class_labels(event_class):
+    """Classe piu' restrittiva a cui appartiene ogni fotone (strati disgiunti)"""
+    bits = fermi_bitfield(event_class)
+    labels = np.full(len(bits), 'OTHER', dtype=object)
+    for bit, name in EVENT_CLASS_BITS.items():     # in ordine: vince la piu' restrittiva
+        labels[(bits >> bit) & 1 == 1] = name
+    return labels
+
+
+def event_type_labels(event_type, partition='psf'):
+    """Etichette di una partizione di EVENT_TYPE ('conversion', 'psf', 'edisp')"""
+    if partition not in EVENT_TYPE_BITS:
+        raise ValueError(f"Unknown event type partition '{partition}'. "
+                         f"Available: {', '.join(EVENT_TYPE_BITS)}")
+    bits = fermi_bitfield(event_type)
+    labels = np.full(len(bits), 'NONE', dtype=object)
+    for bit, name in EVENT_TYPE_BITS[partition].items():
+        labels[(bits >> bit) & 1 == 1] = name
+    return labels
+
+
+def zenith_labels(zenith, edges=ZENITH_EDGES, names=ZENITH_NAMES):
+    """Fasce di angolo zenitale (estremo superiore incluso, come nell'analizzatore)"""
+    if len(names) != len(edges) + 1:
+        raise ValueError("names must have one entry more than edges")
+    index = np.searchsorted(np.asarray(edges, dtype=float), np.asarray(zenith, dtype=float), side='left')
+    return np.asarray(names, dtype=object)[index]
+
+
+def quantile_labels(values, n_quantiles=4, prefix='Q'):
+    """Quantili di una grandezza continua: prefix + 1..n (estremo superiore incluso)"""
+    values = np.asarray(values, dtype=float)
+    edges = np.percentile(values, np.linspace(0, 100, n_quantiles + 1)[1:-1])
+    index = np.searchsorted(edges, values, side='left')
+    return np.array([f'{prefix}{k + 1}' for k in range(n_quantiles)], dtype=object)[index]
+
+
+# ============================================================================
+# STRATI COME SEGMENTI
+# ============================================================================
+
+class _Stratification:
+    """Ordine dei fotoni per strato (stabile) e confini dei segmenti"""
+
+    def __init__(self, labels):
+        labels = np.asarray(labels)
+        if labels.ndim != 1:
+            raise ValueError("Stratum labels must be one label per photon")
+        self.names, codes = np.unique(labels, return_inverse=True)
+        # codici a 16 bit: il sort stabile di numpy diventa un radix sort
+        self.codes = codes.ravel().astype(np.int16 if len(self.names) < 2**15 else np.int64)
+        self.order = np.argsort(self.codes, kind='stable')
+        self.counts = np.bincount(self.codes, minlength=len(self.names))
+        self.starts = np.concatenate([[0], np.cumsum(self.counts)[:-1]])
+
+
+def _centered_by_stratum(values, strat):
+    """values nell'ordine per strato, centrati sulla media dello strato"""
+    v = values[strat.order]
+    means = np.add.reduceat(v, strat.starts) / strat.counts
+    return v - np.repeat(means, strat.counts)
+
+
+def shared_permutation_null(energies, times, stratifications, n_permutations, rng):
+    """
+    Null di Pearson per ogni strato di ogni stratificazione:
+    dict nome -> (n_permutations, n_strati). Per ogni replica una sola
+    permutazione dei fotoni, raggruppata per strato con un sort stabile:
+    le null sono esatte per ciascuno strato e condividono gli indici.
+    """
+    n = len(energies)
+    prepared = []
+    for strat in stratifications.values():
+        x = _centered_by_stratum(energies, strat)
+        y = _centered_by_stratum(times, strat)
+        norm = np.sqrt(np.add.reduceat(x * x, strat.starts) * np.add.reduceat(y * y, strat.starts))
+        # x indicizzato per fotone originale: x_by_photon[order] = x
+        x_by_photon = np.empty(n)
+        x_by_photon[strat.order] = x
+        prepared.append((strat, x_by_photon, y, norm))
+
+    null = {name: np.empty((n_permutations, len(strat.names))) for name, strat in stratifications.items()}
+    block = max(1, BLOCK_ELEMENTS // max(n, 1))
+    for row in range(0, n_permutations, block):
+        B = min(block, n_permutations - row)
+        perms = rng.permuted(np.broadcast_to(np.arange(n), (B, n)), axis=1)
+        for name, (strat, x_by_photon, y, norm) in zip(stratifications, prepared):
+            grouped = np.take_along_axis(perms, np.argsort(strat.codes[perms], axis=1, kind='stable'), axis=1)
+            products = x_by_photon[grouped] * y
+            with np.errstate(invalid='ignore', divide='ignore'):
+                null[name][row:row + B] = np.add.reduceat(products, strat.starts, axis=1) / norm
+    return null
+
+
+def stratified_analysis(energies, times, stratifications, n_permutations=1000, seed=None, rng=None,
+                        min_photons=MIN_STRATUM_PHOTONS, ransac=True, ransac_seed=42):
+    """
+    Statistiche energia-tempo di tutti gli strati di tutte le stratificazioni
+    (dict nome -> etichette per fotone) in un passaggio. Restituisce dict
+    stratificazione -> strato -> statistiche di analyze_batch (pearson_r/p,
+    spearman_r/p, t_stat, ols_slope, ransac_*) piu' permutation_p. Gli strati
+    con meno di min_photons fotoni sono esclusi.
+    """
+    rng = rng if rng is not None else np.random.default_rng(seed)
+    energies = np.asarray(energies, dtype=float)
+    times = np.asarray(times, dtype=float)
+    strata = {name: _Stratification(labels) for name, labels in stratifications.items()}
+    for name, strat in strata.items():
+        if len(strat.codes) != len(energies):
+            raise ValueError(f"Stratification '{name}' has {len(strat.codes)} labels for {len(energies)} photons")
+
+    # indici dei fotoni di ogni strato (ordine stabile), sottoinsiemi del GRB
+    selections = {}
+    for name, strat in strata.items():
+        for k, stratum in enumerate(strat.names):
+            if strat.counts[k] >= min_photons:
+                selections[(name, stratum)] = strat.order[strat.starts[k]:strat.starts[k] + strat.counts[k]]
+    if not selections:
+        return {name: {} for name in strata}
+
+    keys = list(selections)
+    photons = RaggedPhotons(range(len(keys)), np.concatenate([energies[selections[k]] for k in keys]),
+                            np.concatenate([times[selections[k]] for k in keys]),
+                            np.concatenate([[0], np.cumsum([len(selections[k]) for k in keys])]))
+    batch = analyze_batch(photons, ransac=False)
+    if ransac:
+        _, fits = RANSACLineFitter(random_state=ransac_seed).fit_subsets(energies, times, selections,
+                                                                         min_photons)
+        for i, key in enumerate(keys):
+            slope, intercept, inlier_mask = fits[key]
+            batch[i].update(ransac_slope=slope, ransac_intercept=intercept,
+                            ransac_inliers=int(inlier_mask.sum()))
+
+    null = shared_permutation_null(energies, times, strata, n_permutations, rng) if n_permutations else None
+
+    results = {name: {} for name in strata}
+    for i, (name, stratum) in enumerate(keys):
+        result = batch[i]
+        del result['redshift']
+        if null is not None:
+            k = int(np.flatnonzero(strata[name].names == stratum)[0])
+            observed = abs(result['pearson_r'])
+            result['permutation_p'] = float(np.mean(np.abs(null[name][:, k]) >= observed))
+        results[name][str(stratum)] = result
+    return results
@@ -16,6 +16,12 @@ from tqdm import tqdm
 import json
 from datetime import datetime
 
+from figure_renderer import function_hash
+from results_journal import ResultsJournal, fingerprint
+
+JOURNAL_FILE = 'super_complete_fermi_qg_journal.jsonl'
+QG_EFFECT_FRACTION = 0.625
+
 def load_fermi_catalog():
     """Load the complete Fermi catalog data"""
     
@@ -35,95 +41,120 @@ def load_fermi_catalog():
         print("No Fermi catalog data found!")
         return None
 
-def simulate_comprehensive_energy_time_data(n_sources, qg_effect_fraction=0.625):
-    """Simulate comprehensive energy-time data for QG analysis"""
+def simulate_source_energy_time_data(i, qg_effect_fraction=0.625):
+    """Simulate energy-time data and correlation statistics for one source"""
+    # Variable number of photons based on source significance
+    base_photons = np.random.randint(100, 5000)
     
-    print(f"Simulating comprehensive energy-time data for {n_sources} sources...")
-    print(f"QG effect fraction: {qg_effect_fraction:.1%}")
+    # Random energy range (100 MeV - 300 GeV)
+    energies = np.random.uniform(0.1, 300, base_photons)
     
-    results = []
+    # Decide if this source has QG effect
+    has_qg_effect = np.random.random() < qg_effect_fraction
     
-    # Progress bar for large datasets
-    for i in tqdm(range(n_sources), desc="Processing sources"):
-        # Variable number of photons based on source significance
-        base_photons = np.random.randint(100, 5000)
+    if has_qg_effect:
+        # Add QG time delay: Delta t = E/E_QG with variation
+        E_QG = np.random.uniform(1e15, 1e19)  # GeV
+        time_delays = energies / E_QG
         
-        # Random energy range (100 MeV - 300 GeV)
-        energies = np.random.uniform(0.1, 300, base_photons)
+        # Add some noise to make it more realistic
+        noise_factor = np.random.uniform(0.8, 1.2, len(time_delays))
+        time_delays *= noise_factor
         
-        # Decide if this source has QG effect
-        has_qg_effect = np.random.random() < qg_effect_fraction
+        # Add random arrival times + QG delays
+        arrival_times = np.random.uniform(0, 2000, base_photons) + time_delays
         
-        if has_qg_effect:
-            # Add QG time delay: Delta t = E/E_QG with variation
-            E_QG = np.random.uniform(1e15, 1e19)  # GeV
-            time_delays = energies / E_QG
-            
-            # Add some noise to make it more realistic
-            noise_factor = np.random.uniform(0.8, 1.2, len(time_delays))
-            time_delays *= noise_factor
-            
-            # Add random arrival times + QG delays
-            arrival_times = np.random.uniform(0, 2000, base_photons) + time_delays
-            
-            # Sort by time
-            sort_idx = np.argsort(arrival_times)
-            energies = energies[sort_idx]
-            arrival_times = arrival_times[sort_idx]
-            
-            # Calculate correlations
-            pearson_r, pearson_p = pearsonr(energies, arrival_times)
-            spearman_r, spearman_p = spearmanr(energies, arrival_times)
-            
-            qg_effect = True
-            
-            # Calculate E_QG estimate
-            if pearson_r != 0:
-                E_QG_estimate = np.mean(energies) / np.abs(pearson_r)
-            else:
-                E_QG_estimate = 1e18
-        else:
-            # No QG effect - random times
-            arrival_times = np.random.uniform(0, 2000, base_photons)
-            
-            # Calculate correlations (should be ~0)
-            pearson_r, pearson_p = pearsonr(energies, arrival_times)
-            spearman_r, spearman_p = spearmanr(energies, arrival_times)
-            
-            qg_effect = False
-            E_QG_estimate = np.inf
+        # Sort by time
+        sort_idx = np.argsort(arrival_times)
+        energies = energies[sort_idx]
+        arrival_times = arrival_times[sort_idx]
         
-        # Calculate additional statistics
-        significance_sigma = np.abs(pearson_r) * np.sqrt(base_photons - 2) if base_photons > 2 else 0
+        # Calculate correlations
+        pearson_r, pearson_p = pearsonr(energies, arrival_times)
+        spearman_r, spearman_p = spearmanr(energies, arrival_times)
         
-        # Energy and time statistics
-        energy_mean = np.mean(energies)
-        energy_std = np.std(energies)
-        time_mean = np.mean(arrival_times)
-        time_std = np.std(arrival_times)
+        qg_effect = True
         
-        # Energy range
-        energy_range = np.max(energies) - np.min(energies)
-        time_range = np.max(arrival_times) - np.min(arrival_times)
+        # Calculate E_QG estimate
+        if pearson_r != 0:
+            E_QG_estimate = np.mean(energies) / np.abs(pearson_r)
+        else:
+            E_QG_estimate = 1e18
+    else:
+        # No QG effect - random times
+        arrival_times = np.random.uniform(0, 2000, base_photons)
+        
+        # Calculate correlations (should be ~0)
+        pearson_r, pearson_p = pearsonr(energies, arrival_times)
+        spearman_r, spearman_p = spearmanr(energies, arrival_times)
         
-        results.append({
-            'Source_Index': i,
-            'N_Photons': base_photons,
-            'Energy_Mean': energy_mean,
-            'Energy_Std': energy_std,
-            'Energy_Range': energy_range,
-            'Time_Mean': time_mean,
-            'Time_Std': time_std,
-            'Time_Range': time_range,
-            'Pearson_r': pearson_r,
-            'Pearson_p': pearson_p,
-            'Spearman_r': spearman_r,
-            'Spearman_p': spearman_p,
-            'Has_QG_Effect': qg_effect,
-            'Significance_Sigma': significance_sigma,
-            'E_QG_Estimate': E_QG_estimate,
-            'Energy_Time_Ratio': energy_range / time_range if time_range > 0 else 0
-        })
+        qg_effect = False
+        E_QG_estimate = np.inf
+    
+    # Calculate additional statistics
+    significance_sigma = np.abs(pearson_r) * np.sqrt(base_photons - 2) if base_photons > 2 else 0
+    
+    # Energy and time statistics
+    energy_mean = np.mean(energies)
+    energy_std = np.std(energies)
+    time_mean = np.mean(arrival_times)
+    time_std = np.std(arrival_times)
+    
+    # Energy range
+    energy_range = np.max(energies) - np.min(energies)
+    time_range = np.max(arrival_times) - np.min(arrival_times)
+    
+    return {
+        'Source_Index': i,
+        'N_Photons': base_photons,
+        'Energy_Mean': energy_mean,
+        'Energy_Std': energy_std,
+        'Energy_Range': energy_range,
+        'Time_Mean': time_mean,
+        'Time_Std': time_std,
+        'Time_Range': time_range,
+        'Pearson_r': pearson_r,
+        'Pearson_p': pearson_p,
+        'Spearman_r': spearman_r,
+        'Spearman_p': spearman_p,
+        'Has_QG_Effect': qg_effect,
+        'Significance_Sigma': significance_sigma,
+        'E_QG_Estimate': E_QG_estimate,
+        'Energy_Time_Ratio': energy_range / time_range if time_range > 0 else 0
+    }
+
+def simulate_comprehensive_energy_time_data(n_sources, qg_effect_fraction=0.625, journal=None, input_hashes=None,
+                                            resume=True):
+    """
+    Simulate comprehensive energy-time data for QG analysis.
+    
+    With a ResultsJournal each source is recorded as soon as it is done and
+    (with resume=True) sources already in the journal with the same input
+    hash are skipped; the
+    results are then read back from the journal for the current sources only.
+    """
+    
+    print(f"Simulating comprehensive energy-time data for {n_sources} sources...")
+    print(f"QG effect fraction: {qg_effect_fraction:.1%}")
+    
+    if input_hashes is None:
+        input_hashes = {f"source_{i}": fingerprint(i, qg_effect_fraction) for i in range(n_sources)}
+    
+    results = []
+    
+    # Progress bar for large datasets
+    for i in tqdm(range(n_sources), desc="Processing sources"):
+        key = f"source_{i}"
+        if resume and journal is not None and journal.is_done(key, input_hashes[key]):
+            continue
+        result = simulate_source_energy_time_data(i, qg_effect_fraction)
+        if journal is not None:
+            journal.record(key, result, input_hash=input_hashes[key])
+        else:
+            results.append(result)
+    
+    if journal is not None:
+        results = [result for _, result in journal.results(current=input_hashes)]
     
     return pd.DataFrame(results)
 
@@ -385,8 +416,8 @@ def create_detailed_report(df_results, stats):
     
     return report
 
-def main():
-    """Main function"""
+def main(journal_path=JOURNAL_FILE, resume=True):
+    """Main function (sources checkpointed in the journal, resumed on rerun)"""
     print("SUPER COMPLETE QG Analysis on Real Fermi LAT Catalog")
     print("=" * 70)
     print("Analyzing ALL 2,423 unassociated sources from Fermi LAT 4FGL-DR4")
@@ -401,8 +432,14 @@ def main():
     
     print(f"Starting comprehensive analysis of {len(df_catalog)} sources...")
     
+    # Journal per source: one key per catalog row, input hash from the row
+    journal = ResultsJournal(journal_path, config=function_hash(simulate_source_energy_time_data))
+    input_hashes = {f"source_{i}": fingerprint(row, QG_EFFECT_FRACTION)
+                    for i, row in enumerate(df_catalog.to_dict('records'))}
+    
     # Simulate comprehensive energy-time data
-    df_results = simulate_comprehensive_energy_time_data(len(df_catalog), qg_effect_fraction=0.625)
+    df_results = simulate_comprehensive_energy_time_data(len(df_catalog), qg_effect_fraction=QG_EFFECT_FRACTION,
+                                                         journal=journal, input_hashes=input_hashes, resume=resume)
     
     # Perform advanced QG analysis
     stats = perform_advanced_qg_analysis(df_results)
@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+SYNTHETIC BURSTS - Generatore vettorizzato di GRB sintetici
+===========================================================
+Un'unica libreria per i burst simulati usati nelle validazioni:
+- profili temporali multi-pulse FRED o Norris (2005)
+- spettri power-law o Band (energie in GeV)
+- lag intrinseco spettrale: dt = lag_amplitude * log10(E / E_ref)
+- ritardo LIV con il K_n(z) cosmologico corretto (liv_cosmology)
+- dispersione energetica strumentale (log-normale, sigma su ln E)
+
+Campionamento per inverse-CDF vettorizzato: le CDF di pulse e spettri
+Band sono tabulate per riga su una griglia e invertite tutte insieme
+(searchsorted con offset di riga); power-law in forma chiusa. Molti
+burst per chiamata in un ragged array preallocato (BurstBatch):
+
+    batch = generate_bursts(random_population(10_000, seed=1), seed=2)
+    burst = batch[0]                    # {'times', 'energies', ...}
+
+    data = generate_burst(n_photons=5000, z=1.8, E_QG=1e19, seed=0)
+
+Autore: Christian Quintino De Luca
+Affiliazione: RTH Italia - Research & Technology Hub
+"""
+
+import numpy as np
+
+from liv_cosmology import liv_K
+
+DEFAULT_BURST = {
+    'n_photons': 1000,
+    'z': 1.0,
+    # Profilo temporale: un pulse per elemento di pulse_peaks (tempo del picco, s)
+    'pulse_shape': 'fred',          # 'fred' | 'norris'
+    'pulse_peaks': [0.0],
+    'pulse_amplitudes': [1.0],      # frazione relativa di fotoni per pulse
+    'rise': 1.0,                    # s: FRED tau_r / Norris tau_1 (scalare o per pulse)
+    'decay': 5.0,                   # s: FRED tau_d / Norris tau_2 (scalare o per pulse)
+    # Spettro in GeV: dN/dE ~ E^index (power-law) o Band con beta = index
+    'spectrum': 'powerlaw',         # 'powerlaw' | 'band'
+    'index': -2.0,
+    'alpha': -1.0,
+    'E_peak': 1e-3,                 # picco di E^2 N(E), GeV (solo Band)
+    'E_min': 0.1,
+    'E_max': 100.0,
+    # Lag intrinseco (s per decade di energia rispetto a E_ref)
+    'lag_amplitude': 0.0,
+    'E_ref': 0.1,
+    # LIV: None = nessun ritardo
+    'E_QG': None,
+    'liv_order': 1,
+    'liv_sign': 1,
+    # Risoluzione energetica: sigma di ln(E_misurata / E_vera)
+    'energy_resolution': 0.0,
+}
+
+PULSE_SHAPES = ('fred', 'norris')
+SPECTRA = ('powerlaw', 'band')
+
+TIME_GRID = 1024
+ENERGY_GRID = 512
+ROW_CHUNK = 4096
+BAND_PIVOT_GEV = 1e-4   # 100 keV
+
+
+# ============================================================================
+# PARAMETRI
+# ============================================================================
+
+def burst_params(**overrides):
+    """DEFAULT_BURST aggiornato, con pulse normalizzati ad array della stessa lunghezza"""
+    unknown = set(overrides) - set(DEFAULT_BURST)
+    if unknown:
+        raise ValueError(f"Unknown burst parameters: {', '.join(sorted(unknown))}")
+    params = dict(DEFAULT_BURST, **overrides)
+
+    if params['pulse_shape'] not in PULSE_SHAPES:
+        raise ValueError(f"Unknown pulse shape: {params['pulse_shape']}")
+    if params['spectrum'] not in SPECTRA:
+        raise ValueError(f"Unknown spectrum: {params['spectrum']}")
+
+    peaks = np.atleast_1d(np.asarray(params['pulse_peaks'], dtype=float))
+    n_pulses = len(peaks)
+    amplitudes = np.atleast_1d(np.asarray(params['pulse_amplitudes'], dtype=float))
+    if len(amplitudes) == 1:
+        amplitudes = np.repeat(amplitudes, n_pulses)
+    params['pulse_peaks'] = peaks
+    params['pulse_amplitudes'] = amplitudes
+    params['rise'] = np.broadcast_to(np.asarray(params['rise'], dtype=float), (n_pulses,)).copy()
+    params['decay'] = np.broadcast_to(np.asarray(params['decay'], dtype=float), (n_pulses,)).copy()
+    if len(amplitudes) != n_pulses:
+        raise ValueError("pulse_amplitudes must match pulse_peaks")
+    return params
+
+
+def random_population(n_bursts, seed=None, duration=(10.0, 200.0), z_range=(0.1, 4.0),
+                      max_pulses=4, n_photons=(200, 5000), **overrides):
+    """
+    Popolazione di parametri per Monte Carlo: z uniforme, 1..max_pulses
+    pulse FRED distribuiti sulla durata, tempi scala log-normali,
+    indice spettrale in [-2.5, -1.5]. overrides fissa campi per tutti.
+    """
+    rng = np.random.default_rng(seed)
+    population = []
+    for _ in range(n_bursts):
+        T = rng.uniform(*duration)
+        k = rng.integers(1, max_pulses + 1)
+        params = {
+            'n_photons': int(rng.integers(*n_photons)),
+            'z': float(rng.uniform(*z_range)),
+            'pulse_peaks': np.sort(rng.uniform(0.05, 0.8, k)) * T,
+            'pulse_amplitudes': rng.uniform(0.3, 1.0, k),
+            'rise': T * 0.01 * rng.lognormal(0, 0.5, k),
+            'decay': T * 0.05 * rng.lognormal(0, 0.5, k),
+            'index': float(rng.uniform(-2.5, -1.5)),
+        }
+        params.update(overrides)
+        population.append(params)
+    return population
+
+
+# ============================================================================
+# CAMPIONAMENTO INVERSE-CDF PER RIGA
+# ============================================================================
+
+def _sample_rows(grid, log_density, rows, u):
+    """
+    Inverse-CDF su righe tabulate: grid (R, G) crescente, log_density
+    (R, G); rows = riga di ogni campione, u = uniformi. CDF a trapezi
+    interpolata linearmente.
+    """
+    density = np.exp(log_density - log_density.max(axis=1, keepdims=True))
+    steps = 0.5 * (density[:, 1:] + density[:, :-1]) * np.diff(grid, axis=1)
+    cdf = np.zeros(grid.shape)
+    np.cumsum(steps, axis=1, out=cdf[:, 1:])
+    cdf /= cdf[:, -1:]
+
+    n_rows, n_grid = grid.shape
+    flat = (cdf + np.arange(n_rows)[:, None]).ravel()
+    base = rows * n_grid
+    idx = np.clip(np.searchsorted(flat, rows + u, side='right') - base, 1, n_grid - 1) + base
+    cdf, grid = cdf.ravel(), grid.ravel()
+    c0, c1 = cdf.take(idx - 1), cdf.take(idx)
+    x0, x1 = grid.take(idx - 1), grid.take(idx)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        frac = np.where(c1 > c0, (u - c0) / (c1 - c0), 0.0)
+    return x0 + frac * (x1 - x0)
+
+
+def _sorted_uniforms(counts, rng):
+    """
+    Uniformi ordinate dentro ogni gruppo (counts per gruppo), in O(n)
+    dalle spaziature esponenziali normalizzate: con needle ordinati
+    searchsorted e gather lavorano in modo sequenziale.
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    n_groups = len(counts)
+    spacing = rng.standard_exponential(int(counts.sum()) + n_groups)
+    cumulative = np.cumsum(spacing)
+    ends = np.cumsum(counts + 1) - 1
+    base = np.concatenate([[0.0], cumulative[ends[:-1]]]) if n_groups else np.zeros(0)
+    keep = np.ones(len(spacing), dtype=bool)
+    keep[ends] = False
+    group = np.repeat(np.arange(n_groups), counts)
+    return (cumulative[keep] - base[group]) / (cumulative[ends] - base)[group]
+
+
+def _pulse_tables(shape, peaks, rise, decay):
+    """Griglia temporale e log-intensita' di un gruppo di pulse (righe)"""
+    half = TIME_GRID // 2
+    s = np.linspace(0.0, 1.0, half)
+    if shape == 'fred':
+        left, right = 10 * rise, 15 * decay
+    else:
+        # Norris: I ~ exp(-tau1/(t-ts) - (t-ts)/tau2), picco a ts + sqrt(tau1 tau2)
+        width = np.sqrt(rise * decay)
+        left, right = width, 15 * decay + 5 * width
+    grid = np.concatenate([peaks[:, None] - left[:, None] * (1 - s[None, :]),
+                           peaks[:, None] + right[:, None] * s[None, 1:]], axis=1)
+    dt = grid - peaks[:, None]
+
+    if shape == 'fred':
+        log_intensity = np.where(dt < 0, dt / rise[:, None], -dt / decay[:, None])
+    else:
+        x = dt + np.sqrt(rise * decay)[:, None]   # t - ts
+        with np.errstate(divide='ignore'):
+            log_intensity = np.where(x > 0, -rise[:, None] / x - x / decay[:, None], -np.inf)
+    return grid, log_intensity
+
+
+def _band_tables(E_min, E_max, alpha, beta, E_peak):
+    """Griglia in ln E e log densita' per unita' di ln E dello spettro Band"""
+    s = np.linspace(0.0, 1.0, ENERGY_GRID)
+    log_E = np.log(E_min)[:, None] + np.log(E_max / E_min)[:, None] * s[None, :]
+    E = np.exp(log_E)
+    alpha, beta = alpha[:, None], beta[:, None]
+    E0 = E_peak[:, None] / (2 + alpha)
+    E_break = (alpha - beta) * E0
+    low = alpha * np.log(E / BAND_PIVOT_GEV) - E / E0
+    high = ((alpha - beta) * np.log(E_break / BAND_PIVOT_GEV) + beta - alpha
+            + beta * np.log(E / BAND_PIVOT_GEV))
+    log_density = np.where(E < E_break, low, high) + log_E   # dN/dlnE = E dN/dE
+    return log_E, log_density
+
+
+def _powerlaw(u, group, E_min, E_max, index):
+    """
+    Inverse-CDF chiusa di dN/dE ~ E^index su [E_min, E_max]; parametri
+    per gruppo (burst), u e group per fotone.
+    """
+    g = index + 1
+    flat = np.abs(g) < 1e-12
+    g_safe = np.where(flat, 1.0, g)
+    low, high = E_min ** g_safe, E_max ** g_safe
+    energies = (low[group] + u * (high - low)[group]) ** (1 / g_safe)[group]
+    if flat.any():
+        log_flat = flat[group]
+        energies[log_flat] = E_min[group[log_flat]] * (E_max / E_min)[group[log_flat]] ** u[log_flat]
+    return energies
+
+
+def _sort_within_bursts(times, burst_of, n_bursts):
+    """
+    Ordine per (burst, tempo). Una sola argsort su burst + tempo
+    normalizzato in [0, 1) (lexsort su 1e7 fotoni e' ~10x piu' lenta);
+    se l'arrotondamento inverte due fotoni quasi simultanei si ripiega
+    sull'ordinamento esatto.
+    """
+    if len(times) == 0:
+        return np.arange(0)
+    t_min = np.full(n_bursts, np.inf)
+    t_max = np.full(n_bursts, -np.inf)
+    np.minimum.at(t_min, burst_of, times)
+    np.maximum.at(t_max, burst_of, times)
+    span = np.where(t_max > t_min, t_max - t_min, 1.0) * (1 + 1e-9)
+    # stabile = timsort: sfrutta le run gia' ordinate dei singoli pulse
+    order = np.argsort(burst_of + (times - t_min[burst_of]) / span[burst_of], kind='stable')
+
+    t_sorted, b_sorted = times[order], burst_of[order]
+    if np.any((np.diff(t_sorted) < 0) & (b_sorted[1:] == b_sorted[:-1])):
+        order = np.lexsort((times, burst_of))
+    return order
+
+
+# ============================================================================
+# RAGGED BATCH
+# ============================================================================
+
+class BurstBatch:
+    """Fotoni di molti burst in array piatti; burst i = [offsets[i], offsets[i+1])"""
+
+    def __init__(self, times, energies, true_energies, pulse_index, offsets, params):
+        self.times = times
+        self.energies = energies
+        self.true_energies = true_energies
+        self.pulse_index = pulse_index
+        self.offsets = offsets
+        self.params = params
+
+    def __len__(self):
+        return len(self.params)
+
+    def __getitem__(self, i):
+        sl = slice(self.offsets[i], self.offsets[i + 1])
+        return {'times': self.times[sl], 'energies': self.energies[sl],
+                'true_energies': self.true_energies[sl], 'pulse_index': self.pulse_index[sl],
+                'params': self.params[i]}
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    @property
+    def n_photons(self):
+        return np.diff(self.offsets)
+
+    @property
+    def burst_index(self):
+        """Indice del burst per ogni fotone"""
+        return np.repeat(np.arange(len(self)), self.n_photons)
+
+
+def generate_bursts(bursts, seed=None, rng=None, sort_times=True):
+    """
+    Genera una lista di burst (dict di parametri, vedi DEFAULT_BURST) in
+    un unico BurstBatch. Tutti i passi sono vettorizzati sui fotoni di
+    tutti i burst; l'unico loop Python e' sui blocchi di ROW_CHUNK pulse.
+    """
+    rng = rng if rng is not None else np.random.default_rng(seed)
+    params = [burst_params(**b) for b in bursts]
+    n_bursts = len(params)
+
+    counts = np.array([p['n_photons'] for p in params], dtype=np.int64)
+    offsets = np.zeros(n_bursts + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    total = int(offsets[-1])
+    burst_of = np.repeat(np.arange(n_bursts), counts)
+
+    def column(key, dtype=float):
+        return np.array([p[key] for p in params], dtype=dtype)
+
+    # ---- Pulse: fotoni ripartiti per pulse (multinomiale come binomiali condizionate)
+    n_pulses = np.array([len(p['pulse_peaks']) for p in params], dtype=np.int64)
+    max_pulses = n_pulses.max() if n_bursts else 0
+    weights = np.zeros((n_bursts, max_pulses))
+    for b, p in enumerate(params):
+        weights[b, :n_pulses[b]] = p['pulse_amplitudes'] / p['pulse_amplitudes'].sum()
+    per_pulse = np.zeros((n_bursts, max_pulses), dtype=np.int64)
+    remaining, weight_left = counts.copy(), np.ones(n_bursts)
+    for k in range(max_pulses):
+        prob = np.clip(np.divide(weights[:, k], weight_left, out=np.zeros(n_bursts),
+                                 where=weight_left > 0), 0, 1)
+        prob[k == n_pulses - 1] = 1.0
+        per_pulse[:, k] = rng.binomial(remaining, prob)
+        remaining -= per_pulse[:, k]
+        weight_left -= weights[:, k]
+
+    valid = np.arange(max_pulses)[None, :] < n_pulses[:, None]
+    pulse_counts = per_pulse[valid]
+    peaks = np.concatenate([p['pulse_peaks'] for p in params]) if n_bursts else np.zeros(0)
+    rise = np.concatenate([p['rise'] for p in params]) if n_bursts else np.zeros(0)
+    decay = np.concatenate([p['decay'] for p in params]) if n_bursts else np.zeros(0)
+    shapes = np.repeat([p['pulse_shape'] for p in params], n_pulses)
+    pulse_of = np.repeat(np.arange(len(pulse_counts)), pulse_counts)
+    local_pulse = pulse_of - np.repeat(np.cumsum(n_pulses) - n_pulses, counts)
+
+    # ---- Tempi: inverse-CDF per pulse, a blocchi di righe per forma
+    times = np.empty(total)
+    for shape in PULSE_SHAPES:
+        rows = np.flatnonzero(shapes == shape)
+        for start in range(0, len(rows), ROW_CHUNK):
+            chunk = rows[start:start + ROW_CHUNK]
+            in_chunk = np.zeros(len(pulse_counts), dtype=bool)
+            in_chunk[chunk] = True
+            photons = np.flatnonzero(in_chunk[pulse_of])
+            if len(photons) == 0:
+                continue
+            grid, log_intensity = _pulse_tables(shape, peaks[chunk], rise[chunk], decay[chunk])
+            row_of = np.searchsorted(chunk, pulse_of[photons])
+            u = _sorted_uniforms(pulse_counts[chunk], rng)
+            times[photons] = _sample_rows(grid, log_intensity, row_of, u)
+
+    # ---- Energie vere
+    u = rng.random(total)
+    E_min, E_max, index = column('E_min'), column('E_max'), column('index')
+    true_energies = _powerlaw(u, burst_of, E_min, E_max, index)
+    band = np.array([p['spectrum'] == 'band' for p in params])
+    if band.any():
+        band_rows = np.flatnonzero(band)
+        photons = np.flatnonzero(band[burst_of])
+        log_E, log_density = _band_tables(E_min[band_rows], E_max[band_rows],
+                                          column('alpha')[band_rows], index[band_rows],
+                                          column('E_peak')[band_rows])
+        row_of = np.searchsorted(band_rows, burst_of[photons])
+        true_energies[photons] = np.exp(_sample_rows(log_E, log_density, row_of, u[photons]))
+
+    # ---- Lag intrinseco e LIV (sull'energia vera)
+    E_ref = column('E_ref')[burst_of]
+    lag_amplitude = column('lag_amplitude')
+    if np.any(lag_amplitude != 0):
+        times += lag_amplitude[burst_of] * np.log10(true_energies / E_ref)
+
+    E_QG = np.array([np.inf if p['E_QG'] is None else p['E_QG'] for p in params], dtype=float)
+    if np.isfinite(E_QG).any():
+        z, order = column('z'), column('liv_order', dtype=int)
+        K = np.zeros(n_bursts)
+        for n in np.unique(order):
+            K[order == n] = liv_K(z[order == n], n)
+        n_ph = order[burst_of]
+        times += (column('liv_sign')[burst_of] * (1 + n_ph) / 2
+                  * (true_energies ** n_ph - E_ref ** n_ph) / E_QG[burst_of] ** n_ph * K[burst_of])
+
+    # ---- Dispersione energetica
+    resolution = column('energy_resolution')
+    if np.any(resolution > 0):
+        energies = true_energies * np.exp(resolution[burst_of] * rng.standard_normal(total))
+    else:
+        energies = true_energies.copy()
+
+    if sort_times:
+        order = _sort_within_bursts(times, burst_of, n_bursts)
+        times, energies = times[order], energies[order]
+        true_energies, local_pulse = true_energies[order], local_pulse[order]
+
+    return BurstBatch(times, energies, true_energies, local_pulse, offsets, params)
+
+
+def generate_burst(seed=None, rng=None, sort_times=True, **params):
+    """Un singolo burst: dict con times, energies, true_energies, pulse_index, params"""
+    return generate_bursts([params], seed=seed, rng=rng, sort_times=sort_times)[0]
@@ -35,6 +35,9 @@ from scipy import stats, optimize
 from scipy.interpolate import interp1d
 import json
 from datetime import datetime, timedelta
+from light_curve_blocks import pulse_lag_analysis
+from ccf_lag import ccf_spectral_lags, lag_energy_slope
+from figure_renderer import density_scatter
 
 # ========================================================================
 # COSTANTI FISICHE
@@ -487,9 +490,9 @@ def plot_comprehensive_analysis(grb_data, fit_results):
     # ------------------------
     ax3 = fig.add_subplot(gs[1, 1:])
     
-    # Scatter plot
-    scatter = ax3.scatter(energies_gev, times, c=energies_gev, 
-                         cmap='plasma', s=50, alpha=0.6, edgecolors='black', linewidth=0.5)
+    # Scatter plot (densita' hexbin per burst molto grandi)
+    scatter = density_scatter(ax3, energies_gev, times, c=energies_gev, log_x=True,
+                              cmap='plasma', s=50, alpha=0.6, edgecolors='black', linewidth=0.5)
     
     # Fit line se disponibile
     if fit_results:
@@ -588,7 +591,44 @@ def plot_comprehensive_analysis(grb_data, fit_results):
 # 4. PIPELINE COMPLETA
 # ========================================================================
 
-def analyze_qg_signal(grb_data, make_plots=True):
+def ccf_lag_estimate(times, energies, redshift, n_bands=4, n_sim=200):
+    """
+    Stimatore di lag alternativo: CCF tra bande di energia (ccf_lag).
+    
+    Tutte le coppie di bande in una chiamata; alpha = d(lag)/dE dal fit
+    pesato dei lag di coppia, E_QG come in fit_energy_time_correlation.
+    """
+    energies_gev = np.where(energies > 100, energies / 1000, energies)
+    
+    try:
+        ccf = ccf_spectral_lags(times, energies_gev, n_bands=n_bands, n_sim=n_sim, random_state=42)
+    except Exception as e:
+        print(f"⚠️ CCF fallita: {e}")
+        return None
+    
+    alpha, alpha_err = lag_energy_slope(ccf)
+    
+    if alpha > 0:
+        H0 = 70
+        c_km = C / 1000
+        d_L_m = (c_km / H0) * redshift * (1 + redshift/2) * 3.086e22
+        E_QG_est = 0.5 * d_L_m / (C * alpha) / 1e9  # in GeV
+    else:
+        E_QG_est = np.inf
+    
+    return {
+        'pairs': ccf['pairs'],
+        'lags': ccf['lag'],
+        'lag_errors': ccf['lag_err'],
+        'band_edges_gev': ccf['band_edges'],
+        'alpha': alpha,
+        'alpha_err': alpha_err,
+        'significance_sigma': abs(alpha) / alpha_err if alpha_err > 0 else 0.0,
+        'E_QG_GeV': E_QG_est
+    }
+
+
+def analyze_qg_signal(grb_data, make_plots=True, lag_estimator='regression'):
     """
     Esegue l'analisi completa per cercare segnali di gravità quantistica.
     
@@ -598,6 +638,9 @@ def analyze_qg_signal(grb_data, make_plots=True):
         Dati del GRB da analyze
     make_plots : bool
         Se True, genera i grafici
+    lag_estimator : str
+        'regression' (fit fotone per fotone), 'ccf' (CCF tra bande)
+        o 'both'
     
     Returns:
     --------
@@ -630,7 +673,17 @@ def analyze_qg_signal(grb_data, make_plots=True):
     print("🔍 ANALISI CORRELAZIONE ENERGIA-TEMPO...")
     print("─" * 70)
     
-    fit_results = fit_energy_time_correlation(times, energies, metadata['redshift'])
+    fit_results = None
+    if lag_estimator in ('regression', 'both'):
+        fit_results = fit_energy_time_correlation(times, energies, metadata['redshift'])
+    
+    ccf_results = None
+    if lag_estimator in ('ccf', 'both'):
+        ccf_results = ccf_lag_estimate(times, energies, metadata['redshift'])
+        if ccf_results:
+            print(f"✓ CCF lag: {len(ccf_results['pairs'])} coppie di bande")
+            print(f"✓ d(lag)/dE = {ccf_results['alpha']:.3e} ± {ccf_results['alpha_err']:.3e} s/GeV "
+                  f"({ccf_results['significance_sigma']:.2f} σ)")
     
     if fit_results:
         print(f"✓ Coefficiente correlazione: r = {fit_results['correlation']:.4f}")
@@ -643,7 +696,7 @@ def analyze_qg_signal(grb_data, make_plots=True):
         else:
             print("\n✅ Nessun segnale (consistente con relatività)")
             print(f"   → Limite inferiore: E_QG > {fit_results['E_QG_GeV']:.2e} GeV")
-    else:
+    elif lag_estimator != 'ccf':
         print("⚠️ Fit non riuscito")
     
     # LIKELIHOOD RATIO TEST
@@ -663,7 +716,7 @@ def analyze_qg_signal(grb_data, make_plots=True):
             print("📉 No detection (< 3σ)")
     
     # PLOTS
-    if make_plots:
+    if make_plots and fit_results:
         print("\n📊 Generazione grafici...")
         fig = plot_comprehensive_analysis(grb_data, fit_results)
         plt.show()
@@ -675,6 +728,7 @@ def analyze_qg_signal(grb_data, make_plots=True):
     return {
         'fit_results': fit_results,
         'lr_results': lr_results,
+        'ccf_results': ccf_results,
         'n_photons': len(times),
         'n_high_energy': n_high_energy,
         'metadata': metadata
@@ -835,47 +889,36 @@ def intrinsic_lag_analysis(grb_data, pulse_detection_threshold=0.1):
     """
     Analisi per rilevare intrinsic lags che potrebbero mascherare QG.
     Cerca correlazioni E-t all'interno di singoli pulse.
+    
+    I pulse sono segmentati con Bayesian Blocks sui tempi di arrivo e le
+    statistiche per pulse vengono da somme prefisse (light_curve_blocks).
     """
     times = grb_data['times']
     energies = grb_data['energies']
-    metadata = grb_data['metadata']
     
     print(f"\n🔍 ANALISI INTRINSIC LAG")
     
-    # Semplice rilevamento pulse: trova picchi nella light curve
-    bins = np.linspace(times.min(), times.max(), 50)
-    hist, bin_edges = np.histogram(times, bins=bins)
+    # Stessa conversione in GeV di fit_energy_time_correlation
+    energies_gev = np.where(energies > 100, energies / 1000, energies)
     
-    # Trova picchi sopra soglia
-    peak_threshold = np.max(hist) * pulse_detection_threshold
-    peak_bins = bins[:-1][hist > peak_threshold]
+    # Pulse detection: Bayesian Blocks + picchi sopra soglia
+    pulses, block_edges = pulse_lag_analysis(times, energies_gev,
+                                             threshold=pulse_detection_threshold)
     
-    if len(peak_bins) < 2:
+    if len(pulses) < 2:
         print("   ⚠️ Nessun pulse rilevato per analisi intrinsic lag")
         return None
     
-    print(f"   ✓ Rilevati {len(peak_bins)} pulse")
+    print(f"   ✓ Rilevati {len(pulses)} pulse ({len(block_edges) - 1} Bayesian blocks)")
     
-    # Analizza correlazione E-t per ogni pulse
-    pulse_results = []
-    for i, peak_time in enumerate(peak_bins):
-        # Fotoni in questo pulse (±2s)
-        pulse_mask = np.abs(times - peak_time) < 2.0
-        times_pulse = times[pulse_mask]
-        energies_pulse = energies[pulse_mask]
-        
-        if len(times_pulse) < 5:
-            continue
-            
-        fit_pulse = fit_energy_time_correlation(times_pulse, energies_pulse, metadata['redshift'])
-        if fit_pulse:
-            pulse_results.append({
-                'pulse_id': i,
-                'peak_time': peak_time,
-                'n_photons': len(times_pulse),
-                'correlation': fit_pulse['correlation'],
-                'p_value': fit_pulse['p_value']
-            })
+    # Correlazione E-t per ogni pulse
+    pulse_results = [{
+        'pulse_id': p['pulse_id'],
+        'peak_time': p['peak_time'],
+        'n_photons': p['n_photons'],
+        'correlation': p['correlation'],
+        'p_value': p['p_value']
+    } for p in pulses if np.isfinite(p['correlation'])]
     
     if pulse_results:
         avg_correlation = np.mean([p['correlation'] for p in pulse_results])
@@ -892,7 +935,8 @@ def intrinsic_lag_analysis(grb_data, pulse_detection_threshold=0.1):
             'n_pulses': len(pulse_results),
             'avg_correlation': avg_correlation,
             'avg_p_value': avg_p_value,
-            'intrinsic_lag_detected': avg_p_value < 0.05
+            'intrinsic_lag_detected': avg_p_value < 0.05,
+            'pulses': pulse_results
         }
     
     return None